@@ -1,7 +1,25 @@
 #!/bin/bash
 # Check LSP binary availability
-# Usage: check-binaries.sh [server1] [server2] ...
-# If no arguments, checks all servers from registry
+# Usage: check-binaries.sh [--jsonl] [server1] [server2] ...
+# If no servers are given, checks all servers from registry
+#
+# Prints one JSON document:
+#   {"servers": {"<server>": {"status": "installed|missing|unknown",
+#                             "command": ..., "path": ..., "root": ...,
+#                             "shadowed": [...]}},
+#    "summary": {"installed": N, "missing": N, "unknown": N}}
+# or, with --jsonl, one {"server": ..., "status": ...} object per line.
+#
+# Binaries are searched for in PATH, then $LSPCTL_SEARCH_ROOTS, Mason's bin
+# directory, the current project's .venv/bin, venv/bin and
+# node_modules/.bin, and cargo and go bin directories (the same roots, in
+# the same order, as lspctl_resolve.py). "root" is the kind of directory
+# the binary was found in; "shadowed" lists executables of the same name
+# found later.
+#
+# The registry is read by one jq call and results are rendered by another;
+# PATH lookups happen in the shell, so the process count does not grow with
+# the number of servers. Exits 1 if any server is missing or unknown.
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 REGISTRY="$SCRIPT_DIR/../registry/servers.json"
@@ -12,35 +30,116 @@ if ! command -v jq &> /dev/null; then
     exit 1
 fi
 
-# Function to check a single binary
+FORMAT="document"
+if [ "$1" = "--jsonl" ]; then
+    FORMAT="jsonl"
+    shift
+fi
+
+# Build the search roots once, dropping repeated entries
+SEARCH_DIRS=()
+SEARCH_KINDS=()
+seen=":"
+add_root() {
+    case "$seen" in
+        *":$2:"*) return ;;
+    esac
+    seen="$seen$2:"
+    SEARCH_KINDS+=("$1")
+    SEARCH_DIRS+=("$2")
+}
+# Empty PATH entries mean "."
+IFS=: read -r -a raw_dirs <<< "$PATH"
+for dir in "${raw_dirs[@]}"; do
+    add_root path "${dir:-.}"
+done
+IFS=: read -r -a raw_dirs <<< "${LSPCTL_SEARCH_ROOTS:-}"
+for dir in "${raw_dirs[@]}"; do
+    [ -z "$dir" ] || add_root extra "$dir"
+done
+if [ -n "$MASON" ]; then
+    add_root mason "$MASON/bin"
+else
+    add_root mason "${XDG_DATA_HOME:-$HOME/.local/share}/nvim/mason/bin"
+fi
+add_root venv "$PWD/.venv/bin"
+add_root venv "$PWD/venv/bin"
+add_root node_modules "$PWD/node_modules/.bin"
+add_root cargo "${CARGO_HOME:-$HOME/.cargo}/bin"
+[ -z "$GOBIN" ] || add_root go "$GOBIN"
+IFS=: read -r -a raw_dirs <<< "${GOPATH:-$HOME/go}"
+for dir in "${raw_dirs[@]}"; do
+    [ -z "$dir" ] || add_root go "$dir/bin"
+done
+
+# Emit "server<TAB>status<TAB>command<TAB>root<TAB>path<TAB>shadowed..." for one server
 check_binary() {
     local server="$1"
-    local command=$(jq -r ".\"$server\".command // empty" "$REGISTRY")
+    local command="$2"
 
     if [ -z "$command" ]; then
-        echo "UNKNOWN:$server"
-        return 1
+        printf '%s\tunknown\t\t\n' "$server"
+        return
     fi
 
-    if command -v "$command" &> /dev/null; then
-        local path=$(which "$command")
-        echo "INSTALLED:$server:$command:$path"
-        return 0
+    local found=()
+    local root="" i candidate previous duplicate
+    for i in "${!SEARCH_DIRS[@]}"; do
+        candidate="${SEARCH_DIRS[$i]}/$command"
+        [ -f "$candidate" ] && [ -x "$candidate" ] || continue
+        # Skip the same file reached through a symlinked directory
+        duplicate=""
+        for previous in "${found[@]}"; do
+            if [ "$candidate" -ef "$previous" ]; then
+                duplicate=1
+                break
+            fi
+        done
+        [ -n "$duplicate" ] && continue
+        [ ${#found[@]} -gt 0 ] || root="${SEARCH_KINDS[$i]}"
+        found+=("$candidate")
+    done
+
+    if [ ${#found[@]} -eq 0 ]; then
+        printf '%s\tmissing\t%s\t\n' "$server" "$command"
     else
-        echo "MISSING:$server:$command"
-        return 1
+        local IFS=$'\t'
+        printf '%s\tinstalled\t%s\t%s\t%s\n' "$server" "$command" "$root" "${found[*]}"
     fi
 }
 
-# If arguments provided, check only those
-if [ $# -gt 0 ]; then
-    for server in "$@"; do
-        check_binary "$server"
-    done
-else
-    # Check all servers from registry
-    servers=$(jq -r 'keys[]' "$REGISTRY")
-    for server in $servers; do
-        check_binary "$server"
+# Read every requested server's command in one pass over the registry
+results=$(
+    jq -r '. as $registry
+        | (if ($ARGS.positional | length) > 0 then $ARGS.positional else ($registry | keys) end)[]
+        | [., ($registry[.].command // "")]
+        | @tsv' "$REGISTRY" --args "$@" |
+    while IFS=$'\t' read -r server command; do
+        check_binary "$server" "$command"
     done
-fi
+)
+
+printf '%s\n' "$results" | jq -R -s -r --arg format "$FORMAT" '
+    [split("\n")[] | select(length > 0) | split("\t") | {
+        server: .[0],
+        status: .[1]
+    }
+    + (if .[2] != "" then {command: .[2]} else {} end)
+    + (if .[1] == "installed" then {path: .[4], root: .[3], shadowed: .[5:]} else {} end)]
+    | if $format == "jsonl" then
+        .[] | tojson
+    else
+        {
+            servers: (map({key: .server, value: del(.server)}) | from_entries),
+            summary: {
+                installed: map(select(.status == "installed")) | length,
+                missing: map(select(.status == "missing")) | length,
+                unknown: map(select(.status == "unknown")) | length
+            }
+        }
+    end'
+
+case "$results" in
+    *$'\tmissing\t'* | *$'\tunknown\t'*) exit 1 ;;
+esac
+exit 0
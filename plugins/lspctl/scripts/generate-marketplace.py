@@ -3,7 +3,12 @@
 Generate Claude Code marketplace structure from LSP configuration.
 
 This script takes a parsed LSP config (JSON) and server registry,
-then generates a complete marketplace with individual LSP plugins.
+then generates a complete marketplace with individual LSP plugins, or
+with --bundle a single plugin holding every server.
+
+The implementation lives in the lspctl_* modules beside this script. They
+are byte-compiled once and each mode imports only the modules it uses, so
+quick commands like --help and --remove do not pay for the rest.
 
 Usage:
     python3 generate-marketplace.py \
@@ -15,342 +20,8 @@ Usage:
 import argparse
 import json
 import os
-import shutil
-import subprocess
 import sys
 from pathlib import Path
-from typing import Any
-
-
-def load_json(path: Path) -> dict:
-    """Load JSON file."""
-    with open(path) as f:
-        return json.load(f)
-
-
-def save_json(path: Path, data: dict, indent: int = 2) -> None:
-    """Save JSON file with pretty formatting."""
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(data, f, indent=indent)
-        f.write("\n")
-
-
-def check_binary(command: str) -> bool:
-    """Check if a binary exists in PATH."""
-    result = subprocess.run(
-        ["which", command],
-        capture_output=True,
-        text=True
-    )
-    return result.returncode == 0
-
-
-def generate_plugin_json(server_name: str, registry_entry: dict) -> dict:
-    """Generate plugin.json for an LSP server."""
-    return {
-        "name": registry_entry["pluginName"],
-        "description": f"{registry_entry['description']} for Claude Code",
-        "version": "1.0.0"
-    }
-
-
-def generate_lsp_json(server_name: str, registry_entry: dict, user_settings: dict) -> dict:
-    """Generate .lsp.json for an LSP server."""
-    language = registry_entry["language"]
-
-    lsp_config = {
-        "command": registry_entry["command"],
-        "extensionToLanguage": registry_entry["extensionToLanguage"]
-    }
-
-    # Add args if present
-    if registry_entry.get("args"):
-        lsp_config["args"] = registry_entry["args"]
-
-    # Merge user settings
-    if user_settings.get("settings"):
-        lsp_config["settings"] = user_settings["settings"]
-
-    return {language: lsp_config}
-
-
-def generate_marketplace_json(plugins: list[dict]) -> dict:
-    """Generate marketplace.json."""
-    return {
-        "name": "generated-lsp",
-        "owner": {
-            "name": "lspctl"
-        },
-        "metadata": {
-            "description": "Auto-generated LSP plugins from lsp-config.lua",
-            "version": "1.0.0",
-            "pluginRoot": "./plugins"
-        },
-        "plugins": plugins
-    }
-
-
-def generate_marketplace(
-    config: dict,
-    registry: dict,
-    output_dir: Path
-) -> dict:
-    """
-    Generate complete marketplace structure.
-
-    Returns dict with:
-        - generated: list of generated plugin names
-        - missing_binaries: dict of server -> install commands
-        - unknown_servers: list of servers not in registry
-    """
-    result = {
-        "generated": [],
-        "missing_binaries": {},
-        "unknown_servers": []
-    }
-
-    ensure_installed = config.get("ensure_installed", [])
-    servers_config = config.get("servers", {})
-
-    # Clean output directory
-    if output_dir.exists():
-        shutil.rmtree(output_dir)
-
-    # Create directory structure
-    plugins_dir = output_dir / "plugins"
-    plugins_dir.mkdir(parents=True, exist_ok=True)
-    (output_dir / ".claude-plugin").mkdir(parents=True, exist_ok=True)
-
-    marketplace_plugins = []
-
-    for server_name in ensure_installed:
-        if server_name not in registry:
-            result["unknown_servers"].append(server_name)
-            print(f"Warning: Unknown server '{server_name}' - skipping", file=sys.stderr)
-            continue
-
-        registry_entry = registry[server_name]
-        plugin_name = registry_entry["pluginName"]
-        user_settings = servers_config.get(server_name, {})
-
-        # Check binary availability
-        command = registry_entry["command"]
-        if not check_binary(command):
-            result["missing_binaries"][server_name] = registry_entry.get("installCommands", {})
-
-        # Create plugin directory
-        plugin_dir = plugins_dir / plugin_name
-        (plugin_dir / ".claude-plugin").mkdir(parents=True, exist_ok=True)
-
-        # Generate plugin.json
-        plugin_json = generate_plugin_json(server_name, registry_entry)
-        save_json(plugin_dir / ".claude-plugin" / "plugin.json", plugin_json)
-
-        # Generate .lsp.json
-        lsp_json = generate_lsp_json(server_name, registry_entry, user_settings)
-        save_json(plugin_dir / ".lsp.json", lsp_json)
-
-        # Add to marketplace plugins list
-        marketplace_plugins.append({
-            "name": plugin_name,
-            "source": f"./plugins/{plugin_name}",
-            "description": registry_entry["description"],
-            "keywords": ["lsp", registry_entry["language"]]
-        })
-
-        result["generated"].append(plugin_name)
-
-    # Generate marketplace.json
-    marketplace_json = generate_marketplace_json(marketplace_plugins)
-    save_json(output_dir / ".claude-plugin" / "marketplace.json", marketplace_json)
-
-    return result
-
-
-def update_settings(settings_path: Path, marketplace_path: Path) -> None:
-    """Add marketplace to Claude Code settings."""
-    settings = {}
-
-    if settings_path.exists():
-        try:
-            settings = load_json(settings_path)
-        except json.JSONDecodeError:
-            print(f"Warning: Could not parse {settings_path}, creating new", file=sys.stderr)
-
-    # Ensure extraKnownMarketplaces exists
-    if "extraKnownMarketplaces" not in settings:
-        settings["extraKnownMarketplaces"] = {}
-
-    # Add or update the generated-lsp marketplace
-    # Local paths use "directory" source type
-    settings["extraKnownMarketplaces"]["generated-lsp"] = {
-        "source": {
-            "source": "directory",
-            "path": str(marketplace_path.absolute())
-        }
-    }
-
-    save_json(settings_path, settings)
-
-
-def remove_from_marketplace(
-    server_name: str,
-    registry: dict,
-    output_dir: Path
-) -> dict:
-    """
-    Remove a single server from existing marketplace.
-
-    Returns dict with:
-        - removed: plugin name that was removed (or None)
-        - binary_uninstall_commands: dict of uninstall commands
-        - remaining_plugins: list of remaining plugin names
-        - marketplace_empty: bool if no plugins remain
-    """
-    result = {
-        "removed": None,
-        "binary_uninstall_commands": {},
-        "remaining_plugins": [],
-        "marketplace_empty": False,
-        "error": None
-    }
-
-    # Check if marketplace exists
-    marketplace_json_path = output_dir / ".claude-plugin" / "marketplace.json"
-    if not marketplace_json_path.exists():
-        result["error"] = f"Marketplace not found at {output_dir}"
-        return result
-
-    # Check if server is in registry
-    if server_name not in registry:
-        result["error"] = f"Unknown server: {server_name}"
-        return result
-
-    registry_entry = registry[server_name]
-    plugin_name = registry_entry["pluginName"]
-
-    # Load marketplace.json
-    marketplace = load_json(marketplace_json_path)
-
-    # Find and remove plugin
-    plugins = marketplace.get("plugins", [])
-    plugin_found = False
-    updated_plugins = []
-
-    for plugin in plugins:
-        if plugin["name"] == plugin_name:
-            plugin_found = True
-        else:
-            updated_plugins.append(plugin)
-            result["remaining_plugins"].append(plugin["name"])
-
-    if not plugin_found:
-        result["error"] = f"Plugin '{plugin_name}' not found in marketplace"
-        return result
-
-    # Remove plugin directory
-    plugin_dir = output_dir / "plugins" / plugin_name
-    if plugin_dir.exists():
-        shutil.rmtree(plugin_dir)
-
-    # Update marketplace.json
-    marketplace["plugins"] = updated_plugins
-    save_json(marketplace_json_path, marketplace)
-
-    result["removed"] = plugin_name
-    result["binary_uninstall_commands"] = registry_entry.get("installCommands", {})
-    result["marketplace_empty"] = len(updated_plugins) == 0
-
-    return result
-
-
-def remove_settings_marketplace(settings_path: Path) -> bool:
-    """Remove generated-lsp marketplace from settings.json."""
-    if not settings_path.exists():
-        return False
-
-    try:
-        settings = load_json(settings_path)
-    except json.JSONDecodeError:
-        return False
-
-    if "extraKnownMarketplaces" not in settings:
-        return False
-
-    if "generated-lsp" not in settings["extraKnownMarketplaces"]:
-        return False
-
-    del settings["extraKnownMarketplaces"]["generated-lsp"]
-
-    # Clean up empty extraKnownMarketplaces
-    if not settings["extraKnownMarketplaces"]:
-        del settings["extraKnownMarketplaces"]
-
-    save_json(settings_path, settings)
-    return True
-
-
-def deregister_marketplace(
-    output_dir: Path,
-    settings_path: Path | None = None,
-    delete_files: bool = True
-) -> dict:
-    """
-    Deregister and optionally delete the marketplace.
-
-    Returns dict with:
-        - deregistered: bool if settings were updated
-        - plugins_removed: list of plugins that were in marketplace
-        - files_deleted: bool if directory was deleted
-        - error: error message if any
-    """
-    result = {
-        "deregistered": False,
-        "plugins_removed": [],
-        "files_deleted": False,
-        "error": None
-    }
-
-    # Get list of plugins before deletion
-    marketplace_json_path = output_dir / ".claude-plugin" / "marketplace.json"
-    if marketplace_json_path.exists():
-        try:
-            marketplace = load_json(marketplace_json_path)
-            result["plugins_removed"] = [p["name"] for p in marketplace.get("plugins", [])]
-        except json.JSONDecodeError:
-            pass
-
-    # Remove from settings
-    if settings_path:
-        result["deregistered"] = remove_settings_marketplace(settings_path)
-
-    # Delete marketplace directory
-    if delete_files and output_dir.exists():
-        shutil.rmtree(output_dir)
-        result["files_deleted"] = True
-
-    return result
-
-
-def get_scope_paths(scope: str) -> tuple[Path, Path]:
-    """Get output and settings paths based on scope."""
-    home = Path.home()
-    cwd = Path.cwd()
-
-    if scope == "user":
-        output = home / ".claude" / "generated-lsp-marketplace"
-        settings = home / ".claude" / "settings.json"
-    elif scope == "project":
-        output = cwd / ".claude" / "generated-lsp-marketplace"
-        settings = cwd / ".claude" / "settings.json"
-    elif scope == "local":
-        output = cwd / ".claude" / "generated-lsp-marketplace"
-        settings = cwd / ".claude" / "settings.local.json"
-    else:
-        raise ValueError(f"Unknown scope: {scope}")
-
-    return output, settings
 
 
 def main():
@@ -365,7 +36,7 @@ def main():
     parser.add_argument(
         "--registry",
         type=Path,
-        help="Path to server registry JSON"
+        help="Path to server registry (JSON or SQLite store from import-mason-registry.py)"
     )
     parser.add_argument(
         "--output",
@@ -387,6 +58,16 @@ def main():
         action="store_true",
         help="Output result as JSON"
     )
+    parser.add_argument(
+        "--events",
+        action="store_true",
+        help="Stream progress as JSON lines while working, ending with a \"result\" event"
+    )
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Put every server in one lsp-bundle plugin instead of one plugin per server"
+    )
     parser.add_argument(
         "--remove",
         type=str,
@@ -398,9 +79,162 @@ def main():
         action="store_true",
         help="Deregister and remove the entire marketplace"
     )
+    plan_group = parser.add_argument_group("plan/apply")
+    plan_group.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the add/update/remove/noop plan for --config without changing anything"
+    )
+    plan_group.add_argument(
+        "--apply",
+        action="store_true",
+        help="Plan, then regenerate and install/uninstall only the plugins that changed"
+    )
+    plan_group.add_argument(
+        "--claude",
+        default="claude",
+        help="Claude CLI executable for --apply (default: claude on PATH)"
+    )
+    watch_group = parser.add_argument_group("watch mode")
+    watch_group.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep the marketplace in sync as the config, registry and PATH change (Linux)"
+    )
+    watch_group.add_argument(
+        "--lua-config",
+        type=Path,
+        metavar="PATH",
+        help="lsp-config.lua to parse and watch"
+    )
+    watch_group.add_argument(
+        "--layer",
+        action="append",
+        default=[],
+        metavar="NAME=PATH",
+        help="Config layer to parse and watch; for --fleet, {} in PATH is each project "
+             "(repeatable, lowest precedence first; default for --fleet: user, project, local)"
+    )
+    watch_group.add_argument(
+        "--import-nvim",
+        type=Path,
+        metavar="DIR",
+        help="Neovim config tree to import and watch"
+    )
+    watch_group.add_argument(
+        "--debounce",
+        type=float,
+        default=0.3,
+        metavar="SECONDS",
+        help="Quiet period that ends a burst of changes (default: 0.3)"
+    )
+    watch_group.add_argument(
+        "--max-syncs",
+        type=int,
+        metavar="N",
+        help="Exit after N re-syncs following the initial one"
+    )
+    watch_group.add_argument(
+        "--lua",
+        default="lua",
+        help="Lua interpreter for the config parser in --watch/--fleet (default: lua)"
+    )
+    fleet_group = parser.add_argument_group("fleet mode")
+    fleet_group.add_argument(
+        "--fleet",
+        type=Path,
+        metavar="ROOT",
+        help="Sync the project scope of every .claude/lsp-config.lua found under ROOT"
+    )
+    fleet_group.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Parser and generator processes for --fleet (default: CPU count)"
+    )
+    state_group = parser.add_argument_group("state store")
+    state_group.add_argument(
+        "--state",
+        type=Path,
+        help="State database path (default: $LSPCTL_STATE_DB or ~/.claude/lspctl-state.db)"
+    )
+    state_group.add_argument(
+        "--no-state",
+        action="store_true",
+        help="Do not read or record lspctl state"
+    )
+    state_group.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Write plugin files into the marketplace instead of linking shared copies"
+    )
+    state_group.add_argument(
+        "--gc-blobs",
+        action="store_true",
+        help="Delete shared plugin files that no marketplace links to any more"
+    )
+    state_group.add_argument(
+        "--rebuild-state",
+        action="store_true",
+        help="Rebuild the scope's state from the marketplace files on disk"
+    )
+    state_group.add_argument(
+        "--show-state",
+        action="store_true",
+        help="Show the scope's plugins, binaries and recent history from the state store"
+    )
+    state_group.add_argument(
+        "--record-install",
+        type=str,
+        metavar="SERVER",
+        help="Record a binary install attempt for SERVER in the install history"
+    )
+    state_group.add_argument(
+        "--install-status",
+        choices=["ok", "failed"],
+        default="ok",
+        help="Outcome for --record-install (default: ok)"
+    )
+    state_group.add_argument(
+        "--install-method",
+        type=str,
+        help="Install method for --record-install (e.g. npm, pip)"
+    )
+    state_group.add_argument(
+        "--install-duration",
+        type=float,
+        metavar="SECONDS",
+        help="Install duration for --record-install"
+    )
 
     args = parser.parse_args()
 
+    from lspctl_marketplace import (
+        EventStream,
+        deregister_marketplace,
+        generate_marketplace,
+        get_scope_paths,
+        load_json,
+        load_registry,
+        no_events,
+        open_state,
+        rebuild_state,
+        remove_from_marketplace,
+        show_state,
+        update_settings,
+    )
+
+    # --events replaces the final JSON document with a stream that ends in it
+    events = EventStream() if args.events else no_events
+    if args.events:
+        args.json_output = True
+
+    def print_result(result: dict) -> None:
+        if args.events:
+            events("result", result=result)
+        else:
+            print(json.dumps(result, indent=2))
+
     # Determine output and settings paths
     if args.scope:
         scope_output, scope_settings = get_scope_paths(args.scope)
@@ -410,27 +244,8 @@ def main():
         output_dir = args.output
         settings_path = args.settings
 
-    # Handle --deregister mode
-    if args.deregister:
-        if not output_dir:
-            parser.error("--output or --scope is required for --deregister")
-
-        result = deregister_marketplace(output_dir, settings_path, delete_files=True)
-        result["marketplace_path"] = str(output_dir)
-
-        if args.json_output:
-            print(json.dumps(result, indent=2))
-        else:
-            if result["files_deleted"]:
-                print(f"Marketplace deleted: {output_dir}")
-            if result["deregistered"]:
-                print(f"Marketplace removed from settings: {settings_path}")
-            if result["plugins_removed"]:
-                print(f"\nPlugins removed:")
-                for plugin in result["plugins_removed"]:
-                    print(f"  - {plugin}")
-            print("\n** RELOAD Claude Code for changes to take effect **")
-        return
+    # Project scopes may also use binaries from the project's venv and node_modules
+    search_project = Path.cwd() if args.scope in ("project", "local") else None
 
     # Handle --remove mode
     if args.remove:
@@ -439,12 +254,14 @@ def main():
         if not args.registry:
             parser.error("--registry is required for --remove")
 
-        registry = load_json(args.registry)
+        registry = load_registry(args.registry)
+        # marketplace.json is the record; the state store catches up on its
+        # next read (see StateStore.is_current()), so --remove never opens it
         result = remove_from_marketplace(args.remove, registry, output_dir)
         result["marketplace_path"] = str(output_dir)
 
         if args.json_output:
-            print(json.dumps(result, indent=2))
+            print_result(result)
         else:
             if result["error"]:
                 print(f"Error: {result['error']}", file=sys.stderr)
@@ -465,6 +282,256 @@ def main():
                 print("\n** Run 'claude plugin uninstall <plugin>@generated-lsp' to remove from Claude Code **")
         return
 
+    if args.no_state:
+        state = None
+    elif args.rebuild_state:
+        from lspctl_state import StateStore
+
+        state = StateStore.open_or_reset(args.state)
+    else:
+        state = open_state(args.state)
+
+    if args.no_dedup:
+        blobs = None
+    else:
+        from lspctl_blobs import BlobStore
+
+        blobs = BlobStore()
+
+    if args.gc_blobs:
+        if blobs is None:
+            parser.error("--gc-blobs cannot be combined with --no-dedup")
+        result = blobs.gc()
+        if args.json_output:
+            print_result(result)
+        else:
+            print(f"Removed {len(result['removed'])} unreferenced plugin blobs, kept {result['kept']}")
+        return
+
+    # Handle state store modes
+    if args.rebuild_state or args.show_state:
+        if not output_dir:
+            parser.error("--output or --scope is required for --rebuild-state/--show-state")
+        if state is None:
+            parser.error("--rebuild-state/--show-state need the state store")
+
+        if args.rebuild_state:
+            from lspctl_resolve import BinaryResolver, default_search_roots
+
+            registry = load_registry(args.registry) if args.registry else None
+            resolver = BinaryResolver(default_search_roots(search_project), search_project, state)
+            result = rebuild_state(state, output_dir, settings_path, registry, resolver)
+            if not args.json_output:
+                print(f"Rebuilt state for {output_dir}: {len(result['plugins'])} plugins")
+        else:
+            result = show_state(state, output_dir)
+            if not args.json_output:
+                print(f"State for {output_dir}:")
+                for plugin in result["plugins"]:
+                    binary = plugin["binary"] or {}
+                    location = binary.get("path") or "missing"
+                    version = binary.get("version") or ""
+                    print(f"  - {plugin['plugin_name']} ({plugin['server_name']}): {location} {version}".rstrip())
+                for server, health in result["health"].items():
+                    label = "Unhealthy" if health["unhealthy"] else "Crashed"
+                    print(
+                        f"{label}: {server}, {health['crashes']} crashes in the last day, "
+                        f"last exit {health['last_exit_code']} (log: {health['log']})"
+                    )
+        if args.json_output:
+            print_result(result)
+        return
+
+    if args.record_install:
+        if state is None:
+            parser.error("--record-install needs the state store")
+        duration_ms = args.install_duration * 1000 if args.install_duration is not None else None
+        state.record_event(
+            "install", args.install_status,
+            marketplace=output_dir,
+            server_name=args.record_install,
+            duration_ms=duration_ms,
+            detail=args.install_method
+        )
+        if args.json_output:
+            print_result({"recorded": args.record_install, "status": args.install_status})
+        return
+
+    # Handle --deregister mode
+    if args.deregister:
+        if not output_dir:
+            parser.error("--output or --scope is required for --deregister")
+
+        result = deregister_marketplace(output_dir, settings_path, delete_files=True, state=state)
+        result["marketplace_path"] = str(output_dir)
+
+        if args.json_output:
+            print_result(result)
+        else:
+            if result["files_deleted"]:
+                print(f"Marketplace deleted: {output_dir}")
+            if result["deregistered"]:
+                print(f"Marketplace removed from settings: {settings_path}")
+            if result["plugins_removed"]:
+                print(f"\nPlugins removed:")
+                for plugin in result["plugins_removed"]:
+                    print(f"  - {plugin}")
+            print("\n** RELOAD Claude Code for changes to take effect **")
+        return
+
+
+    if args.bundle and (args.watch or args.fleet):
+        parser.error("--bundle cannot be combined with --watch or --fleet")
+
+    # Handle --watch mode
+    if args.watch:
+        from lspctl_watch import watch_config
+
+        if not args.registry:
+            parser.error("--registry is required for --watch")
+        if not output_dir:
+            parser.error("--output or --scope is required for --watch")
+        sources = [bool(args.lua_config), bool(args.layer), bool(args.import_nvim)]
+        if sum(sources) != 1:
+            parser.error("--watch needs exactly one of --lua-config, --layer or --import-nvim")
+
+        module_root = None
+        if args.lua_config:
+            parse_argv = [str(args.lua_config)]
+            config_paths = [args.lua_config]
+        elif args.layer:
+            parse_argv = [arg for layer in args.layer for arg in ("--layer", layer)]
+            config_paths = [Path(layer.partition("=")[2]) for layer in args.layer]
+        else:
+            module_root = Path(os.path.abspath(args.import_nvim))
+            parse_argv = ["--import-nvim", str(module_root)]
+            config_paths = [module_root / "init.lua"]
+
+        def emit(report: dict) -> None:
+            if args.events:
+                events("sync", **report)
+                return
+            if args.json_output:
+                print(json.dumps(report), flush=True)
+                return
+            line = f"[{', '.join(report['stages'])}]"
+            if report["error"]:
+                line += f" error: {report['error']}"
+            if report["generated"]:
+                line += f" regenerated {', '.join(report['generated'])};"
+            if report["removed"]:
+                line += f" removed {', '.join(report['removed'])};"
+            if report["missing_binaries"]:
+                line += f" missing binaries: {', '.join(report['missing_binaries'])};"
+            print(f"{line.rstrip(';')} ({report['duration_ms']:.0f}ms)", flush=True)
+
+        try:
+            watch_config(
+                parse_argv, config_paths, args.registry, output_dir, settings_path, state,
+                module_root=module_root,
+                debounce=args.debounce,
+                max_syncs=args.max_syncs,
+                lua=args.lua,
+                emit=emit,
+                blobs=blobs,
+                project=search_project
+            )
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"Error: Cannot watch: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    # Handle --fleet mode
+    if args.fleet:
+        from lspctl_fleet import sync_fleet
+
+        if not args.registry:
+            parser.error("--registry is required for --fleet")
+        if not args.fleet.is_dir():
+            parser.error(f"--fleet root is not a directory: {args.fleet}")
+
+        registry = load_registry(args.registry)
+        result = sync_fleet(
+            args.fleet.resolve(), registry, state,
+            workers=args.workers, lua=args.lua, blobs=blobs, events=events,
+            layers=args.layer or None
+        )
+
+        if args.json_output:
+            print_result(result)
+        else:
+            for project in result["projects"]:
+                if project["error"]:
+                    print(f"  FAILED {project['project']}: {project['error']}")
+                else:
+                    missing = f", missing: {', '.join(project['missing_binaries'])}" \
+                        if project["missing_binaries"] else ""
+                    print(f"  ok     {project['project']}: {len(project['generated'])} plugins "
+                          f"({project['generate_ms']:.0f}ms{missing})")
+            summary = result["summary"]
+            print(f"\nSynced {summary['succeeded']}/{summary['projects']} projects, "
+                  f"{summary['plugins']} plugins in {result['timings_ms']['total'] / 1000:.1f}s")
+            if summary["succeeded"]:
+                print("\n** RELOAD Claude Code in the synced projects for changes to take effect **")
+        if result["summary"]["failed"]:
+            sys.exit(1)
+        return
+
+    # Handle plan/apply modes
+    if args.dry_run or args.apply:
+        from lspctl_plan import apply_plan, plan_sync
+        from lspctl_resolve import BinaryResolver, PlanResolver, default_search_roots
+
+        if not args.config or not args.registry:
+            parser.error("--config and --registry are required for --dry-run/--apply")
+        if not output_dir:
+            parser.error("--output or --scope is required")
+
+        config = load_json(args.config)
+        registry = load_registry(args.registry)
+        # A dry run must not run version managers; --apply resolves for real
+        resolver_class = PlanResolver if args.dry_run else BinaryResolver
+        resolver = resolver_class(default_search_roots(search_project), search_project, state)
+        plan = plan_sync(
+            config, registry, output_dir, settings_path, args.scope, state,
+            bundle=args.bundle, resolver=resolver
+        )
+
+        if args.dry_run:
+            result = plan
+        else:
+            events("plan", summary=plan["summary"], regenerate=plan["regenerate"])
+            result = apply_plan(
+                plan, config, registry, output_dir, settings_path, args.scope, state,
+                blobs=blobs, events=events, bundle=args.bundle, resolver=resolver,
+                claude=args.claude
+            )
+
+        if args.json_output:
+            print_result(result)
+        else:
+            for step in plan["steps"]:
+                print(f"  {step['action']:<7} {step['plugin']} ({step['reason']})")
+            summary = plan["summary"]
+            print(f"\nPlan: {summary['add']} to add, {summary['update']} to update, "
+                  f"{summary['remove']} to remove, {summary['noop']} unchanged")
+            if args.apply:
+                for phase in ("uninstall", "install"):
+                    report = result[phase]
+                    if report is None:
+                        continue
+                    for op in report["results"]:
+                        if op["status"] != "ok":
+                            print(f"  {phase} {op['plugin']} {op['status']}: {op['output'].strip()}",
+                                  file=sys.stderr)
+                if any(step["action"] != "noop" for step in plan["steps"]):
+                    print("\n** RELOAD Claude Code for changes to take effect **")
+        if args.apply and not result["ok"]:
+            sys.exit(1)
+        return
+
     # Default: Generate marketplace
     if not args.config:
         parser.error("--config is required for marketplace generation")
@@ -475,10 +542,18 @@ def main():
 
     # Load inputs
     config = load_json(args.config)
-    registry = load_json(args.registry)
+    registry = load_registry(args.registry)
+
+    events("config_loaded", config=str(args.config), servers=config.get("ensure_installed", []))
 
     # Generate marketplace
-    result = generate_marketplace(config, registry, output_dir)
+    from lspctl_resolve import BinaryResolver, default_search_roots
+
+    result = generate_marketplace(
+        config, registry, output_dir, state, settings_path,
+        blobs=blobs, events=events, bundle=args.bundle,
+        resolver=BinaryResolver(default_search_roots(search_project), search_project, state)
+    )
     result["marketplace_path"] = str(output_dir)
 
     # Update settings if specified
@@ -488,7 +563,7 @@ def main():
 
     # Output results
     if args.json_output:
-        print(json.dumps(result, indent=2))
+        print_result(result)
     else:
         print(f"\nGenerated {len(result['generated'])} LSP plugins:")
         for plugin in result["generated"]:
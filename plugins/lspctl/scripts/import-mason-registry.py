@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Import a Mason registry snapshot into an indexed lspctl registry store.
+
+Reads a local copy of the Mason registry (registry.json or the
+registry.json.zip release asset, no network access) and translates every
+language server package into an lspctl registry entry. Entries are written
+to a SQLite database indexed by server name, language and file extension,
+which generate-marketplace.py accepts as --registry.
+
+Entries from an overlay registry (the hand-maintained servers.json) take
+precedence over the Mason translation.
+
+Usage:
+    python3 import-mason-registry.py \
+        --snapshot <registry.json[.zip]> \
+        --output <registry.db> \
+        [--overlay <servers.json>]
+
+    python3 import-mason-registry.py --output <registry.db> --find-extension .py
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import zipfile
+from pathlib import Path
+
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE servers (
+    name TEXT PRIMARY KEY,
+    plugin_name TEXT NOT NULL,
+    language TEXT NOT NULL,
+    command TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE TABLE server_extensions (
+    extension TEXT NOT NULL,
+    name TEXT NOT NULL REFERENCES servers(name),
+    PRIMARY KEY (extension, name)
+);
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE INDEX servers_language ON servers(language);
+CREATE INDEX servers_plugin_name ON servers(plugin_name);
+CREATE INDEX server_extensions_name ON server_extensions(name);
+"""
+
+# Mason only records language names; map them to the file extensions and
+# language ids Claude Code needs in extensionToLanguage.
+LANGUAGE_EXTENSIONS = {
+    "Bash": {".sh": "shellscript", ".bash": "shellscript", ".zsh": "shellscript"},
+    "C": {".c": "c", ".h": "c"},
+    "C#": {".cs": "csharp"},
+    "C++": {".cpp": "cpp", ".hpp": "cpp", ".cc": "cpp", ".cxx": "cpp"},
+    "Clojure": {".clj": "clojure", ".cljs": "clojure", ".cljc": "clojure", ".edn": "clojure"},
+    "CMake": {".cmake": "cmake"},
+    "CSS": {".css": "css", ".scss": "scss", ".less": "less"},
+    "Dart": {".dart": "dart"},
+    "Dockerfile": {".dockerfile": "dockerfile"},
+    "Elixir": {".ex": "elixir", ".exs": "elixir"},
+    "Elm": {".elm": "elm"},
+    "Erlang": {".erl": "erlang", ".hrl": "erlang"},
+    "F#": {".fs": "fsharp", ".fsi": "fsharp", ".fsx": "fsharp"},
+    "Go": {".go": "go", ".mod": "gomod", ".sum": "gosum"},
+    "GraphQL": {".graphql": "graphql", ".gql": "graphql"},
+    "Haskell": {".hs": "haskell", ".lhs": "haskell"},
+    "HTML": {".html": "html", ".htm": "html"},
+    "Java": {".java": "java"},
+    "JavaScript": {".js": "javascript", ".jsx": "javascriptreact", ".mjs": "javascript", ".cjs": "javascript"},
+    "JSON": {".json": "json", ".jsonc": "jsonc"},
+    "Julia": {".jl": "julia"},
+    "Kotlin": {".kt": "kotlin", ".kts": "kotlin"},
+    "LaTeX": {".tex": "latex", ".bib": "bibtex"},
+    "Lua": {".lua": "lua"},
+    "Markdown": {".md": "markdown", ".markdown": "markdown"},
+    "Nix": {".nix": "nix"},
+    "OCaml": {".ml": "ocaml", ".mli": "ocaml"},
+    "Perl": {".pl": "perl", ".pm": "perl"},
+    "PHP": {".php": "php"},
+    "Python": {".py": "python", ".pyi": "python"},
+    "R": {".r": "r", ".R": "r"},
+    "Ruby": {".rb": "ruby", ".rake": "ruby", ".gemspec": "ruby"},
+    "Rust": {".rs": "rust"},
+    "Scala": {".scala": "scala", ".sc": "scala"},
+    "SQL": {".sql": "sql"},
+    "Svelte": {".svelte": "svelte"},
+    "Swift": {".swift": "swift"},
+    "Terraform": {".tf": "terraform", ".tfvars": "terraform"},
+    "TOML": {".toml": "toml"},
+    "TypeScript": {".ts": "typescript", ".tsx": "typescriptreact", ".mts": "typescript", ".cts": "typescript"},
+    "Vue": {".vue": "vue"},
+    "XML": {".xml": "xml", ".xsd": "xml"},
+    "YAML": {".yaml": "yaml", ".yml": "yaml"},
+    "Zig": {".zig": "zig"},
+}
+
+
+def load_snapshot(path: Path) -> list[dict]:
+    """Load the Mason registry from registry.json or registry.json.zip."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = [n for n in archive.namelist() if n.endswith(".json")]
+            if not names:
+                raise ValueError(f"No JSON file in {path}")
+            with archive.open(names[0]) as f:
+                packages = json.load(f)
+    else:
+        with open(path) as f:
+            packages = json.load(f)
+
+    if not isinstance(packages, list):
+        raise ValueError(f"Expected a list of packages in {path}")
+    return packages
+
+
+def parse_purl(source_id: str) -> tuple[str, str]:
+    """Split a package URL like pkg:npm/%40scope/name@1.0 into (type, name)."""
+    if not source_id.startswith("pkg:"):
+        return "", ""
+    kind, _, rest = source_id[4:].partition("/")
+    # Scoped npm names are percent-encoded (%40scope/name), so the first
+    # literal @ always starts the version
+    name = rest.split("?")[0].split("@")[0].replace("%40", "@")
+    return kind, name
+
+
+def install_commands(package: dict) -> dict:
+    """Derive lspctl installCommands from a Mason package source."""
+    kind, name = parse_purl(package.get("source", {}).get("id", ""))
+    commands = {}
+
+    if kind == "npm":
+        commands["npm"] = f"npm install -g {name}"
+    elif kind == "pypi":
+        commands["uv"] = f"uv tool install {name}"
+        commands["pipx"] = f"pipx install {name}"
+        commands["pip"] = f"pip install {name}"
+    elif kind == "cargo":
+        commands["cargo"] = f"cargo install {name}"
+    elif kind == "golang":
+        commands["go"] = f"go install {name}@latest"
+    elif kind == "gem":
+        commands["gem"] = f"gem install {name}"
+    elif kind == "luarocks":
+        commands["luarocks"] = f"luarocks install {name}"
+
+    # Every Mason package can be installed through Mason itself
+    commands["mason"] = f"nvim --headless -c 'MasonInstall {package['name']}' -c qa"
+    return commands
+
+
+def translate_package(package: dict) -> tuple[str, dict] | None:
+    """
+    Translate a Mason package into an lspctl registry entry.
+
+    Returns (lspconfig name, entry), or None for packages that aren't
+    language servers or have no lspconfig name or binary.
+    """
+    if "LSP" not in package.get("categories", []):
+        return None
+
+    server_name = package.get("neovim", {}).get("lspconfig")
+    binaries = list(package.get("bin", {}))
+    if not server_name or not binaries:
+        return None
+
+    # Prefer a binary that looks like the server over helper executables
+    command = next(
+        (b for b in binaries if "language-server" in b or "langserver" in b or b.endswith("ls")),
+        binaries[0],
+    )
+
+    extension_to_language = {}
+    for language in package.get("languages", []):
+        extension_to_language.update(LANGUAGE_EXTENSIONS.get(language, {}))
+
+    languages = package.get("languages") or [server_name]
+    language = (
+        next(iter(extension_to_language.values()))
+        if extension_to_language
+        else languages[0].lower()
+    )
+
+    kind, _ = parse_purl(package.get("source", {}).get("id", ""))
+    return server_name, {
+        "pluginName": "lsp-" + server_name.replace("_", "-"),
+        "language": language,
+        "description": package.get("description", "").strip().split("\n")[0] or package["name"],
+        "command": command,
+        # Node-based servers almost universally speak LSP over --stdio
+        "args": ["--stdio"] if kind == "npm" else [],
+        "extensionToLanguage": extension_to_language,
+        "installCommands": install_commands(package),
+        "masonPackage": package["name"],
+    }
+
+
+def build_entries(packages: list[dict], overlay: dict | None = None) -> dict:
+    """Translate Mason packages and apply overlay entries on top."""
+    entries = {}
+    for package in packages:
+        translated = translate_package(package)
+        if translated:
+            name, entry = translated
+            entries[name] = ("mason", entry)
+
+    for name, entry in (overlay or {}).items():
+        entries[name] = ("lspctl", entry)
+
+    return entries
+
+
+def write_store(output: Path, entries: dict, snapshot: Path | None = None) -> None:
+    """Write entries to a fresh SQLite store, replacing any existing one."""
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            "INSERT INTO servers VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    name,
+                    entry["pluginName"],
+                    entry["language"],
+                    entry["command"],
+                    origin,
+                    json.dumps(entry, sort_keys=True),
+                )
+                for name, (origin, entry) in sorted(entries.items())
+            ],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO server_extensions VALUES (?, ?)",
+            [
+                (extension, name)
+                for name, (_, entry) in sorted(entries.items())
+                for extension in entry.get("extensionToLanguage", {})
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO metadata VALUES (?, ?)",
+            [
+                ("schema_version", str(SCHEMA_VERSION)),
+                ("snapshot", str(snapshot) if snapshot else ""),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Readers never see a half-written store
+    tmp.replace(output)
+
+
+def find_by_extension(store: Path, extension: str) -> list[str]:
+    """Return server names handling a file extension."""
+    conn = sqlite3.connect(f"file:{store}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT name FROM server_extensions WHERE extension = ? ORDER BY name",
+            (extension,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def find_by_language(store: Path, language: str) -> list[str]:
+    """Return server names whose primary language matches."""
+    conn = sqlite3.connect(f"file:{store}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT name FROM servers WHERE language = ? ORDER BY name",
+            (language,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import a Mason registry snapshot into an indexed lspctl registry"
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=Path,
+        help="Path to Mason registry.json or registry.json.zip"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="Path to the SQLite registry store"
+    )
+    parser.add_argument(
+        "--overlay",
+        type=Path,
+        help="lspctl registry JSON whose entries override Mason's"
+    )
+    parser.add_argument(
+        "--find-extension",
+        metavar="EXT",
+        help="List servers for a file extension in an existing store"
+    )
+    parser.add_argument(
+        "--find-language",
+        metavar="LANG",
+        help="List servers for a language in an existing store"
+    )
+    parser.add_argument(
+        "--json-output",
+        action="store_true",
+        help="Output result as JSON"
+    )
+
+    args = parser.parse_args()
+
+    # Query modes
+    if args.find_extension or args.find_language:
+        if not args.output.exists():
+            parser.error(f"Registry store not found: {args.output}")
+        if args.find_extension:
+            names = find_by_extension(args.output, args.find_extension)
+        else:
+            names = find_by_language(args.output, args.find_language)
+        if args.json_output:
+            print(json.dumps(names, indent=2))
+        else:
+            for name in names:
+                print(name)
+        return
+
+    if not args.snapshot:
+        parser.error("--snapshot is required for import")
+
+    try:
+        packages = load_snapshot(args.snapshot)
+    except (OSError, ValueError, json.JSONDecodeError) as e:
+        print(f"Error: Could not read snapshot: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    overlay = None
+    if args.overlay:
+        with open(args.overlay) as f:
+            overlay = json.load(f)
+
+    entries = build_entries(packages, overlay)
+    write_store(args.output, entries, args.snapshot)
+
+    result = {
+        "store": str(args.output),
+        "packages_read": len(packages),
+        "servers_imported": sum(1 for origin, _ in entries.values() if origin == "mason"),
+        "servers_from_overlay": sum(1 for origin, _ in entries.values() if origin == "lspctl"),
+    }
+
+    if args.json_output:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Read {result['packages_read']} Mason packages")
+        print(f"Imported {result['servers_imported']} language servers")
+        if overlay:
+            print(f"Applied {result['servers_from_overlay']} entries from {args.overlay}")
+        print(f"\nRegistry store written to: {args.output}")
+        print("\nUse it with:")
+        print(f"   generate-marketplace.py --registry {args.output} ...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Install LSP server binaries from a local artifact directory.
+
+An alternative to installCommands for machines that should provision from
+an internal mirror instead of the internet. Artifacts (tarballs or zips
+listed in the directory's manifest.json with sha256 checksums) are verified,
+unpacked once into a content-addressed store shared by every user of it,
+and their commands are linked into a bin directory that goes on PATH.
+See lspctl_artifacts for the manifest format.
+
+Usage:
+    python3 install-artifact.py install lua_ls pyright --from /mnt/lsp-artifacts
+    python3 install-artifact.py verify
+    python3 install-artifact.py list --json-output
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from lspctl_artifacts import (
+    ArtifactError,
+    ArtifactStore,
+    default_store_path,
+    load_manifest,
+    select_artifact,
+)
+
+
+def record_install(state_path: Path | None, server: str, status: str, duration_ms: float) -> None:
+    """Append an install attempt to the state store's history."""
+    from lspctl_state import StateStore
+
+    try:
+        with StateStore(state_path) as state:
+            state.record_event(
+                "install", status,
+                server_name=server,
+                duration_ms=duration_ms,
+                detail="artifact"
+            )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: Could not record history ({e})", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Install LSP servers from a local content-addressed artifact store"
+    )
+    parser.add_argument(
+        "action",
+        choices=["install", "verify", "list"],
+        help="install servers, re-hash the store, or list installed servers"
+    )
+    parser.add_argument(
+        "servers",
+        nargs="*",
+        metavar="SERVER",
+        help="Servers to install (lspconfig names, as in the manifest)"
+    )
+    parser.add_argument(
+        "--from",
+        dest="artifact_dir",
+        type=Path,
+        default=os.environ.get("LSPCTL_ARTIFACTS"),
+        metavar="DIR",
+        help="Artifact directory with manifest.json (default: $LSPCTL_ARTIFACTS)"
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        help=f"Store directory (default: $LSPCTL_STORE or {default_store_path()})"
+    )
+    parser.add_argument(
+        "--bin-dir",
+        type=Path,
+        help="Where to link server commands (default: <store>/bin)"
+    )
+    parser.add_argument(
+        "--link",
+        choices=["symlink", "hardlink"],
+        default="symlink",
+        help="How commands are linked into --bin-dir (default: symlink)"
+    )
+    parser.add_argument(
+        "--platform",
+        help="Manifest platform to install for (default: this machine's)"
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        help="State database path (default: $LSPCTL_STATE_DB or ~/.claude/lspctl-state.db)"
+    )
+    parser.add_argument(
+        "--no-state",
+        action="store_true",
+        help="Do not record installs in the state store"
+    )
+    parser.add_argument(
+        "--json-output",
+        action="store_true",
+        help="Output result as JSON"
+    )
+
+    args = parser.parse_args()
+    store = ArtifactStore(args.store)
+
+    if args.action == "list":
+        result = store.installed()
+        if args.json_output:
+            print(json.dumps(result, indent=2))
+        else:
+            for server, record in sorted(result.items()):
+                print(f"  {server} {record['version'] or ''}".rstrip())
+                for command, link_path in record["commands"].items():
+                    print(f"      {command} -> {link_path}")
+        return
+
+    if args.action == "verify":
+        problems = store.verify()
+        if args.json_output:
+            print(json.dumps({"ok": not problems, "problems": problems}, indent=2))
+        elif problems:
+            for problem in problems:
+                print(f"  {problem['problem']:<12} {problem['digest'][:12]} {problem['path']}")
+        else:
+            print(f"Store verified: {store.root}")
+        if problems:
+            sys.exit(1)
+        return
+
+    if not args.servers:
+        parser.error("install needs at least one SERVER")
+    if not args.artifact_dir:
+        parser.error("--from (or $LSPCTL_ARTIFACTS) is required for install")
+
+    try:
+        artifacts = load_manifest(args.artifact_dir)
+    except ArtifactError as e:
+        parser.error(str(e))
+
+    results = []
+    for server in args.servers:
+        started = time.monotonic()
+        try:
+            entry = select_artifact(artifacts, server, args.platform)
+            result = store.install(entry, args.artifact_dir, args.bin_dir, args.link)
+            result["error"] = None
+        except (ArtifactError, OSError) as e:
+            result = {"server": server, "error": str(e)}
+        duration_ms = (time.monotonic() - started) * 1000
+        result["duration_ms"] = round(duration_ms, 1)
+        results.append(result)
+        if not args.no_state:
+            record_install(args.state, server, "failed" if result["error"] else "ok", duration_ms)
+
+    failed = [r for r in results if r["error"]]
+    if args.json_output:
+        print(json.dumps({"results": results, "failed": len(failed)}, indent=2))
+    else:
+        for result in results:
+            if result["error"]:
+                print(f"  failed  {result['server']}: {result['error']}")
+            else:
+                reused = "" if result["unpacked"] else " (already in store)"
+                print(f"  ok      {result['server']} {result['version'] or ''}{reused}")
+        bin_dir = args.bin_dir or store.root / "bin"
+        print(f"\nCommands are linked in {bin_dir}; make sure it is on PATH.")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+"""
+Launch a language server behind a proxy that stops it while idle.
+
+Claude Code keeps its connection to the proxy for the whole session. After
+--idle-timeout minutes with no traffic and no request in flight, the proxy
+shuts the real server down to give its memory back. The next request, or
+an edit to an open document, starts a fresh server: the proxy replays the
+client's initialize and initialized messages, the last workspace
+configuration and every open document from its shadow copy, then forwards
+what the client sent. The client never sees the restart.
+
+A restarted server usually registers the same dynamic capabilities (file
+watchers and the like) as the first one; the proxy answers those itself,
+since the client already holds the registrations.
+
+With --record DIR, every message between the client and the server is
+also written to a session log in DIR, for lsp-replay.py to drive against
+other servers and settings (see lspctl_replay). Without --idle-timeout
+the server is never stopped.
+
+With --supervise, a server that crashes is restarted by the proxy after
+an exponential backoff instead of ending the session, and the crash is
+recorded (see lspctl_supervise). Requests that arrive while it is down
+fail at once rather than wait for it, except a client initialize the
+crashed server never answered: the restarted server answers that one.
+
+With --coalesce-diagnostics MS, publishDiagnostics notifications are
+held for up to MS milliseconds and only the newest set per document is
+forwarded; sets for a document version the client has already replaced
+are dropped. The messages and bytes saved are logged at exit.
+
+With --shared-cache ROOT, {cache} in the --cache-env values and in the
+server's arguments becomes the server's cache directory under ROOT for the
+git repository of the working directory, shared by all of its worktrees
+and clones (see lspctl_cache). With no other option the launcher then
+replaces itself with the server instead of proxying.
+
+Generated .lsp.json files use this launcher when a server sets
+`idle_timeout`, `record`, `supervise`, `coalesce_diagnostics` or
+`shared_cache` in lsp-config.lua.
+
+Usage:
+    python3 lsp-launch.py --idle-timeout 30 -- rust-analyzer
+    python3 lsp-launch.py --record ~/.cache/lspctl/sessions -- pylsp
+    python3 lsp-launch.py --supervise --name pylsp -- pylsp
+    python3 lsp-launch.py --coalesce-diagnostics 200 -- pyright-langserver --stdio
+    python3 lsp-launch.py --shared-cache ~/.cache/lspctl/repos \
+        --cache-env 'CARGO_TARGET_DIR={cache}/target' -- rust-analyzer
+"""
+
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from lspctl_lsp import (
+    DocumentShadow,
+    ProtocolError,
+    is_request,
+    is_response,
+    read_frame,
+    read_message,
+    write_message,
+)
+
+
+# Seconds to wait for a server to honour shutdown/exit before killing it
+STOP_GRACE = 5.0
+
+# Client notifications that should reach a running server; others are
+# only recorded while the server is stopped
+WAKE_NOTIFICATIONS = {
+    "textDocument/didOpen",
+    "textDocument/didChange",
+    "textDocument/didSave",
+}
+
+
+INTERNAL_ID = "lspctl-"
+
+# LSP's RequestFailed, for requests a crashed server cannot answer
+REQUEST_FAILED = -32803
+
+
+class Launcher:
+    """Proxy between one client and a restartable server process."""
+
+    def __init__(
+        self,
+        command: list[str],
+        idle_timeout: float | None,
+        client_in,
+        client_out,
+        log=None,
+        recorder=None,
+        supervisor=None,
+        coalesce: float | None = None,
+        env: dict[str, str] | None = None,
+    ):
+        self.command = command
+        self.idle_timeout = idle_timeout
+        self.client_in = client_in
+        self.client_out = client_out
+        self.log = log or (lambda message: None)
+        self.recorder = recorder
+        self.supervisor = supervisor
+        self.coalesce = coalesce
+        self.env = {**os.environ, **env} if env else None
+
+        self.events: queue.Queue = queue.Queue()
+        self.process: subprocess.Popen | None = None
+        self.generation = 0
+        # running: forwarding; stopping: waiting for the server to exit;
+        # stopped: no server; starting: replaying the handshake;
+        # backoff: waiting to restart a crashed server
+        self.state = "stopped"
+        self.backlog: list[dict] = []
+        self.stop_deadline: float | None = None
+        self.restart_at: float | None = None
+        self.started_at = 0.0
+        self.stderr = None
+
+        # Shadow of the client's side of the session
+        self.initialize: dict | None = None
+        self.initialize_id = None
+        self.initialized: dict | None = None
+        self.configuration: dict | None = None
+        self.shadow = DocumentShadow()
+        self.client_shutdown = False
+        # Any exit the client sends ends the session, shutdown or not
+        self.client_exit = False
+
+        # Requests in flight; the server is only stopped when both are empty
+        self.client_pending: set = set()
+        self.server_pending: set = set()
+        # Dynamic registrations the client holds: (method, options) -> id
+        self.registrations: dict[tuple[str, str], str] = {}
+        self.last_activity = time.monotonic()
+
+        # Held publishDiagnostics: uri -> (message, size), oldest first
+        self.diagnostics: dict[str, tuple[dict, int]] = {}
+        self.flush_at: float | None = None
+        self.diagnostic_stats = {"received": 0, "forwarded": 0, "bytes_received": 0, "bytes_forwarded": 0}
+
+    # -- processes ---------------------------------------------------------
+
+    def _start_process(self) -> None:
+        self.generation += 1
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE if self.supervisor is not None else None,
+            env=self.env,
+        )
+        self.started_at = time.monotonic()
+        if self.supervisor is not None:
+            self.stderr = self.supervisor.tail(self.process.stderr)
+        self.server_pending.clear()
+        threading.Thread(
+            target=self._read_server,
+            args=(self.generation, self.process),
+            daemon=True,
+        ).start()
+
+    def _read_server(self, generation: int, process: subprocess.Popen) -> None:
+        try:
+            while True:
+                frame = read_frame(process.stdout)
+                if frame is None:
+                    break
+                self.events.put(("server", generation, frame))
+        except (OSError, ValueError, ProtocolError):
+            pass
+        self.events.put(("exit", generation, process.wait()))
+
+    def _read_client(self) -> None:
+        try:
+            while True:
+                message = read_message(self.client_in)
+                if message is None:
+                    break
+                self.events.put(("client", None, message))
+        except (OSError, ValueError, ProtocolError) as e:
+            self.log(f"client stream error: {e}")
+        self.events.put(("eof", None, None))
+
+    def _to_server(self, message: dict) -> None:
+        try:
+            write_message(self.process.stdin, message)
+        except (OSError, ValueError):
+            # The exit event from the reader thread reports the failure
+            pass
+
+    def _to_client(self, message: dict) -> None:
+        if self.recorder is not None:
+            self.recorder.write("s", message)
+        write_message(self.client_out, message)
+
+    def _hold_diagnostics(self, message: dict, size: int) -> None:
+        """Keep the newest diagnostics per document until the window closes."""
+        self.diagnostic_stats["received"] += 1
+        self.diagnostic_stats["bytes_received"] += size
+        params = message.get("params") or {}
+        uri = params.get("uri")
+        version = params.get("version")
+        current = self.shadow.documents.get(uri, {}).get("version")
+        if version is not None and current is not None and version < current:
+            return
+        # Re-inserted so documents are flushed in the order they last changed
+        self.diagnostics.pop(uri, None)
+        self.diagnostics[uri] = (message, size)
+        if self.flush_at is None:
+            self.flush_at = time.monotonic() + self.coalesce
+
+    def _flush_diagnostics(self) -> None:
+        held, self.diagnostics = self.diagnostics, {}
+        self.flush_at = None
+        for message, size in held.values():
+            self.diagnostic_stats["forwarded"] += 1
+            self.diagnostic_stats["bytes_forwarded"] += size
+            self._to_client(message)
+
+    def _stop(self) -> None:
+        """Ask an idle server to shut down."""
+        self._flush_diagnostics()
+        self.log(f"idle for {self.idle_timeout:g}s, stopping server")
+        self.state = "stopping"
+        self.stop_deadline = time.monotonic() + STOP_GRACE
+        self._to_server({"jsonrpc": "2.0", "id": f"{INTERNAL_ID}shutdown", "method": "shutdown"})
+
+    def _restart(self) -> None:
+        """Start a server and replay the client's handshake to it."""
+        self.log("restarting server")
+        self._start_process()
+        if self.initialize is None:
+            # Crashed before the client's initialize: it goes to this one
+            self._finish_replay()
+        elif self.initialize_id in self.client_pending:
+            # Crashed before answering initialize: this one answers it
+            self._to_server({
+                "jsonrpc": "2.0",
+                "id": self.initialize_id,
+                "method": "initialize",
+                "params": self.initialize,
+            })
+            self._finish_replay()
+        else:
+            self.state = "starting"
+            self._to_server({
+                "jsonrpc": "2.0",
+                "id": f"{INTERNAL_ID}initialize",
+                "method": "initialize",
+                "params": self.initialize,
+            })
+
+    def _finish_replay(self) -> None:
+        if self.initialized is None:
+            # Only the client's initialize was sent; the rest of the
+            # session, if any, is in the backlog
+            self.state = "running"
+            backlog, self.backlog = self.backlog, []
+            for message in backlog:
+                self._from_client(message)
+            return
+        self._to_server({"jsonrpc": "2.0", "method": "initialized", "params": self.initialized})
+        if self.configuration is not None:
+            self._to_server({
+                "jsonrpc": "2.0",
+                "method": "workspace/didChangeConfiguration",
+                "params": self.configuration,
+            })
+        for notification in self.shadow.open_notifications():
+            self._to_server(notification)
+        self.state = "running"
+        backlog, self.backlog = self.backlog, []
+        for message in backlog:
+            self._from_client(message)
+
+    # -- message handling --------------------------------------------------
+
+    def _record(self, message: dict) -> None:
+        """Update the shadow session from a client message."""
+        method = message.get("method")
+        params = message.get("params")
+        if method == "initialize":
+            self.initialize = params
+            self.initialize_id = message["id"]
+        elif method == "initialized":
+            self.initialized = params or {}
+        elif method == "workspace/didChangeConfiguration":
+            self.configuration = params
+        elif method == "workspace/didChangeWorkspaceFolders" and self.initialize is not None:
+            folders = [
+                folder for folder in self.initialize.get("workspaceFolders") or []
+                if folder not in params["event"]["removed"]
+            ]
+            self.initialize["workspaceFolders"] = folders + params["event"]["added"]
+        elif method == "shutdown":
+            self.client_shutdown = True
+        elif method == "exit":
+            self.client_exit = True
+        else:
+            self.shadow.track(message)
+
+    def _failed(self, request_id) -> dict:
+        wait = max((self.restart_at or 0.0) - time.monotonic(), 0.0)
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {"code": REQUEST_FAILED, "message": f"Server crashed, restarting in {wait:.0f}s"},
+        }
+
+    def _from_client(self, message: dict) -> None:
+        if self.state in ("starting", "stopping"):
+            self.backlog.append(message)
+            return
+
+        if self.state == "backoff":
+            method = message.get("method")
+            if method == "exit":
+                raise SystemExit(0 if self.client_shutdown else 1)
+            if method == "shutdown":
+                self.client_shutdown = True
+                self._to_client({"jsonrpc": "2.0", "id": message["id"], "result": None})
+            elif method == "initialize":
+                # Held for the restarted server to answer
+                self._record(message)
+                self.client_pending.add(message["id"])
+            elif is_request(message):
+                self._to_client(self._failed(message["id"]))
+            elif not is_response(message):
+                # Edits still reach the shadow, so the restarted server gets them
+                self._record(message)
+            return
+
+        if self.state == "stopped":
+            method = message.get("method")
+            if method == "exit":
+                raise SystemExit(0 if self.client_shutdown else 1)
+            if method == "shutdown":
+                self.client_shutdown = True
+                self._to_client({"jsonrpc": "2.0", "id": message["id"], "result": None})
+                return
+            if is_request(message) or method in WAKE_NOTIFICATIONS:
+                self.backlog.append(message)
+                self._restart()
+                return
+            # Closes, configuration and cancellations only update the shadow
+            self._record(message)
+            return
+
+        self._record(message)
+        if is_request(message):
+            self.client_pending.add(message["id"])
+        elif is_response(message):
+            self.server_pending.discard(message["id"])
+        self._to_server(message)
+
+    def _internal_response(self, message: dict) -> None:
+        if message["id"] == f"{INTERNAL_ID}initialize" and self.state == "starting":
+            if "error" in message:
+                self.log(f"replayed initialize failed: {message['error']}")
+                raise SystemExit(1)
+            self._finish_replay()
+        elif message["id"] == f"{INTERNAL_ID}shutdown" and self.state == "stopping":
+            self._to_server({"jsonrpc": "2.0", "method": "exit"})
+
+    def _from_server(self, message: dict, size: int = 0) -> None:
+        if self.coalesce and message.get("method") == "textDocument/publishDiagnostics":
+            self._hold_diagnostics(message, size)
+            return
+        if is_response(message):
+            if isinstance(message["id"], str) and message["id"].startswith(INTERNAL_ID):
+                self._internal_response(message)
+                return
+            self.client_pending.discard(message["id"])
+            if message["id"] == self.initialize_id and "result" in message:
+                capabilities = message["result"].get("capabilities", {})
+                self.shadow.encoding = capabilities.get("positionEncoding", "utf-16")
+            self._to_client(message)
+            return
+
+        if is_request(message):
+            if self._registered(message):
+                self._to_server({"jsonrpc": "2.0", "id": message["id"], "result": None})
+                return
+            self.server_pending.add(message["id"])
+        self._to_client(message)
+
+    def _registered(self, message: dict) -> bool:
+        """
+        Track dynamic registrations; True if the client already holds them.
+
+        A restarted server registers with fresh ids, so registrations are
+        matched by method and options.
+        """
+        method = message["method"]
+        params = message.get("params") or {}
+        if method == "client/registerCapability":
+            keys = [
+                (r["method"], json.dumps(r.get("registerOptions"), sort_keys=True))
+                for r in params.get("registrations", [])
+            ]
+            if keys and all(key in self.registrations for key in keys):
+                return True
+            for key, registration in zip(keys, params.get("registrations", [])):
+                self.registrations[key] = registration["id"]
+        elif method == "client/unregisterCapability":
+            held = set(self.registrations.values())
+            # The spec's field name really is "unregisterations"
+            removals = params.get("unregisterations", [])
+            if removals and not any(r["id"] in held for r in removals):
+                return True
+            removed = {r["id"] for r in removals}
+            self.registrations = {
+                key: value for key, value in self.registrations.items() if value not in removed
+            }
+        return False
+
+    def _server_exited(self, code: int) -> None:
+        self.process = None
+        if not self.client_shutdown:
+            self._flush_diagnostics()
+        if self.state == "stopping":
+            self.state = "stopped"
+            self.client_pending.clear()
+            # Messages that arrived meanwhile get the stopped-server treatment:
+            # only requests and edits bring the server back
+            backlog, self.backlog = self.backlog, []
+            for message in backlog:
+                self._from_client(message)
+            return
+        if self.supervisor is not None and not (self.client_shutdown or self.client_exit):
+            delay = self.supervisor.crashed(code, time.monotonic() - self.started_at, self.stderr.tail())
+            self._back_off(code, delay)
+            return
+        # Exits the client asked for, or crashes, end the session as they
+        # would without the proxy
+        self.log(f"server exited with {code}")
+        raise SystemExit(code if not self.client_shutdown else 0)
+
+    def _back_off(self, code: int, delay: float) -> None:
+        """Wait to restart a crashed server, failing what it left unanswered."""
+        self.log(f"server exited with {code}, restarting in {delay:g}s")
+        self.state = "backoff"
+        self.restart_at = time.monotonic() + delay
+        # An unanswered initialize is kept for the restarted server to answer
+        for request_id in self.client_pending - {self.initialize_id}:
+            self._to_client(self._failed(request_id))
+        self.client_pending &= {self.initialize_id}
+        self.server_pending.clear()
+        backlog, self.backlog = self.backlog, []
+        for message in backlog:
+            self._from_client(message)
+
+    def _idle_deadline(self) -> float | None:
+        """When the server becomes idle, or None while it cannot be stopped."""
+        if (
+            self.idle_timeout is None
+            or self.state != "running"
+            or self.initialized is None
+            or self.client_shutdown
+            or self.client_pending
+            or self.server_pending
+        ):
+            return None
+        return self.last_activity + self.idle_timeout
+
+    def _expire(self) -> None:
+        """Act on every deadline that has passed."""
+        now = time.monotonic()
+        if self.flush_at is not None and now >= self.flush_at:
+            self._flush_diagnostics()
+        if self.state == "stopping":
+            if self.stop_deadline is not None and now >= self.stop_deadline:
+                # The exit event follows from the reader thread
+                self.process.kill()
+                self.stop_deadline = None
+        elif self.state == "backoff":
+            if not self.client_shutdown and now >= self.restart_at:
+                self._restart()
+        else:
+            deadline = self._idle_deadline()
+            if deadline is not None and now >= deadline:
+                self._stop()
+
+    def run(self) -> int:
+        self._start_process()
+        self.state = "running"
+        threading.Thread(target=self._read_client, daemon=True).start()
+
+        try:
+            while True:
+                if self.state == "stopping":
+                    deadline = self.stop_deadline
+                elif self.state == "backoff":
+                    deadline = None if self.client_shutdown else self.restart_at
+                else:
+                    deadline = self._idle_deadline()
+                if self.flush_at is not None:
+                    deadline = self.flush_at if deadline is None else min(deadline, self.flush_at)
+                wait = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+                try:
+                    kind, generation, payload = self.events.get(timeout=wait)
+                except queue.Empty:
+                    kind = None
+
+                if kind == "eof":
+                    return 0
+                if kind == "client":
+                    self.last_activity = time.monotonic()
+                    if self.recorder is not None:
+                        self.recorder.write("c", payload)
+                    self._from_client(payload)
+                elif kind is None or generation != self.generation:
+                    pass
+                elif kind == "server":
+                    self.last_activity = time.monotonic()
+                    self._from_server(*payload)
+                elif kind == "exit":
+                    self._server_exited(payload)
+
+                # A steady stream of events must not hold deadlines off
+                self._expire()
+                if self.recorder is not None and self.events.empty():
+                    self.recorder.flush()
+        except SystemExit as e:
+            return e.code
+        finally:
+            if self.recorder is not None:
+                self.recorder.close()
+            if self.process is not None and self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(STOP_GRACE)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+
+
+def report_diagnostics(name: str, stats: dict, log) -> None:
+    """Log what diagnostics coalescing saved and add it to the state store's history."""
+    import sqlite3
+
+    from lspctl_state import StateStore
+
+    dropped = stats["received"] - stats["forwarded"]
+    saved = stats["bytes_received"] - stats["bytes_forwarded"]
+    log(
+        f"coalesced diagnostics: forwarded {stats['forwarded']} of {stats['received']} "
+        f"notifications, dropped {dropped} ({saved} bytes)"
+    )
+    try:
+        with StateStore() as state:
+            state.record_event("coalesce", "ok", server_name=name, detail=json.dumps(stats))
+    except (OSError, sqlite3.Error):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a language server, stopping it while idle and restarting it on demand"
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        metavar="MINUTES",
+        help="Stop the server after this many idle minutes"
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        metavar="DIR",
+        help="Write the session's messages to a new log in this directory"
+    )
+    parser.add_argument(
+        "--supervise",
+        action="store_true",
+        help="Restart a crashed server with exponential backoff and record its crashes"
+    )
+    parser.add_argument(
+        "--coalesce-diagnostics",
+        type=float,
+        metavar="MS",
+        help="Forward only the newest diagnostics per document every MS milliseconds"
+    )
+    parser.add_argument(
+        "--shared-cache",
+        metavar="ROOT",
+        help="Fill {cache} with this repository's cache directory under ROOT"
+    )
+    parser.add_argument(
+        "--cache-env",
+        action="append",
+        default=[],
+        metavar="VAR=TEMPLATE",
+        help="Environment variable to set from a {cache} template (repeatable)"
+    )
+    parser.add_argument(
+        "--name",
+        help="Server name for crash history, logs and statistics (default: the command's name)"
+    )
+    parser.add_argument(
+        "command",
+        nargs=argparse.REMAINDER,
+        help="Server command and arguments (after --)"
+    )
+
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("missing server command")
+    proxied = (
+        args.idle_timeout is not None
+        or args.record is not None
+        or args.supervise
+        or args.coalesce_diagnostics is not None
+    )
+    if not proxied and args.shared_cache is None:
+        parser.error("one of --idle-timeout, --record, --supervise, --coalesce-diagnostics or --shared-cache is required")
+    if any("=" not in value for value in args.cache_env):
+        parser.error("--cache-env takes VAR=TEMPLATE")
+    if args.coalesce_diagnostics is not None and args.coalesce_diagnostics <= 0:
+        parser.error("--coalesce-diagnostics must be positive")
+    if args.idle_timeout is not None and args.idle_timeout <= 0:
+        parser.error("--idle-timeout must be positive")
+
+    def log(message: str) -> None:
+        print(f"lsp-launch[{os.getpid()}]: {message}", file=sys.stderr, flush=True)
+
+    name = args.name
+    if name is None and (args.supervise or args.coalesce_diagnostics or args.shared_cache):
+        from lspctl_resolve import launched_command
+
+        name = launched_command({"command": command[0], "args": command[1:]})
+
+    env = {}
+    if args.shared_cache is not None:
+        from lspctl_cache import expand, shared_cache_dir
+
+        cache = shared_cache_dir(Path(args.shared_cache), Path.cwd(), name)
+        if cache is not None:
+            try:
+                cache.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                log(f"cannot create shared cache {cache}: {e}")
+                cache = None
+        templates = dict(value.split("=", 1) for value in args.cache_env)
+        env, command = expand(templates, command, cache)
+        if not proxied:
+            try:
+                os.execvpe(command[0], command, {**os.environ, **env})
+            except FileNotFoundError:
+                print(f"Error: Server command not found: {command[0]}", file=sys.stderr)
+                sys.exit(127)
+
+    recorder = None
+    if args.record is not None:
+        from lspctl_replay import SessionRecorder, session_path
+
+        path = session_path(args.record.expanduser(), command)
+        try:
+            recorder = SessionRecorder(path, command)
+            log(f"recording session to {path}")
+        except OSError as e:
+            # A session without its recording is still a working session
+            log(f"cannot record session: {e}")
+
+    supervisor = None
+    if args.supervise:
+        from lspctl_supervise import Supervisor
+
+        supervisor = Supervisor(name, os.getcwd())
+        # The client restarts a launcher whose server died during startup
+        delay = supervisor.startup_delay()
+        if delay:
+            log(f"{name} keeps crashing here, waiting {delay:.0f}s before starting it")
+            time.sleep(delay)
+
+    launcher = Launcher(
+        command,
+        args.idle_timeout * 60 if args.idle_timeout is not None else None,
+        sys.stdin.buffer,
+        sys.stdout.buffer,
+        log=log,
+        recorder=recorder,
+        supervisor=supervisor,
+        coalesce=args.coalesce_diagnostics / 1000 if args.coalesce_diagnostics else None,
+        env=env,
+    )
+    try:
+        code = launcher.run()
+    except FileNotFoundError:
+        print(f"Error: Server command not found: {command[0]}", file=sys.stderr)
+        code = 127
+    sys.stdout.flush()
+    if launcher.diagnostic_stats["received"]:
+        report_diagnostics(name, launcher.diagnostic_stats, log)
+    # The client reader thread may still hold stdin's lock; a normal
+    # interpreter shutdown would abort on it
+    os._exit(code)
+
+
+if __name__ == "__main__":
+    main()
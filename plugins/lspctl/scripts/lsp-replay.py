@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded LSP session against a registry server and report on it.
+
+Sessions are recorded by servers that set `record` in lsp-config.lua (see
+lsp-launch.py --record). Replaying one against several servers, or one
+server with several `settings`, compares them under the traffic of a real
+session rather than a single cold start: throughput, per-method latency
+percentiles and the server's peak resident memory.
+
+Usage:
+    python3 lsp-replay.py ~/.cache/lspctl/sessions/pylsp-20261019-101500-4242.jsonl.gz pyright
+    python3 lsp-replay.py SESSION pylsp --settings '{"pylsp": {"plugins": {"ruff": {"enabled": true}}}}' --speed 0
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+from lspctl_marketplace import load_registry
+from lspctl_replay import replay
+from lspctl_resolve import BinaryResolver, default_search_roots
+
+
+DEFAULT_REGISTRY = Path(__file__).resolve().parent.parent / "registry" / "servers.json"
+
+
+def load_settings(value: str | None) -> dict | None:
+    """--settings as inline JSON or a path to a JSON file."""
+    if value is None:
+        return None
+    if not value.lstrip().startswith("{"):
+        with open(Path(value).expanduser()) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def record_result(state_path: Path | None, server: str, report: dict) -> None:
+    """Append the replay to the state store's history."""
+    from lspctl_state import StateStore
+
+    try:
+        with StateStore(state_path) as state:
+            state.record_event(
+                "replay", report["status"],
+                server_name=server,
+                duration_ms=report["duration_s"] * 1000,
+                detail=report["session"]
+            )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: Could not record history ({e})", file=sys.stderr)
+
+
+def print_report(server: str, report: dict) -> None:
+    peak = report["peak_rss_kb"]
+    memory = f"{peak / 1024:.1f} MB" if peak else "unknown"
+    print(
+        f"Replayed {report['requests']} requests to {server} in {report['duration_s']:.1f}s "
+        f"({report['throughput_rps']} req/s), peak RSS {memory}"
+    )
+    if report["reason"]:
+        print(f"  {report['status']}: {report['reason']}")
+    if report["methods"]:
+        width = max(len(method) for method in report["methods"])
+        print(f"  {'method':<{width}}  {'count':>5}  {'errors':>6}  {'p50 ms':>8}  {'p90 ms':>8}  {'p99 ms':>8}")
+        for method, stats in report["methods"].items():
+            print(
+                f"  {method:<{width}}  {stats['count']:>5}  {stats['errors']:>6}  "
+                f"{stats['p50_ms']:>8.1f}  {stats['p90_ms']:>8.1f}  {stats['p99_ms']:>8.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded LSP session against a server and report latency and memory"
+    )
+    parser.add_argument(
+        "session",
+        type=Path,
+        help="Session log written by lsp-launch.py --record"
+    )
+    parser.add_argument(
+        "server",
+        help="Registry server to replay against (lspconfig name)"
+    )
+    parser.add_argument(
+        "--settings",
+        metavar="JSON",
+        help="Workspace settings to use instead of the recorded ones (inline JSON or a file)"
+    )
+    parser.add_argument(
+        "--project",
+        type=Path,
+        help="Run in this project instead of the recorded workspace root"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Pacing relative to the recording: 2 replays twice as fast, 0 sends without pauses (default: 1)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help="How long to wait for outstanding responses (default: 60)"
+    )
+    parser.add_argument(
+        "--registry",
+        type=Path,
+        default=DEFAULT_REGISTRY,
+        help="Server registry (default: bundled servers.json)"
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        help="State database path (default: $LSPCTL_STATE_DB or ~/.claude/lspctl-state.db)"
+    )
+    parser.add_argument(
+        "--no-state",
+        action="store_true",
+        help="Do not record the replay in the state store"
+    )
+    parser.add_argument(
+        "--json-output",
+        action="store_true",
+        help="Output the report as JSON"
+    )
+
+    args = parser.parse_args()
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+    try:
+        settings = load_settings(args.settings)
+    except (OSError, ValueError) as e:
+        parser.error(f"invalid --settings: {e}")
+
+    try:
+        registry = load_registry(args.registry)
+    except (OSError, json.JSONDecodeError, sqlite3.Error) as e:
+        print(f"Error: Cannot load registry: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.server not in registry:
+        parser.error(f"unknown server: {args.server}")
+
+    project = args.project.resolve() if args.project else None
+    entry = registry[args.server]
+    resolver = BinaryResolver(default_search_roots(project), project)
+    command = [*resolver.launch(entry["command"]), *entry.get("args", [])]
+
+    try:
+        report = replay(
+            args.session,
+            command,
+            settings=settings,
+            project=project,
+            speed=args.speed,
+            timeout=args.timeout,
+        )
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename or e}: not found", file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(f"Error: Cannot replay {args.session}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.no_state:
+        record_result(args.state, args.server, report)
+
+    if args.json_output:
+        print(json.dumps({"server": args.server, **report}, indent=2))
+    else:
+        print_report(args.server, report)
+    sys.exit(0 if report["status"] == "ok" else 1)
+
+
+if __name__ == "__main__":
+    main()
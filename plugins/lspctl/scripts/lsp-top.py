@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Show which language servers are running and what they cost (Linux).
+
+Maps running processes to registry entries and samples /proc at a fixed
+interval, printing per-server RSS, CPU%, threads, uptime and I/O summed
+over all instances. --record writes a compact time series that
+--summarize later condenses, so server configurations can be compared.
+
+Usage:
+    python3 lsp-top.py                      # refresh every second until ^C
+    python3 lsp-top.py --iterations 1 --json-output
+    python3 lsp-top.py --interval 5 --record pylsp-ruff.jsonl
+    python3 lsp-top.py --summarize before.jsonl after.jsonl
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from lspctl_marketplace import load_registry
+from lspctl_proc import SAMPLE_COLUMNS, ServerSampler
+
+
+DEFAULT_REGISTRY = Path(__file__).resolve().parent.parent / "registry" / "servers.json"
+
+RECORD_FORMAT = "lspctl-top"
+RECORD_VERSION = 1
+
+
+def format_bytes(value: int | None) -> str:
+    """Render a byte count with a binary unit."""
+    if value is None:
+        return "-"
+    for unit in ("B", "K", "M", "G"):
+        if value < 1024 or unit == "G":
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return str(value)
+
+
+def format_duration(seconds: float) -> str:
+    """Render an uptime as 1d02h, 3h04m or 5m06s."""
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f"{days}d{hours:02d}h"
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    return f"{minutes}m{seconds:02d}s"
+
+
+def render_table(sample: dict) -> str:
+    """Render one sample as a top-style table."""
+    lines = [
+        f"{'SERVER':<20} {'INST':>4} {'RSS':>9} {'CPU%':>6} {'THR':>4} {'UPTIME':>7} {'READ':>8} {'WRITE':>8}"
+    ]
+    servers = sorted(sample["servers"].items(), key=lambda item: -item[1]["rss_kb"])
+    for server, stats in servers:
+        lines.append(
+            f"{server:<20} {stats['instances']:>4} {format_bytes(stats['rss_kb'] * 1024):>9} "
+            f"{stats['cpu_pct']:>6.1f} {stats['threads']:>4} {format_duration(stats['uptime_s']):>7} "
+            f"{format_bytes(stats['read_bytes']):>8} {format_bytes(stats['write_bytes']):>8}"
+        )
+    if not servers:
+        lines.append("(no language servers running)")
+    return "\n".join(lines)
+
+
+def record_header(interval: float, registry_path: Path) -> dict:
+    return {
+        "format": RECORD_FORMAT,
+        "version": RECORD_VERSION,
+        "interval": interval,
+        "registry": str(registry_path),
+        "started": time.time(),
+        "columns": SAMPLE_COLUMNS,
+    }
+
+
+def record_row(sample: dict, started: float) -> list:
+    """Compact a sample to [offset_s, {server: [column values]}]."""
+    return [
+        round(sample["time"] - started, 3),
+        {
+            server: [stats[column] for column in SAMPLE_COLUMNS]
+            for server, stats in sample["servers"].items()
+        },
+    ]
+
+
+def summarize_recording(path: Path) -> dict:
+    """
+    Condense a --record file into per-server statistics.
+
+    Returns {"header", "duration_s", "samples", "servers": {server:
+    {samples, max_instances, mean_rss_kb, peak_rss_kb, mean_cpu_pct,
+    peak_cpu_pct}}}. Means are over the samples the server was running in.
+    """
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get("format") != RECORD_FORMAT:
+            raise ValueError(f"{path} is not an lsp-top recording")
+        columns = header["columns"]
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    servers: dict[str, dict] = {}
+    for _offset, values in rows:
+        for server, row in values.items():
+            stats = dict(zip(columns, row))
+            summary = servers.setdefault(server, {
+                "samples": 0, "max_instances": 0, "rss_total": 0, "peak_rss_kb": 0,
+                "cpu_total": 0.0, "peak_cpu_pct": 0.0,
+            })
+            summary["samples"] += 1
+            summary["max_instances"] = max(summary["max_instances"], stats["instances"])
+            summary["rss_total"] += stats["rss_kb"]
+            summary["peak_rss_kb"] = max(summary["peak_rss_kb"], stats["rss_kb"])
+            summary["cpu_total"] += stats["cpu_pct"]
+            summary["peak_cpu_pct"] = max(summary["peak_cpu_pct"], stats["cpu_pct"])
+
+    for summary in servers.values():
+        samples = summary["samples"]
+        summary["mean_rss_kb"] = round(summary.pop("rss_total") / samples)
+        summary["mean_cpu_pct"] = round(summary.pop("cpu_total") / samples, 1)
+
+    return {
+        "header": header,
+        "duration_s": rows[-1][0] if rows else 0.0,
+        "samples": len(rows),
+        "servers": dict(sorted(servers.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-server CPU and memory of running language servers"
+    )
+    parser.add_argument(
+        "--registry",
+        type=Path,
+        default=DEFAULT_REGISTRY,
+        help="Server registry used to recognize processes (default: bundled servers.json)"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="Sampling interval (default: 1)"
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        metavar="N",
+        help="Stop after N samples (default: run until interrupted)"
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        metavar="FILE",
+        help="Write a compact time series of every sample to FILE"
+    )
+    parser.add_argument(
+        "--summarize",
+        type=Path,
+        nargs="+",
+        metavar="FILE",
+        help="Summarize --record files side by side instead of sampling"
+    )
+    parser.add_argument(
+        "--proc-root",
+        type=Path,
+        default=Path("/proc"),
+        help=argparse.SUPPRESS
+    )
+    parser.add_argument(
+        "--json-output",
+        action="store_true",
+        help="Print each sample as one JSON line"
+    )
+
+    args = parser.parse_args()
+
+    if args.summarize:
+        try:
+            summaries = {str(path): summarize_recording(path) for path in args.summarize}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: Cannot summarize recording: {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.json_output:
+            print(json.dumps(summaries, indent=2))
+            return
+        for path, summary in summaries.items():
+            print(f"{path}: {summary['samples']} samples over {summary['duration_s']:.0f}s")
+            print(f"  {'SERVER':<20} {'MAX INST':>8} {'MEAN RSS':>9} {'PEAK RSS':>9} {'MEAN CPU%':>9} {'PEAK CPU%':>9}")
+            for server, stats in summary["servers"].items():
+                print(
+                    f"  {server:<20} {stats['max_instances']:>8} "
+                    f"{format_bytes(stats['mean_rss_kb'] * 1024):>9} {format_bytes(stats['peak_rss_kb'] * 1024):>9} "
+                    f"{stats['mean_cpu_pct']:>9.1f} {stats['peak_cpu_pct']:>9.1f}"
+                )
+        return
+
+    if not args.proc_root.is_dir():
+        print(f"Error: {args.proc_root} is not available (lsp-top needs Linux)", file=sys.stderr)
+        sys.exit(1)
+
+    sampler = ServerSampler(load_registry(args.registry), args.proc_root)
+    record = None
+    if args.record:
+        record = open(args.record, "w")
+        header = record_header(args.interval, args.registry)
+        record.write(json.dumps(header, separators=(",", ":")) + "\n")
+
+    interactive = sys.stdout.isatty() and not args.json_output
+    count = 0
+    next_tick = time.monotonic()
+    try:
+        while args.iterations is None or count < args.iterations:
+            sample = sampler.sample()
+            count += 1
+            if record is not None:
+                record.write(json.dumps(record_row(sample, header["started"]), separators=(",", ":")) + "\n")
+                record.flush()
+            if args.json_output:
+                print(json.dumps(sample), flush=True)
+            elif interactive:
+                print("\033[H\033[J" + render_table(sample), flush=True)
+            elif record is None or args.iterations is not None:
+                print(render_table(sample) + "\n", flush=True)
+
+            if args.iterations is not None and count >= args.iterations:
+                break
+            # Sample on a fixed grid rather than interval-after-work
+            next_tick += args.interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if record is not None:
+            record.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Pre-warm language server indexes for a project after a sync.
+
+The first query of a session is slow when clangd or gopls first have to
+build an index. For every server in a generated marketplace whose registry
+entry declares a "warm" action (see lspctl_warm), this runs that action for
+the project ahead of time, a few servers at a time and at low CPU priority,
+so the index is already on disk when Claude Code starts the server.
+
+Usage:
+    python3 lsp-warm.py --scope project --background
+    python3 lsp-warm.py clangd --project ~/src/app --json-output
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from lspctl_marketplace import (
+    BUNDLE_PLUGIN,
+    bundled_servers,
+    get_scope_paths,
+    load_registry,
+    plugin_server_map,
+)
+from lspctl_cache import expand, launcher_cache, shared_cache_dir
+from lspctl_resolve import BinaryResolver, default_search_roots
+from lspctl_warm import Warmup, default_concurrency, run_warmups
+
+
+DEFAULT_REGISTRY = Path(__file__).resolve().parent.parent / "registry" / "servers.json"
+
+
+def marketplace_servers(marketplace_dir: Path, registry) -> dict[str, dict]:
+    """Map each server in a generated marketplace to its .lsp.json entry."""
+    servers = {}
+    by_plugin = plugin_server_map(registry)
+    with open(marketplace_dir / ".claude-plugin" / "marketplace.json") as f:
+        plugins = [plugin["name"] for plugin in json.load(f).get("plugins", [])]
+    for plugin in plugins:
+        if plugin == BUNDLE_PLUGIN:
+            with open(marketplace_dir / "plugins" / plugin / ".lsp.json") as f:
+                lsp_json = json.load(f)
+            for key, server in bundled_servers(lsp_json, registry).items():
+                servers[server] = lsp_json[key]
+            continue
+        server = by_plugin.get(plugin)
+        if server is None:
+            continue
+        entry = {}
+        try:
+            with open(marketplace_dir / "plugins" / plugin / ".lsp.json") as f:
+                for lsp_config in json.load(f).values():
+                    entry = lsp_config
+                    break
+        except (OSError, json.JSONDecodeError):
+            pass
+        servers[server] = entry
+    return servers
+
+
+def shared_cache(server: str, lsp_config: dict, spec: dict, project: Path) -> tuple[dict[str, str], list[str]]:
+    """The env and extra args that point a warm-up at the server's shared cache, if it has one."""
+    launched = launcher_cache(lsp_config)
+    if launched is None:
+        return {}, []
+    root, templates, name = launched
+    cache = shared_cache_dir(Path(root), project, name or server)
+    if cache is not None:
+        try:
+            cache.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            cache = None
+    return expand(templates, spec.get("args", []), cache)
+
+
+def record_results(state_path: Path | None, report: dict) -> None:
+    """Append each warm-up to the state store's history."""
+    from lspctl_state import StateStore
+
+    try:
+        with StateStore(state_path) as state:
+            for result in report["results"]:
+                if result["status"] == "skipped":
+                    continue
+                state.record_event(
+                    "warm", result["status"],
+                    server_name=result["server"],
+                    duration_ms=result["elapsed_s"] * 1000,
+                    detail=report["project"]
+                )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: Could not record history ({e})", file=sys.stderr)
+
+
+def detach(argv: list[str], log_path: Path) -> int:
+    """Re-run this command in a new session with output going to log_path."""
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), *argv],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    return process.pid
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build language server indexes ahead of the first session"
+    )
+    parser.add_argument(
+        "servers",
+        nargs="*",
+        metavar="SERVER",
+        help="Servers to warm (default: every server in the marketplace)"
+    )
+    parser.add_argument(
+        "--project",
+        type=Path,
+        default=Path.cwd(),
+        help="Project directory to warm (default: current directory)"
+    )
+    parser.add_argument(
+        "--scope",
+        choices=["user", "project", "local"],
+        default="project",
+        help="Marketplace whose servers to warm (default: project)"
+    )
+    parser.add_argument(
+        "--from-marketplace",
+        type=Path,
+        metavar="DIR",
+        help="Generated marketplace directory (overrides --scope)"
+    )
+    parser.add_argument(
+        "--registry",
+        type=Path,
+        default=DEFAULT_REGISTRY,
+        help="Server registry (default: bundled servers.json)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=default_concurrency(),
+        help=f"Maximum servers warming at once (default: {default_concurrency()}, a quarter of the CPUs)"
+    )
+    parser.add_argument(
+        "--max-load",
+        type=float,
+        metavar="LOAD",
+        help="Hold back new warm-ups while the load average is this high (default: CPU count; 0 disables)"
+    )
+    parser.add_argument(
+        "--nice",
+        type=int,
+        default=10,
+        help="Niceness increment for the warm-ups (default: 10)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600.0,
+        metavar="SECONDS",
+        help="Per-server time limit (default: 600)"
+    )
+    parser.add_argument(
+        "--background",
+        action="store_true",
+        help="Detach and write progress to --log instead"
+    )
+    parser.add_argument(
+        "--log",
+        type=Path,
+        default=Path.home() / ".cache" / "lspctl" / "warm.log",
+        help="Progress log for --background (default: ~/.cache/lspctl/warm.log)"
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        help="State database path (default: $LSPCTL_STATE_DB or ~/.claude/lspctl-state.db)"
+    )
+    parser.add_argument(
+        "--no-state",
+        action="store_true",
+        help="Do not record warm-ups in the state store"
+    )
+    parser.add_argument(
+        "--json-output",
+        action="store_true",
+        help="Output the final report as JSON"
+    )
+
+    args = parser.parse_args()
+    project = args.project.resolve()
+
+    try:
+        registry = load_registry(args.registry)
+    except (OSError, json.JSONDecodeError, sqlite3.Error) as e:
+        print(f"Error: Cannot load registry: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.servers:
+        unknown = [server for server in args.servers if server not in registry]
+        if unknown:
+            parser.error(f"unknown servers: {', '.join(unknown)}")
+        servers = {server: {} for server in args.servers}
+    else:
+        marketplace = args.from_marketplace or get_scope_paths(args.scope, project)[0]
+        try:
+            servers = marketplace_servers(marketplace, registry)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error: Cannot read marketplace: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    # Servers installed by Mason, in the project's venv or behind shims are used in place
+    resolver = BinaryResolver(default_search_roots(project), project)
+    warmups = []
+    for server, lsp_config in servers.items():
+        entry = registry[server]
+        if not entry.get("warm"):
+            continue
+        # Warm-ups fill the cache the server will use, shared across worktrees
+        env, cache_args = shared_cache(server, lsp_config, entry.get("cache") or {}, project)
+        warmups.append(Warmup(
+            server=server,
+            command=[*resolver.launch(entry["command"]), *entry.get("args", []), *cache_args],
+            extensions=entry.get("extensionToLanguage", {}),
+            spec=entry["warm"],
+            settings=lsp_config.get("settings"),
+            env=env,
+        ))
+
+    if args.background:
+        argv = [arg for arg in sys.argv[1:] if arg != "--background"]
+        if not any(arg == "--project" or arg.startswith("--project=") for arg in argv):
+            argv += ["--project", str(project)]
+        pid = detach(argv, args.log)
+        print(f"Warming {len(warmups)} servers in the background (pid {pid}, log: {args.log})")
+        return
+
+    if args.nice:
+        os.nice(args.nice)
+
+    started = time.monotonic()
+
+    def emit(server: str, message: str) -> None:
+        if not args.json_output:
+            print(f"[{time.monotonic() - started:6.1f}s] {server}: {message}", flush=True)
+
+    report = run_warmups(
+        warmups,
+        project,
+        concurrency=args.concurrency,
+        max_load=args.max_load,
+        timeout=args.timeout,
+        emit=emit,
+    )
+
+    if not args.no_state:
+        record_results(args.state, report)
+
+    if args.json_output:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in report["results"]:
+            line = f"  {result['status']:<8} {result['server']}"
+            if result["status"] == "skipped":
+                line += f" ({result['reason']})"
+            else:
+                line += f" {result['elapsed_s']:.1f}s"
+                if result["reason"]:
+                    line += f": {result['reason']}"
+            print(line)
+        print(f"\nWarmed {report['summary'].get('ok', 0)}/{len(report['results'])} servers "
+              f"in {report['duration_s']:.1f}s")
+
+    if any(result["status"] in ("failed", "timeout") for result in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Content-addressed store for LSP server artifacts.
+
+Installs servers from a local artifact directory (an internal mirror, a
+shared mount or a USB stick) instead of each machine downloading through
+installCommands. The directory holds tarballs or zips and a manifest.json:
+
+    {
+      "artifacts": [
+        {
+          "server": "lua_ls",
+          "version": "3.7.4",
+          "platform": "linux-x86_64",
+          "file": "lua-language-server-3.7.4-linux-x64.tar.gz",
+          "sha256": "<hex digest of the file>",
+          "bin": {"lua-language-server": "bin/lua-language-server"}
+        }
+      ]
+    }
+
+"platform" is optional; entries without one match every platform. Each
+archive is checked against its sha256, then unpacked once into
+objects/<sha256>/ in the store and made read-only; installing the same
+artifact again, or for another user sharing the store, reuses that copy.
+The commands listed in "bin" are linked into a shared bin directory. The
+file hashes of every unpacked tree are recorded so verify() can detect
+later modification.
+
+The store lives at $LSPCTL_STORE or ~/.local/share/lspctl/store.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import shutil
+import stat
+import sys
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path
+
+from lspctl_marketplace import file_lock, load_json, save_json
+
+
+class ArtifactError(Exception):
+    """An artifact is missing, malformed or fails verification."""
+
+
+def default_store_path() -> Path:
+    """Return the artifact store location ($LSPCTL_STORE overrides)."""
+    override = os.environ.get("LSPCTL_STORE")
+    if override:
+        return Path(override)
+    return Path.home() / ".local" / "share" / "lspctl" / "store"
+
+
+def platform_tag() -> str:
+    """Return this machine's manifest platform, e.g. linux-x86_64."""
+    machine = platform.machine().lower()
+    machine = {"amd64": "x86_64", "arm64": "aarch64"}.get(machine, machine)
+    return f"{sys.platform}-{machine}"
+
+
+def file_sha256(path: Path) -> str:
+    """Hash a file in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(artifact_dir: Path) -> list[dict]:
+    """Read the artifact entries from artifact_dir/manifest.json."""
+    manifest_path = artifact_dir / "manifest.json"
+    try:
+        artifacts = load_json(manifest_path).get("artifacts", [])
+    except FileNotFoundError:
+        raise ArtifactError(f"No manifest.json in {artifact_dir}") from None
+    except json.JSONDecodeError as e:
+        raise ArtifactError(f"Invalid {manifest_path}: {e}") from None
+    for entry in artifacts:
+        missing = [key for key in ("server", "file", "sha256", "bin") if key not in entry]
+        if missing:
+            raise ArtifactError(f"Manifest entry {entry!r} lacks {', '.join(missing)}")
+    return artifacts
+
+
+def select_artifact(artifacts: list[dict], server: str, tag: str | None = None) -> dict:
+    """Pick the server's artifact for this platform (exact platform wins)."""
+    tag = tag or platform_tag()
+    candidates = [entry for entry in artifacts if entry["server"] == server]
+    for entry in candidates:
+        if entry.get("platform") == tag:
+            return entry
+    for entry in candidates:
+        if not entry.get("platform"):
+            return entry
+    if candidates:
+        raise ArtifactError(f"No {server} artifact for platform {tag}")
+    raise ArtifactError(f"No artifact for {server}")
+
+
+def _check_member_name(name: str) -> None:
+    """Reject archive members that would land outside the unpack directory."""
+    parts = Path(name).parts
+    if Path(name).is_absolute() or ".." in parts:
+        raise ArtifactError(f"Unsafe path in archive: {name}")
+
+
+def unpack_archive(archive: Path, target: Path) -> None:
+    """Unpack a tarball or zip into target, refusing paths that escape it."""
+    if tarfile.is_tarfile(archive):
+        with tarfile.open(archive) as tar:
+            members = tar.getmembers()
+            for member in members:
+                _check_member_name(member.name)
+                if member.issym() or member.islnk():
+                    link_target = member.linkname if member.islnk() else os.path.join(
+                        os.path.dirname(member.name), member.linkname
+                    )
+                    _check_member_name(os.path.normpath(link_target))
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(target, members, filter="data")
+            else:
+                tar.extractall(target, members)
+    elif zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                _check_member_name(info.filename)
+                path = Path(zf.extract(info, target))
+                mode = (info.external_attr >> 16) & 0o777
+                if mode and not info.is_dir():
+                    path.chmod(mode)
+    else:
+        raise ArtifactError(f"{archive.name} is not a tar or zip archive")
+
+
+def tree_hashes(root: Path) -> dict[str, str]:
+    """Map every file and symlink under root to its content hash."""
+    hashes = {}
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files) + [d for d in dirs if os.path.islink(os.path.join(directory, d))]:
+            path = Path(directory) / name
+            rel_path = path.relative_to(root).as_posix()
+            if path.is_symlink():
+                hashes[rel_path] = "symlink:" + os.readlink(path)
+            else:
+                hashes[rel_path] = file_sha256(path)
+    return hashes
+
+
+def _make_read_only(root: Path) -> None:
+    """Drop write permission from every file so linked copies stay pristine."""
+    for directory, _dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if not os.path.islink(path):
+                mode = os.stat(path).st_mode
+                os.chmod(path, stat.S_IMODE(mode) & ~0o222)
+
+
+def _replace_link(link_path: Path, target: Path, mode: str) -> None:
+    """Point link_path at target, swapping any existing entry atomically."""
+    tmp = link_path.with_name(f".{link_path.name}.tmp-{os.getpid()}")
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    if mode == "hardlink":
+        os.link(target, tmp)
+    else:
+        os.symlink(target, tmp)
+    os.replace(tmp, link_path)
+
+
+class ArtifactStore:
+    """An artifact store rooted at a directory (see module docstring)."""
+
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root) if root else default_store_path()
+        self.objects = self.root / "objects"
+        self.installed_path = self.root / "installed.json"
+
+    def object_dir(self, digest: str) -> Path:
+        return self.objects / digest
+
+    def _hashes_path(self, digest: str) -> Path:
+        return self.objects / f"{digest}.files.json"
+
+    def has(self, digest: str) -> bool:
+        return self.object_dir(digest).is_dir() and self._hashes_path(digest).is_file()
+
+    def add(self, archive: Path, digest: str) -> bool:
+        """
+        Unpack a verified archive into the store unless it is already there.
+
+        Returns True if it was unpacked, False if an existing copy was reused.
+        """
+        self.objects.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.object_dir(digest)):
+            if self.has(digest):
+                return False
+            shutil.rmtree(self.object_dir(digest), ignore_errors=True)
+            unpack_dir = Path(tempfile.mkdtemp(prefix=f".{digest}.unpack-", dir=self.objects))
+            try:
+                unpack_archive(archive, unpack_dir)
+                _make_read_only(unpack_dir)
+                save_json(self._hashes_path(digest), {"files": tree_hashes(unpack_dir)})
+                unpack_dir.chmod(0o755)
+                os.replace(unpack_dir, self.object_dir(digest))
+            except BaseException:
+                shutil.rmtree(unpack_dir, ignore_errors=True)
+                raise
+        return True
+
+    def install(
+        self,
+        entry: dict,
+        artifact_dir: Path,
+        bin_dir: Path | None = None,
+        link_mode: str = "symlink"
+    ) -> dict:
+        """
+        Install one manifest entry: verify, unpack once, link its commands.
+
+        Returns dict with server, version, digest, unpacked (False when the
+        store already had the artifact) and commands (name -> link path).
+        """
+        bin_dir = bin_dir or self.root / "bin"
+        archive = artifact_dir / entry["file"]
+        if not archive.is_file():
+            raise ArtifactError(f"Artifact not found: {archive}")
+        digest = file_sha256(archive)
+        if digest != entry["sha256"].lower():
+            raise ArtifactError(
+                f"Checksum mismatch for {entry['file']}: expected {entry['sha256']}, got {digest}"
+            )
+
+        unpacked = self.add(archive, digest)
+        object_dir = self.object_dir(digest)
+
+        bin_dir.mkdir(parents=True, exist_ok=True)
+        commands = {}
+        for command, rel_path in entry["bin"].items():
+            _check_member_name(rel_path)
+            target = object_dir / rel_path
+            if not target.is_file() or not os.access(target, os.X_OK):
+                raise ArtifactError(f"{entry['file']} has no executable {rel_path}")
+            link_path = bin_dir / command
+            _replace_link(link_path, target, link_mode)
+            commands[command] = str(link_path)
+
+        record = {
+            "version": entry.get("version"),
+            "digest": digest,
+            "file": entry["file"],
+            "commands": commands
+        }
+        with file_lock(self.installed_path):
+            installed = self.installed()
+            installed[entry["server"]] = record
+            save_json(self.installed_path, installed)
+
+        return {"server": entry["server"], "unpacked": unpacked, **record}
+
+    def installed(self) -> dict[str, dict]:
+        """Return server -> install record."""
+        try:
+            return load_json(self.installed_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def verify(self) -> list[dict]:
+        """
+        Re-hash every unpacked artifact and check installed links.
+
+        Returns a list of problems, each {digest, path, problem} where
+        problem is "modified", "missing", "unexpected" or "broken link".
+        """
+        problems = []
+        if self.objects.is_dir():
+            for hashes_path in sorted(self.objects.glob("*.files.json")):
+                digest = hashes_path.name[:-len(".files.json")]
+                expected = load_json(hashes_path)["files"]
+                actual = tree_hashes(self.object_dir(digest)) if self.object_dir(digest).is_dir() else {}
+                for rel_path, file_hash in expected.items():
+                    if rel_path not in actual:
+                        problems.append({"digest": digest, "path": rel_path, "problem": "missing"})
+                    elif actual[rel_path] != file_hash:
+                        problems.append({"digest": digest, "path": rel_path, "problem": "modified"})
+                for rel_path in actual:
+                    if rel_path not in expected:
+                        problems.append({"digest": digest, "path": rel_path, "problem": "unexpected"})
+
+        for record in self.installed().values():
+            for link_path in record["commands"].values():
+                if not os.path.exists(link_path):
+                    problems.append({"digest": record["digest"], "path": link_path, "problem": "broken link"})
+        return problems
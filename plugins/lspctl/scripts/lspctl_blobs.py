@@ -0,0 +1,123 @@
+"""
+Content-addressed storage for generated plugin files.
+
+A user-scope marketplace and any number of project-scope ones usually
+contain byte-identical plugins. Each rendered plugin is stored once, as a
+read-only directory named by its content hash (the same hash the state
+store records), and its files are hardlinked into every marketplace that
+uses it. Generating an unchanged plugin in another scope then costs a link
+instead of a write.
+
+A blob's link count is its reference count: once no marketplace links its
+files, st_nlink drops back to 1 and gc() removes it. Linking holds the
+store's lock shared and gc() holds it exclusively, so a blob cannot be
+collected between being found and being linked.
+
+Where hardlinks are not possible (the marketplace is on another
+filesystem), files are copied instead.
+
+The store lives at $LSPCTL_BLOBS or ~/.claude/lspctl-blobs.
+"""
+
+import errno
+import os
+import shutil
+from pathlib import Path
+
+from lspctl_marketplace import file_lock, make_temp_dir, write_atomic
+
+
+# Errors that mean "hardlinks are not possible here", not "something broke"
+LINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP}
+
+
+def default_blob_path() -> Path:
+    """Return the blob store location ($LSPCTL_BLOBS overrides)."""
+    override = os.environ.get("LSPCTL_BLOBS")
+    return Path(override) if override else Path.home() / ".claude" / "lspctl-blobs"
+
+
+class BlobStore:
+    """Plugin file blobs keyed by content hash (see module docstring)."""
+
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root) if root else default_blob_path()
+
+    def blob_dir(self, digest: str) -> Path:
+        return self.root / digest
+
+    def _ensure(self, digest: str, files: dict[str, str]) -> bool:
+        """Store a plugin's files unless present; returns True if written."""
+        blob_dir = self.blob_dir(digest)
+        if blob_dir.is_dir():
+            return False
+        tmp_dir = make_temp_dir(self.root, f".{digest}.")
+        try:
+            for rel_path, text in files.items():
+                path = tmp_dir / rel_path
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(text)
+                path.chmod(0o444)
+            tmp_dir.chmod(0o755)
+            os.rename(tmp_dir, blob_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if blob_dir.is_dir():
+                # Another process stored the same plugin first
+                return False
+            raise
+        return True
+
+    def place(self, digest: str, files: dict[str, str], plugin_dir: Path) -> bool:
+        """
+        Put a rendered plugin's files into plugin_dir as links to its blob.
+
+        Existing files in plugin_dir are replaced atomically. Returns True
+        if the blob had to be written, False if an existing one was reused.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.root, shared=True):
+            written = self._ensure(digest, files)
+            for rel_path, text in files.items():
+                target = plugin_dir / rel_path
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_name(f".{target.name}.link-{os.getpid()}")
+                try:
+                    os.link(self.blob_dir(digest) / rel_path, tmp)
+                except OSError as e:
+                    if e.errno not in LINK_UNSUPPORTED:
+                        raise
+                    write_atomic(target, text)
+                    continue
+                os.replace(tmp, target)
+        return written
+
+    def gc(self) -> dict:
+        """
+        Remove blobs no marketplace links to.
+
+        Returns dict with removed (digests) and kept (count).
+        """
+        result = {"removed": [], "kept": 0}
+        if not self.root.is_dir():
+            return result
+
+        with file_lock(self.root):
+            for entry in sorted(self.root.iterdir()):
+                if not entry.is_dir():
+                    continue
+                if entry.name.startswith("."):
+                    # Left behind by an interrupted store
+                    shutil.rmtree(entry, ignore_errors=True)
+                    continue
+                linked = any(
+                    path.stat().st_nlink > 1
+                    for path in entry.rglob("*")
+                    if path.is_file()
+                )
+                if linked:
+                    result["kept"] += 1
+                else:
+                    shutil.rmtree(entry)
+                    result["removed"].append(entry.name)
+        return result
@@ -0,0 +1,152 @@
+"""
+Index and build caches shared by the worktrees and clones of a repository.
+
+A registry entry declares where its server keeps caches that are worth
+sharing, with {cache} standing for the shared directory:
+
+    "cache": {
+        "env": {"CARGO_TARGET_DIR": "{cache}/target"},
+        "args": ["--index-dir={cache}/index"]
+    }
+
+A server that sets `shared_cache` in lsp-config.lua is started through
+lsp-launch.py --shared-cache ROOT. At startup the launcher identifies the
+git repository of its working directory and fills in
+ROOT/<repository>/<server> for {cache}, so every worktree and clone of a
+repository points the server at the same directory and reuses its warm
+cache. Outside a git repository the cache env is not set and args that
+mention {cache} are left out, so the server falls back to its defaults.
+
+A repository is identified by its root commit, which all clones share
+whatever their remotes; shallow clones, which lack it, by their origin
+URL. The root commit is looked up once per clone (its git common
+directory, shared by all of its worktrees) and kept in the state store,
+since finding it walks the whole history.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import subprocess
+from pathlib import Path
+
+
+PLACEHOLDER = "{cache}"
+
+# host:path and scheme://user@host/path remotes
+REMOTE_PATTERN = re.compile(r"^(?:[a-z][a-z0-9+.-]*://)?(?:[^@/]+@)?([^/:]+)[:/](.+)$")
+
+
+def _git(project: Path, *args: str) -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(project), *args],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    output = result.stdout.strip()
+    return output if result.returncode == 0 and output else None
+
+
+def normalize_remote(url: str) -> str:
+    """Reduce a remote URL to host/path, so ssh and https remotes compare equal."""
+    url = url.strip().rstrip("/")
+    if url.endswith(".git"):
+        url = url[:-4]
+    match = REMOTE_PATTERN.match(url)
+    if match:
+        return f"{match.group(1).lower()}/{match.group(2).lstrip('/')}"
+    return url
+
+
+def repository_identity(project: Path, state=None) -> str | None:
+    """
+    Identify the git repository containing project, or None outside one.
+
+    Returns "commit:<root commit>" or "remote:<host/path>". With a state
+    store, root commits are cached per git common directory.
+    """
+    common = _git(project, "rev-parse", "--git-common-dir")
+    if common is None:
+        return None
+    common_dir = str((project / common).resolve())
+    if state is not None:
+        cached = state.repository(common_dir)
+        if cached:
+            return cached
+
+    identity = None
+    if _git(project, "rev-parse", "--is-shallow-repository") != "true":
+        roots = _git(project, "rev-list", "--max-parents=0", "HEAD")
+        if roots:
+            identity = f"commit:{min(roots.split())}"
+    if identity is None:
+        remote = _git(project, "config", "--get", "remote.origin.url")
+        if remote is None:
+            return None
+        identity = f"remote:{normalize_remote(remote)}"
+
+    if state is not None:
+        state.record_repository(common_dir, identity)
+    return identity
+
+
+def repository_key(identity: str) -> str:
+    """Directory name for a repository: readable where the remote allows, always unique."""
+    digest = hashlib.sha256(identity.encode()).hexdigest()[:16]
+    kind, _, value = identity.partition(":")
+    if kind == "remote":
+        return f"{os.path.basename(value)}-{digest}"
+    return digest
+
+
+def shared_cache_dir(root: Path, project: Path, server: str) -> Path | None:
+    """The shared cache directory of a server for the repository of project."""
+    from lspctl_state import StateStore
+
+    try:
+        with StateStore() as state:
+            identity = repository_identity(project, state)
+    except (OSError, sqlite3.Error):
+        identity = repository_identity(project)
+    if identity is None:
+        return None
+    return root.expanduser() / repository_key(identity) / server
+
+
+def expand(templates: dict[str, str], argv: list[str], cache: Path | None) -> tuple[dict[str, str], list[str]]:
+    """
+    Fill {cache} into env templates and arguments.
+
+    Without a cache directory, no env is set and arguments that mention
+    {cache} are dropped.
+    """
+    if cache is None:
+        return {}, [arg for arg in argv if PLACEHOLDER not in arg]
+    env = {name: value.replace(PLACEHOLDER, str(cache)) for name, value in templates.items()}
+    return env, [arg.replace(PLACEHOLDER, str(cache)) for arg in argv]
+
+
+def launcher_cache(lsp_config: dict) -> tuple[str, dict[str, str], str | None] | None:
+    """
+    Read (root, env templates, name) from an .lsp.json entry's launcher options,
+    or None if it does not share a cache.
+    """
+    args = [str(arg) for arg in lsp_config.get("args") or []]
+    if not args or not args[0].endswith("lsp-launch.py") or "--shared-cache" not in args:
+        return None
+    options = args[1:args.index("--")] if "--" in args else args[1:]
+    root, templates, name = None, {}, None
+    for option, value in zip(options, options[1:]):
+        if option == "--shared-cache":
+            root = value
+        elif option == "--cache-env":
+            key, _, template = value.partition("=")
+            templates[key] = template
+        elif option == "--name":
+            name = value
+    return (root, templates, name) if root else None
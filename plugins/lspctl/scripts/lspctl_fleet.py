@@ -0,0 +1,262 @@
+"""
+Fleet mode for generate-marketplace.py.
+
+Syncs the project scope of every project under a root directory, sharing
+one registry and one binary index across a pool of generator processes.
+Each project's config is merged from the same layers as a single-project
+sync: user, project and local.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from lspctl_marketplace import (
+    generate_marketplace,
+    get_scope_paths,
+    no_events,
+    open_state,
+    resolve_binary,
+    update_settings,
+)
+from lspctl_resolve import BinaryResolver, default_search_roots
+from lspctl_watch import PARSER_SCRIPT
+
+if TYPE_CHECKING:
+    from lspctl_blobs import BlobStore
+    from lspctl_state import StateStore
+
+
+# Directories fleet discovery never descends into
+FLEET_SKIP_DIRS = {"node_modules", "venv", "__pycache__", "target", "dist"}
+
+
+def fleet_layers() -> list[str]:
+    """The config layers merged for each project; {} is the project directory."""
+    return [
+        f"user={Path.home() / '.claude' / 'lsp-config.lua'}",
+        "project={}/.claude/lsp-config.lua",
+        "local={}/.claude/lsp-config.local.lua",
+    ]
+
+
+def discover_projects(root: Path) -> list[Path]:
+    """Find project directories under root that have .claude/lsp-config.lua."""
+    projects = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            if entry.name == ".claude":
+                if os.path.isfile(os.path.join(entry.path, "lsp-config.lua")):
+                    projects.append(Path(directory))
+            elif not entry.name.startswith(".") and entry.name not in FLEET_SKIP_DIRS:
+                stack.append(Path(entry.path))
+    return sorted(projects)
+
+
+def parse_configs(
+    paths: list[Path],
+    workers: int,
+    lua: str = "lua",
+    layers: list[str] | None = None
+) -> dict[str, dict]:
+    """
+    Parse many configs with the Lua parser's --batch mode.
+
+    Configs are split across `workers` parser processes running at once,
+    so the interpreter start-up is paid per worker, not per config. With
+    layers (NAME=TEMPLATE, see fleet_layers()), each path is merged from
+    those layers instead, {} standing for the path.
+    Returns {path: {"config" | "error", "cpu_ms"}}.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    chunks = [chunk for chunk in (paths[i::workers] for i in range(workers)) if chunk]
+    layer_argv = [arg for layer in layers or [] for arg in ("--layer", layer)]
+
+    def run(chunk: list[Path]) -> dict:
+        result = subprocess.run(
+            [lua, str(PARSER_SCRIPT), "--batch", *layer_argv, *map(str, chunk)],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip() or f"parser exited with {result.returncode}"
+            return {str(path): {"error": error} for path in chunk}
+        return json.loads(result.stdout) or {}
+
+    parsed = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(chunks))) as pool:
+        for results in pool.map(run, chunks):
+            parsed.update(results)
+    return parsed
+
+
+# Per-process context for fleet generation workers
+_fleet_context: dict = {}
+
+
+def _fleet_worker_init(
+    registry: dict,
+    binaries: dict,
+    listings: dict,
+    state_path: Path | None,
+    blobs: BlobStore | None
+) -> None:
+    _fleet_context["registry"] = registry
+    _fleet_context["binaries"] = binaries
+    _fleet_context["listings"] = listings
+    _fleet_context["blobs"] = blobs
+    _fleet_context["state"] = open_state(state_path) if state_path else None
+
+
+def _fleet_generate(project: str, config: dict) -> dict:
+    """Generate and register one project's marketplace (runs in a worker)."""
+    started = time.monotonic()
+    output_dir, settings_path = get_scope_paths("project", Path(project))
+    result = generate_marketplace(
+        config,
+        _fleet_context["registry"],
+        output_dir,
+        _fleet_context["state"],
+        settings_path,
+        binaries=_fleet_context["binaries"],
+        blobs=_fleet_context["blobs"],
+        # Shared roots come listed from the parent; only the project's own
+        # roots (venv, node_modules) are searched here
+        resolver=BinaryResolver(
+            default_search_roots(Path(project)), Path(project), _fleet_context["state"],
+            listings=_fleet_context["listings"]
+        )
+    )
+    update_settings(settings_path, output_dir)
+    return {
+        "marketplace": str(output_dir),
+        "generated": result["generated"],
+        "missing_binaries": sorted(result["missing_binaries"]),
+        "unknown_servers": result["unknown_servers"],
+        "generate_ms": round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+def sync_fleet(
+    root: Path,
+    registry: Mapping,
+    state: StateStore | None = None,
+    workers: int | None = None,
+    lua: str = "lua",
+    blobs: BlobStore | None = None,
+    events=no_events,
+    layers: list[str] | None = None
+) -> dict:
+    """
+    Sync every project scope under root in one run.
+
+    Projects are discovered by their .claude/lsp-config.lua. Their configs
+    are merged from layers (default: fleet_layers()) in a few batched
+    parser processes, the registry entries and binaries they need are
+    loaded and resolved once, and the marketplaces are generated in a
+    process pool. The shared search roots are listed once; only each
+    project's venv and node_modules are searched per project, for binaries
+    missing from the shared roots. events receives each project as it is
+    parsed and as its marketplace is finished.
+
+    Returns dict with:
+        - projects: per-project results with parse and generate timings
+        - binaries: command -> resolved path (None if missing)
+        - summary: project, failure and plugin counts
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    started = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    projects = discover_projects(root)
+    discovered_ms = (time.monotonic() - started) * 1000
+
+    config_paths = [project / ".claude" / "lsp-config.lua" for project in projects]
+    parsed = parse_configs(projects, workers, lua, layers or fleet_layers()) if projects else {}
+    parsed_ms = (time.monotonic() - started) * 1000 - discovered_ms
+
+    # One registry subset and one binary index shared by every project
+    servers = {
+        server
+        for entry in parsed.values()
+        for server in (entry.get("config") or {}).get("ensure_installed", [])
+    }
+    shared_registry = {server: registry[server] for server in sorted(servers) if server in registry}
+    binaries = {}
+    resolver = BinaryResolver(state=state)
+    for registry_entry in shared_registry.values():
+        command = registry_entry["command"]
+        if command not in binaries:
+            binaries[command] = resolve_binary(command, registry_entry, state, resolver)
+            if binaries[command] is None:
+                events("binary_missing", command=command)
+            else:
+                events("binary_resolved", command=command, path=binaries[command]["path"],
+                       version=binaries[command]["version"])
+    listings = resolver.scan()
+
+    reports = []
+    pending = {}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_fleet_worker_init,
+        initargs=(
+            shared_registry, binaries, listings, state.path if state is not None else None, blobs
+        )
+    ) as pool:
+        for project, config_path in zip(projects, config_paths):
+            entry = parsed.get(str(project), {"error": "not parsed"})
+            report = {
+                "project": str(project),
+                "config": str(config_path),
+                "parse_cpu_ms": round(entry.get("cpu_ms", 0.0), 1),
+                "error": entry.get("error")
+            }
+            reports.append(report)
+            events("project_parsed", project=report["project"], error=report["error"],
+                   cpu_ms=report["parse_cpu_ms"])
+            if report["error"] is None:
+                pending[pool.submit(_fleet_generate, str(project), entry["config"])] = report
+        for future in as_completed(pending):
+            report = pending[future]
+            try:
+                report.update(future.result())
+            except Exception as e:
+                report["error"] = f"{type(e).__name__}: {e}"
+            events("project_synced", project=report["project"], error=report["error"],
+                   generated=report.get("generated", []),
+                   missing_binaries=report.get("missing_binaries", []),
+                   generate_ms=report.get("generate_ms"))
+
+    failed = sum(1 for report in reports if report["error"])
+    return {
+        "root": str(root),
+        "projects": reports,
+        "binaries": {command: info["path"] if info else None for command, info in binaries.items()},
+        "summary": {
+            "projects": len(reports),
+            "succeeded": len(reports) - failed,
+            "failed": failed,
+            "plugins": sum(len(report.get("generated", [])) for report in reports)
+        },
+        "timings_ms": {
+            "discover": round(discovered_ms, 1),
+            "parse": round(parsed_ms, 1),
+            "total": round((time.monotonic() - started) * 1000, 1)
+        }
+    }
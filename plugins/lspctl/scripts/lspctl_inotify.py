@@ -0,0 +1,118 @@
+"""
+Minimal Linux inotify binding (ctypes, no third-party packages).
+
+Watches directories rather than files: editors usually save by writing a
+temporary file and renaming it over the original, which would silently
+end a watch on the original inode. Callers filter events by file name.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+from pathlib import Path
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+
+# A file in a watched directory appeared, changed, or went away
+DIRECTORY_EVENTS = (
+    IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyError(OSError):
+    """inotify is unavailable or a watch could not be added."""
+
+
+class Inotify:
+    """An inotify instance watching a set of directories."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise InotifyError(errno.ENOSYS, f"inotify is not available: {e}") from e
+        self.fd = init(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise InotifyError(err, os.strerror(err))
+        self._dirs: dict[int, Path] = {}
+
+    def watch_directory(self, directory: Path, mask: int = DIRECTORY_EVENTS) -> bool:
+        """Watch a directory; returns False if it does not exist."""
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), mask | IN_ONLYDIR
+        )
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return False
+            raise InotifyError(err, f"{os.strerror(err)}: {directory}")
+        self._dirs[wd] = Path(directory)
+        return True
+
+    @property
+    def directories(self) -> set[Path]:
+        return set(self._dirs.values())
+
+    def read(self, timeout: float | None = None) -> list[tuple[Path | None, int]]:
+        """
+        Block until events arrive (or timeout seconds pass).
+
+        Returns (path, mask) pairs; path is None for queue overflows,
+        meaning events were lost and everything should be re-checked.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    events.append((None, mask))
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is not None:
+                    events.append((directory / os.fsdecode(name) if name else directory, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def __enter__(self) -> "Inotify":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,168 @@
+"""
+Language Server Protocol plumbing for the server launcher and session replay.
+
+Reads and writes base-protocol frames (Content-Length headers followed by
+a JSON body) and keeps a shadow copy of the documents a client has open,
+applying didChange edits in whichever position encoding the server
+negotiated, so the documents can be replayed to a fresh server process.
+"""
+
+import json
+import re
+
+
+LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+class ProtocolError(Exception):
+    """A malformed base-protocol frame."""
+
+
+def read_message(stream) -> dict | None:
+    """Read one message from a binary stream; None at end of stream."""
+    frame = read_frame(stream)
+    return frame[0] if frame is not None else None
+
+
+def read_frame(stream) -> tuple[dict, int] | None:
+    """Read one message and its body size in bytes; None at end of stream."""
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.rstrip(b"\r\n")
+        if not line:
+            break
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            try:
+                length = int(value)
+            except ValueError:
+                raise ProtocolError(f"Bad Content-Length: {value!r}") from None
+    if length is None:
+        raise ProtocolError("Message without Content-Length")
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body), length
+
+
+def write_message(stream, message: dict) -> None:
+    """Write one message to a binary stream and flush it."""
+    body = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    stream.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    stream.flush()
+
+
+def is_request(message: dict) -> bool:
+    return "method" in message and "id" in message
+
+
+def is_notification(message: dict) -> bool:
+    return "method" in message and "id" not in message
+
+
+def is_response(message: dict) -> bool:
+    return "method" not in message and "id" in message
+
+
+def configuration_section(settings: dict | None, section: str | None):
+    """Answer one workspace/configuration item from .lsp.json settings."""
+    value = settings
+    if section:
+        for key in section.split("."):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+    return value
+
+
+def _units(char: str, encoding: str) -> int:
+    """Length of one code point in the negotiated position encoding."""
+    if encoding == "utf-8":
+        return len(char.encode("utf-8"))
+    if encoding == "utf-32":
+        return 1
+    return 2 if ord(char) > 0xFFFF else 1
+
+
+def position_offset(text: str, position: dict, encoding: str = "utf-16") -> int:
+    """
+    Convert an LSP position to an index into text.
+
+    Characters past the end of a line clamp to the line end and lines past
+    the end of the text clamp to its end, as the specification asks.
+    """
+    line_start = 0
+    for _ in range(position["line"]):
+        match = LINE_BREAK.search(text, line_start)
+        if match is None:
+            return len(text)
+        line_start = match.end()
+
+    match = LINE_BREAK.search(text, line_start)
+    line_end = match.start() if match else len(text)
+    remaining = position["character"]
+    index = line_start
+    while index < line_end and remaining > 0:
+        remaining -= _units(text[index], encoding)
+        index += 1
+    return index
+
+
+class DocumentShadow:
+    """The open documents as the server sees them."""
+
+    def __init__(self):
+        # uri -> {"languageId", "version", "text"}
+        self.documents: dict[str, dict] = {}
+        self.encoding = "utf-16"
+
+    def did_open(self, params: dict) -> None:
+        document = params["textDocument"]
+        self.documents[document["uri"]] = {
+            "languageId": document["languageId"],
+            "version": document["version"],
+            "text": document["text"],
+        }
+
+    def did_change(self, params: dict) -> None:
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return
+        text = document["text"]
+        for change in params["contentChanges"]:
+            if "range" in change:
+                start = position_offset(text, change["range"]["start"], self.encoding)
+                end = position_offset(text, change["range"]["end"], self.encoding)
+                text = text[:start] + change["text"] + text[end:]
+            else:
+                text = change["text"]
+        document["text"] = text
+        if params["textDocument"].get("version") is not None:
+            document["version"] = params["textDocument"]["version"]
+
+    def did_close(self, params: dict) -> None:
+        self.documents.pop(params["textDocument"]["uri"], None)
+
+    def track(self, message: dict) -> None:
+        """Apply a client notification that changes document state."""
+        handler = {
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didClose": self.did_close,
+        }.get(message.get("method"))
+        if handler is not None:
+            handler(message.get("params") or {})
+
+    def open_notifications(self) -> list[dict]:
+        """didOpen notifications that recreate every open document."""
+        return [
+            {
+                "jsonrpc": "2.0",
+                "method": "textDocument/didOpen",
+                "params": {"textDocument": {"uri": uri, **document}},
+            }
+            for uri, document in self.documents.items()
+        ]
@@ -0,0 +1,1173 @@
+"""
+Marketplace generation core for generate-marketplace.py.
+
+Renders plugins from a parsed config and the server registry, writes and
+registers the generated marketplace, and keeps the state store in step.
+Stdlib modules only some paths need (subprocess, sqlite3, the state store)
+are imported where they are first used, so quick commands start fast.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import sys
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from lspctl_resolve import BinaryResolver, launched_command
+
+# At runtime the state store stays unimported until a command opens it
+if TYPE_CHECKING:
+    from lspctl_blobs import BlobStore
+    from lspctl_state import StateStore
+
+
+MARKETPLACE_NAME = "generated-lsp"
+
+# Wraps servers that set idle_timeout, record, supervise, coalesce_diagnostics
+# or shared_cache
+LAUNCHER_SCRIPT = Path(__file__).resolve().parent / "lsp-launch.py"
+
+# Diagnostics window for `coalesce_diagnostics = true`
+DEFAULT_COALESCE_MS = 200
+
+# Shared caches for `shared_cache = true` (expanded by the launcher)
+DEFAULT_CACHE_ROOT = "~/.cache/lspctl/repos"
+
+# The single plugin --bundle generates in place of one plugin per server
+BUNDLE_PLUGIN = "lsp-bundle"
+
+
+def no_events(event: str, **fields) -> None:
+    """Default progress sink: events are dropped."""
+
+
+class EventStream:
+    """
+    Progress sink for --events: one JSON object per line, flushed at once.
+
+    Each line has "event" (its name), "t_ms" (milliseconds since the stream
+    was created) and the event's own fields.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.started = time.monotonic()
+
+    def __call__(self, event: str, **fields) -> None:
+        record = {"event": event, "t_ms": round((time.monotonic() - self.started) * 1000, 1), **fields}
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+def load_json(path: Path) -> dict:
+    """Load JSON file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def render_json(data: dict, indent: int = 2) -> str:
+    """Render JSON exactly as save_json writes it."""
+    return json.dumps(data, indent=indent) + "\n"
+
+
+def _temp_path(directory: Path, prefix: str, suffix: str = "") -> Path:
+    return Path(directory) / f"{prefix}{os.urandom(6).hex()}{suffix}"
+
+
+def make_temp_file(directory: Path, prefix: str, suffix: str = "") -> tuple[int, Path]:
+    """
+    Create a new private file in directory, like tempfile.mkstemp(); the
+    tempfile module (and random, which it imports) would add a few
+    milliseconds to every start-up.
+    """
+    while True:
+        path = _temp_path(directory, prefix, suffix)
+        try:
+            return os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC, 0o600), path
+        except FileExistsError:
+            continue
+
+
+def make_temp_dir(directory: Path, prefix: str) -> Path:
+    """Create a new private directory in directory, like tempfile.mkdtemp()."""
+    while True:
+        path = _temp_path(directory, prefix)
+        try:
+            os.mkdir(path, 0o700)
+            return path
+        except FileExistsError:
+            continue
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Write a text file via a temporary file renamed into place, so readers
+    see either the old or the new content, never a partial one.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = make_temp_file(path.parent, f".{path.name}.", ".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        mode = path.stat().st_mode & 0o7777 if path.exists() else 0o644
+        os.chmod(tmp_name, mode)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def save_json(path: Path, data: dict, indent: int = 2) -> None:
+    """Save JSON file with pretty formatting."""
+    write_atomic(path, render_json(data, indent))
+
+
+def lock_path(target: Path) -> Path:
+    """The hidden sidecar file that file_lock() locks for target."""
+    return target.parent / f".{target.name}.lock"
+
+
+@contextmanager
+def file_lock(target: Path, shared: bool = False):
+    """
+    Hold an exclusive (or shared) advisory lock for mutating target.
+
+    The lock lives in a hidden sidecar file next to target, so it survives
+    target being replaced or deleted while held.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path(target), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# renameat2() and renamex_np() flags that swap two paths in one step
+RENAME_EXCHANGE = 2
+RENAME_SWAP = 2
+AT_FDCWD = -100
+
+
+def exchange_paths(first: Path, second: Path) -> bool:
+    """
+    Atomically swap two existing paths.
+
+    Uses renameat2(RENAME_EXCHANGE) on Linux and renamex_np(RENAME_SWAP)
+    on macOS. Returns False where the C library or filesystem cannot.
+    """
+    import ctypes
+    import errno
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    if hasattr(libc, "renameat2"):
+        status = libc.renameat2(AT_FDCWD, os.fsencode(first), AT_FDCWD, os.fsencode(second), RENAME_EXCHANGE)
+    elif hasattr(libc, "renamex_np"):
+        status = libc.renamex_np(os.fsencode(first), os.fsencode(second), RENAME_SWAP)
+    else:
+        return False
+    if status == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), str(first), None, str(second))
+
+
+def swap_directory(build_dir: Path, target: Path) -> None:
+    """
+    Replace target with build_dir; the caller holds the lock.
+
+    An existing target is exchanged with build_dir in one rename, so
+    readers see the old tree or the new one and never no tree at all.
+    Only where the exchange is unsupported is target moved aside first.
+    """
+    if not target.exists():
+        os.replace(build_dir, target)
+        return
+    if exchange_paths(build_dir, target):
+        shutil.rmtree(build_dir, ignore_errors=True)
+        return
+    old_dir = make_temp_dir(target.parent, f".{target.name}.old-")
+    os.replace(target, old_dir)
+    os.replace(build_dir, target)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class SqliteRegistry(Mapping):
+    """
+    Read-only registry backed by a store from import-mason-registry.py.
+
+    Entries are fetched by primary key on first use, so opening a store
+    with thousands of servers costs the same as loading ten from JSON.
+    """
+
+    def __init__(self, path: Path):
+        import sqlite3
+
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self._entries: dict[str, dict | None] = {}
+
+    def _lookup(self, name: str) -> dict | None:
+        if name not in self._entries:
+            row = self._conn.execute(
+                "SELECT entry FROM servers WHERE name = ?", (name,)
+            ).fetchone()
+            self._entries[name] = json.loads(row[0]) if row else None
+        return self._entries[name]
+
+    def __getitem__(self, name: str) -> dict:
+        entry = self._lookup(name)
+        if entry is None:
+            raise KeyError(name)
+        return entry
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self._lookup(name) is not None
+
+    def __iter__(self):
+        for (name,) in self._conn.execute("SELECT name FROM servers ORDER BY name"):
+            yield name
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM servers").fetchone()[0]
+
+    def summary(self) -> list[tuple[str, str, str, str]]:
+        """(name, pluginName, language, command) of every server, in one query."""
+        return self._conn.execute(
+            "SELECT name, plugin_name, language, command FROM servers ORDER BY name"
+        ).fetchall()
+
+
+def registry_summary(registry: Mapping) -> list[tuple[str, str, str, str]]:
+    """(name, pluginName, language, command) of every server in a registry."""
+    if isinstance(registry, SqliteRegistry):
+        return registry.summary()
+    return [
+        (name, entry["pluginName"], entry["language"], entry["command"])
+        for name, entry in registry.items()
+    ]
+
+
+def load_registry(path: Path) -> Mapping:
+    """Load the server registry from JSON or an indexed SQLite store."""
+    with open(path, "rb") as f:
+        header = f.read(16)
+    if header == b"SQLite format 3\x00":
+        return SqliteRegistry(path)
+    return load_json(path)
+
+
+def probe_version(path: str, version_args: list[str]) -> str | None:
+    """Return the first line a binary prints for its version flag."""
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            [path, *version_args],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    for line in (result.stdout + result.stderr).splitlines():
+        if line.strip():
+            return line.strip()[:200]
+    return None
+
+
+def project_key(resolver: BinaryResolver) -> str | None:
+    """Key state by the resolver's project; None without one (user scope)."""
+    return None if resolver.project is None else str(resolver.project)
+
+
+def resolve_binary(
+    command: str,
+    registry_entry: dict,
+    state: StateStore | None = None,
+    resolver: BinaryResolver | None = None
+) -> dict | None:
+    """
+    Resolve a server binary in the resolver's search roots (by default
+    PATH, Mason, cargo and go; see lspctl_resolve).
+
+    Returns {"path", "version", "root"} or None if missing, where root is
+    the kind of search root it was found in. For a version-manager shim,
+    path is the binary the shim runs and "shim" is the shim itself.
+    Versions are probed only when the binary's path, size or mtime differ
+    from the state store, so repeated syncs spawn nothing for unchanged
+    binaries.
+    """
+    resolver = resolver or BinaryResolver(state=state)
+    project = project_key(resolver)
+    found = resolver.find(command)
+    if found is None:
+        if state is not None:
+            # Record a binary as missing once, not on every sync that misses it
+            cached = state.binary(command, project)
+            if cached is None or cached["path"] is not None:
+                state.record_binary(project, command, None)
+        return None
+
+    path, root = found
+    info = {"path": path, "version": None, "root": root.kind}
+    target = resolver.unshim(path)
+    if target is not None:
+        info["path"], info["shim"] = target, path
+        path = target
+    if state is None:
+        return info
+
+    stat = os.stat(path)
+    cached = state.binary(command, project)
+    if (
+        cached
+        and cached["path"] == path
+        and cached["mtime"] == stat.st_mtime
+        and cached["size"] == stat.st_size
+    ):
+        info["version"] = cached["version"]
+    else:
+        info["version"] = probe_version(path, registry_entry.get("versionArgs", ["--version"]))
+        state.record_binary(project, command, path, info["version"], stat.st_mtime, stat.st_size)
+    return info
+
+
+def open_state(path: Path | None) -> StateStore | None:
+    """Open the state store; state is best-effort and never blocks a sync."""
+    import sqlite3
+
+    from lspctl_state import StateStore
+
+    try:
+        return StateStore(path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: State store unavailable ({e}), continuing without it", file=sys.stderr)
+        return None
+
+
+def generate_plugin_json(server_name: str, registry_entry: dict) -> dict:
+    """Generate plugin.json for an LSP server."""
+    return {
+        "name": registry_entry["pluginName"],
+        "description": f"{registry_entry['description']} for Claude Code",
+        "version": "1.0.0"
+    }
+
+
+def generate_lsp_json(
+    server_name: str,
+    registry_entry: dict,
+    user_settings: dict,
+    resolver: BinaryResolver | None = None
+) -> dict:
+    """
+    Generate .lsp.json for an LSP server.
+
+    With a resolver, a binary found outside PATH (in Mason, a venv, ...)
+    is run by its absolute path so the existing install is used, and a
+    version-manager shim by the binary it resolves to (see
+    BinaryResolver.launch()). A
+    positive idle_timeout (minutes) in the user settings runs the server
+    through lsp-launch.py, which stops it while idle and restarts it on
+    the next request; a `record` directory has it log each session there,
+    `supervise = true` restarts a crashed server with backoff, and
+    `coalesce_diagnostics` (milliseconds, or true for
+    DEFAULT_COALESCE_MS) thins out bursts of diagnostics. `shared_cache`
+    (a root directory, or true for DEFAULT_CACHE_ROOT) points the caches
+    the registry entry declares under "cache" at a directory shared by
+    every worktree of the repository the server runs in.
+    """
+    language = registry_entry["language"]
+    argv = resolver.launch(registry_entry["command"]) if resolver else [registry_entry["command"]]
+
+    lsp_config = {
+        "command": argv[0],
+        "extensionToLanguage": registry_entry["extensionToLanguage"]
+    }
+
+    # Add args (after a pinned interpreter's script) if present
+    if argv[1:] or registry_entry.get("args"):
+        lsp_config["args"] = [*argv[1:], *registry_entry.get("args", [])]
+
+    launcher_args = []
+    idle_timeout = user_settings.get("idle_timeout")
+    if isinstance(idle_timeout, (int, float)) and not isinstance(idle_timeout, bool) and idle_timeout > 0:
+        launcher_args += ["--idle-timeout", f"{idle_timeout:g}"]
+    record = user_settings.get("record")
+    if isinstance(record, str) and record:
+        launcher_args += ["--record", record]
+    if user_settings.get("supervise") is True:
+        launcher_args += ["--supervise"]
+    coalesce = user_settings.get("coalesce_diagnostics")
+    if coalesce is True:
+        coalesce = DEFAULT_COALESCE_MS
+    if isinstance(coalesce, (int, float)) and not isinstance(coalesce, bool) and coalesce > 0:
+        launcher_args += ["--coalesce-diagnostics", f"{coalesce:g}"]
+    shared_cache = user_settings.get("shared_cache")
+    cache_spec = registry_entry.get("cache")
+    if cache_spec and (shared_cache is True or (isinstance(shared_cache, str) and shared_cache)):
+        launcher_args += ["--shared-cache", DEFAULT_CACHE_ROOT if shared_cache is True else shared_cache]
+        for name, template in cache_spec.get("env", {}).items():
+            launcher_args += ["--cache-env", f"{name}={template}"]
+        if cache_spec.get("args"):
+            lsp_config["args"] = [*lsp_config.get("args", []), *cache_spec["args"]]
+    if {"--supervise", "--coalesce-diagnostics", "--shared-cache"} & set(launcher_args):
+        launcher_args += ["--name", server_name]
+    if launcher_args:
+        lsp_config["args"] = [
+            str(LAUNCHER_SCRIPT),
+            *launcher_args,
+            "--",
+            lsp_config["command"],
+            *lsp_config.get("args", []),
+        ]
+        # The running interpreter's own path: a bare python3 may be a
+        # version-manager shim that re-resolves on every start
+        lsp_config["command"] = sys.executable or "python3"
+
+    # Merge user settings
+    if user_settings.get("settings"):
+        lsp_config["settings"] = user_settings["settings"]
+
+    return {language: lsp_config}
+
+
+def render_plugin(
+    server_name: str,
+    registry_entry: dict,
+    user_settings: dict,
+    resolver: BinaryResolver | None = None
+) -> dict[str, str]:
+    """Render a plugin's files (relative path -> text) without writing them."""
+    return {
+        ".claude-plugin/plugin.json": render_json(
+            generate_plugin_json(server_name, registry_entry)
+        ),
+        ".lsp.json": render_json(
+            generate_lsp_json(server_name, registry_entry, user_settings, resolver)
+        ),
+    }
+
+
+def marketplace_entry(registry_entry: dict) -> dict:
+    """Generate a plugin's entry in marketplace.json."""
+    plugin_name = registry_entry["pluginName"]
+    return {
+        "name": plugin_name,
+        "source": f"./plugins/{plugin_name}",
+        "description": registry_entry["description"],
+        "keywords": ["lsp", registry_entry["language"]]
+    }
+
+
+def bundle_lsp_json(
+    servers: list[tuple[str, dict, dict]],
+    resolver: BinaryResolver | None = None
+) -> dict:
+    """
+    Merge the .lsp.json of several servers into one.
+
+    servers is a list of (server_name, registry_entry, user_settings).
+    Entries are keyed by language as usual; when two or more servers
+    share a language (pylsp and pyright both serve "python"), each of
+    them is keyed by its server name instead, so none replaces another.
+    """
+    languages = [registry_entry["language"] for _, registry_entry, _ in servers]
+    merged = {}
+    for server_name, registry_entry, user_settings in servers:
+        [(language, lsp_config)] = generate_lsp_json(
+            server_name, registry_entry, user_settings, resolver
+        ).items()
+        merged[language if languages.count(language) == 1 else server_name] = lsp_config
+    return merged
+
+
+def bundled_servers(lsp_json: dict, registry: Mapping) -> dict[str, str]:
+    """Map the entries of a bundle's .lsp.json back to server names."""
+    by_language: dict[str, list[tuple[str, str]]] = {}
+    names = set()
+    for server_name, _, language, command in registry_summary(registry):
+        by_language.setdefault(language, []).append((server_name, command))
+        names.add(server_name)
+
+    servers = {}
+    for key, lsp_config in lsp_json.items():
+        if key in names:
+            servers[key] = key
+            continue
+        launched = launched_command(lsp_config)
+        for server_name, command in by_language.get(key, []):
+            if command == launched:
+                servers[key] = server_name
+                break
+    return servers
+
+
+def render_bundle(
+    servers: list[tuple[str, dict, dict]],
+    resolver: BinaryResolver | None = None
+) -> dict[str, str]:
+    """Render the files of the single plugin --bundle generates."""
+    names = ", ".join(server_name for server_name, _, _ in servers)
+    return {
+        ".claude-plugin/plugin.json": render_json({
+            "name": BUNDLE_PLUGIN,
+            "description": f"Language servers ({names}) for Claude Code",
+            "version": "1.0.0"
+        }),
+        ".lsp.json": render_json(bundle_lsp_json(servers, resolver)),
+    }
+
+
+def bundle_entry(servers: list[tuple[str, dict, dict]]) -> dict:
+    """Generate the bundle's entry in marketplace.json."""
+    languages = []
+    for _, registry_entry, _ in servers:
+        if registry_entry["language"] not in languages:
+            languages.append(registry_entry["language"])
+    return {
+        "name": BUNDLE_PLUGIN,
+        "source": f"./plugins/{BUNDLE_PLUGIN}",
+        "description": "Language servers: " + ", ".join(server_name for server_name, _, _ in servers),
+        "keywords": ["lsp", *languages]
+    }
+
+
+def generate_marketplace_json(plugins: list[dict]) -> dict:
+    """Generate marketplace.json."""
+    return {
+        "name": "generated-lsp",
+        "owner": {
+            "name": "lspctl"
+        },
+        "metadata": {
+            "description": "Auto-generated LSP plugins from lsp-config.lua",
+            "version": "1.0.0",
+            "pluginRoot": "./plugins"
+        },
+        "plugins": plugins
+    }
+
+
+def generate_marketplace(
+    config: dict,
+    registry: Mapping,
+    output_dir: Path,
+    state: StateStore | None = None,
+    settings_path: Path | None = None,
+    binaries: Mapping | None = None,
+    blobs: BlobStore | None = None,
+    events=no_events,
+    bundle: bool = False,
+    resolver: BinaryResolver | None = None
+) -> dict:
+    """
+    Generate complete marketplace structure.
+
+    binaries, if given, is a pre-resolved index of command -> binary info
+    (as from resolve_binary()) used instead of resolving each command;
+    commands it lists as missing are looked up again in the resolver's
+    roots, which may include project ones the index did not search.
+    With a blob store, plugin files are hardlinked from it rather than
+    written, so identical plugins share storage across scopes. events is
+    called as each server is resolved and written (see EventStream).
+    With bundle, every server goes into one BUNDLE_PLUGIN plugin (see
+    bundle_lsp_json()) instead of a plugin each, so Claude Code loads and
+    installs a single plugin.
+
+    The marketplace is built in a private directory beside output_dir and
+    swapped in under the marketplace lock, so concurrent syncs serialize
+    on the swap and never see each other's half-written trees.
+
+    Returns dict with:
+        - generated: list of generated plugin names
+        - missing_binaries: dict of server -> install commands
+        - unknown_servers: list of servers not in registry
+        - binaries: dict of server -> resolved path and version
+        - reused_blobs: plugins linked from an already stored blob
+    """
+    from lspctl_state import content_hash
+
+    started = time.monotonic()
+    result = {
+        "generated": [],
+        "missing_binaries": {},
+        "unknown_servers": [],
+        "binaries": {},
+        "reused_blobs": []
+    }
+
+    ensure_installed = config.get("ensure_installed", [])
+    servers_config = config.get("servers", {})
+    resolver = resolver or BinaryResolver(state=state)
+
+    # Create directory structure in a private build directory
+    output_dir.parent.mkdir(parents=True, exist_ok=True)
+    build_dir = make_temp_dir(output_dir.parent, f".{output_dir.name}.build-")
+    build_dir.chmod(0o755)
+    try:
+        plugins_dir = build_dir / "plugins"
+        plugins_dir.mkdir(parents=True, exist_ok=True)
+        (build_dir / ".claude-plugin").mkdir(parents=True, exist_ok=True)
+
+        marketplace_plugins = []
+        state_plugins = []
+        bundled = []
+
+        def write_plugin(plugin_name: str, files: dict[str, str], **fields) -> str:
+            digest = content_hash({path: text.encode() for path, text in files.items()})
+            plugin_dir = plugins_dir / plugin_name
+            (plugin_dir / ".claude-plugin").mkdir(parents=True, exist_ok=True)
+            reused = False
+            if blobs is not None:
+                reused = not blobs.place(digest, files, plugin_dir)
+                if reused:
+                    result["reused_blobs"].append(plugin_name)
+            else:
+                for rel_path, text in files.items():
+                    (plugin_dir / rel_path).write_text(text)
+            events("plugin_written", plugin=plugin_name, reused_blob=reused, **fields)
+            result["generated"].append(plugin_name)
+            return digest
+
+        for server_name in ensure_installed:
+            if server_name not in registry:
+                result["unknown_servers"].append(server_name)
+                print(f"Warning: Unknown server '{server_name}' - skipping", file=sys.stderr)
+                events("server_unknown", server=server_name)
+                continue
+
+            registry_entry = registry[server_name]
+            plugin_name = registry_entry["pluginName"]
+            user_settings = servers_config.get(server_name, {})
+
+            # Check binary availability
+            command = registry_entry["command"]
+            binary = binaries.get(command) if binaries is not None else None
+            if binary is None:
+                binary = resolve_binary(command, registry_entry, state, resolver)
+            if binary is None:
+                result["missing_binaries"][server_name] = registry_entry.get("installCommands", {})
+                events("binary_missing", server=server_name, command=command)
+            else:
+                result["binaries"][server_name] = binary
+                events("binary_resolved", server=server_name, command=command,
+                       path=binary.get("path"), version=binary.get("version"), root=binary.get("root"))
+
+            if bundle:
+                bundled.append((server_name, registry_entry, user_settings))
+                continue
+
+            # Render and write (or link) the plugin directory
+            digest = write_plugin(
+                plugin_name, render_plugin(server_name, registry_entry, user_settings, resolver),
+                server=server_name
+            )
+
+            # Add to marketplace plugins list
+            entry = marketplace_entry(registry_entry)
+            marketplace_plugins.append(entry)
+            state_plugins.append({
+                "plugin_name": plugin_name,
+                "server_name": server_name,
+                "command": command,
+                "content_hash": digest,
+                "entry": entry
+            })
+
+        if bundled:
+            digest = write_plugin(
+                BUNDLE_PLUGIN, render_bundle(bundled, resolver),
+                servers=[server_name for server_name, _, _ in bundled]
+            )
+            entry = bundle_entry(bundled)
+            marketplace_plugins.append(entry)
+            state_plugins.append({
+                "plugin_name": BUNDLE_PLUGIN,
+                "server_name": BUNDLE_PLUGIN,
+                "command": None,
+                "content_hash": digest,
+                "entry": entry
+            })
+
+        # Generate marketplace.json
+        marketplace_json = generate_marketplace_json(marketplace_plugins)
+        save_json(build_dir / ".claude-plugin" / "marketplace.json", marketplace_json)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    with file_lock(output_dir):
+        swap_directory(build_dir, output_dir)
+        if state is not None:
+            state.replace_scope(output_dir, settings_path, state_plugins, project_key(resolver))
+    events("marketplace_written", path=str(output_dir), plugins=len(state_plugins))
+
+    if state is not None:
+        state.record_event(
+            "generate", "ok",
+            marketplace=output_dir,
+            duration_ms=(time.monotonic() - started) * 1000,
+            detail=f"{len(state_plugins)} plugins"
+        )
+
+    return result
+
+
+def update_marketplace(
+    config: dict,
+    registry: Mapping,
+    output_dir: Path,
+    state: StateStore | None = None,
+    settings_path: Path | None = None,
+    blobs: BlobStore | None = None,
+    resolver: BinaryResolver | None = None
+) -> dict:
+    """
+    Bring an existing marketplace up to date, rewriting only what changed.
+
+    Plugins whose rendered files hash the same as the generated copy are
+    left untouched; changed plugins are rewritten file by file, dropped
+    plugins are deleted, and marketplace.json is rewritten only if its
+    entries changed. Falls back to generate_marketplace() when there is
+    no marketplace yet. Binaries are not resolved here, but the resolver
+    decides which commands are written as absolute paths.
+
+    Returns dict with:
+        - generated: plugins written (new or changed)
+        - removed: plugins deleted
+        - unchanged: plugins left as they were
+        - unknown_servers: list of servers not in registry
+    """
+    from lspctl_state import content_hash
+
+    started = time.monotonic()
+    marketplace_json_path = output_dir / ".claude-plugin" / "marketplace.json"
+    if not marketplace_json_path.exists():
+        generated = generate_marketplace(
+            config, registry, output_dir, state, settings_path, blobs=blobs, resolver=resolver
+        )
+        return {
+            "generated": generated["generated"],
+            "removed": [],
+            "unchanged": [],
+            "unknown_servers": generated["unknown_servers"]
+        }
+
+    result = {"generated": [], "removed": [], "unchanged": [], "unknown_servers": []}
+    servers_config = config.get("servers", {})
+    resolver = resolver or BinaryResolver(state=state)
+
+    with file_lock(output_dir):
+        current = generated_plugins(output_dir, state)
+        entries = []
+        state_plugins = []
+
+        for server_name in config.get("ensure_installed", []):
+            if server_name not in registry:
+                result["unknown_servers"].append(server_name)
+                continue
+            registry_entry = registry[server_name]
+            plugin_name = registry_entry["pluginName"]
+            files = render_plugin(
+                server_name, registry_entry, servers_config.get(server_name, {}), resolver
+            )
+            digest = content_hash({path: text.encode() for path, text in files.items()})
+
+            if current.get(plugin_name, {}).get("content_hash") == digest:
+                result["unchanged"].append(plugin_name)
+            else:
+                plugin_dir = output_dir / "plugins" / plugin_name
+                if blobs is not None:
+                    blobs.place(digest, files, plugin_dir)
+                else:
+                    for rel_path, text in files.items():
+                        write_atomic(plugin_dir / rel_path, text)
+                result["generated"].append(plugin_name)
+
+            entry = marketplace_entry(registry_entry)
+            entries.append(entry)
+            state_plugins.append({
+                "plugin_name": plugin_name,
+                "server_name": server_name,
+                "command": registry_entry["command"],
+                "content_hash": digest,
+                "entry": entry
+            })
+
+        wanted = {entry["name"] for entry in entries}
+        marketplace_json = generate_marketplace_json(entries)
+        if load_json(marketplace_json_path) != marketplace_json:
+            save_json(marketplace_json_path, marketplace_json)
+        for plugin_name in current:
+            if plugin_name not in wanted:
+                shutil.rmtree(output_dir / "plugins" / plugin_name, ignore_errors=True)
+                result["removed"].append(plugin_name)
+
+        if state is not None:
+            state.replace_scope(output_dir, settings_path, state_plugins, project_key(resolver))
+
+    if state is not None and (result["generated"] or result["removed"]):
+        state.record_event(
+            "update", "ok",
+            marketplace=output_dir,
+            duration_ms=(time.monotonic() - started) * 1000,
+            detail=f"{len(result['generated'])} written, {len(result['removed'])} removed"
+        )
+
+    return result
+
+
+def update_settings(settings_path: Path, marketplace_path: Path) -> None:
+    """Add marketplace to Claude Code settings."""
+    with file_lock(settings_path):
+        settings = {}
+
+        if settings_path.exists():
+            try:
+                settings = load_json(settings_path)
+            except json.JSONDecodeError:
+                print(f"Warning: Could not parse {settings_path}, creating new", file=sys.stderr)
+
+        # Ensure extraKnownMarketplaces exists
+        if "extraKnownMarketplaces" not in settings:
+            settings["extraKnownMarketplaces"] = {}
+
+        # Add or update the generated-lsp marketplace
+        # Local paths use "directory" source type
+        settings["extraKnownMarketplaces"]["generated-lsp"] = {
+            "source": {
+                "source": "directory",
+                "path": str(marketplace_path.absolute())
+            }
+        }
+
+        save_json(settings_path, settings)
+
+
+def remove_from_marketplace(
+    server_name: str,
+    registry: Mapping,
+    output_dir: Path,
+    state: StateStore | None = None
+) -> dict:
+    """
+    Remove a single server from existing marketplace.
+
+    The plugin list comes from the state store when its record of the scope
+    is current, falling back to marketplace.json for marketplaces it has
+    not seen or that were written without it.
+    generate-marketplace.py --remove passes no store, to start faster; the
+    store forgets the plugin the next time it reads the scope (see
+    StateStore.is_current()).
+
+    Returns dict with:
+        - removed: plugin name that was removed (or None)
+        - binary_uninstall_commands: dict of uninstall commands
+        - remaining_plugins: list of remaining plugin names
+        - marketplace_empty: bool if no plugins remain
+    """
+    result = {
+        "removed": None,
+        "binary_uninstall_commands": {},
+        "remaining_plugins": [],
+        "marketplace_empty": False,
+        "error": None
+    }
+
+    # Check if marketplace exists
+    marketplace_json_path = output_dir / ".claude-plugin" / "marketplace.json"
+    if not marketplace_json_path.exists():
+        result["error"] = f"Marketplace not found at {output_dir}"
+        return result
+
+    # Check if server is in registry
+    if server_name not in registry:
+        result["error"] = f"Unknown server: {server_name}"
+        return result
+
+    registry_entry = registry[server_name]
+    plugin_name = registry_entry["pluginName"]
+
+    with file_lock(output_dir):
+        # Re-check now that concurrent syncs are excluded
+        if not marketplace_json_path.exists():
+            result["error"] = f"Marketplace not found at {output_dir}"
+            return result
+
+        # Load plugin entries
+        current = state is not None and state.is_current(output_dir)
+        if current:
+            plugins = [row["entry"] for row in state.plugins(output_dir)]
+        else:
+            plugins = load_json(marketplace_json_path).get("plugins", [])
+
+        # Find and remove plugin
+        plugin_found = False
+        updated_plugins = []
+
+        for plugin in plugins:
+            if plugin["name"] == plugin_name:
+                plugin_found = True
+            else:
+                updated_plugins.append(plugin)
+                result["remaining_plugins"].append(plugin["name"])
+
+        if not plugin_found:
+            if BUNDLE_PLUGIN in result["remaining_plugins"]:
+                result["error"] = (
+                    f"Marketplace is bundled; drop '{server_name}' from the config "
+                    "and regenerate with --bundle"
+                )
+            else:
+                result["error"] = f"Plugin '{plugin_name}' not found in marketplace"
+            return result
+
+        # Update marketplace.json before its plugin disappears
+        save_json(marketplace_json_path, generate_marketplace_json(updated_plugins))
+
+        # Remove plugin directory
+        plugin_dir = output_dir / "plugins" / plugin_name
+        if plugin_dir.exists():
+            shutil.rmtree(plugin_dir)
+
+        if state is not None:
+            if current:
+                state.remove_plugin(output_dir, plugin_name)
+            else:
+                state.rebuild_scope(output_dir, plugin_servers=plugin_server_map(registry))
+            state.record_event("remove", "ok", marketplace=output_dir, server_name=server_name)
+
+        result["removed"] = plugin_name
+        result["binary_uninstall_commands"] = registry_entry.get("installCommands", {})
+        result["marketplace_empty"] = len(updated_plugins) == 0
+
+        return result
+
+
+def remove_settings_marketplace(settings_path: Path) -> bool:
+    """Remove generated-lsp marketplace from settings.json."""
+    if not settings_path.exists():
+        return False
+
+    with file_lock(settings_path):
+        try:
+            settings = load_json(settings_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+        if "extraKnownMarketplaces" not in settings:
+            return False
+
+        if "generated-lsp" not in settings["extraKnownMarketplaces"]:
+            return False
+
+        del settings["extraKnownMarketplaces"]["generated-lsp"]
+
+        # Clean up empty extraKnownMarketplaces
+        if not settings["extraKnownMarketplaces"]:
+            del settings["extraKnownMarketplaces"]
+
+        save_json(settings_path, settings)
+        return True
+
+
+def deregister_marketplace(
+    output_dir: Path,
+    settings_path: Path | None = None,
+    delete_files: bool = True,
+    state: StateStore | None = None
+) -> dict:
+    """
+    Deregister and optionally delete the marketplace.
+
+    Returns dict with:
+        - deregistered: bool if settings were updated
+        - plugins_removed: list of plugins that were in marketplace
+        - files_deleted: bool if directory was deleted
+        - error: error message if any
+    """
+    result = {
+        "deregistered": False,
+        "plugins_removed": [],
+        "files_deleted": False,
+        "error": None
+    }
+
+    # Get list of plugins before deletion
+    marketplace_json_path = output_dir / ".claude-plugin" / "marketplace.json"
+    if state is not None and state.is_current(output_dir):
+        result["plugins_removed"] = [row["plugin_name"] for row in state.plugins(output_dir)]
+    elif marketplace_json_path.exists():
+        try:
+            marketplace = load_json(marketplace_json_path)
+            result["plugins_removed"] = [p["name"] for p in marketplace.get("plugins", [])]
+        except json.JSONDecodeError:
+            pass
+
+    # Remove from settings
+    if settings_path:
+        result["deregistered"] = remove_settings_marketplace(settings_path)
+
+    # Delete marketplace directory
+    if delete_files:
+        with file_lock(output_dir):
+            if output_dir.exists():
+                shutil.rmtree(output_dir)
+                result["files_deleted"] = True
+            if state is not None:
+                state.drop_scope(output_dir)
+        if state is not None:
+            state.record_event("deregister", "ok", marketplace=output_dir)
+
+    return result
+
+
+def plugin_server_map(registry: Mapping | None) -> dict[str, str]:
+    """Map plugin names back to server names."""
+    if registry is None:
+        return {}
+    return {plugin_name: name for name, plugin_name, _, _ in registry_summary(registry)}
+
+
+def rebuild_state(
+    state: StateStore,
+    output_dir: Path,
+    settings_path: Path | None = None,
+    registry: Mapping | None = None,
+    resolver: BinaryResolver | None = None
+) -> dict:
+    """
+    Reconstruct a scope's state from the marketplace files on disk.
+
+    Re-hashes every plugin and re-resolves the binaries its .lsp.json names
+    for the resolver's project.
+    """
+    resolver = resolver or BinaryResolver(state=state)
+    with file_lock(output_dir):
+        plugin_names = state.rebuild_scope(
+            output_dir, settings_path, plugin_server_map(registry), project_key(resolver)
+        )
+    binaries = {}
+    for row in state.plugins(output_dir):
+        if row["command"]:
+            registry_entry = registry.get(row["server_name"], {}) if registry else {}
+            binaries[row["server_name"]] = resolve_binary(row["command"], registry_entry, state, resolver)
+    state.record_event("rebuild-state", "ok", marketplace=output_dir)
+    return {"plugins": plugin_names, "binaries": binaries}
+
+
+def show_state(state: StateStore, output_dir: Path) -> dict:
+    """Summarize a scope from the state store alone."""
+    # Checked first, since it catches the record up after a --remove
+    current = state.is_current(output_dir)
+    plugins = state.plugins(output_dir)
+    project = state.scope_project(output_dir)
+    return {
+        "known": state.has_scope(output_dir),
+        "current": current,
+        "plugins": [
+            {
+                "plugin_name": row["plugin_name"],
+                "server_name": row["server_name"],
+                "content_hash": row["content_hash"],
+                "generated_at": row["generated_at"],
+                "binary": state.binary(row["command"], project) if row["command"] else None
+            }
+            for row in plugins
+        ],
+        "history": state.history(marketplace=output_dir, limit=20),
+        "health": server_health(state)
+    }
+
+
+def server_health(state: StateStore) -> dict[str, dict]:
+    """Summarize each supervised server's crashes over the last day."""
+    from lspctl_supervise import HEALTH_WINDOW, UNHEALTHY_STREAK, crash_log_path, crash_streak
+
+    by_server: dict[str, list[dict]] = {}
+    for crash in state.crashes(since=time.time() - HEALTH_WINDOW, limit=1000):
+        by_server.setdefault(crash["server_name"], []).append(crash)
+    health = {}
+    for server, crashes in by_server.items():
+        workspaces = sorted({crash["workspace"] for crash in crashes})
+        streak = max(
+            crash_streak([crash for crash in crashes if crash["workspace"] == workspace])
+            for workspace in workspaces
+        )
+        health[server] = {
+            "crashes": len(crashes),
+            "unhealthy": streak >= UNHEALTHY_STREAK,
+            "last_exit_code": crashes[0]["exit_code"],
+            "last_crash_at": crashes[0]["at"],
+            "workspaces": workspaces,
+            "log": str(crash_log_path(server)),
+        }
+    return health
+
+
+def generated_plugins(output_dir: Path, state: StateStore | None) -> dict[str, dict]:
+    """Map each plugin in the generated marketplace to its server and content hash."""
+    if state is not None and state.is_current(output_dir):
+        return {
+            row["plugin_name"]: {
+                "server_name": row["server_name"],
+                "content_hash": row["content_hash"]
+            }
+            for row in state.plugins(output_dir)
+        }
+
+    marketplace_json_path = output_dir / ".claude-plugin" / "marketplace.json"
+    if not marketplace_json_path.exists():
+        return {}
+    generated = {}
+    for entry in load_json(marketplace_json_path).get("plugins", []):
+        plugin_dir = output_dir / "plugins" / entry["name"]
+        if plugin_dir.is_dir():
+            generated[entry["name"]] = {
+                "server_name": None,
+                "content_hash": rendered_files_hash(plugin_dir)
+            }
+    return generated
+
+
+def rendered_files_hash(plugin_dir: Path) -> str:
+    """Hash the files render_plugin() produces, ignoring anything else present."""
+    from lspctl_state import content_hash
+
+    return content_hash({
+        rel_path: (plugin_dir / rel_path).read_bytes()
+        for rel_path in (".claude-plugin/plugin.json", ".lsp.json")
+        if (plugin_dir / rel_path).is_file()
+    })
+
+
+def get_scope_paths(scope: str, project_dir: Path | None = None) -> tuple[Path, Path]:
+    """Get output and settings paths based on scope (project/local relative to project_dir or cwd)."""
+    home = Path.home()
+    cwd = project_dir or Path.cwd()
+
+    if scope == "user":
+        output = home / ".claude" / "generated-lsp-marketplace"
+        settings = home / ".claude" / "settings.json"
+    elif scope == "project":
+        output = cwd / ".claude" / "generated-lsp-marketplace"
+        settings = cwd / ".claude" / "settings.json"
+    elif scope == "local":
+        output = cwd / ".claude" / "generated-lsp-marketplace"
+        settings = cwd / ".claude" / "settings.local.json"
+    else:
+        raise ValueError(f"Unknown scope: {scope}")
+
+    return output, settings
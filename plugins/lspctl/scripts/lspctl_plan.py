@@ -0,0 +1,257 @@
+"""
+Plan/apply for generate-marketplace.py.
+
+Diffs the plugins a config asks for against the generated marketplace and
+what Claude Code has installed, then applies only the steps that change
+something.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from lspctl_marketplace import (
+    BUNDLE_PLUGIN,
+    MARKETPLACE_NAME,
+    generate_marketplace,
+    generated_plugins,
+    load_json,
+    no_events,
+    rendered_files_hash,
+    render_bundle,
+    render_plugin,
+    update_settings,
+)
+from lspctl_resolve import BinaryResolver, PlanResolver
+from lspctl_state import content_hash
+
+if TYPE_CHECKING:
+    from lspctl_blobs import BlobStore
+    from lspctl_state import StateStore
+
+
+def claude_config_dir() -> Path:
+    """Return Claude Code's config directory ($CLAUDE_CONFIG_DIR overrides)."""
+    override = os.environ.get("CLAUDE_CONFIG_DIR")
+    return Path(override) if override else Path.home() / ".claude"
+
+
+def desired_plugins(
+    config: dict,
+    registry: Mapping,
+    bundle: bool = False,
+    resolver: BinaryResolver | None = None
+) -> dict[str, dict]:
+    """Map each plugin the config asks for to its server and content hash."""
+    servers_config = config.get("servers", {})
+    resolver = resolver or PlanResolver()
+    desired = {}
+    bundled = []
+    for server_name in config.get("ensure_installed", []):
+        if server_name not in registry:
+            continue
+        registry_entry = registry[server_name]
+        if bundle:
+            bundled.append((server_name, registry_entry, servers_config.get(server_name, {})))
+            continue
+        files = render_plugin(server_name, registry_entry, servers_config.get(server_name, {}), resolver)
+        desired[registry_entry["pluginName"]] = {
+            "server_name": server_name,
+            "content_hash": content_hash({path: text.encode() for path, text in files.items()})
+        }
+    if bundled:
+        files = render_bundle(bundled, resolver)
+        desired[BUNDLE_PLUGIN] = {
+            "server_name": BUNDLE_PLUGIN,
+            "content_hash": content_hash({path: text.encode() for path, text in files.items()})
+        }
+    return desired
+
+
+def installed_plugins(settings_path: Path | None, scope: str | None) -> dict[str, dict]:
+    """
+    Map plugins from this marketplace that Claude Code has installed to
+    {"enabled", "content_hash", "scope"}.
+
+    Reads installed_plugins.json (either its per-plugin object or list of
+    per-scope installs) and enabledPlugins from the scope's settings file.
+    The hash is of the installed copy, or None if its path is unknown.
+    """
+    suffix = f"@{MARKETPLACE_NAME}"
+    installed_path = claude_config_dir() / "plugins" / "installed_plugins.json"
+    try:
+        records = load_json(installed_path).get("plugins", {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        records = {}
+
+    enabled = {}
+    if settings_path and settings_path.exists():
+        try:
+            enabled = load_json(settings_path).get("enabledPlugins", {})
+        except json.JSONDecodeError:
+            pass
+
+    installed = {}
+    for key, value in records.items():
+        if not key.endswith(suffix):
+            continue
+        installs = value if isinstance(value, list) else [value]
+        if scope:
+            installs = [i for i in installs if i.get("scope", scope) == scope]
+        if not installs:
+            continue
+        install = installs[0]
+        install_path = Path(install["installPath"]) if install.get("installPath") else None
+        installed[key[:-len(suffix)]] = {
+            "enabled": enabled.get(key, True) is not False,
+            "content_hash": (
+                rendered_files_hash(install_path)
+                if install_path and install_path.is_dir() else None
+            ),
+            "scope": install.get("scope")
+        }
+    return installed
+
+
+def plan_sync(
+    config: dict,
+    registry: Mapping,
+    output_dir: Path,
+    settings_path: Path | None = None,
+    scope: str | None = None,
+    state: StateStore | None = None,
+    bundle: bool = False,
+    resolver: BinaryResolver | None = None
+) -> dict:
+    """
+    Diff desired, generated and installed plugins into a plan.
+
+    Every plugin gets one step: "add" (not installed), "update" (installed
+    or generated content differs from the config), "remove" (generated or
+    installed but no longer wanted) or "noop". Planning renders files in
+    memory only; it runs no binaries and no Claude CLI calls. The resolver
+    (by default a PlanResolver) lists its search roots to decide which
+    commands are written as absolute paths. With bundle the desired set is
+    the single BUNDLE_PLUGIN, so switching to or from a bundle removes the
+    plugins of the other layout.
+
+    Returns dict with:
+        - steps: list of {plugin, server_name, action, reason}
+        - summary: count per action
+        - regenerate: bool if the marketplace files are out of date
+    """
+    desired = desired_plugins(config, registry, bundle, resolver or PlanResolver(state=state))
+    generated = generated_plugins(output_dir, state)
+    installed = installed_plugins(settings_path, scope)
+
+    steps = []
+    for plugin, want in desired.items():
+        have = installed.get(plugin)
+        if have is None:
+            action, reason = "add", "not installed"
+        elif have["content_hash"] not in (None, want["content_hash"]):
+            action, reason = "update", "installed copy differs from config"
+        elif have["content_hash"] is None and \
+                generated.get(plugin, {}).get("content_hash") != want["content_hash"]:
+            action, reason = "update", "generated plugin differs from config"
+        elif not have["enabled"]:
+            action, reason = "noop", "disabled in settings"
+        else:
+            action, reason = "noop", "up to date"
+        steps.append({
+            "plugin": plugin,
+            "server_name": want["server_name"],
+            "action": action,
+            "reason": reason
+        })
+
+    for plugin in list(generated) + [p for p in installed if p not in generated]:
+        if plugin in desired:
+            continue
+        steps.append({
+            "plugin": plugin,
+            "server_name": generated.get(plugin, {}).get("server_name"),
+            "action": "remove",
+            "reason": "installed but not configured" if plugin in installed else "generated but not configured"
+        })
+
+    summary = {"add": 0, "update": 0, "remove": 0, "noop": 0}
+    for step in steps:
+        summary[step["action"]] += 1
+
+    regenerate = [(plugin, have["content_hash"]) for plugin, have in generated.items()] != [
+        (plugin, want["content_hash"]) for plugin, want in desired.items()
+    ]
+    return {"steps": steps, "summary": summary, "regenerate": regenerate}
+
+
+def apply_plan(
+    plan: dict,
+    config: dict,
+    registry: Mapping,
+    output_dir: Path,
+    settings_path: Path | None = None,
+    scope: str | None = None,
+    state: StateStore | None = None,
+    blobs: BlobStore | None = None,
+    events=no_events,
+    bundle: bool = False,
+    resolver: BinaryResolver | None = None,
+    **ops_options
+) -> dict:
+    """
+    Execute the non-noop steps of a plan.
+
+    Removed and updated plugins are uninstalled first, the marketplace is
+    regenerated only if its files are out of date, then added and updated
+    plugins are installed. ops_options are passed to run_plugin_ops(),
+    which runs the CLI calls one at a time under settings_path's lock; events receives
+    generation and install progress as it happens. bundle and resolver
+    must match the plan_sync() call that made the plan.
+    """
+    from lspctl_plugins import PluginOp, run_plugin_ops
+
+    result = {"plan": plan, "generation": None, "uninstall": None, "install": None}
+    by_action = {"add": [], "update": [], "remove": []}
+    for step in plan["steps"]:
+        if step["action"] in by_action:
+            by_action[step["action"]].append(step["plugin"])
+
+    to_uninstall = by_action["remove"] + by_action["update"]
+    to_install = by_action["add"] + by_action["update"]
+    installed = installed_plugins(settings_path, scope)
+    to_uninstall = [p for p in to_uninstall if p in installed]
+
+    if to_uninstall:
+        result["uninstall"] = run_plugin_ops(
+            [PluginOp("uninstall", p, MARKETPLACE_NAME, scope) for p in to_uninstall],
+            events=events,
+            settings=settings_path,
+            **ops_options
+        )
+
+    if plan["regenerate"]:
+        result["generation"] = generate_marketplace(
+            config, registry, output_dir, state, settings_path,
+            blobs=blobs, events=events, bundle=bundle, resolver=resolver
+        )
+        if settings_path:
+            update_settings(settings_path, output_dir)
+
+    if to_install:
+        result["install"] = run_plugin_ops(
+            [PluginOp("install", p, MARKETPLACE_NAME, scope) for p in to_install],
+            events=events,
+            settings=settings_path,
+            **ops_options
+        )
+
+    result["ok"] = all(
+        report is None or report["summary"]["ok"] == len(report["results"])
+        for report in (result["uninstall"], result["install"])
+    )
+    return result
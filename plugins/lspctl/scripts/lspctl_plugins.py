@@ -0,0 +1,192 @@
+"""
+Runner for `claude plugin install/uninstall` calls.
+
+run_plugin_ops() issues the calls with a per-call timeout, retries
+failures that look transient with exponential backoff, and returns one
+aggregated report.
+
+The calls run one at a time. Each rewrites the settings.json of its scope
+and ~/.claude/plugins/installed_plugins.json, which every scope shares,
+with a read-modify-write inside the CLI that nothing outside it can lock
+on its own. Two calls in flight at once lose each other's entries. So
+each call holds the sidecar locks of both files (the ones the generator
+takes to update settings) for as long as it runs.
+"""
+
+import re
+import subprocess
+import time
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+
+MARKETPLACE_NAME = "generated-lsp"
+
+# Output that marks a failure as worth retrying: network hiccups, rate
+# limits and contention on files the CLI shares between calls. Status codes
+# must stand alone, so versions (1.5.429) and paths do not match, and words
+# must be whole, so "blocked" or "unlocked" do not.
+TRANSIENT_ERRORS = re.compile(
+    r"\b(?:ECONNRESET|ETIMEDOUT|EAI_AGAIN|EBUSY|EAGAIN|locked)\b"
+    r"|\bsocket hang up\b|\brate limit|\btemporarily unavailable\b"
+    r"|(?<![\w./-])(?:429|50[234])(?![\w/-]|\.\w)",
+    re.IGNORECASE,
+)
+
+OUTPUT_TAIL_CHARS = 2000
+
+
+@dataclass
+class PluginOp:
+    """One plugin command to run."""
+
+    action: str  # "install" or "uninstall"
+    plugin: str
+    marketplace: str = MARKETPLACE_NAME
+    scope: str | None = None
+
+    def argv(self, claude: str) -> list[str]:
+        cmd = [claude, "plugin", self.action, f"{self.plugin}@{self.marketplace}"]
+        if self.scope:
+            cmd.extend(["--scope", self.scope])
+        return cmd
+
+    def settings_path(self) -> Path:
+        """The settings file the command writes (the CLI defaults to user scope)."""
+        from lspctl_marketplace import get_scope_paths
+
+        return get_scope_paths(self.scope or "user")[1]
+
+
+@dataclass
+class OpResult:
+    """Outcome of one plugin command across all attempts."""
+
+    action: str
+    plugin: str
+    status: str = "pending"  # "ok", "failed" or "timeout"
+    attempts: int = 0
+    returncode: int | None = None
+    duration_ms: float = 0.0
+    output: str = ""
+    attempt_log: list[dict] = field(default_factory=list)
+
+
+def is_transient(output: str) -> bool:
+    """Return True if CLI output suggests the failure may not recur."""
+    return TRANSIENT_ERRORS.search(output) is not None
+
+
+def installed_plugins_path() -> Path:
+    """The installed-plugins record every scope's CLI calls rewrite."""
+    from lspctl_plan import claude_config_dir
+
+    return claude_config_dir() / "plugins" / "installed_plugins.json"
+
+
+def _attempt(op: PluginOp, claude: str, settings: Path, timeout: float) -> tuple[str, int | None, str]:
+    """Run one CLI call under the file locks; returns (status, returncode, output)."""
+    from lspctl_marketplace import file_lock
+
+    with ExitStack() as locks:
+        # Always in this order, so two runners cannot deadlock
+        for path in sorted({settings, installed_plugins_path()}):
+            locks.enter_context(file_lock(path))
+        try:
+            proc = subprocess.run(
+                op.argv(claude),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return "timeout", None, f"timed out after {timeout:g}s"
+        except OSError as e:
+            return "failed", None, str(e)
+
+    output = proc.stdout.decode(errors="replace")
+    return ("ok" if proc.returncode == 0 else "failed"), proc.returncode, output
+
+
+def _run_op(
+    op: PluginOp,
+    claude: str,
+    settings: Path,
+    timeout: float,
+    retries: int,
+    backoff: float,
+    events,
+) -> OpResult:
+    result = OpResult(action=op.action, plugin=op.plugin)
+    started = time.monotonic()
+
+    for attempt in range(retries + 1):
+        attempt_started = time.monotonic()
+        events(f"{op.action}_started", plugin=op.plugin, attempt=attempt + 1)
+        status, returncode, output = _attempt(op, claude, settings, timeout)
+        result.attempts = attempt + 1
+        result.status = status
+        result.returncode = returncode
+        result.output = output[-OUTPUT_TAIL_CHARS:]
+        result.attempt_log.append({
+            "status": status,
+            "returncode": returncode,
+            "duration_ms": round((time.monotonic() - attempt_started) * 1000, 1),
+        })
+
+        if status == "ok":
+            break
+        if status == "failed" and not is_transient(output):
+            break
+        if attempt < retries:
+            # Back off without the locks, so other processes can proceed
+            time.sleep(backoff * (2 ** attempt))
+
+    result.duration_ms = round((time.monotonic() - started) * 1000, 1)
+    events(
+        f"{op.action}_finished",
+        plugin=op.plugin,
+        status=result.status,
+        attempts=result.attempts,
+        returncode=result.returncode,
+        duration_ms=result.duration_ms,
+    )
+    return result
+
+
+def run_plugin_ops(
+    ops: list[PluginOp],
+    claude: str = "claude",
+    timeout: float = 120.0,
+    retries: int = 2,
+    backoff: float = 1.0,
+    events=None,
+    settings: Path | None = None,
+) -> dict:
+    """
+    Run plugin commands one after another and aggregate their outcomes.
+
+    Each call holds the locks of its settings file and of
+    installed_plugins.json (see the module docstring); settings, if given,
+    is the file every command writes instead of the one its scope implies.
+    events, if given, is called with "<action>_started" before each
+    attempt and "<action>_finished" once a plugin's outcome is final.
+    """
+    events = events or (lambda event, **fields: None)
+    started = time.monotonic()
+    results = [
+        _run_op(op, claude, settings or op.settings_path(), timeout, retries, backoff, events)
+        for op in ops
+    ]
+
+    summary = {"ok": 0, "failed": 0, "timeout": 0}
+    for result in results:
+        summary[result.status] += 1
+
+    return {
+        "results": [asdict(result) for result in results],
+        "summary": summary,
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+    }
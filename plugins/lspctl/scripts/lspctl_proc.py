@@ -0,0 +1,207 @@
+"""
+Per-server resource sampling from /proc (Linux).
+
+Processes are mapped to registry entries by their executable: argv[0],
+the /proc/<pid>/exe link, or for scripts run by an interpreter (npm-installed
+servers run as `node .../pyright-langserver`) the script in argv[1]. When
+several entries share a command, the one whose registry args all appear on
+the command line wins.
+
+Matching reads a process's cmdline once; the result is cached by pid and
+start time, so each later sample only reads stat, status and io for the
+processes that are language servers.
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+
+
+# argv[0] basenames that run a script given as argv[1]
+INTERPRETER_PATTERN = re.compile(r"^(node(js)?|bun|deno|python[0-9.]*|pypy[0-9.]*|ruby|perl|java|sh|bash)$")
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+# Per-server values recorded by top --record, in this order
+SAMPLE_COLUMNS = ["instances", "rss_kb", "cpu_pct", "threads", "read_bytes", "write_bytes"]
+
+
+def build_command_index(registry) -> dict[str, list[tuple[str, list[str]]]]:
+    """Map each registry command to its (server, args) entries."""
+    index: dict[str, list[tuple[str, list[str]]]] = {}
+    for server, entry in registry.items():
+        command = os.path.basename(entry.get("command", ""))
+        if command:
+            index.setdefault(command, []).append((server, entry.get("args", [])))
+    return index
+
+
+def match_server(argv: list[str], exe: str | None, index: dict) -> str | None:
+    """Return the registry server a process runs, or None."""
+    if not argv:
+        return None
+    candidates = [os.path.basename(argv[0])]
+    if exe:
+        candidates.append(os.path.basename(exe))
+    if len(argv) > 1 and INTERPRETER_PATTERN.match(candidates[0]):
+        candidates.append(os.path.basename(argv[1]))
+
+    for name in candidates:
+        entries = index.get(name)
+        if not entries:
+            continue
+        if len(entries) == 1:
+            return entries[0][0]
+        with_args = [server for server, args in entries if args and all(a in argv for a in args)]
+        return with_args[0] if with_args else entries[0][0]
+    return None
+
+
+def parse_stat(text: str) -> dict:
+    """Extract CPU ticks, thread count and start time from /proc/<pid>/stat."""
+    # comm may contain spaces and parentheses; fields resume after the last ')'
+    fields = text[text.rindex(")") + 2:].split()
+    return {
+        "ticks": int(fields[11]) + int(fields[12]),
+        "threads": int(fields[17]),
+        "start_ticks": int(fields[19]),
+    }
+
+
+def parse_status(text: str) -> dict:
+    """Extract resident memory (kB) and thread count from /proc/<pid>/status."""
+    result = {"rss_kb": 0, "threads": None}
+    for line in text.splitlines():
+        if line.startswith("VmRSS:"):
+            result["rss_kb"] = int(line.split()[1])
+        elif line.startswith("Threads:"):
+            result["threads"] = int(line.split()[1])
+    return result
+
+
+def parse_io(text: str) -> dict:
+    """Extract storage read/write byte counts from /proc/<pid>/io."""
+    result = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("read_bytes", "write_bytes"):
+            result[key] = int(value)
+    return result
+
+
+class ServerSampler:
+    """Samples running language servers, aggregated per registry entry."""
+
+    def __init__(self, registry, proc_root: Path = Path("/proc")):
+        self.index = build_command_index(registry)
+        self.proc_root = Path(proc_root)
+        # (pid, start_ticks) -> server or None; pid reuse changes start_ticks
+        self._matches: dict[tuple[int, int], str | None] = {}
+        # pid -> (cpu ticks, monotonic time) at the previous sample
+        self._previous: dict[int, tuple[int, float]] = {}
+
+    def _read(self, pid: int, name: str) -> str | None:
+        try:
+            with open(self.proc_root / str(pid) / name) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _server_for(self, pid: int, start_ticks: int) -> str | None:
+        key = (pid, start_ticks)
+        if key not in self._matches:
+            try:
+                with open(self.proc_root / str(pid) / "cmdline", "rb") as f:
+                    argv = [os.fsdecode(arg) for arg in f.read().split(b"\0") if arg]
+            except OSError:
+                argv = []
+            try:
+                exe = os.readlink(self.proc_root / str(pid) / "exe")
+            except OSError:
+                exe = None
+            self._matches[key] = match_server(argv, exe, self.index)
+        return self._matches[key]
+
+    def _system_uptime(self) -> float:
+        try:
+            with open(self.proc_root / "uptime") as f:
+                return float(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            return 0.0
+
+    def sample(self) -> dict:
+        """
+        Take one sample of every running language server.
+
+        Returns {"time": epoch, "servers": {server: {instances, rss_kb,
+        cpu_pct, threads, uptime_s, read_bytes, write_bytes, pids}}}.
+        CPU% is measured since the previous sample, or over the process
+        lifetime on the first one. read_bytes/write_bytes are None when
+        /proc/<pid>/io is not readable (another user's process).
+        """
+        now = time.monotonic()
+        uptime = self._system_uptime()
+        servers: dict[str, dict] = {}
+        seen_pids = set()
+        seen_keys = set()
+
+        for entry in os.scandir(self.proc_root):
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            stat_text = self._read(pid, "stat")
+            if stat_text is None:
+                continue
+            try:
+                stat = parse_stat(stat_text)
+            except (ValueError, IndexError):
+                continue
+            seen_keys.add((pid, stat["start_ticks"]))
+            server = self._server_for(pid, stat["start_ticks"])
+            if server is None:
+                continue
+
+            status = parse_status(self._read(pid, "status") or "")
+            io_text = self._read(pid, "io")
+            io = parse_io(io_text) if io_text else {}
+            process_uptime = max(uptime - stat["start_ticks"] / CLK_TCK, 0.0)
+
+            previous = self._previous.get(pid)
+            if previous is not None and now > previous[1]:
+                cpu_seconds = (stat["ticks"] - previous[0]) / CLK_TCK
+                cpu_pct = 100.0 * cpu_seconds / (now - previous[1])
+            else:
+                cpu_pct = 100.0 * (stat["ticks"] / CLK_TCK) / process_uptime if process_uptime else 0.0
+            self._previous[pid] = (stat["ticks"], now)
+            seen_pids.add(pid)
+
+            aggregate = servers.setdefault(server, {
+                "instances": 0,
+                "rss_kb": 0,
+                "cpu_pct": 0.0,
+                "threads": 0,
+                "uptime_s": 0.0,
+                "read_bytes": 0,
+                "write_bytes": 0,
+                "pids": [],
+            })
+            aggregate["instances"] += 1
+            aggregate["rss_kb"] += status["rss_kb"]
+            aggregate["cpu_pct"] = round(aggregate["cpu_pct"] + cpu_pct, 1)
+            aggregate["threads"] += status["threads"] or stat["threads"]
+            aggregate["uptime_s"] = round(max(aggregate["uptime_s"], process_uptime), 1)
+            for key in ("read_bytes", "write_bytes"):
+                if key in io and aggregate[key] is not None:
+                    aggregate[key] += io[key]
+                else:
+                    aggregate[key] = None
+            aggregate["pids"].append(pid)
+
+        # Forget processes that exited so the caches stay small
+        self._previous = {pid: v for pid, v in self._previous.items() if pid in seen_pids}
+        self._matches = {key: v for key, v in self._matches.items() if key in seen_keys}
+
+        for aggregate in servers.values():
+            aggregate["pids"].sort()
+        return {"time": time.time(), "servers": dict(sorted(servers.items()))}
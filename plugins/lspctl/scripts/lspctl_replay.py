@@ -0,0 +1,416 @@
+"""
+Recording LSP sessions and replaying them against other servers.
+
+lsp-launch.py --record writes every message that passes between Claude
+Code and the server to a gzipped JSON-lines session log. The first line is
+a header, {"lspctl_session": 1, "command": [...], "started": <epoch s>};
+each further line is [t_ms, "c" or "s", message], with t_ms counted from
+the start of the session and "c" for client-to-server traffic.
+
+replay() drives a recorded session's client traffic against any server
+command and measures how the server copes: requests are sent at their
+recorded offsets (divided by speed, or back to back with speed 0), server
+requests are answered the way the client answered them, and each response
+is timed against its request. The replay starts once initialize has been
+answered and ends with shutdown and exit after every request has its
+response, so a session that was cut off still ends cleanly.
+"""
+
+import gzip
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from lspctl_lsp import (
+    ProtocolError,
+    configuration_section,
+    is_request,
+    is_response,
+    read_message,
+    write_message,
+)
+from lspctl_resolve import launched_command
+
+
+SESSION_VERSION = 1
+
+# LSP's RequestCancelled: a request the client gave up on, not a failure
+REQUEST_CANCELLED = -32800
+
+# Seconds between peak RSS samples of the server's process tree
+RSS_INTERVAL = 0.05
+
+# Seconds to wait for a server to honour shutdown/exit before killing it
+STOP_GRACE = 5.0
+
+
+def session_path(directory: Path, command: list[str]) -> Path:
+    """A new session log in directory, named after the server and start time."""
+    name = launched_command({"command": command[0], "args": command[1:]}) if command else None
+    name = name or "server"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return directory / f"{name}-{stamp}-{os.getpid()}.jsonl.gz"
+
+
+class SessionRecorder:
+    """Appends the messages of one session to a gzipped log."""
+
+    def __init__(self, path: Path, command: list[str]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.started = time.monotonic()
+        self._write({"lspctl_session": SESSION_VERSION, "command": command, "started": round(time.time(), 3)})
+
+    def _write(self, entry) -> None:
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def write(self, direction: str, message: dict) -> None:
+        self._write([round((time.monotonic() - self.started) * 1000, 1), direction, message])
+
+    def flush(self) -> None:
+        """Make everything written so far readable, should the process be killed."""
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_session(path: Path) -> tuple[dict, list]:
+    """
+    Load a session log as (header, [[t_ms, direction, message], ...]).
+
+    A log whose recorder was killed ends mid-stream; everything up to the
+    last complete line is returned.
+    """
+    header, entries = None, []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline() or "null")
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        except (EOFError, zlib.error):
+            pass
+    if not isinstance(header, dict) or header.get("lspctl_session") != SESSION_VERSION:
+        raise ValueError(f"{path} is not an lspctl session log")
+    return header, entries
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of values (0 < q <= 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def session_root(entries: list) -> str | None:
+    """The workspace root URI from a session's initialize request."""
+    for _, direction, message in entries:
+        if direction == "c" and message.get("method") == "initialize":
+            params = message.get("params") or {}
+            folders = params.get("workspaceFolders") or []
+            return params.get("rootUri") or (folders[0]["uri"] if folders else None)
+    return None
+
+
+def tree_rss_kb(pid: int, proc_root: Path = Path("/proc")) -> int | None:
+    """Resident memory of a process and its descendants, or None once it is gone."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            for line in (proc_root / str(current) / "status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+                    break
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+            continue
+        try:
+            children = (proc_root / str(current) / "task" / str(current) / "children").read_text()
+        except OSError:
+            # Kernels without CONFIG_PROC_CHILDREN: the process alone
+            continue
+        pending.extend(int(child) for child in children.split())
+    return total
+
+
+def peak_rss_kb(pid: int, proc_root: Path = Path("/proc")) -> int | None:
+    """The kernel's high-water mark of a process's resident memory (VmHWM)."""
+    try:
+        for line in (proc_root / str(pid) / "status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class Replayer:
+    """Drives one recorded session against one server process."""
+
+    def __init__(
+        self,
+        entries: list,
+        command: list[str],
+        settings: dict | None = None,
+        project: Path | None = None,
+        speed: float = 1.0,
+        timeout: float = 60.0,
+    ):
+        self.command = command
+        self.settings = settings
+        self.speed = speed
+        self.timeout = timeout
+        self.cwd = project
+        self.messages: queue.Queue = queue.Queue()
+
+        root = session_root(entries)
+        self.rewrite = None
+        if project is not None and root:
+            self.rewrite = (root, project.resolve().as_uri())
+
+        # What the client sent, and how it answered each kind of server request
+        self.outgoing = []
+        self.answers: dict[str, object] = {}
+        server_methods = {}
+        for t_ms, direction, message in entries:
+            if direction == "s" and is_request(message):
+                server_methods[json.dumps(message["id"])] = message["method"]
+            elif direction == "c" and is_response(message):
+                method = server_methods.get(json.dumps(message["id"]))
+                if method and "result" in message:
+                    self.answers.setdefault(method, message["result"])
+            elif direction == "c":
+                self.outgoing.append((t_ms, message))
+
+        self.process: subprocess.Popen | None = None
+        self.pending: dict[str, tuple[str, float]] = {}
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.cancelled: dict[str, int] = {}
+        self.server_messages = 0
+        self.peak_rss = 0
+        self.current_settings = settings
+
+    # -- process -----------------------------------------------------------
+
+    def _read(self, process: subprocess.Popen) -> None:
+        try:
+            while (message := read_message(process.stdout)) is not None:
+                self.messages.put((time.monotonic(), message))
+        except (OSError, ValueError, ProtocolError):
+            pass
+        self.messages.put((time.monotonic(), None))
+
+    def _sample(self, pid: int, done: threading.Event) -> None:
+        while not done.is_set():
+            rss = tree_rss_kb(pid)
+            if rss is None:
+                return
+            self.peak_rss = max(self.peak_rss, rss)
+            done.wait(RSS_INTERVAL)
+
+    def _send(self, message: dict) -> None:
+        write_message(self.process.stdin, message)
+
+    # -- traffic -----------------------------------------------------------
+
+    def _prepare(self, message: dict) -> dict:
+        """Adapt a recorded client message to this replay's project and settings."""
+        if self.rewrite:
+            old, new = self.rewrite
+            message = json.loads(json.dumps(message).replace(json.dumps(old)[1:-1], json.dumps(new)[1:-1]))
+        method = message.get("method")
+        if method == "initialize":
+            params = dict(message.get("params") or {})
+            # The recorded client is long gone; servers that watch it would exit
+            params["processId"] = os.getpid()
+            if self.rewrite and params.get("rootPath"):
+                params["rootPath"] = str(self.cwd.resolve())
+            message = {**message, "params": params}
+        elif method == "workspace/didChangeConfiguration":
+            if self.settings is not None:
+                message = {**message, "params": {"settings": self.settings}}
+            self.current_settings = (message.get("params") or {}).get("settings")
+        return message
+
+    def _receive(self, received: float, message: dict) -> None:
+        self.server_messages += 1
+        if is_response(message):
+            sent = self.pending.pop(json.dumps(message["id"]), None)
+            if sent is None:
+                return
+            method, started = sent
+            self.latencies.setdefault(method, []).append((received - started) * 1000)
+            if "error" in message:
+                bucket = self.cancelled if message["error"].get("code") == REQUEST_CANCELLED else self.errors
+                bucket[method] = bucket.get(method, 0) + 1
+        elif is_request(message):
+            method = message["method"]
+            if method == "workspace/configuration":
+                result = [
+                    configuration_section(self.current_settings, item.get("section"))
+                    for item in message["params"]["items"]
+                ]
+            else:
+                result = self.answers.get(method)
+            self._send({"jsonrpc": "2.0", "id": message["id"], "result": result})
+
+    def _pump(self, until: float | None) -> None:
+        """Handle server messages until the monotonic time `until` (None: only what is queued)."""
+        while True:
+            wait = None if until is None else until - time.monotonic()
+            try:
+                if wait is None or wait <= 0:
+                    received, message = self.messages.get_nowait()
+                else:
+                    received, message = self.messages.get(timeout=wait)
+            except queue.Empty:
+                return
+            if message is None:
+                raise EOFError(f"server exited with {self.process.wait()}")
+            self._receive(received, message)
+
+    def _drain(self, deadline: float) -> None:
+        """Wait until every request sent so far has its response."""
+        while self.pending and time.monotonic() < deadline:
+            self._pump(min(deadline, time.monotonic() + 0.1))
+
+    def _request(self, message: dict) -> None:
+        self.pending[json.dumps(message["id"])] = (message["method"], time.monotonic())
+        self._send(message)
+
+    def run(self) -> dict:
+        report = {"command": self.command, "status": "ok", "reason": None}
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=self.cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        threading.Thread(target=self._read, args=(self.process,), daemon=True).start()
+        done = threading.Event()
+        threading.Thread(target=self._sample, args=(self.process.pid, done), daemon=True).start()
+
+        started = time.monotonic()
+        finished = started
+        requests = 0
+        try:
+            # A session that was cut off still ends with shutdown and exit
+            outgoing = list(self.outgoing)
+            methods = {message.get("method") for _, message in outgoing}
+            last = outgoing[-1][0]
+            if "shutdown" not in methods:
+                outgoing.append((last, {"jsonrpc": "2.0", "id": "lspctl-shutdown", "method": "shutdown"}))
+            if "exit" not in methods:
+                outgoing.append((last, {"jsonrpc": "2.0", "method": "exit"}))
+
+            # Recorded offsets are replayed relative to the initialize request
+            base_t, base = outgoing[0][0], started
+            for t_ms, message in outgoing:
+                message = self._prepare(message)
+                method = message.get("method")
+                if self.speed > 0:
+                    self._pump(base + (t_ms - base_t) / 1000 / self.speed)
+                else:
+                    self._pump(None)
+
+                if method == "shutdown":
+                    self._drain(time.monotonic() + self.timeout)
+                    finished = time.monotonic()
+                if method == "exit":
+                    self._drain(time.monotonic() + STOP_GRACE)
+                    report["peak_rss_kb"] = peak_rss_kb(self.process.pid)
+
+                if is_request(message):
+                    requests += 1
+                    self._request(message)
+                else:
+                    self._send(message)
+                if method == "exit":
+                    break
+
+                if method == "initialize":
+                    # Nothing else may be sent before the server has answered
+                    self._drain(time.monotonic() + self.timeout)
+                    if self.pending:
+                        raise TimeoutError("no response to initialize")
+                    base_t, base = t_ms, time.monotonic()
+        except (OSError, ValueError, EOFError, TimeoutError) as e:
+            report["status"], report["reason"] = "failed", str(e)
+            finished = time.monotonic()
+        finally:
+            try:
+                report["exit_code"] = self.process.wait(timeout=STOP_GRACE)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                report["exit_code"] = self.process.wait()
+            done.set()
+
+        duration = max(finished - started, 1e-6)
+        completed = sum(len(values) for values in self.latencies.values())
+        report.update({
+            "duration_s": round(duration, 3),
+            "requests": requests,
+            "responses": completed,
+            "unanswered": len(self.pending),
+            "notifications": sum(1 for _, m in self.outgoing if "method" in m and "id" not in m),
+            "server_messages": self.server_messages,
+            "throughput_rps": round(completed / duration, 1),
+            "peak_rss_kb": max(report.get("peak_rss_kb") or 0, self.peak_rss) or None,
+            "methods": {
+                method: {
+                    "count": len(values),
+                    "errors": self.errors.get(method, 0),
+                    "cancelled": self.cancelled.get(method, 0),
+                    "p50_ms": round(percentile(values, 50), 2),
+                    "p90_ms": round(percentile(values, 90), 2),
+                    "p99_ms": round(percentile(values, 99), 2),
+                    "max_ms": round(max(values), 2),
+                }
+                for method, values in sorted(self.latencies.items())
+            },
+        })
+        if report["unanswered"] and report["status"] == "ok":
+            report["status"], report["reason"] = "incomplete", f"{report['unanswered']} requests unanswered"
+        return report
+
+
+def replay(
+    session: Path,
+    command: list[str],
+    settings: dict | None = None,
+    project: Path | None = None,
+    speed: float = 1.0,
+    timeout: float = 60.0,
+) -> dict:
+    """
+    Replay a recorded session against a server command and report on it.
+
+    Returns {"session", "command", "status", "reason", "exit_code",
+    "duration_s", "requests", "responses", "unanswered", "notifications",
+    "server_messages", "throughput_rps", "peak_rss_kb", "methods"}, where
+    methods maps each request method to its count, errors, cancellations
+    and p50/p90/p99/max latency in milliseconds. settings replaces the
+    recorded workspace configuration; project replaces the recorded
+    workspace root in every message and is the server's working directory.
+    """
+    _, entries = read_session(session)
+    if not any(direction == "c" for _, direction, _ in entries):
+        raise ValueError(f"{session} has no client messages")
+    report = Replayer(entries, command, settings, project, speed, timeout).run()
+    return {"session": str(session), **report}
@@ -0,0 +1,401 @@
+"""
+Binary resolution across PATH and the places other tools install servers.
+
+Many servers are already installed outside PATH: by Mason for Neovim, in a
+project's virtualenv or node_modules, or by cargo and go. BinaryResolver
+searches an ordered list of search roots:
+
+    path          every PATH entry
+    extra         $LSPCTL_SEARCH_ROOTS (colon-separated), for anything else
+    mason         $MASON/bin, or ~/.local/share/nvim/mason/bin
+    venv          <project>/.venv/bin and <project>/venv/bin
+    node_modules  <project>/node_modules/.bin
+    cargo         $CARGO_HOME/bin, or ~/.cargo/bin
+    go            $GOBIN, and bin/ of each $GOPATH entry (or ~/go/bin)
+
+A lookup checks for the command in each root in turn, as shutil.which()
+does, which is cheapest for the few servers of one config; a resolver
+shared by many lookups (fleet mode) lists every root once with scan()
+and answers from the listings instead. check-binaries.sh searches the
+same roots in the same order.
+
+A binary that turns out to be an asdf, mise, pyenv or volta shim is
+resolved, at sync time and for the project, to the binary the shim would
+run (`<manager> which <command>`), so launches skip the shim's own
+startup. The answer is cached in the state store together with a
+fingerprint of the version files the manager reads (.tool-versions,
+.python-version, package.json, ...) and is re-validated when any of them
+changes. A resolved script that starts with `#!/usr/bin/env <interpreter>`
+is run by that interpreter's concrete path, taken from the same install
+where possible, so neither PATH nor another shim decides which interpreter
+runs it. Binaries inside an nvm install are treated the same way.
+
+All of that is per project. Without one (a user-scope sync), shims and nvm
+binaries are written as found, so each project's own version files still
+decide what runs there.
+
+Planning uses PlanResolver, which runs and opens nothing: it answers shims
+from the command lines the last sync recorded.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lspctl_state import StateStore
+
+
+class SearchRoot:
+    """A directory to search, labelled with the kind of root it is."""
+
+    __slots__ = ("kind", "path")
+
+    def __init__(self, kind: str, path: Path):
+        self.kind = kind
+        self.path = Path(path)
+
+    def __repr__(self) -> str:
+        return f"SearchRoot({self.kind!r}, {str(self.path)!r})"
+
+
+def _split_paths(value: str | None) -> list[Path]:
+    return [Path(entry) for entry in (value or "").split(os.pathsep) if entry]
+
+
+def default_search_roots(project: Path | None = None) -> list[SearchRoot]:
+    """
+    Return the standard search roots in lookup order.
+
+    Project roots (venv, node_modules) are included only for a project,
+    since a user-scope marketplace must not point into one project.
+    """
+    home = Path.home()
+    data_home = Path(os.environ.get("XDG_DATA_HOME") or home / ".local" / "share")
+
+    roots = [SearchRoot("path", entry or ".") for entry in os.environ.get("PATH", "").split(os.pathsep)]
+    roots += [SearchRoot("extra", path) for path in _split_paths(os.environ.get("LSPCTL_SEARCH_ROOTS"))]
+    mason = os.environ.get("MASON")
+    roots.append(SearchRoot("mason", Path(mason) / "bin" if mason else data_home / "nvim" / "mason" / "bin"))
+    if project is not None:
+        roots.append(SearchRoot("venv", project / ".venv" / "bin"))
+        roots.append(SearchRoot("venv", project / "venv" / "bin"))
+        roots.append(SearchRoot("node_modules", project / "node_modules" / ".bin"))
+    roots.append(SearchRoot("cargo", Path(os.environ.get("CARGO_HOME") or home / ".cargo") / "bin"))
+    if os.environ.get("GOBIN"):
+        roots.append(SearchRoot("go", Path(os.environ["GOBIN"])))
+    for gopath in _split_paths(os.environ.get("GOPATH")) or [home / "go"]:
+        roots.append(SearchRoot("go", gopath / "bin"))
+
+    # The same directory can be both on PATH and a tool's bin; keep the first
+    unique, seen = [], set()
+    for root in roots:
+        key = os.path.abspath(root.path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(root)
+    return unique
+
+
+def launched_command(lsp_config: dict) -> str | None:
+    """
+    Return the name of the server command an .lsp.json entry starts,
+    looking through lsp-launch.py, absolute paths and pinned
+    interpreters.
+    """
+    argv = [lsp_config.get("command"), *(lsp_config.get("args") or [])]
+    if len(argv) > 1 and str(argv[1]).endswith("lsp-launch.py") and "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    if len(argv) > 1 and os.path.isabs(str(argv[0])) and os.path.isabs(str(argv[1])):
+        # An interpreter pinned in front of the server script
+        argv = argv[1:]
+    return Path(argv[0]).name if argv and argv[0] else None
+
+
+class ShimManager:
+    """A version manager whose shims re-dispatch to a per-project version."""
+
+    __slots__ = ("name", "shim_dir", "executables", "config_names", "global_configs")
+
+    def __init__(
+        self,
+        name: str,
+        shim_dir: Path,
+        executables: list[Path],
+        config_names: list[str],
+        global_configs: list[Path]
+    ):
+        self.name = name
+        self.shim_dir = shim_dir
+        self.executables = executables
+        self.config_names = config_names
+        self.global_configs = global_configs
+
+    def config_files(self, project: Path) -> list[Path]:
+        """Every file, present or not, whose contents can change what a shim runs."""
+        files = []
+        for directory in (project, *project.parents):
+            files += [directory / name for name in self.config_names]
+        return files + self.global_configs
+
+
+def shim_managers() -> list[ShimManager]:
+    """Return the version managers whose shim layouts are recognized."""
+    home = Path.home()
+    data_home = Path(os.environ.get("XDG_DATA_HOME") or home / ".local" / "share")
+    config_home = Path(os.environ.get("XDG_CONFIG_HOME") or home / ".config")
+    asdf = Path(os.environ.get("ASDF_DATA_DIR") or home / ".asdf")
+    mise = Path(os.environ.get("MISE_DATA_DIR") or data_home / "mise")
+    pyenv = Path(os.environ.get("PYENV_ROOT") or home / ".pyenv")
+    volta = Path(os.environ.get("VOLTA_HOME") or home / ".volta")
+    return [
+        ShimManager(
+            "asdf", asdf / "shims", [asdf / "bin" / "asdf"],
+            [".tool-versions"], [home / ".tool-versions"]
+        ),
+        ShimManager(
+            "mise", mise / "shims", [home / ".local" / "bin" / "mise"],
+            ["mise.toml", ".mise.toml", "mise.local.toml", ".mise.local.toml", ".tool-versions"],
+            [config_home / "mise" / "config.toml"]
+        ),
+        ShimManager(
+            "pyenv", pyenv / "shims", [pyenv / "bin" / "pyenv"],
+            [".python-version"], [pyenv / "version"]
+        ),
+        ShimManager(
+            "volta", volta / "bin", [volta / "bin" / "volta"],
+            ["package.json"], [volta / "tools" / "user" / "platform.json"]
+        ),
+    ]
+
+
+def _is_executable(path: str) -> bool:
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _env_interpreter(script: str) -> str | None:
+    """Return X for a script that starts with "#!/usr/bin/env X", else None."""
+    try:
+        with open(script, "rb") as f:
+            first = f.readline(256)
+    except OSError:
+        return None
+    parts = first[2:].split() if first.startswith(b"#!") else []
+    if len(parts) == 2 and parts[0].endswith(b"/env"):
+        return os.fsdecode(parts[1])
+    return None
+
+
+class BinaryResolver:
+    """
+    Find executables in an ordered list of search roots.
+
+    Resolved shims are cached, so build one resolver per sync and share
+    it across servers. project is where version managers are asked which
+    version applies; without one, shims are left as found. state, if
+    given, keeps resolved shims across syncs. listings, if given, are
+    directory listings (see scan()) shared with other resolvers; roots
+    listed there are answered from the listing, the rest are looked up
+    one command at a time.
+    """
+
+    def __init__(
+        self,
+        roots: list[SearchRoot] | None = None,
+        project: Path | None = None,
+        state: StateStore | None = None,
+        listings: dict[str, frozenset[str]] | None = None
+    ):
+        self.roots = default_search_roots() if roots is None else roots
+        self.project = Path(project) if project is not None else None
+        self.state = state
+        self.shim_files: set[Path] = set()
+        self._listings: dict[str, frozenset[str]] = {} if listings is None else listings
+        self._managers: list[tuple[str, ShimManager]] | None = None
+        self._shims: dict[str, str | None] = {}
+
+    def scan(self) -> dict[str, frozenset[str]]:
+        """List every root now and return the listings, keyed by directory."""
+        for root in self.roots:
+            key = os.path.abspath(root.path)
+            if key not in self._listings:
+                try:
+                    with os.scandir(key) as entries:
+                        self._listings[key] = frozenset(entry.name for entry in entries)
+                except OSError:
+                    self._listings[key] = frozenset()
+        return self._listings
+
+    def find(self, command: str) -> tuple[str, SearchRoot] | None:
+        """Return (absolute path, root) of the first executable match, or None."""
+        if os.sep in command:
+            if os.path.isfile(command) and os.access(command, os.X_OK):
+                return os.path.abspath(command), SearchRoot("path", os.path.dirname(command))
+            return None
+        for root in self.roots:
+            directory = os.path.abspath(root.path)
+            names = self._listings.get(directory)
+            if names is not None and command not in names:
+                continue
+            candidate = os.path.join(directory, command)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                return candidate, root
+        return None
+
+    def _manager(self, path: str) -> ShimManager | None:
+        if self._managers is None:
+            self._managers = [
+                (os.path.realpath(manager.shim_dir), manager) for manager in shim_managers()
+            ]
+        directory = os.path.realpath(os.path.dirname(path))
+        for shim_dir, manager in self._managers:
+            if directory == shim_dir and os.path.basename(path) != manager.name:
+                return manager
+        return None
+
+    def _fingerprint(self, manager: ShimManager) -> str:
+        import hashlib
+
+        stats = []
+        for path in manager.config_files(self.project):
+            self.shim_files.add(path)
+            try:
+                stat = os.stat(path)
+                stats.append([str(path), stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                pass
+        return hashlib.sha256(json.dumps(stats).encode()).hexdigest()[:16]
+
+    def _which(self, manager: ShimManager, command: str) -> str | None:
+        """Ask the manager which binary its shim runs in the project."""
+        import subprocess
+
+        executable = shutil.which(manager.name) or next(
+            (str(path) for path in manager.executables if _is_executable(str(path))), None
+        )
+        if executable is None:
+            return None
+        try:
+            result = subprocess.run(
+                [executable, "which", command],
+                cwd=self.project if self.project.is_dir() else None,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+        if result.returncode != 0 or not lines:
+            return None
+        target = os.path.abspath(lines[-1])
+        if not _is_executable(target) or self._manager(target) is not None:
+            return None
+        return target
+
+    def unshim(self, path: str) -> str | None:
+        """
+        Return the binary a version-manager shim at path runs for the
+        project, or None if path is not a shim, cannot be resolved or
+        there is no project.
+        """
+        if self.project is None:
+            return None
+        manager = self._manager(path)
+        if manager is None:
+            return None
+        if path in self._shims:
+            return self._shims[path]
+
+        fingerprint = self._fingerprint(manager)
+        project = str(self.project)
+        cached = self.state.shim(path, project) if self.state is not None else None
+        if cached and cached["fingerprint"] == fingerprint and \
+                (cached["target"] is None or _is_executable(cached["target"])):
+            target = cached["target"]
+        else:
+            target = self._which(manager, os.path.basename(path))
+            if self.state is not None:
+                self.state.record_shim(path, project, manager.name, target, fingerprint)
+        self._shims[path] = target
+        return target
+
+    def _in_nvm(self, path: str) -> bool:
+        nvm = os.path.realpath(os.environ.get("NVM_DIR") or Path.home() / ".nvm")
+        return os.path.realpath(path).startswith(os.path.join(nvm, "versions", ""))
+
+    def _interpreter(self, script: str) -> str | None:
+        """Return the concrete interpreter for an env-shebang script, if any."""
+        name = _env_interpreter(script)
+        if name is None:
+            return None
+        sibling = os.path.join(os.path.dirname(script), name)
+        if _is_executable(sibling) and self._manager(sibling) is None:
+            return sibling
+        found = self.find(name)
+        if found is None:
+            return None
+        if self._manager(found[0]) is None:
+            return found[0]
+        return self.unshim(found[0])
+
+    def launch(self, command: str) -> list[str]:
+        """
+        Return the command line .lsp.json should start command with.
+
+        Binaries found on PATH keep their bare name, so Claude Code looks
+        them up itself and the plugin stays portable; anything found in
+        another root is written as its absolute path. For a project, shims
+        and nvm installs are written as the concrete binary, run by its
+        concrete interpreter when it is an env-shebang script.
+        """
+        found = self.find(command)
+        if found is None:
+            return [command]
+        path, root = found
+        target = self.unshim(path)
+        if target is None and (self.project is None or not self._in_nvm(path)):
+            return [command] if root.kind == "path" else [path]
+        target = target or path
+        interpreter = self._interpreter(target)
+        argv = [interpreter, target] if interpreter else [target]
+        if self.state is not None:
+            self.state.record_launch(str(self.project), command, path, argv)
+        return argv
+
+
+class PlanResolver(BinaryResolver):
+    """
+    A resolver for planning that never runs a version manager or opens a
+    binary.
+
+    Shims and nvm installs are written as the command line the last sync
+    recorded for the project, as long as the shim's version files are
+    unchanged since; otherwise they are left as found, so the plan reports
+    the plugin as out of date rather than guessing.
+    """
+
+    def launch(self, command: str) -> list[str]:
+        found = self.find(command)
+        if found is None:
+            return [command]
+        path, root = found
+        manager = self._manager(path) if self.project is not None else None
+        if manager is None and (self.project is None or not self._in_nvm(path)):
+            return [command] if root.kind == "path" else [path]
+        if self.state is None:
+            return [path]
+        project = str(self.project)
+        recorded = self.state.launch(project, command)
+        if recorded is None or recorded["path"] != path:
+            return [path]
+        if manager is not None:
+            shim = self.state.shim(path, project)
+            if shim is None or shim["fingerprint"] != self._fingerprint(manager):
+                return [path]
+        return recorded["argv"]
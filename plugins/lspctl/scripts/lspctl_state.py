@@ -0,0 +1,598 @@
+"""
+SQLite-backed lspctl state store.
+
+Records, per marketplace scope, the generated plugins with content hashes,
+resolved binary paths and versions per project, version-manager shims
+resolved per project and the command lines they were written as, an install/sync history with timings, the crashes of supervised servers
+per workspace, and the identity of each git repository whose servers
+share caches. Commands answer "what is generated and installed where" with
+indexed queries instead of re-reading marketplace.json and plugin
+directories.
+
+The database lives at $LSPCTL_STATE_DB or ~/.claude/lspctl-state.db and is
+shared by all scopes; scopes are keyed by their absolute marketplace path
+and record the project their binaries were resolved for (none for the
+user scope).
+Each scope records the fingerprint of the marketplace.json it describes,
+and is only trusted while the file still matches (see is_current()), so a
+sync run with --no-state or by hand is noticed. --remove does not open the
+store at all; a scope that has only lost plugins since is caught up with
+on its next read. If the database is lost or
+corrupted, rebuild_scope() reconstructs a scope from the marketplace files
+on disk.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from lspctl_resolve import launched_command
+
+
+SCHEMA_VERSION = 4
+
+# MIGRATIONS[n] takes a version n database to version n + 1; SCHEMA then
+# creates any table the database does not have yet.
+#
+# Version 2 fingerprints marketplace.json per scope and keys binaries by
+# project; the binaries table is only a probe cache, so it is dropped.
+# Version 3 adds the launches table. Version 4 records each scope's project
+# and keys user-scope binaries by a NULL project instead of $HOME.
+MIGRATIONS = {
+    1: """
+ALTER TABLE scopes ADD COLUMN marketplace_json TEXT;
+DROP TABLE binaries;
+""",
+    2: "",
+    3: """
+ALTER TABLE scopes ADD COLUMN project TEXT;
+DROP TABLE IF EXISTS binaries;
+""",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scopes (
+    marketplace TEXT PRIMARY KEY,
+    settings TEXT,
+    updated_at REAL NOT NULL,
+    marketplace_json TEXT,
+    project TEXT
+);
+CREATE TABLE IF NOT EXISTS plugins (
+    marketplace TEXT NOT NULL REFERENCES scopes(marketplace) ON DELETE CASCADE,
+    plugin_name TEXT NOT NULL,
+    server_name TEXT NOT NULL,
+    command TEXT,
+    position INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    generated_at REAL NOT NULL,
+    PRIMARY KEY (marketplace, plugin_name)
+);
+CREATE INDEX IF NOT EXISTS plugins_server ON plugins(server_name);
+CREATE TABLE IF NOT EXISTS binaries (
+    project TEXT,
+    command TEXT NOT NULL,
+    path TEXT,
+    version TEXT,
+    mtime REAL,
+    size INTEGER,
+    checked_at REAL NOT NULL
+);
+-- A NULL project (no project, as for the user scope) is a key like any other
+CREATE UNIQUE INDEX IF NOT EXISTS binaries_key ON binaries(ifnull(project, ''), command);
+CREATE TABLE IF NOT EXISTS shims (
+    shim TEXT NOT NULL,
+    project TEXT NOT NULL,
+    manager TEXT NOT NULL,
+    target TEXT,
+    fingerprint TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (shim, project)
+);
+CREATE TABLE IF NOT EXISTS launches (
+    project TEXT NOT NULL,
+    command TEXT NOT NULL,
+    path TEXT NOT NULL,
+    argv TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (project, command)
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    marketplace TEXT,
+    server_name TEXT,
+    action TEXT NOT NULL,
+    status TEXT NOT NULL,
+    detail TEXT,
+    duration_ms REAL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_scope ON history(marketplace, at);
+CREATE INDEX IF NOT EXISTS history_server ON history(server_name, at);
+CREATE TABLE IF NOT EXISTS crashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    server_name TEXT NOT NULL,
+    workspace TEXT NOT NULL,
+    exit_code INTEGER,
+    uptime_s REAL NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS crashes_server ON crashes(server_name, workspace, at);
+CREATE TABLE IF NOT EXISTS repositories (
+    common_dir TEXT PRIMARY KEY,
+    identity TEXT NOT NULL,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+def default_state_path() -> Path:
+    """Return the state database path ($LSPCTL_STATE_DB overrides)."""
+    override = os.environ.get("LSPCTL_STATE_DB")
+    if override:
+        return Path(override)
+    return Path.home() / ".claude" / "lspctl-state.db"
+
+
+def content_hash(files: dict[str, bytes]) -> str:
+    """Hash a plugin's rendered files (relative path -> bytes)."""
+    import hashlib
+
+    digest = hashlib.sha256()
+    for rel_path in sorted(files):
+        digest.update(rel_path.encode())
+        digest.update(b"\0")
+        digest.update(files[rel_path])
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def read_plugin_files(plugin_dir: Path) -> dict[str, bytes]:
+    """Read every file of a generated plugin for hashing."""
+    return {
+        str(path.relative_to(plugin_dir)): path.read_bytes()
+        for path in sorted(plugin_dir.rglob("*"))
+        if path.is_file()
+    }
+
+
+def scope_key(marketplace: Path) -> str:
+    """Key a scope by its absolute marketplace path."""
+    return str(Path(marketplace).absolute())
+
+
+def marketplace_fingerprint(marketplace: Path) -> str | None:
+    """
+    Identify the current marketplace.json by inode, mtime and size.
+
+    Every write replaces the file by rename, so any rewrite changes it.
+    """
+    try:
+        stat = os.stat(Path(marketplace) / ".claude-plugin" / "marketplace.json")
+    except OSError:
+        return None
+    return f"{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class StateStore:
+    """Connection to the lspctl state database."""
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else default_state_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Concurrent syncs wait on SQLite's lock instead of failing
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        # The store can be rebuilt from disk, so a commit need not wait for
+        # fsync; WAL keeps it consistent either way
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            # Set up already; WAL mode is kept in the database file
+            return
+        if version != 0 and version not in MIGRATIONS:
+            raise sqlite3.DatabaseError(
+                f"Unsupported state schema version {version} in {self.path}"
+            )
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        for step in range(version or SCHEMA_VERSION, SCHEMA_VERSION):
+            self._conn.executescript(MIGRATIONS[step])
+        self._conn.executescript(SCHEMA)
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @classmethod
+    def open_or_reset(cls, path: Path | None = None) -> "StateStore":
+        """Open the store, moving a corrupt database aside first if needed."""
+        try:
+            return cls(path)
+        except sqlite3.DatabaseError:
+            target = Path(path) if path else default_state_path()
+            for suffix in ("", "-wal", "-shm"):
+                stale = target.with_name(target.name + suffix)
+                if stale.exists():
+                    stale.replace(stale.with_name(stale.name + ".corrupt"))
+            return cls(path)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "StateStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # Scopes and plugins
+
+    def has_scope(self, marketplace: Path) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM scopes WHERE marketplace = ?", (scope_key(marketplace),)
+        ).fetchone()
+        return row is not None
+
+    def scope_project(self, marketplace: Path) -> str | None:
+        """The project a scope's binaries were resolved for, if any."""
+        row = self._conn.execute(
+            "SELECT project FROM scopes WHERE marketplace = ?", (scope_key(marketplace),)
+        ).fetchone()
+        return row["project"] if row else None
+
+    def is_current(self, marketplace: Path) -> bool:
+        """
+        Whether the scope is recorded and its marketplace.json is unchanged
+        since. A marketplace.json that has only lost plugins, the rest being
+        exactly as recorded (as --remove leaves it), is caught up with first.
+        """
+        row = self._conn.execute(
+            "SELECT marketplace_json FROM scopes WHERE marketplace = ?", (scope_key(marketplace),)
+        ).fetchone()
+        if row is None or row["marketplace_json"] is None:
+            return False
+        fingerprint = marketplace_fingerprint(marketplace)
+        if row["marketplace_json"] == fingerprint:
+            return True
+        return fingerprint is not None and self._catch_up(marketplace, fingerprint)
+
+    def _catch_up(self, marketplace: Path, fingerprint: str) -> bool:
+        """Forget plugins gone from marketplace.json if all the others are unchanged."""
+        try:
+            with open(Path(marketplace) / ".claude-plugin" / "marketplace.json") as f:
+                entries = json.load(f).get("plugins", [])
+        except (OSError, ValueError):
+            return False
+        recorded = {row["plugin_name"]: row for row in self.plugins(marketplace)}
+        if len(entries) >= len(recorded):
+            return False
+        for entry in entries:
+            row = recorded.pop(entry.get("name"), None)
+            if row is None or row["entry"] != entry:
+                return False
+            plugin_dir = Path(marketplace) / "plugins" / entry["name"]
+            if content_hash(read_plugin_files(plugin_dir)) != row["content_hash"]:
+                return False
+
+        key = scope_key(marketplace)
+        with self._conn:
+            for plugin_name in recorded:
+                self._conn.execute(
+                    "DELETE FROM plugins WHERE marketplace = ? AND plugin_name = ?",
+                    (key, plugin_name),
+                )
+            self._conn.execute(
+                "UPDATE scopes SET marketplace_json = ?, updated_at = ? WHERE marketplace = ?",
+                (fingerprint, time.time(), key),
+            )
+        for row in recorded.values():
+            self.record_event("remove", "ok", marketplace=marketplace, server_name=row["server_name"])
+        return True
+
+    def replace_scope(
+        self,
+        marketplace: Path,
+        settings: Path | None,
+        plugins: list[dict],
+        project: str | None = None,
+    ) -> None:
+        """
+        Replace everything recorded for a scope in one transaction.
+
+        Each plugin dict has plugin_name, server_name, command,
+        content_hash and entry (its marketplace.json entry). project is
+        the one its binaries were resolved for. Call it once
+        marketplace.json is written, since the scope records its fingerprint.
+        """
+        key = scope_key(marketplace)
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO scopes (marketplace, settings, updated_at, marketplace_json, project) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(marketplace) DO UPDATE SET "
+                "settings = excluded.settings, updated_at = excluded.updated_at, "
+                "marketplace_json = excluded.marketplace_json, project = excluded.project",
+                (
+                    key,
+                    str(settings) if settings else None,
+                    now,
+                    marketplace_fingerprint(marketplace),
+                    project,
+                ),
+            )
+            self._conn.execute("DELETE FROM plugins WHERE marketplace = ?", (key,))
+            self._conn.executemany(
+                "INSERT INTO plugins VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        key,
+                        plugin["plugin_name"],
+                        plugin["server_name"],
+                        plugin.get("command"),
+                        position,
+                        plugin["content_hash"],
+                        json.dumps(plugin["entry"], sort_keys=True),
+                        now,
+                    )
+                    for position, plugin in enumerate(plugins)
+                ],
+            )
+
+    def plugins(self, marketplace: Path) -> list[dict]:
+        """Return a scope's plugins in marketplace order."""
+        rows = self._conn.execute(
+            "SELECT plugin_name, server_name, command, content_hash, entry, generated_at "
+            "FROM plugins WHERE marketplace = ? ORDER BY position",
+            (scope_key(marketplace),),
+        ).fetchall()
+        return [
+            {
+                "plugin_name": row["plugin_name"],
+                "server_name": row["server_name"],
+                "command": row["command"],
+                "content_hash": row["content_hash"],
+                "entry": json.loads(row["entry"]),
+                "generated_at": row["generated_at"],
+            }
+            for row in rows
+        ]
+
+    def remove_plugin(self, marketplace: Path, plugin_name: str) -> None:
+        """Forget a plugin once marketplace.json has been rewritten without it."""
+        key = scope_key(marketplace)
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM plugins WHERE marketplace = ? AND plugin_name = ?",
+                (key, plugin_name),
+            )
+            self._conn.execute(
+                "UPDATE scopes SET marketplace_json = ?, updated_at = ? WHERE marketplace = ?",
+                (marketplace_fingerprint(marketplace), time.time(), key),
+            )
+
+    def drop_scope(self, marketplace: Path) -> None:
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM scopes WHERE marketplace = ?", (scope_key(marketplace),)
+            )
+
+    def scopes_for_server(self, server_name: str) -> list[str]:
+        """Return marketplaces that contain a plugin for a server."""
+        rows = self._conn.execute(
+            "SELECT marketplace FROM plugins WHERE server_name = ? ORDER BY marketplace",
+            (server_name,),
+        ).fetchall()
+        return [row["marketplace"] for row in rows]
+
+    # Binaries
+
+    def binary(self, command: str, project: str | None) -> dict | None:
+        """Return what command resolved to for a project (None: without one)."""
+        row = self._conn.execute(
+            "SELECT project, command, path, version, mtime, size, checked_at "
+            "FROM binaries WHERE ifnull(project, '') = ifnull(?, '') AND command = ?",
+            (project, command),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def record_binary(
+        self,
+        project: str | None,
+        command: str,
+        path: str | None,
+        version: str | None = None,
+        mtime: float | None = None,
+        size: int | None = None,
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO binaries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (project, command, path, version, mtime, size, time.time()),
+            )
+
+    def shim(self, shim: str, project: str) -> dict | None:
+        row = self._conn.execute(
+            "SELECT shim, project, manager, target, fingerprint, checked_at "
+            "FROM shims WHERE shim = ? AND project = ?",
+            (shim, project),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def record_shim(
+        self,
+        shim: str,
+        project: str,
+        manager: str,
+        target: str | None,
+        fingerprint: str,
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shims VALUES (?, ?, ?, ?, ?, ?)",
+                (shim, project, manager, target, fingerprint, time.time()),
+            )
+
+    def launch(self, project: str, command: str) -> dict | None:
+        """The command line a shimmed command was last written as in a project."""
+        row = self._conn.execute(
+            "SELECT path, argv FROM launches WHERE project = ? AND command = ?",
+            (project, command),
+        ).fetchone()
+        return {"path": row["path"], "argv": json.loads(row["argv"])} if row else None
+
+    def record_launch(self, project: str, command: str, path: str, argv: list[str]) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO launches VALUES (?, ?, ?, ?, ?)",
+                (project, command, path, json.dumps(argv), time.time()),
+            )
+
+    def repository(self, common_dir: str) -> str | None:
+        row = self._conn.execute(
+            "SELECT identity FROM repositories WHERE common_dir = ?",
+            (common_dir,),
+        ).fetchone()
+        return row["identity"] if row else None
+
+    def record_repository(self, common_dir: str, identity: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO repositories VALUES (?, ?, ?)",
+                (common_dir, identity, time.time()),
+            )
+
+    # History
+
+    def record_event(
+        self,
+        action: str,
+        status: str,
+        marketplace: Path | None = None,
+        server_name: str | None = None,
+        duration_ms: float | None = None,
+        detail: str | None = None,
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO history "
+                "(marketplace, server_name, action, status, detail, duration_ms, at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    scope_key(marketplace) if marketplace else None,
+                    server_name,
+                    action,
+                    status,
+                    detail,
+                    duration_ms,
+                    time.time(),
+                ),
+            )
+
+    def history(
+        self,
+        marketplace: Path | None = None,
+        server_name: str | None = None,
+        limit: int = 50,
+    ) -> list[dict]:
+        """Return recent history, newest first."""
+        clauses, params = [], []
+        if marketplace is not None:
+            clauses.append("marketplace = ?")
+            params.append(scope_key(marketplace))
+        if server_name is not None:
+            clauses.append("server_name = ?")
+            params.append(server_name)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn.execute(
+            "SELECT marketplace, server_name, action, status, detail, duration_ms, at "
+            f"FROM history {where} ORDER BY at DESC, id DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    # Crashes
+
+    def record_crash(
+        self,
+        server_name: str,
+        workspace: str,
+        exit_code: int | None,
+        uptime_s: float,
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO crashes (server_name, workspace, exit_code, uptime_s, at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (server_name, workspace, exit_code, uptime_s, time.time()),
+            )
+
+    def crashes(
+        self,
+        server_name: str | None = None,
+        workspace: str | None = None,
+        since: float = 0.0,
+        limit: int = 50,
+    ) -> list[dict]:
+        """Return crashes at or after `since` (epoch seconds), newest first."""
+        clauses, params = ["at >= ?"], [since]
+        if server_name is not None:
+            clauses.append("server_name = ?")
+            params.append(server_name)
+        if workspace is not None:
+            clauses.append("workspace = ?")
+            params.append(workspace)
+        rows = self._conn.execute(
+            "SELECT server_name, workspace, exit_code, uptime_s, at "
+            f"FROM crashes WHERE {' AND '.join(clauses)} ORDER BY at DESC, id DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    # Recovery
+
+    def rebuild_scope(
+        self,
+        marketplace: Path,
+        settings: Path | None = None,
+        plugin_servers: dict[str, str] | None = None,
+        project: str | None = None,
+    ) -> list[str]:
+        """
+        Reconstruct a scope from the marketplace files on disk.
+
+        plugin_servers maps plugin names to server names (from the
+        registry); unmapped plugins are recorded under their plugin name.
+        project defaults to the one already recorded for the scope.
+        Returns the plugin names found. A missing marketplace drops the scope.
+        """
+        marketplace_json = Path(marketplace) / ".claude-plugin" / "marketplace.json"
+        if not marketplace_json.exists():
+            self.drop_scope(marketplace)
+            return []
+
+        with open(marketplace_json) as f:
+            entries = json.load(f).get("plugins", [])
+
+        plugins = []
+        for entry in entries:
+            plugin_dir = Path(marketplace) / "plugins" / entry["name"]
+            if not plugin_dir.is_dir():
+                continue
+            files = read_plugin_files(plugin_dir)
+            lsp_configs = list(json.loads(files[".lsp.json"]).values()) if ".lsp.json" in files else []
+            # A bundle has several servers and so no single command
+            command = launched_command(lsp_configs[0]) if len(lsp_configs) == 1 else None
+            plugins.append({
+                "plugin_name": entry["name"],
+                "server_name": (plugin_servers or {}).get(entry["name"], entry["name"]),
+                "command": command,
+                "content_hash": content_hash(files),
+                "entry": entry,
+            })
+
+        if project is None:
+            project = self.scope_project(marketplace)
+        self.replace_scope(marketplace, settings, plugins, project)
+        return [plugin["plugin_name"] for plugin in plugins]
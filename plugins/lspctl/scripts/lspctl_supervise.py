@@ -0,0 +1,151 @@
+"""
+Crash-loop supervision for language servers run by lsp-launch.py.
+
+A server that dies on a bad setting is restarted by the client at once,
+dies again, and so on, burning CPU and filling logs. With --supervise the
+launcher restarts a crashed server itself, after a delay that doubles with
+each crash in a row (BACKOFF_BASE seconds, up to BACKOFF_CAP). A run that
+lasted STABLE_SECONDS or more ends the streak.
+
+Crashes are recorded in the state store per server and workspace, so a
+launcher started after the client gave up on the last one picks the streak
+up where it ended, and `generate-marketplace.py --show-state` can report
+unhealthy servers. The last STDERR_LINES lines the server wrote before
+each crash are appended to ~/.cache/lspctl/logs/<server>.log.
+"""
+
+import collections
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 300.0
+
+# A run at least this long ends a crash streak
+STABLE_SECONDS = 60.0
+
+# Crashes older than this never count towards a streak
+CRASH_WINDOW = 3600.0
+
+STDERR_LINES = 50
+
+# --show-state reports crashes from this far back, and a server as unhealthy
+# once it has crashed this many times in a row in some workspace
+HEALTH_WINDOW = 86400.0
+UNHEALTHY_STREAK = 3
+
+# Crash logs are trimmed to about this size, keeping the newest entries
+LOG_LIMIT = 256 * 1024
+
+
+def crash_log_path(server: str) -> Path:
+    return Path.home() / ".cache" / "lspctl" / "logs" / f"{server}.log"
+
+
+def backoff_delay(streak: int) -> float:
+    """Seconds to wait before the next start after `streak` crashes in a row."""
+    if streak <= 0:
+        return 0.0
+    return min(BACKOFF_BASE * 2 ** (streak - 1), BACKOFF_CAP)
+
+
+def crash_streak(crashes: list[dict]) -> int:
+    """Count the crashes in a row, newest first, back to the last stable run."""
+    streak = 0
+    for crash in crashes:
+        streak += 1
+        if crash["uptime_s"] >= STABLE_SECONDS:
+            break
+    return streak
+
+
+class StderrTail:
+    """Passes a server's stderr through, keeping its last lines."""
+
+    def __init__(self, stream, out=None, lines: int = STDERR_LINES):
+        self.lines: collections.deque = collections.deque(maxlen=lines)
+        self.out = out if out is not None else sys.stderr.buffer
+        self.thread = threading.Thread(target=self._read, args=(stream,), daemon=True)
+        self.thread.start()
+
+    def _read(self, stream) -> None:
+        try:
+            for line in iter(stream.readline, b""):
+                self.lines.append(line.decode("utf-8", "replace").rstrip("\n"))
+                self.out.write(line)
+                self.out.flush()
+        except (OSError, ValueError):
+            pass
+
+    def tail(self, timeout: float = 1.0) -> list[str]:
+        """The last lines, once the stream has ended (or after timeout)."""
+        self.thread.join(timeout)
+        return list(self.lines)
+
+
+class Supervisor:
+    """Crash history and backoff for one server in one workspace."""
+
+    def __init__(self, server: str, workspace: str, state_path: Path | None = None, log_path: Path | None = None):
+        self.server = server
+        self.workspace = workspace
+        self.state_path = state_path
+        self.log_path = log_path or crash_log_path(server)
+        self.history: list[dict] = []
+        try:
+            with self._store() as state:
+                self.history = state.crashes(server, workspace, since=time.time() - CRASH_WINDOW)
+        except (OSError, sqlite3.Error):
+            pass
+
+    def _store(self):
+        from lspctl_state import StateStore
+
+        return StateStore(self.state_path)
+
+    def tail(self, stream) -> StderrTail:
+        return StderrTail(stream)
+
+    def startup_delay(self) -> float:
+        """How much longer a new launcher should wait after a recent crash loop."""
+        if not self.history:
+            return 0.0
+        ready = self.history[0]["at"] + backoff_delay(crash_streak(self.history))
+        return max(ready - time.time(), 0.0)
+
+    def crashed(self, exit_code: int | None, uptime_s: float, stderr: list[str]) -> float:
+        """Record a crash and return how long to wait before restarting."""
+        crash = {"exit_code": exit_code, "uptime_s": uptime_s, "at": time.time()}
+        self.history.insert(0, crash)
+        try:
+            with self._store() as state:
+                state.record_crash(self.server, self.workspace, exit_code, uptime_s)
+        except (OSError, sqlite3.Error):
+            pass
+        delay = backoff_delay(crash_streak(self.history))
+        self._write_log(crash, delay, stderr)
+        return delay
+
+    def _write_log(self, crash: dict, delay: float, stderr: list[str]) -> None:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(crash["at"]))
+        entry = [
+            f"== {stamp} {self.server} exited with {crash['exit_code']} "
+            f"after {crash['uptime_s']:.1f}s in {self.workspace}; next start in {delay:g}s",
+            *stderr,
+            "",
+        ]
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(entry) + "\n")
+            if self.log_path.stat().st_size > LOG_LIMIT:
+                text = self.log_path.read_text(encoding="utf-8", errors="replace")
+                keep = text[-LOG_LIMIT // 2:]
+                start = keep.find("\n== ")
+                self.log_path.write_text(keep[start + 1:] if start >= 0 else keep, encoding="utf-8")
+        except OSError:
+            pass
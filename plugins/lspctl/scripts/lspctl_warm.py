@@ -0,0 +1,338 @@
+"""
+Index pre-warming for language servers that keep their index on disk.
+
+A registry entry opts in with a "warm" object:
+
+    "warm": {
+        "markers": ["compile_commands.json", "build/compile_commands.json"],
+        "files": 3
+    }
+
+runs the server itself: an LSP initialize, then didOpen for up to `files`
+project files with the server's extensions, then waits until its work-done
+progress has ended and it has been quiet for a moment. Alternatively
+
+    "warm": {"markers": ["Cargo.toml"], "command": ["cargo", "check", "--workspace"]}
+
+runs a CLI index build in the project directory. Either way the warm-up is
+skipped unless one of the marker paths exists in the project, so servers
+only warm projects they would serve.
+
+run_warmups() schedules them with a concurrency cap and holds back new ones
+while the system load is above the CPU count.
+"""
+
+import os
+import queue
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from lspctl_fleet import FLEET_SKIP_DIRS
+from lspctl_lsp import (
+    ProtocolError,
+    configuration_section,
+    is_request,
+    is_response,
+    read_message,
+    write_message,
+)
+
+
+# Seconds without server traffic or running progress that count as done
+SETTLE_SECONDS = 2.0
+
+DEFAULT_FILES = 3
+
+
+@dataclass
+class Warmup:
+    """One server's warm-up for a project."""
+
+    server: str
+    command: list[str]
+    extensions: dict[str, str]
+    spec: dict
+    settings: dict | None = None
+    # Extra environment, such as a shared cache location
+    env: dict[str, str] | None = None
+
+    def environment(self) -> dict[str, str] | None:
+        return {**os.environ, **self.env} if self.env else None
+
+
+@dataclass
+class WarmResult:
+    server: str
+    method: str  # "lsp" or "command"
+    status: str = "pending"  # "ok", "skipped", "failed" or "timeout"
+    reason: str | None = None
+    elapsed_s: float = 0.0
+    files_opened: int = 0
+    progress: str | None = None
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_concurrency() -> int:
+    """Servers index on several threads each, so run a quarter as many."""
+    return max(1, available_cpus() // 4)
+
+
+def find_files(project: Path, extensions: dict[str, str], limit: int) -> list[Path]:
+    """Return up to limit project files with the given extensions, shallowest first."""
+    found = []
+    level = [project]
+    while level and len(found) < limit:
+        next_level = []
+        for directory in level:
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith(".") and entry.name not in FLEET_SKIP_DIRS:
+                        next_level.append(Path(entry.path))
+                elif Path(entry.name).suffix in extensions and len(found) < limit:
+                    found.append(Path(entry.path))
+        level = next_level
+    return found
+
+
+def warm_lsp(warmup: Warmup, project: Path, timeout: float, emit) -> WarmResult:
+    """Start a server, open representative files and wait for indexing to finish."""
+    result = WarmResult(warmup.server, "lsp")
+    files = find_files(project, warmup.extensions, warmup.spec.get("files", DEFAULT_FILES))
+    try:
+        process = subprocess.Popen(
+            warmup.command,
+            cwd=project,
+            env=warmup.environment(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError as e:
+        result.status, result.reason = "failed", str(e)
+        return result
+
+    messages: queue.Queue = queue.Queue()
+
+    def read():
+        try:
+            while (message := read_message(process.stdout)) is not None:
+                messages.put(message)
+        except (OSError, ValueError, ProtocolError):
+            pass
+        messages.put(None)
+
+    threading.Thread(target=read, daemon=True).start()
+
+    def send(message: dict):
+        write_message(process.stdin, {"jsonrpc": "2.0", **message})
+
+    root_uri = project.resolve().as_uri()
+    deadline = time.monotonic() + timeout
+    active: dict = {}  # progress token -> title
+    initialized = False
+
+    try:
+        send({"id": 1, "method": "initialize", "params": {
+            "processId": os.getpid(),
+            "rootUri": root_uri,
+            "workspaceFolders": [{"uri": root_uri, "name": project.name}],
+            "capabilities": {"window": {"workDoneProgress": True}},
+        }})
+        quiet_until = None
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                result.status = "timeout"
+                break
+            if quiet_until is not None and now >= quiet_until and not active:
+                result.status = "ok"
+                break
+            wait = deadline - now if quiet_until is None else min(deadline, quiet_until) - now
+            try:
+                message = messages.get(timeout=max(wait, 0.0))
+            except queue.Empty:
+                continue
+            if message is None:
+                result.status, result.reason = "failed", f"server exited with {process.wait()}"
+                return result
+
+            if quiet_until is not None:
+                quiet_until = time.monotonic() + SETTLE_SECONDS
+
+            if is_response(message) and message["id"] == 1 and not initialized:
+                if "error" in message:
+                    result.status, result.reason = "failed", message["error"].get("message")
+                    break
+                initialized = True
+                send({"method": "initialized", "params": {}})
+                if warmup.settings is not None:
+                    send({"method": "workspace/didChangeConfiguration",
+                          "params": {"settings": warmup.settings}})
+                for path in files:
+                    try:
+                        text = path.read_text(errors="replace")
+                    except OSError:
+                        continue
+                    send({"method": "textDocument/didOpen", "params": {"textDocument": {
+                        "uri": path.resolve().as_uri(),
+                        "languageId": warmup.extensions[path.suffix],
+                        "version": 1,
+                        "text": text,
+                    }}})
+                    result.files_opened += 1
+                emit(warmup.server, f"opened {result.files_opened} files")
+                quiet_until = time.monotonic() + SETTLE_SECONDS
+            elif is_request(message):
+                reply = None
+                if message["method"] == "workspace/configuration":
+                    reply = [
+                        configuration_section(warmup.settings, item.get("section"))
+                        for item in message["params"]["items"]
+                    ]
+                send({"id": message["id"], "result": reply})
+            elif message.get("method") == "$/progress":
+                token = message["params"]["token"]
+                value = message["params"]["value"]
+                if value.get("kind") == "begin":
+                    active[token] = value.get("title", "")
+                elif value.get("kind") == "end":
+                    active.pop(token, None)
+                if value.get("kind") in ("begin", "report"):
+                    title = active.get(token, "")
+                    detail = value.get("message") or ""
+                    percent = f" {value['percentage']}%" if "percentage" in value else ""
+                    result.progress = " ".join(p for p in (title, detail) if p) + percent
+                    emit(warmup.server, result.progress)
+    except (OSError, ValueError) as e:
+        result.status, result.reason = "failed", str(e)
+    finally:
+        try:
+            send({"id": 2, "method": "shutdown"})
+            send({"method": "exit"})
+        except (OSError, ValueError):
+            pass
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return result
+
+
+def warm_command(warmup: Warmup, project: Path, timeout: float, emit) -> WarmResult:
+    """Run a registry-declared CLI index build in the project."""
+    result = WarmResult(warmup.server, "command")
+    command = warmup.spec["command"]
+    emit(warmup.server, f"running {' '.join(command)}")
+    try:
+        completed = subprocess.run(
+            command,
+            cwd=project,
+            env=warmup.environment(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        result.status = "timeout"
+        return result
+    except OSError as e:
+        result.status, result.reason = "failed", str(e)
+        return result
+    if completed.returncode == 0:
+        result.status = "ok"
+    else:
+        tail = completed.stderr.strip().splitlines()[-1:] or [""]
+        result.status, result.reason = "failed", f"exit {completed.returncode}: {tail[0]}"
+    return result
+
+
+def warm_one(warmup: Warmup, project: Path, timeout: float, emit) -> WarmResult:
+    markers = warmup.spec.get("markers", [])
+    method = "command" if "command" in warmup.spec else "lsp"
+    if markers and not any((project / marker).exists() for marker in markers):
+        return WarmResult(warmup.server, method, "skipped", f"no {' or '.join(markers)}")
+    if method == "lsp" and not find_files(project, warmup.extensions, 1):
+        return WarmResult(warmup.server, method, "skipped", "no matching files")
+
+    start = time.monotonic()
+    emit(warmup.server, "started")
+    if method == "command":
+        result = warm_command(warmup, project, timeout, emit)
+    else:
+        result = warm_lsp(warmup, project, timeout, emit)
+    result.elapsed_s = round(time.monotonic() - start, 2)
+    emit(warmup.server, f"{result.status} in {result.elapsed_s:.1f}s")
+    return result
+
+
+def run_warmups(
+    warmups: list[Warmup],
+    project: Path,
+    concurrency: int | None = None,
+    max_load: float | None = None,
+    timeout: float = 600.0,
+    emit=lambda server, message: None,
+) -> dict:
+    """
+    Warm servers for a project, a few at a time.
+
+    A new warm-up waits while the 1-minute load average is at or above
+    max_load (default: the CPU count), unless nothing is running. Returns
+    {"project", "results": [WarmResult as dict], "duration_s", "summary"}.
+    """
+    concurrency = concurrency or default_concurrency()
+    if max_load is None:
+        max_load = float(available_cpus())
+
+    started = time.monotonic()
+    results: dict[str, WarmResult] = {}
+    pending = list(warmups)
+    running: set[str] = set()
+    changed = threading.Condition()
+
+    def work(warmup: Warmup):
+        try:
+            result = warm_one(warmup, project, timeout, emit)
+        except Exception as e:  # noqa: BLE001 - one server must not stop the rest
+            result = WarmResult(warmup.server, "lsp", "failed", str(e))
+        with changed:
+            results[warmup.server] = result
+            running.discard(warmup.server)
+            changed.notify()
+
+    with changed:
+        while pending or running:
+            loaded = max_load > 0 and running and os.getloadavg()[0] >= max_load
+            if pending and len(running) < concurrency and not loaded:
+                warmup = pending.pop(0)
+                running.add(warmup.server)
+                threading.Thread(target=work, args=(warmup,), daemon=True).start()
+                continue
+            changed.wait(timeout=1.0)
+
+    ordered = [asdict(results[warmup.server]) for warmup in warmups]
+    summary: dict[str, int] = {}
+    for result in ordered:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return {
+        "project": str(project),
+        "results": ordered,
+        "duration_s": round(time.monotonic() - started, 2),
+        "summary": summary,
+    }
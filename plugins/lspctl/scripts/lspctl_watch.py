@@ -0,0 +1,214 @@
+"""
+Watch mode for generate-marketplace.py.
+
+Re-runs the parser and an incremental sync whenever the config, the modules
+it loads, the registry or a server binary in the search roots changes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from lspctl_marketplace import load_registry, resolve_binary, update_marketplace, update_settings
+from lspctl_resolve import BinaryResolver, default_search_roots
+
+if TYPE_CHECKING:
+    from lspctl_blobs import BlobStore
+    from lspctl_state import StateStore
+
+
+PARSER_SCRIPT = Path(__file__).resolve().parent / "parse-lua-config.lua"
+
+
+def parse_config(parse_argv: list[str], lua: str = "lua") -> tuple[dict, list[Path]]:
+    """Run the Lua parser; returns the parsed config and the files it read."""
+    with tempfile.NamedTemporaryFile(prefix="lspctl-deps-", suffix=".txt") as deps:
+        result = subprocess.run(
+            [lua, str(PARSER_SCRIPT), "--deps-out", deps.name, *parse_argv],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            raise ValueError(result.stderr.strip() or f"parser exited with {result.returncode}")
+        files = [Path(line) for line in Path(deps.name).read_text().splitlines() if line]
+    return json.loads(result.stdout), files
+
+
+def watch_config(
+    parse_argv: list[str],
+    config_paths: list[Path],
+    registry_path: Path,
+    output_dir: Path,
+    settings_path: Path | None = None,
+    state: StateStore | None = None,
+    module_root: Path | None = None,
+    debounce: float = 0.3,
+    max_syncs: int | None = None,
+    lua: str = "lua",
+    emit=print,
+    blobs: BlobStore | None = None,
+    project: Path | None = None
+) -> None:
+    """
+    Keep a marketplace in sync with its config using inotify.
+
+    Blocks on inotify (no polling) for changes to the config files and the
+    modules they load, the registry, server binaries in the search roots
+    (default_search_roots(project)) and the version files behind any
+    version-manager shims. Bursts of events are debounced into one run,
+    and each run does only the stages its events call for: re-parse on
+    config edits, registry reload on registry edits, incremental
+    regeneration after either, and binary re-resolution plus regeneration
+    for binaries that appeared, vanished or were re-pinned, since each of
+    those can change the command written to .lsp.json. Directories created
+    under the Neovim config's lua/ tree are watched as they appear. Every
+    run is reported through emit(report); a failed run reports its error
+    and the watch goes on.
+    """
+    from lspctl_inotify import IN_CREATE, IN_ISDIR, IN_MOVED_TO, Inotify
+
+    def absolute(path: Path) -> Path:
+        return Path(os.path.abspath(path))
+
+    lua_root = absolute(module_root / "lua") if module_root is not None else None
+
+    registry_path = absolute(registry_path)
+    search_roots = default_search_roots(project)
+    path_dirs = {absolute(root.path) for root in search_roots}
+    config_files: set[Path] = set()
+    shim_files: set[Path] = set()
+    registry = load_registry(registry_path)
+    config: dict = {}
+
+    def server_commands() -> dict[str, str]:
+        return {
+            server: registry[server]["command"]
+            for server in config.get("ensure_installed", [])
+            if server in registry
+        }
+
+    def watch_files(inotify: Inotify, files: list[Path]) -> None:
+        for path in files:
+            config_files.add(absolute(path))
+            inotify.watch_directory(absolute(path).parent)
+
+    def watch_tree(inotify: Inotify, root: Path) -> None:
+        for directory, _dirs, _files in os.walk(root):
+            inotify.watch_directory(absolute(Path(directory)))
+
+    def classify(inotify: Inotify, events: list) -> tuple[set[str], set[str]]:
+        stages, binary_names = set(), set()
+        commands = set(server_commands().values())
+        for path, mask in events:
+            if path is None:
+                stages |= {"parse", "registry", "binaries"}
+                binary_names |= commands
+            elif mask & IN_ISDIR:
+                if lua_root is not None and mask & (IN_CREATE | IN_MOVED_TO) and \
+                        (path == lua_root or lua_root in path.parents):
+                    # Modules may already be inside; watch first, then re-parse
+                    watch_tree(inotify, path)
+                    stages.add("parse")
+            elif path in config_files or (
+                module_root is not None and path.suffix == ".lua" and module_root in path.parents
+            ):
+                stages.add("parse")
+            elif path == registry_path:
+                stages.add("registry")
+            elif path in shim_files:
+                stages.add("binaries")
+                binary_names |= commands
+            elif path.parent in path_dirs and path.name in commands:
+                stages.add("binaries")
+                binary_names.add(path.name)
+        return stages, binary_names
+
+    def resolve(servers: list[str], report: dict, resolver: BinaryResolver) -> None:
+        for server in servers:
+            binary = resolve_binary(registry[server]["command"], registry[server], state, resolver)
+            if binary is None:
+                report["missing_binaries"].append(server)
+            else:
+                report["binaries"][server] = binary
+
+    with Inotify() as inotify:
+        watch_files(inotify, config_paths)
+        if module_root is not None:
+            # The config root too, so a lua/ created later is noticed
+            inotify.watch_directory(absolute(module_root))
+            watch_tree(inotify, lua_root)
+        inotify.watch_directory(registry_path.parent)
+        for directory in path_dirs:
+            inotify.watch_directory(directory)
+
+        stages = {"initial"}
+        binary_names: set[str] = set()
+        syncs = 0
+        while True:
+            started = time.monotonic()
+            report = {
+                "stages": sorted(stages),
+                "generated": [],
+                "removed": [],
+                "binaries": {},
+                "missing_binaries": [],
+                "error": None
+            }
+            # Directory listings are only good for one run
+            resolver = BinaryResolver(search_roots, project, state)
+            try:
+                if "registry" in stages:
+                    registry = load_registry(registry_path)
+                if stages & {"initial", "parse"}:
+                    config, deps = parse_config(parse_argv, lua)
+                    watch_files(inotify, deps)
+                if stages & {"initial", "parse", "registry", "binaries"}:
+                    update = update_marketplace(
+                        config, registry, output_dir, state, settings_path, blobs, resolver
+                    )
+                    report["generated"] = update["generated"]
+                    report["removed"] = update["removed"]
+                    if "initial" in stages and settings_path:
+                        update_settings(settings_path, output_dir)
+                resolve(
+                    [
+                        server for server, command in server_commands().items()
+                        if "initial" in stages
+                        or command in binary_names
+                        or registry[server]["pluginName"] in report["generated"]
+                    ],
+                    report,
+                    resolver
+                )
+            except (ValueError, OSError, KeyError, json.JSONDecodeError, sqlite3.Error) as e:
+                report["error"] = str(e)
+            report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+            emit(report)
+
+            # Version files read while resolving shims decide what they run
+            for path in resolver.shim_files - shim_files:
+                shim_files.add(absolute(path))
+                inotify.watch_directory(absolute(path).parent)
+
+            syncs += 1
+            if max_syncs is not None and syncs > max_syncs:
+                return
+
+            # Block until something relevant changes, then let the burst settle
+            stages, binary_names = set(), set()
+            while not stages:
+                stages, binary_names = classify(inotify, inotify.read())
+            while True:
+                events = inotify.read(debounce)
+                if not events:
+                    break
+                more_stages, more_names = classify(inotify, events)
+                stages |= more_stages
+                binary_names |= more_names
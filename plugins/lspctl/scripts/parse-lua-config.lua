@@ -1,7 +1,31 @@
 #!/usr/bin/env lua
 -- parse-lua-config.lua
 -- Parses LSP configuration from Lua file and outputs JSON
--- Usage: lua parse-lua-config.lua <config-path>
+-- Usage: lua parse-lua-config.lua [--max-instructions N] [--max-memory-kb N]
+--                                  [--allow-module NAME]... <config-path>
+--        lua parse-lua-config.lua --layer NAME=PATH... [--cache FILE | --no-cache]
+--        lua parse-lua-config.lua --import-nvim [--cache FILE | --no-cache]
+--                                  [<nvim-config-dir>]
+--        lua parse-lua-config.lua --batch [--layer NAME=TEMPLATE]... <arg>...
+--
+-- The config is evaluated in a restricted environment (no io, os.execute,
+-- debug or load) under an instruction and memory budget, so a runaway
+-- config fails fast instead of hanging the caller.
+--
+-- --layer (repeatable, lowest precedence first) merges several configs,
+-- e.g. user, project and local, in one process.
+--
+-- --import-nvim evaluates a whole Neovim config tree instead and records
+-- the servers passed to lspconfig.X.setup(), vim.lsp.config()/enable(),
+-- mason-lspconfig and lazy.nvim specs, emitting the same JSON shape.
+--
+-- --batch parses several independent configs in one process (each in its
+-- own sandbox and budget) and emits {"<path>": {config|error, cpu_ms}}.
+-- With --layer, each argument is instead merged from the given layers, with
+-- {} in a layer path standing for the argument (e.g. a project directory).
+--
+-- --deps-out FILE (any form) writes the config and module files that were
+-- read, one per line, so a watcher knows what to re-parse on.
 
 -- Minimal JSON encoder for Lua tables
 local function encode_json(obj, indent)
@@ -86,48 +110,287 @@ local function encode_json(obj, indent)
     return "null"
 end
 
+local unpack = table.unpack or unpack
+
+-- Sandbox limits (overridable from the command line)
+local DEFAULT_MAX_INSTRUCTIONS = 50000000
+local DEFAULT_MAX_MEMORY_KB = 65536
+local HOOK_INTERVAL = 1000
+
+-- Budget accounting shared by every chunk evaluated in this process
+local budget = {
+    max_instructions = DEFAULT_MAX_INSTRUCTIONS,
+    max_memory_kb = DEFAULT_MAX_MEMORY_KB,
+    instructions = 0,
+    peak_memory_kb = 0,
+    started = os.clock(),
+    exceeded = nil,
+}
+
+local function budget_cost()
+    return string.format("%d instructions, %.0f KB peak memory, %.3fs CPU",
+        budget.instructions, budget.peak_memory_kb, os.clock() - budget.started)
+end
+
+local function check_memory()
+    local used = collectgarbage("count")
+    if used > budget.max_memory_kb then
+        -- Only give up if the heap is still too big after a full collection
+        collectgarbage("collect")
+        used = collectgarbage("count")
+        if used > budget.max_memory_kb then
+            budget.exceeded = budget.exceeded
+                or string.format("memory limit of %d KB exceeded", budget.max_memory_kb)
+        end
+    end
+    if used > budget.peak_memory_kb then budget.peak_memory_kb = used end
+end
+
+-- Start a fresh budget for the next independent evaluation (--batch)
+local function reset_budget()
+    collectgarbage("collect")
+    budget.instructions = 0
+    budget.peak_memory_kb = 0
+    budget.started = os.clock()
+    budget.exceeded = nil
+end
+
+local function budget_hook()
+    budget.instructions = budget.instructions + HOOK_INTERVAL
+    if budget.instructions > budget.max_instructions then
+        budget.exceeded = budget.exceeded
+            or string.format("instruction budget of %d exceeded", budget.max_instructions)
+    else
+        check_memory()
+    end
+    -- Keep raising once exceeded so a pcall inside the config can't swallow it
+    if budget.exceeded then
+        error("sandbox budget exceeded: " .. budget.exceeded, 0)
+    end
+end
+
+local function pack(...)
+    return { n = select("#", ...), ... }
+end
+
+-- pcall/xpcall for sandboxed code: a budget error is re-raised instead of
+-- being caught, so `while true do pcall(f) end` can't outlive the budget
+local function sandbox_pcall(...)
+    local results = pack(pcall(...))
+    if budget.exceeded then
+        error("sandbox budget exceeded: " .. budget.exceeded, 0)
+    end
+    return unpack(results, 1, results.n)
+end
+
+local function sandbox_xpcall(...)
+    local results = pack(xpcall(...))
+    if budget.exceeded then
+        error("sandbox budget exceeded: " .. budget.exceeded, 0)
+    end
+    return unpack(results, 1, results.n)
+end
+
+-- Inert stand-ins for anything a Neovim config touches that lspctl doesn't
+-- model (plugin modules, vim.uv, vim.opt.rtp, ...). Indexing or calling a
+-- stub returns another stub; numeric keys stay nil so ipairs terminates.
+local stubs = setmetatable({}, { __mode = "k" })
+
+local function create_stub()
+    local stub = {}
+    stubs[stub] = true
+    return setmetatable(stub, {
+        __index = function(t, k)
+            if type(k) == "number" then return nil end
+            local child = create_stub()
+            rawset(t, k, child)
+            return child
+        end,
+        __call = function() return create_stub() end,
+        __tostring = function() return "" end,
+        __concat = function(a, b)
+            return (stubs[a] and "" or tostring(a)) .. (stubs[b] and "" or tostring(b))
+        end,
+    })
+end
+
+-- Fill missing fields of `tbl` with stubs
+local function with_stub_fallback(tbl)
+    return setmetatable(tbl, {
+        __index = function(t, k)
+            if type(k) == "number" then return nil end
+            local child = create_stub()
+            rawset(t, k, child)
+            return child
+        end,
+    })
+end
+
+local function contains(list, value)
+    for _, v in ipairs(list) do
+        if v == value then return true end
+    end
+    return false
+end
+
+local function deep_merge(dst, src)
+    for k, v in pairs(src) do
+        if type(v) == "table" and type(dst[k]) == "table" then
+            deep_merge(dst[k], v)
+        else
+            dst[k] = v
+        end
+    end
+    return dst
+end
+
+-- Copy plain data only: functions, stubs and non-string/number keys are
+-- dropped. Tables are walked raw and come back without metatables, so no
+-- metamethod of the config runs once the budget is lifted.
+local function copy_data(value, seen)
+    if type(value) ~= "table" then
+        if type(value) == "function" or type(value) == "userdata" or type(value) == "thread" then
+            return nil
+        end
+        return value
+    end
+    if stubs[value] then return nil end
+    seen = seen or {}
+    if seen[value] then return nil end
+    seen[value] = true
+    local copy = {}
+    for k, v in next, value do
+        if type(k) == "string" or type(k) == "number" then
+            copy[k] = copy_data(v, seen)
+        end
+    end
+    seen[value] = nil
+    return copy
+end
+
+-- Server config keys kept when importing from a Neovim config
+local IMPORTED_SERVER_KEYS = { "settings", "init_options", "cmd", "filetypes" }
+
+-- What the lspconfig / vim.lsp / mason-lspconfig / lazy.nvim mocks saw.
+-- Each evaluated module gets its own record so import results can be
+-- cached per file; calls made outside any module land in `default`.
+local function new_record()
+    return { ensure_installed = {}, servers = {}, imports = {}, deps = {}, mason = {} }
+end
+
+local recorder = {
+    stack = {},
+    default = new_record(),
+}
+
+local function current_frame()
+    return recorder.stack[#recorder.stack]
+end
+
+local function current_record()
+    local frame = current_frame()
+    return frame and frame.record or recorder.default
+end
+
+local function warn(message)
+    local frame = current_frame()
+    local where = frame and (frame.path .. ": ") or ""
+    io.stderr:write("Warning: " .. where .. tostring(message) .. "\n")
+end
+
+local function record_ensure(name)
+    local record = current_record()
+    if type(name) == "string" and not contains(record.ensure_installed, name) then
+        table.insert(record.ensure_installed, name)
+    end
+end
+
+local function record_server(name, config)
+    if type(name) ~= "string" or name == "*" then return end
+    local record = current_record()
+    local server = record.servers[name] or {}
+    if type(config) == "table" then
+        for _, key in ipairs(IMPORTED_SERVER_KEYS) do
+            local value = copy_data(config[key])
+            if type(value) == "table" and type(server[key]) == "table" then
+                deep_merge(server[key], value)
+            elseif value ~= nil then
+                server[key] = value
+            end
+        end
+    end
+    record.servers[name] = server
+end
+
+local function record_import(namespace)
+    local record = current_record()
+    if type(namespace) == "string" and not contains(record.imports, namespace) then
+        table.insert(record.imports, namespace)
+    end
+end
+
 -- Mock vim global for Neovim config compatibility
-local function create_vim_mock()
+local function create_vim_mock(config_dir)
     local vim_mock = {
-        env = {
+        env = setmetatable({
             VIMRUNTIME = "/usr/share/nvim/runtime"
-        },
-        fn = {
+        }, {
+            __index = function(_, name) return os.getenv(name) end
+        }),
+        fn = with_stub_fallback({
             stdpath = function(what)
                 if what == "data" then return os.getenv("HOME") .. "/.local/share/nvim" end
-                if what == "config" then return os.getenv("HOME") .. "/.config/nvim" end
+                if what == "config" then
+                    return config_dir or (os.getenv("HOME") .. "/.config/nvim")
+                end
                 return ""
             end,
             expand = function(path) return path end,
             has = function() return 0 end,
-        },
+        }),
         opt = setmetatable({}, {
-            __index = function() return { get = function() return {} end } end
+            __index = function()
+                local option = create_stub()
+                rawset(option, "get", function() return {} end)
+                return option
+            end
         }),
         g = {},
         o = {},
         bo = {},
         wo = {},
-        api = {
+        v = with_stub_fallback({ shell_error = 0 }),
+        api = with_stub_fallback({
             nvim_get_runtime_file = function() return {} end,
             nvim_create_autocmd = function() end,
             nvim_create_augroup = function() return 0 end,
             nvim_buf_get_name = function() return "" end,
             nvim_get_current_buf = function() return 0 end,
-        },
-        lsp = {
+        }),
+        lsp = with_stub_fallback({
             protocol = {
                 make_client_capabilities = function() return {} end
             },
+            -- vim.lsp.config("name", {...}) and vim.lsp.config.name = {...}
+            config = setmetatable({}, {
+                __call = function(_, name, config) record_server(name, config) end,
+                __newindex = function(_, name, config) record_server(name, config) end,
+            }),
+            enable = function(names, enable)
+                if enable == false then return end
+                if type(names) == "table" then
+                    for _, name in ipairs(names) do record_ensure(name) end
+                else
+                    record_ensure(names)
+                end
+            end,
+        }),
+        diagnostic = with_stub_fallback({
             config = function() end,
-            enable = function() end,
-        },
-        diagnostic = {
-            config = function() end,
-        },
-        keymap = {
+        }),
+        keymap = with_stub_fallback({
             set = function() end,
-        },
+        }),
         cmd = setmetatable({}, {
             __call = function() end,
             __index = function() return function() end end
@@ -171,99 +434,1143 @@ local function create_vim_mock()
             end
             return false
         end,
+        tbl_isempty = function(t) return next(t) == nil end,
+        tbl_map = function(fn, t)
+            local result = {}
+            for k, v in pairs(t) do result[k] = fn(v) end
+            return result
+        end,
+        tbl_filter = function(fn, t)
+            local result = {}
+            for _, v in ipairs(t) do
+                if fn(v) then table.insert(result, v) end
+            end
+            return result
+        end,
+        list_extend = function(dst, src)
+            for _, v in ipairs(src or {}) do table.insert(dst, v) end
+            return dst
+        end,
+        deepcopy = function(t) return copy_data(t) end,
+        startswith = function(s, prefix) return s:sub(1, #prefix) == prefix end,
+        endswith = function(s, suffix) return suffix == "" or s:sub(-#suffix) == suffix end,
         inspect = function(t) return tostring(t) end,
         log = {
             levels = { DEBUG = 1, INFO = 2, WARN = 3, ERROR = 4 }
         },
     }
-    return vim_mock
+    return with_stub_fallback(vim_mock)
+end
+
+-- Forward declaration: lazy.setup() walks plugin specs
+local process_lazy_spec
+
+-- mason-lspconfig: ensure_installed names the servers; handlers (the
+-- default one at [1] or per-server ones) usually call lspconfig.X.setup
+local mason_servers = {}
+
+local function remember_mason_server(name)
+    if not contains(mason_servers, name) then
+        table.insert(mason_servers, name)
+    end
+    local record = current_record()
+    if not contains(record.mason, name) then
+        table.insert(record.mason, name)
+    end
+end
+
+local function run_mason_handlers(handlers, servers)
+    if type(handlers) ~= "table" then return end
+    for _, server in ipairs(servers) do
+        local handler = handlers[server] or handlers[1]
+        if type(handler) == "function" then
+            local ok, err = sandbox_pcall(handler, server)
+            if not ok then warn(err) end
+        end
+    end
+end
+
+local function mason_lspconfig_setup(opts)
+    if type(opts) ~= "table" then return end
+    if type(opts.ensure_installed) == "table" then
+        for _, server in ipairs(opts.ensure_installed) do
+            if type(server) == "string" then
+                record_ensure(server)
+                remember_mason_server(server)
+            end
+        end
+    end
+    run_mason_handlers(opts.handlers, mason_servers)
 end
 
 -- Mock require for common Neovim plugins
-local original_require = require
 local mock_modules = {
     ["mason"] = { setup = function() end },
-    ["mason-lspconfig"] = { setup = function() end },
-    ["lspconfig"] = setmetatable({}, {
+    ["mason-lspconfig"] = {
+        setup = mason_lspconfig_setup,
+        setup_handlers = function(handlers) run_mason_handlers(handlers, mason_servers) end,
+        get_installed_servers = function() return copy_data(mason_servers) end,
+        get_available_servers = function() return copy_data(mason_servers) end,
+    },
+    -- Tool lists mix servers with formatters/linters, so they only feed
+    -- the server list handlers are run for, not ensure_installed
+    ["mason-tool-installer"] = {
+        setup = function(opts)
+            if type(opts) ~= "table" or type(opts.ensure_installed) ~= "table" then return end
+            for _, tool in ipairs(opts.ensure_installed) do
+                local name = type(tool) == "table" and tool[1] or tool
+                if type(name) == "string" then
+                    remember_mason_server(name)
+                end
+            end
+        end,
+    },
+    ["lspconfig"] = setmetatable({
+        util = create_stub(),
+    }, {
         __index = function(_, server_name)
-            return { setup = function() end }
+            return setmetatable({
+                setup = function(config)
+                    record_ensure(server_name)
+                    record_server(server_name, config)
+                end,
+            }, { __index = function() return create_stub() end })
         end
     }),
     ["cmp_nvim_lsp"] = {
         default_capabilities = function() return {} end
     },
-    ["lazy"] = { setup = function() end },
+    ["lazy"] = {
+        setup = function(spec, opts)
+            if type(spec) == "table" and spec.spec then
+                spec = spec.spec
+            elseif spec == nil and type(opts) == "table" then
+                spec = opts.spec
+            end
+            process_lazy_spec(spec)
+        end,
+    },
 }
 
-local function mock_require(module_name)
-    if mock_modules[module_name] then
-        return mock_modules[module_name]
+local function plugin_short_name(spec)
+    local name = spec[1] or spec.name or spec.url or spec.dir
+    if type(name) ~= "string" then return "" end
+    return (name:gsub("%.git$", ""):match("([^/]+)/*$")) or name
+end
+
+-- Walk a lazy.nvim spec the way lazy would when loading plugins: resolve
+-- opts, run config functions and queue `import` namespaces
+process_lazy_spec = function(spec)
+    if type(spec) == "string" then
+        -- lazy.setup("plugins") imports a module namespace
+        record_import(spec)
+        return
+    end
+    if type(spec) ~= "table" or stubs[spec] then return end
+
+    if type(spec.import) == "string" then
+        record_import(spec.import)
+        return
+    end
+
+    -- A list of specs
+    if type(spec[1]) ~= "string" and spec.name == nil and spec.url == nil and spec.dir == nil then
+        for _, item in ipairs(spec) do
+            if type(item) == "table" then process_lazy_spec(item) end
+        end
+        return
+    end
+
+    if spec.enabled == false or spec.cond == false then return end
+
+    local short = plugin_short_name(spec)
+    local deps = spec.dependencies
+    if type(deps) == "table" then
+        for _, dep in ipairs(deps) do
+            if type(dep) == "table" then process_lazy_spec(dep) end
+        end
+    end
+
+    local plugin = { name = short }
+    local opts = spec.opts
+    if type(opts) == "function" then
+        local defaults = { servers = {}, ensure_installed = {} }
+        local ok, returned = sandbox_pcall(opts, plugin, defaults)
+        if not ok then
+            warn(returned)
+            opts = nil
+        else
+            opts = type(returned) == "table" and returned or defaults
+        end
+    end
+    if type(opts) ~= "table" then opts = nil end
+    plugin.opts = opts
+
+    if short == "nvim-lspconfig" and opts and type(opts.servers) == "table" then
+        -- LazyVim style: opts.servers = { name = { settings = ... } }
+        -- Table order is unspecified, so record servers by name
+        local names = {}
+        for server in pairs(opts.servers) do
+            if type(server) == "string" then table.insert(names, server) end
+        end
+        table.sort(names)
+        for _, server in ipairs(names) do
+            local config = opts.servers[server]
+            if type(config) == "table" and config.enabled ~= false then
+                record_ensure(server)
+                record_server(server, config)
+            elseif config == true then
+                record_ensure(server)
+                record_server(server, {})
+            end
+        end
+    end
+
+    if type(spec.config) == "function" then
+        local ok, err = sandbox_pcall(spec.config, plugin, opts or {})
+        if not ok then warn(err) end
+    elseif opts and short:match("^mason%-lspconfig") then
+        -- lazy calls require(main).setup(opts) when there is no config function
+        mason_lspconfig_setup(opts)
     end
-    -- Try to load normally, but don't fail
-    local ok, result = pcall(original_require, module_name)
-    if ok then return result end
-    -- Return empty table as fallback
-    return {}
 end
 
--- Main function
-local function main()
-    local config_path = arg[1]
-    if not config_path then
-        io.stderr:write("Usage: lua parse-lua-config.lua <config-path>\n")
-        os.exit(1)
+local function read_file(path)
+    local f = io.open(path, "rb")
+    if not f then return nil end
+    local content = f:read("*a")
+    f:close()
+    return content
+end
+
+-- Config and module files read during evaluation, for --deps-out
+local dependencies, dependency_seen = {}, {}
+
+local function note_dependency(path)
+    if not dependency_seen[path] then
+        dependency_seen[path] = true
+        table.insert(dependencies, path)
     end
+end
 
-    -- Check file exists
-    local f = io.open(config_path, "r")
+-- Compile Lua source with `env` as its globals (text chunks only)
+local function load_in_env(source, chunkname, env)
+    if setfenv then
+        if source:byte(1) == 27 then
+            return nil, "attempt to load a binary chunk"
+        end
+        local chunk, err = loadstring(source, chunkname)
+        if chunk then setfenv(chunk, env) end
+        return chunk, err
+    end
+    return load(source, chunkname, "t", env)
+end
+
+local function search_module(name)
+    if package.searchpath then
+        return package.searchpath(name, package.path)
+    end
+    local fname = name:gsub("%.", "/")
+    for template in package.path:gmatch("[^;]+") do
+        local candidate = template:gsub("%?", fname)
+        local f = io.open(candidate, "r")
+        if f then
+            f:close()
+            return candidate
+        end
+    end
+    return nil
+end
+
+local function copy_table(t)
+    local copy = {}
+    for k, v in pairs(t) do copy[k] = v end
+    return copy
+end
+
+-- Content hash for the import cache. Pure arithmetic (two polynomial
+-- hashes modulo large primes) so it runs unchanged on Lua 5.1-5.4/LuaJIT.
+local function hash_content(s)
+    local h1, h2 = 5381, 52711
+    for i = 1, #s do
+        local b = s:byte(i)
+        h1 = (h1 * 33 + b) % 4294967291
+        h2 = (h2 * 31 + b) % 4294967279
+    end
+    return string.format("%08x%08x-%x", h1, h2, #s)
+end
+
+local function shell_quote(s)
+    return "'" .. s:gsub("'", "'\\''") .. "'"
+end
+
+-- Serialize plain data as a Lua expression (used for the cache file)
+local function serialize_lua(value)
+    local t = type(value)
+    if t == "string" then
+        return string.format("%q", value)
+    elseif t == "number" then
+        if value ~= value then return "(0/0)" end
+        if value == math.huge then return "(1/0)" end
+        if value == -math.huge then return "(-1/0)" end
+        if math.floor(value) == value and math.abs(value) < 2^53 then
+            return string.format("%d", value)
+        end
+        return string.format("%.17g", value)
+    elseif t == "boolean" then
+        return tostring(value)
+    elseif t == "table" then
+        local keys = {}
+        for k in pairs(value) do
+            if type(k) == "string" or type(k) == "number" then
+                table.insert(keys, k)
+            end
+        end
+        table.sort(keys, function(a, b)
+            if type(a) == type(b) then return a < b end
+            return type(a) == "number"
+        end)
+        local items = {}
+        for _, k in ipairs(keys) do
+            local v = serialize_lua(value[k])
+            if v ~= "nil" then
+                table.insert(items, "[" .. serialize_lua(k) .. "]=" .. v)
+            end
+        end
+        return "{" .. table.concat(items, ",") .. "}"
+    end
+    return "nil"
+end
+
+-- Build the restricted global environment configs are evaluated in.
+-- No io, debug, load or os.execute; require only resolves the mocks above
+-- and modules named in `allowed_modules`, everything else is an inert stub.
+--
+-- options.config_dir overrides vim.fn.stdpath("config"),
+-- options.resolve_module(name) -> found, value serves config-tree modules
+-- and options.stub_unknown returns stubs instead of empty tables.
+local function create_sandbox(allowed_modules, options)
+    options = options or {}
+    local env = {
+        assert = assert,
+        error = error,
+        -- The string metatable is shared with the parser itself
+        getmetatable = function(value)
+            if type(value) == "string" then return nil end
+            return getmetatable(value)
+        end,
+        ipairs = ipairs,
+        next = next,
+        pairs = pairs,
+        pcall = sandbox_pcall,
+        rawequal = rawequal,
+        rawget = rawget,
+        rawlen = rawlen,
+        rawset = rawset,
+        select = select,
+        -- A finalizer would run after the budget is lifted (or at exit)
+        setmetatable = function(t, mt)
+            if type(mt) == "table" and rawget(mt, "__gc") ~= nil then
+                error("__gc metamethods are not allowed in configs", 2)
+            end
+            return setmetatable(t, mt)
+        end,
+        tonumber = tonumber,
+        tostring = tostring,
+        type = type,
+        unpack = unpack,
+        xpcall = sandbox_xpcall,
+        _VERSION = _VERSION,
+        math = copy_table(math),
+        table = copy_table(table),
+        string = copy_table(string),
+        os = {
+            clock = os.clock,
+            date = os.date,
+            difftime = os.difftime,
+            getenv = os.getenv,
+            time = os.time,
+        },
+        -- stdout carries the JSON result, so config output goes to stderr
+        print = function(...)
+            local parts = {}
+            for i = 1, select("#", ...) do
+                parts[i] = tostring((select(i, ...)))
+            end
+            io.stderr:write(table.concat(parts, "\t") .. "\n")
+        end,
+    }
+    env._G = env
+    env.string.dump = nil
+
+    -- A single string.rep call can allocate far past the memory ceiling
+    -- between two hook invocations, so check its size up front
+    local string_rep = string.rep
+    env.string.rep = function(s, n, sep)
+        local size = (#tostring(s) + #tostring(sep or "")) * (tonumber(n) or 0)
+        if collectgarbage("count") + size / 1024 > budget.max_memory_kb then
+            budget.exceeded = budget.exceeded
+                or string.format("memory limit of %d KB exceeded", budget.max_memory_kb)
+            error("sandbox budget exceeded: " .. budget.exceeded, 0)
+        end
+        return string_rep(s, n, sep)
+    end
+
+    env.vim = create_vim_mock(options.config_dir)
+
+    local loaded = {}
+    env.require = function(name)
+        if mock_modules[name] then
+            return mock_modules[name]
+        end
+        if loaded[name] ~= nil then
+            return loaded[name]
+        end
+        if options.resolve_module then
+            local found, value = options.resolve_module(name)
+            if found then return value end
+        end
+        if not allowed_modules[name] then
+            loaded[name] = options.stub_unknown and create_stub() or {}
+            return loaded[name]
+        end
+        local path = search_module(name)
+        local source = path and read_file(path)
+        if not source then
+            error("module '" .. name .. "' not found on package.path", 2)
+        end
+        note_dependency(path)
+        local chunk, err = load_in_env(source, "@" .. path, env)
+        if not chunk then error(err, 0) end
+        local result = chunk(name, path)
+        if result == nil then result = true end
+        loaded[name] = result
+        return result
+    end
+
+    return env
+end
+
+-- Call fn under the instruction/memory budget.
+-- Returns ok, result like pcall; budget overruns always report as failures.
+local function run_sandboxed(env, fn, ...)
+    -- Count hooks don't fire inside compiled traces
+    if jit then jit.off() end
+
+    -- Method calls on strings ("x"):rep(n) go through the shared metatable
+    local string_mt = debug.getmetatable("")
+    local string_index = string_mt.__index
+    string_mt.__index = env.string
+
+    debug.sethook(budget_hook, "", HOOK_INTERVAL)
+    local ok, result = pcall(fn, ...)
+    if not ok and type(result) ~= "string" and type(result) ~= "number" then
+        -- An error object's __tostring is config code too
+        local ok_string, message = pcall(tostring, result)
+        result = ok_string and type(message) == "string" and message
+            or "(error object is a " .. type(result) .. " value)"
+    end
+    debug.sethook()
+
+    string_mt.__index = string_index
+    check_memory()
+
+    if budget.exceeded then
+        return false, "sandbox budget exceeded: " .. budget.exceeded
+    end
+    return ok, result
+end
+
+-- Import mode: evaluate a whole Neovim config tree (init.lua plus
+-- lua/**/*.lua, including lazy.nvim spec imports) and collect what the
+-- lspconfig / vim.lsp / mason-lspconfig mocks recorded.
+--
+-- Every module's record is cached by content hash together with the
+-- hashes of the tree modules it required, so a re-import only evaluates
+-- files that changed (or whose dependencies changed).
+local CACHE_VERSION = 1
+local ENTRY_MODULE = ""
+
+local function default_cache_path(root)
+    local base = os.getenv("XDG_CACHE_HOME")
+    if not base or base == "" then
+        base = (os.getenv("HOME") or ".") .. "/.cache"
+    end
+    return base .. "/lspctl/nvim-import-" .. hash_content(root) .. ".lua"
+end
+
+local function empty_cache()
+    return { version = CACHE_VERSION, files = {} }
+end
+
+local function load_cache_file(path)
+    local source = path and read_file(path)
+    if not source then return empty_cache() end
+    local chunk = load_in_env(source, "=import-cache", {})
+    if not chunk then return empty_cache() end
+    local ok, cache = pcall(chunk)
+    if not ok or type(cache) ~= "table" or cache.version ~= CACHE_VERSION
+        or type(cache.files) ~= "table" then
+        return empty_cache()
+    end
+    return cache
+end
+
+local function save_cache_file(path, cache)
+    local dir = path:match("^(.*)/[^/]*$")
+    if dir and dir ~= "" then
+        os.execute("mkdir -p " .. shell_quote(dir))
+    end
+    -- Write then rename so a concurrent import never reads a torn file
+    local tmp = path .. ".tmp"
+    local f = io.open(tmp, "w")
     if not f then
-        io.stderr:write("Error: Cannot open file: " .. config_path .. "\n")
-        os.exit(1)
+        io.stderr:write("Warning: Cannot write cache: " .. path .. "\n")
+        return
     end
+    f:write("return " .. serialize_lua(cache) .. "\n")
     f:close()
+    os.rename(tmp, path)
+end
 
-    -- Set up mocks
-    _G.vim = create_vim_mock()
-    _G.require = mock_require
+-- Map module names to files relative to root: the entry init.lua plus
+-- everything under lua/ (foo.lua wins over foo/init.lua, as with package.path)
+local function index_config_tree(root)
+    local index = {}
+    local f = io.open(root .. "/init.lua", "r")
+    if f then
+        f:close()
+        index[ENTRY_MODULE] = "init.lua"
+    end
+    local pipe = io.popen("find -L " .. shell_quote(root .. "/lua")
+        .. " -type f -name '*.lua' 2>/dev/null")
+    if pipe then
+        for path in pipe:lines() do
+            local rel = path:sub(#root + 2)
+            local name = rel:sub(5):gsub("%.lua$", ""):gsub("/init$", ""):gsub("/", ".")
+            if not index[name] or not rel:find("/init%.lua$") then
+                index[name] = rel
+            end
+        end
+        pipe:close()
+    end
+    return index
+end
 
-    -- Load config
-    local ok, config = pcall(dofile, config_path)
-    if not ok then
-        io.stderr:write("Error loading config: " .. tostring(config) .. "\n")
-        os.exit(1)
+-- Modules a lazy.nvim `import` pulls in: the namespace module itself and
+-- its direct children
+local function namespace_modules(index, namespace)
+    local names = {}
+    local prefix = namespace .. "."
+    for name in pairs(index) do
+        if name == namespace or (name:sub(1, #prefix) == prefix
+            and not name:find(".", #prefix + 1, true)) then
+            table.insert(names, name)
+        end
     end
+    table.sort(names)
+    return names
+end
 
-    -- Validate config structure
-    if type(config) ~= "table" then
-        io.stderr:write("Error: Config must return a table\n")
-        os.exit(1)
+local function sorted_keys(t)
+    local keys = {}
+    for k in pairs(t) do table.insert(keys, k) end
+    table.sort(keys)
+    return keys
+end
+
+local function import_nvim_config(root, opts)
+    local index = index_config_tree(root)
+    if not index[ENTRY_MODULE] then
+        return nil, "No init.lua found in " .. root
     end
 
-    -- Extract LSP-relevant configuration
+    local cache_path = not opts.no_cache and (opts.cache_path or default_cache_path(root)) or nil
+    local cache = load_cache_file(cache_path)
+    local stats = { evaluated = 0, cached = 0 }
+    local modules = {}
+    local order = {}
+    local env
+
+    local function module_info(name)
+        if modules[name] then return modules[name] end
+        local rel = index[name]
+        if not rel then return nil end
+        local source = read_file(root .. "/" .. rel) or ""
+        note_dependency(root .. "/" .. rel)
+        modules[name] = { name = name, path = rel, source = source, hash = hash_content(source) }
+        return modules[name]
+    end
+
+    local function mark_visited(m)
+        if not m.visited then
+            m.visited = true
+            table.insert(order, m)
+        end
+    end
+
+    local function load_module(m)
+        if m.loaded then return m.value end
+        -- Set before evaluating so require cycles see a value instead of looping
+        m.loaded = true
+        m.value = true
+        local frame = { path = m.path, record = new_record() }
+        -- A module already satisfied from the cache keeps its cached record
+        m.record = m.record or frame.record
+        table.insert(recorder.stack, frame)
+        local chunk, err = load_in_env(m.source, "@" .. root .. "/" .. m.path, env)
+        local ok, value = false, err
+        if chunk then
+            ok, value = sandbox_pcall(chunk, m.name)
+        end
+        table.remove(recorder.stack)
+        stats.evaluated = stats.evaluated + 1
+        if not ok then
+            frame.record.failed = true
+            error(value, 0)
+        end
+        if value ~= nil then m.value = value end
+        return m.value
+    end
+
+    local function resolve_module(name)
+        local m = name ~= ENTRY_MODULE and module_info(name)
+        if not m then return false end
+        mark_visited(m)
+        local value = load_module(m)
+        local parent = current_frame()
+        if parent then
+            parent.record.deps[name] = m.hash
+            for dep, hash in pairs(m.record.deps) do
+                parent.record.deps[dep] = hash
+            end
+        end
+        return true, value
+    end
+
+    local function deps_valid(deps)
+        for dep, hash in pairs(deps) do
+            local m = module_info(dep)
+            if not m or m.hash ~= hash then return false end
+        end
+        return true
+    end
+
+    local queue, queued = {}, {}
+    local function enqueue(name, as_spec)
+        local key = name .. (as_spec and "\0spec" or "")
+        if not queued[key] then
+            queued[key] = true
+            table.insert(queue, { name = name, spec = as_spec })
+        end
+    end
+
+    local function enqueue_record(record)
+        for _, dep in ipairs(sorted_keys(record.deps)) do
+            enqueue(dep, false)
+        end
+        for _, namespace in ipairs(record.imports) do
+            for _, name in ipairs(namespace_modules(index, namespace)) do
+                enqueue(name, true)
+            end
+        end
+    end
+
+    local function visit(item)
+        local m = module_info(item.name)
+        if not m then return true end
+        mark_visited(m)
+
+        -- Already evaluated (e.g. via require) or restored in a role that
+        -- covers this one: a spec record includes the module's top level
+        if m.record and (m.record.spec or not item.spec) then
+            enqueue_record(m.record)
+            return true
+        end
+
+        local cached = cache.files[m.path]
+        if not m.loaded and not m.record and type(cached) == "table"
+            and cached.hash == m.hash and (cached.spec or not item.spec)
+            and deps_valid(cached.deps or {}) then
+            m.record = {
+                ensure_installed = cached.ensure_installed or {},
+                servers = cached.servers or {},
+                imports = cached.imports or {},
+                deps = cached.deps or {},
+                mason = cached.mason or {},
+                spec = cached.spec,
+            }
+            for _, name in ipairs(m.record.mason) do
+                if not contains(mason_servers, name) then
+                    table.insert(mason_servers, name)
+                end
+            end
+            stats.cached = stats.cached + 1
+            enqueue_record(m.record)
+            return true
+        end
+
+        local ok, err = run_sandboxed(env, function()
+            local value = load_module(m)
+            if item.spec and not m.record.spec then
+                m.record.spec = true
+                table.insert(recorder.stack, { path = m.path, record = m.record })
+                local spec_ok, spec_err = sandbox_pcall(process_lazy_spec, value)
+                table.remove(recorder.stack)
+                if not spec_ok then error(spec_err, 0) end
+            end
+        end)
+        if not ok then
+            if budget.exceeded then return false, err end
+            io.stderr:write("Warning: skipping " .. m.path .. ": " .. tostring(err) .. "\n")
+            if m.record then m.record.failed = true end
+        end
+        if m.record then enqueue_record(m.record) end
+        return true
+    end
+
+    env = create_sandbox(opts.allowed_modules, {
+        config_dir = root,
+        resolve_module = resolve_module,
+        stub_unknown = true,
+    })
+
+    enqueue(ENTRY_MODULE, false)
+    local i = 1
+    while queue[i] do
+        local ok, err = visit(queue[i])
+        if not ok then return nil, err end
+        i = i + 1
+    end
+
+    local result = { ensure_installed = {}, servers = {} }
+    local new_cache = empty_cache()
+    local records = {}
+    for _, m in ipairs(order) do
+        if m.record then
+            table.insert(records, m.record)
+            if not m.record.failed then
+                new_cache.files[m.path] = {
+                    hash = m.hash,
+                    spec = m.record.spec or false,
+                    deps = m.record.deps,
+                    imports = m.record.imports,
+                    ensure_installed = m.record.ensure_installed,
+                    servers = m.record.servers,
+                    mason = m.record.mason,
+                }
+            end
+        end
+    end
+    table.insert(records, recorder.default)
+
+    for _, record in ipairs(records) do
+        for _, server in ipairs(record.ensure_installed) do
+            if not contains(result.ensure_installed, server) then
+                table.insert(result.ensure_installed, server)
+            end
+        end
+        for _, server in ipairs(sorted_keys(record.servers)) do
+            result.servers[server] = deep_merge(result.servers[server] or {},
+                copy_data(record.servers[server]))
+        end
+    end
+
+    if cache_path then
+        save_cache_file(cache_path, new_cache)
+    end
+    io.stderr:write(string.format("Imported %d modules from %s (%d evaluated, %d cached)\n",
+        #order, root, stats.evaluated, stats.cached))
+    return result
+end
+
+local USAGE = "Usage: lua parse-lua-config.lua [--max-instructions N] [--max-memory-kb N]"
+    .. " [--allow-module NAME]... <config-path>\n"
+    .. "       lua parse-lua-config.lua --layer NAME=PATH... [--cache FILE | --no-cache]\n"
+    .. "       lua parse-lua-config.lua --import-nvim [--cache FILE | --no-cache] [<nvim-config-dir>]\n"
+    .. "       lua parse-lua-config.lua --batch [--layer NAME=TEMPLATE]... <arg>...\n"
+    .. "Any form also accepts --deps-out FILE.\n"
+
+local function usage_error(message)
+    if message then
+        io.stderr:write("Error: " .. message .. "\n")
+    end
+    io.stderr:write(USAGE)
+    os.exit(1)
+end
+
+local function parse_args(argv)
+    local opts = {
+        allowed_modules = {},
+        layers = {},
+        paths = {},
+        max_instructions = DEFAULT_MAX_INSTRUCTIONS,
+        max_memory_kb = DEFAULT_MAX_MEMORY_KB,
+    }
+    local i = 1
+    while i <= #argv do
+        local a = argv[i]
+        if a == "--max-instructions" or a == "--max-memory-kb" then
+            local n = tonumber(argv[i + 1])
+            if not n or n <= 0 then
+                usage_error(a .. " requires a positive number")
+            end
+            if a == "--max-instructions" then
+                opts.max_instructions = n
+            else
+                opts.max_memory_kb = n
+            end
+            i = i + 2
+        elseif a == "--allow-module" then
+            if not argv[i + 1] then
+                usage_error("--allow-module requires a module name")
+            end
+            opts.allowed_modules[argv[i + 1]] = true
+            i = i + 2
+        elseif a == "--layer" then
+            local name, path = (argv[i + 1] or ""):match("^([%w_-]+)=(.+)$")
+            if not name then
+                usage_error("--layer requires NAME=PATH")
+            end
+            table.insert(opts.layers, { name = name, path = path })
+            i = i + 2
+        elseif a == "--import-nvim" then
+            opts.import_nvim = true
+            i = i + 1
+        elseif a == "--batch" then
+            opts.batch = true
+            i = i + 1
+        elseif a == "--cache" then
+            if not argv[i + 1] then
+                usage_error("--cache requires a file path")
+            end
+            opts.cache_path = argv[i + 1]
+            i = i + 2
+        elseif a == "--no-cache" then
+            opts.no_cache = true
+            i = i + 1
+        elseif a == "--deps-out" then
+            if not argv[i + 1] then
+                usage_error("--deps-out requires a file path")
+            end
+            opts.deps_out = argv[i + 1]
+            i = i + 2
+        elseif a:sub(1, 2) == "--" then
+            usage_error("Unknown option: " .. a)
+        else
+            opts.config_path = a
+            table.insert(opts.paths, a)
+            i = i + 1
+        end
+    end
+    return opts
+end
+
+local function default_nvim_config_dir()
+    local base = os.getenv("XDG_CONFIG_HOME")
+    if not base or base == "" then
+        base = (os.getenv("HOME") or ".") .. "/.config"
+    end
+    return base .. "/" .. (os.getenv("NVIM_APPNAME") or "nvim")
+end
+
+local function with_cost(message)
+    if budget.exceeded then
+        message = message .. " (" .. budget_cost() .. ")"
+    end
+    return message
+end
+
+-- Extract the LSP-relevant part of an evaluated lsp-config.lua.
+-- Runs under the budget and reads the config raw (see copy_data), so
+-- the result is plain data the parser can walk safely.
+local function extract_lsp_config(config)
     local result = {
         ensure_installed = {},
         servers = {}
     }
 
     -- Handle ensure_installed
-    if type(config.ensure_installed) == "table" then
-        for _, server in ipairs(config.ensure_installed) do
+    local ensure_installed = rawget(config, "ensure_installed")
+    if type(ensure_installed) == "table" then
+        local i = 1
+        while rawget(ensure_installed, i) ~= nil do
+            local server = rawget(ensure_installed, i)
             if type(server) == "string" then
                 table.insert(result.ensure_installed, server)
             end
+            i = i + 1
         end
     end
 
     -- Handle servers configuration
-    if type(config.servers) == "table" then
-        for server_name, server_config in pairs(config.servers) do
+    local servers = rawget(config, "servers")
+    if type(servers) == "table" then
+        for server_name, server_config in next, servers do
             if type(server_name) == "string" and type(server_config) == "table" then
-                result.servers[server_name] = server_config
+                result.servers[server_name] = copy_data(server_config)
+            end
+        end
+    end
+
+    return result
+end
+
+-- Evaluate one lsp-config.lua in a fresh sandbox.
+-- Returns the extracted config, or nil and an error message.
+local function evaluate_config(config_path, source, allowed_modules)
+    local env = create_sandbox(allowed_modules)
+    local chunk, err = load_in_env(source, "@" .. config_path, env)
+    if not chunk then
+        return nil, "Error loading config: " .. tostring(err)
+    end
+
+    local ok, config = run_sandboxed(env, function()
+        local value = chunk()
+        -- Validate config structure
+        if type(value) ~= "table" then return nil end
+        return extract_lsp_config(value)
+    end)
+    if not ok then
+        return nil, with_cost("Error loading config: " .. config)
+    end
+    if config == nil then
+        return nil, "Error: Config must return a table"
+    end
+
+    return config
+end
+
+-- Layered mode: user, project and local configs merged in one pass.
+-- ensure_installed is a union in layer order; servers are deep-merged with
+-- later layers winning. Lists (e.g. diagnostics.globals) are replaced, not
+-- merged. `sources` records the layer each value came from.
+local function is_list(t)
+    if type(t) ~= "table" or next(t) == nil then return false end
+    local n = 0
+    for _ in pairs(t) do n = n + 1 end
+    return n == #t
+end
+
+local function merge_layer(dst, src, layer, sources, prefix)
+    for _, k in ipairs(sorted_keys(src)) do
+        local v = src[k]
+        local path = prefix == "" and tostring(k) or (prefix .. "." .. tostring(k))
+        if type(v) == "table" and not is_list(v) then
+            if type(dst[k]) ~= "table" or is_list(dst[k]) then
+                dst[k] = {}
+            end
+            -- Drop provenance of any leaf the table now replaces
+            sources[path] = nil
+            merge_layer(dst[k], v, layer, sources, path)
+        else
+            if type(dst[k]) == "table" then
+                -- A leaf replaces a whole subtree: forget its provenance
+                for key in pairs(sources) do
+                    if key:sub(1, #path + 1) == path .. "." then sources[key] = nil end
+                end
+            end
+            dst[k] = copy_data(v)
+            sources[path] = layer
+        end
+    end
+end
+
+local function layered_cache_path(layers)
+    local base = os.getenv("XDG_CACHE_HOME")
+    if not base or base == "" then
+        base = (os.getenv("HOME") or ".") .. "/.cache"
+    end
+    local paths = {}
+    for _, layer in ipairs(layers) do
+        table.insert(paths, layer.name .. "=" .. layer.path)
+    end
+    return base .. "/lspctl/layered-" .. hash_content(table.concat(paths, "\0")) .. ".lua"
+end
+
+local function parse_layered(opts)
+    local layers = {}
+    local key_parts = {}
+    for _, layer in ipairs(opts.layers) do
+        local source = read_file(layer.path)
+        -- Layers without a file (e.g. no lsp-config.local.lua) are skipped
+        if source then
+            note_dependency(layer.path)
+            local entry = { name = layer.name, path = layer.path, hash = hash_content(source) }
+            entry.source = source
+            table.insert(layers, entry)
+            table.insert(key_parts, entry.name .. "=" .. entry.path .. "=" .. entry.hash)
+        end
+    end
+    if #layers == 0 then
+        return nil, "Error: Cannot open file: none of the config layers exist"
+    end
+
+    -- Allowlisted modules aren't part of the key, so don't cache with them
+    local cache_path = nil
+    if not opts.no_cache and next(opts.allowed_modules) == nil then
+        cache_path = opts.cache_path or layered_cache_path(opts.layers)
+    end
+    local cache_key = hash_content(table.concat(key_parts, "\0"))
+    if cache_path then
+        local cached = load_cache_file(cache_path)
+        if cached.key == cache_key and type(cached.json) == "string" then
+            io.stderr:write("Layered config served from cache (" .. cache_path .. ")\n")
+            return cached.json
+        end
+    end
+
+    local result = {
+        ensure_installed = {},
+        servers = {},
+        sources = { ensure_installed = {}, servers = {} },
+        layers = {},
+    }
+    for _, layer in ipairs(layers) do
+        local config, err = evaluate_config(layer.path, layer.source, opts.allowed_modules)
+        if not config then
+            return nil, err .. " [" .. layer.name .. " layer: " .. layer.path .. "]"
+        end
+        for _, server in ipairs(config.ensure_installed) do
+            if not contains(result.ensure_installed, server) then
+                table.insert(result.ensure_installed, server)
+                result.sources.ensure_installed[server] = layer.name
+            end
+        end
+        for _, server in ipairs(sorted_keys(config.servers)) do
+            result.servers[server] = result.servers[server] or {}
+            result.sources.servers[server] = result.sources.servers[server] or {}
+            merge_layer(result.servers[server], config.servers[server], layer.name,
+                result.sources.servers[server], "")
+        end
+        table.insert(result.layers, { name = layer.name, path = layer.path, hash = layer.hash })
+    end
+
+    local json = encode_json(result)
+    io.stderr:write(string.format("Merged %d config layers\n", #layers))
+    if cache_path then
+        save_cache_file(cache_path, {
+            version = CACHE_VERSION,
+            files = {},
+            key = cache_key,
+            json = json,
+        })
+    end
+    return json
+end
+
+-- --batch with --layer: each layer path is a template in which {} stands
+-- for the batch argument, e.g. project={}/.claude/lsp-config.lua
+local function batch_layers(layers, arg)
+    local expanded = {}
+    for _, layer in ipairs(layers) do
+        local path = layer.path:gsub("{}", function() return arg end)
+        table.insert(expanded, { name = layer.name, path = path })
+    end
+    return expanded
+end
+
+-- Main function
+local function write_dependencies(path)
+    if not path then return end
+    local f = io.open(path, "w")
+    if not f then
+        io.stderr:write("Warning: Cannot write " .. path .. "\n")
+        return
+    end
+    for _, dep in ipairs(dependencies) do
+        f:write(dep, "\n")
+    end
+    f:close()
+end
+
+local function main()
+    local opts = parse_args(arg)
+    budget.max_instructions = opts.max_instructions
+    budget.max_memory_kb = opts.max_memory_kb
+
+    if opts.import_nvim then
+        local root = (opts.config_path or default_nvim_config_dir()):gsub("/+$", "")
+        local result, err = import_nvim_config(root, opts)
+        if not result then
+            io.stderr:write(with_cost("Error importing config: " .. tostring(err)) .. "\n")
+            os.exit(1)
+        end
+        write_dependencies(opts.deps_out)
+        print(encode_json(result))
+        return
+    end
+
+    if opts.batch then
+        -- Entries are emitted as JSON text, since a layered result
+        -- (possibly from the cache) already is
+        local entries = {}
+        for _, path in ipairs(opts.paths) do
+            reset_budget()
+            local json, err
+            if #opts.layers > 0 then
+                json, err = parse_layered({
+                    layers = batch_layers(opts.layers, path),
+                    allowed_modules = opts.allowed_modules,
+                    no_cache = opts.no_cache,
+                })
+            else
+                local source = read_file(path)
+                if source then
+                    note_dependency(path)
+                    local result
+                    result, err = evaluate_config(path, source, opts.allowed_modules)
+                    json = result and encode_json(result)
+                else
+                    err = "Error: Cannot open file: " .. path
+                end
             end
+            local fields = {}
+            if json then
+                table.insert(fields, '"config": ' .. json)
+            else
+                table.insert(fields, '"error": ' .. encode_json(err))
+            end
+            table.insert(fields, '"cpu_ms": ' .. encode_json((os.clock() - budget.started) * 1000))
+            table.insert(entries, encode_json(path) .. ": {" .. table.concat(fields, ", ") .. "}")
+        end
+        write_dependencies(opts.deps_out)
+        print("{" .. table.concat(entries, ",\n") .. "}")
+        return
+    end
+
+    if #opts.layers > 0 then
+        local json, err = parse_layered(opts)
+        if not json then
+            io.stderr:write(err .. "\n")
+            os.exit(1)
         end
+        write_dependencies(opts.deps_out)
+        print(json)
+        return
+    end
+
+    local config_path = opts.config_path
+    if not config_path then
+        usage_error()
+    end
+
+    -- Check file exists
+    local source = read_file(config_path)
+    if not source then
+        io.stderr:write("Error: Cannot open file: " .. config_path .. "\n")
+        os.exit(1)
+    end
+    note_dependency(config_path)
+
+    local result, err = evaluate_config(config_path, source, opts.allowed_modules)
+    if not result then
+        io.stderr:write(err .. "\n")
+        os.exit(1)
     end
 
     -- Output JSON
+    write_dependencies(opts.deps_out)
     print(encode_json(result))
 end
 
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Install or uninstall generated LSP plugins through the Claude CLI.
+
+Runs `claude plugin install|uninstall <plugin>@generated-lsp` for many
+plugins with per-call timeouts and retries of transient failures, then
+prints one report. The calls run one at a time under the locks of the
+settings.json and installed_plugins.json they rewrite (see
+lspctl_plugins). Outcomes are also recorded in the lspctl state store's
+history.
+
+Usage:
+    python3 plugin-ops.py install lsp-lua lsp-python-pylsp
+    python3 plugin-ops.py install --from-marketplace <marketplace-dir>
+    python3 plugin-ops.py uninstall --from-marketplace <marketplace-dir> --json-output
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+from lspctl_plugins import MARKETPLACE_NAME, PluginOp, run_plugin_ops
+from lspctl_state import StateStore
+
+
+def marketplace_plugins(marketplace_dir: Path) -> list[str]:
+    """List plugin names from a generated marketplace."""
+    with open(marketplace_dir / ".claude-plugin" / "marketplace.json") as f:
+        return [plugin["name"] for plugin in json.load(f).get("plugins", [])]
+
+
+def record_report(
+    state_path: Path | None,
+    report: dict,
+    marketplace_dir: Path | None
+) -> None:
+    """Append each plugin outcome to the state store's history."""
+    try:
+        with StateStore(state_path) as state:
+            for result in report["results"]:
+                state.record_event(
+                    f"plugin-{result['action']}",
+                    result["status"],
+                    marketplace=marketplace_dir,
+                    duration_ms=result["duration_ms"],
+                    detail=result["plugin"]
+                )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: Could not record history ({e})", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Install or uninstall generated LSP plugins"
+    )
+    parser.add_argument(
+        "action",
+        choices=["install", "uninstall"],
+        help="Claude CLI plugin command to run"
+    )
+    parser.add_argument(
+        "plugins",
+        nargs="*",
+        metavar="PLUGIN",
+        help="Plugin names (without @marketplace)"
+    )
+    parser.add_argument(
+        "--from-marketplace",
+        type=Path,
+        metavar="DIR",
+        help="Run for every plugin in a generated marketplace directory"
+    )
+    parser.add_argument(
+        "--marketplace",
+        default=MARKETPLACE_NAME,
+        help=f"Marketplace name (default: {MARKETPLACE_NAME})"
+    )
+    parser.add_argument(
+        "--scope",
+        choices=["user", "project", "local"],
+        help="Passed to the Claude CLI as --scope"
+    )
+    parser.add_argument(
+        "--settings",
+        type=Path,
+        help="Settings file the CLI writes, locked around each call (default: the --scope one)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=120.0,
+        metavar="SECONDS",
+        help="Per-call timeout (default: 120)"
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="Retries for transient failures and timeouts (default: 2)"
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="Initial retry delay, doubled per attempt (default: 1)"
+    )
+    parser.add_argument(
+        "--claude",
+        default="claude",
+        help="Claude CLI executable (default: claude on PATH)"
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        help="State database path (default: $LSPCTL_STATE_DB or ~/.claude/lspctl-state.db)"
+    )
+    parser.add_argument(
+        "--no-state",
+        action="store_true",
+        help="Do not record outcomes in the state store"
+    )
+    parser.add_argument(
+        "--json-output",
+        action="store_true",
+        help="Output result as JSON"
+    )
+    parser.add_argument(
+        "--events",
+        action="store_true",
+        help="Stream install_started/install_finished events as JSON lines, ending with a \"result\" event"
+    )
+
+    args = parser.parse_args()
+
+    plugins = list(args.plugins)
+    if args.from_marketplace:
+        try:
+            plugins.extend(p for p in marketplace_plugins(args.from_marketplace) if p not in plugins)
+        except (OSError, json.JSONDecodeError) as e:
+            parser.error(f"Could not read marketplace: {e}")
+    if not plugins:
+        parser.error("no plugins given (pass names or --from-marketplace)")
+
+    events = None
+    if args.events:
+        from lspctl_marketplace import EventStream
+
+        events = EventStream()
+
+    ops = [
+        PluginOp(action=args.action, plugin=plugin, marketplace=args.marketplace, scope=args.scope)
+        for plugin in plugins
+    ]
+    report = run_plugin_ops(
+        ops,
+        claude=args.claude,
+        timeout=args.timeout,
+        retries=args.retries,
+        backoff=args.backoff,
+        events=events,
+        settings=args.settings
+    )
+    report["action"] = args.action
+
+    if not args.no_state:
+        record_report(args.state, report, args.from_marketplace)
+
+    if events is not None:
+        events("result", result=report)
+    elif args.json_output:
+        print(json.dumps(report, indent=2))
+    else:
+        verb = "Installed" if args.action == "install" else "Uninstalled"
+        for result in report["results"]:
+            attempts = f" after {result['attempts']} attempts" if result["attempts"] > 1 else ""
+            if result["status"] == "ok":
+                print(f"  ok       {result['plugin']}{attempts}")
+            else:
+                print(f"  {result['status']:<8} {result['plugin']}{attempts}")
+                for line in result["output"].strip().splitlines()[-3:]:
+                    print(f"           {line}")
+        summary = report["summary"]
+        print(f"\n{verb} {summary['ok']}/{len(report['results'])} plugins "
+              f"in {report['duration_ms'] / 1000:.1f}s")
+
+    if report["summary"]["ok"] != len(report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -47,6 +47,58 @@ def marketplace_generator(plugin_root) -> Path:
     return plugin_root / "scripts" / "generate-marketplace.py"
 
 
+@pytest.fixture
+def check_binaries_script(plugin_root) -> Path:
+    """Return path to the binary check script."""
+    return plugin_root / "scripts" / "check-binaries.sh"
+
+
+@pytest.fixture
+def plugin_ops_script(plugin_root) -> Path:
+    """Return path to the concurrent plugin install/uninstall script."""
+    return plugin_root / "scripts" / "plugin-ops.py"
+
+
+@pytest.fixture
+def artifact_installer(plugin_root) -> Path:
+    """Return path to the artifact store installer script."""
+    return plugin_root / "scripts" / "install-artifact.py"
+
+
+@pytest.fixture
+def lsp_top_script(plugin_root) -> Path:
+    """Return path to the per-server resource monitor script."""
+    return plugin_root / "scripts" / "lsp-top.py"
+
+
+@pytest.fixture
+def mason_importer(plugin_root) -> Path:
+    """Return path to the Mason registry importer script."""
+    return plugin_root / "scripts" / "import-mason-registry.py"
+
+
+@pytest.fixture
+def mason_snapshot(fixtures_dir) -> Path:
+    """Return path to the Mason registry snapshot fixture."""
+    return fixtures_dir / "mason-registry.json"
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch) -> Path:
+    """Point the lspctl state store at a per-test database."""
+    state_path = tmp_path / "lspctl-state.db"
+    monkeypatch.setenv("LSPCTL_STATE_DB", str(state_path))
+    return state_path
+
+
+@pytest.fixture(autouse=True)
+def isolated_blobs(tmp_path, monkeypatch) -> Path:
+    """Point the shared plugin blob store at a per-test directory."""
+    blob_path = tmp_path / "lspctl-blobs"
+    monkeypatch.setenv("LSPCTL_BLOBS", str(blob_path))
+    return blob_path
+
+
 @pytest.fixture
 def temp_dir():
     """Create a temporary directory for test outputs."""
@@ -85,6 +137,12 @@ def unknown_servers_config(fixtures_dir) -> Path:
     return fixtures_dir / "unknown-servers-config.lua"
 
 
+@pytest.fixture
+def nvim_config_dir(fixtures_dir) -> Path:
+    """Return path to the sample Neovim config tree fixture."""
+    return fixtures_dir / "nvim-config"
+
+
 @pytest.fixture
 def mock_claude_cli(mocker):
     """Mock Claude CLI commands."""
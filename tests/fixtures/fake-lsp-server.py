@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+A minimal language server for launcher and warm-up tests.
+
+Keeps full copies of the documents it is sent (applying incremental
+changes itself, ASCII only) and appends one line per lifecycle event to
+$FAKE_LSP_LOG. With $FAKE_LSP_PROGRESS set, the first didOpen starts an
+"indexing" work-done progress that ends after that many seconds. A
+configuration with {"crash": N} makes it print an error to stderr and exit
+with status N; with $FAKE_LSP_CRASH_MARKER set, the first initialize does
+the same with status 3 and creates that file, so later starts answer.
+Custom requests expose its state:
+
+- fake/state returns {"pid", "documents", "configuration"}
+- fake/diagnose {"uri", "count", "version", "log"} publishes `count`
+  diagnostics sets for the document, numbered from 0, before answering;
+  with `log`, each set follows a window/logMessage of that many bytes
+"""
+
+import json
+import os
+import sys
+import time
+
+
+def read_message():
+    length = None
+    while True:
+        line = sys.stdin.buffer.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    return json.loads(sys.stdin.buffer.read(length))
+
+
+def send(message):
+    body = json.dumps(message).encode()
+    sys.stdout.buffer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    sys.stdout.buffer.flush()
+
+
+def log(event):
+    path = os.environ.get("FAKE_LSP_LOG")
+    if path:
+        with open(path, "a") as f:
+            f.write(f"{os.getpid()} {event}\n")
+
+
+def offset(text, position):
+    lines = text.split("\n")
+    return sum(len(line) + 1 for line in lines[:position["line"]]) + position["character"]
+
+
+def report_progress(seconds):
+    token = f"index-{os.getpid()}"
+    send({"jsonrpc": "2.0", "id": token, "method": "window/workDoneProgress/create",
+          "params": {"token": token}})
+    send({"jsonrpc": "2.0", "method": "$/progress",
+          "params": {"token": token, "value": {"kind": "begin", "title": "indexing"}}})
+    time.sleep(seconds / 2)
+    send({"jsonrpc": "2.0", "method": "$/progress",
+          "params": {"token": token, "value": {"kind": "report", "percentage": 50}}})
+    time.sleep(seconds / 2)
+    send({"jsonrpc": "2.0", "method": "$/progress",
+          "params": {"token": token, "value": {"kind": "end"}}})
+    log("indexed")
+
+
+def main():
+    documents = {}
+    configuration = None
+    log("start")
+    while True:
+        message = read_message()
+        if message is None:
+            log("eof")
+            return
+        method = message.get("method")
+        params = message.get("params") or {}
+
+        if method == "initialize":
+            log("initialize")
+            marker = os.environ.get("FAKE_LSP_CRASH_MARKER")
+            if marker and not os.path.exists(marker):
+                open(marker, "w").close()
+                log("crash")
+                sys.exit(3)
+            send({"jsonrpc": "2.0", "id": message["id"], "result": {
+                "capabilities": {"textDocumentSync": 2},
+                "serverInfo": {"name": "fake", "pid": os.getpid()},
+            }})
+        elif method == "initialized":
+            log("initialized")
+            send({"jsonrpc": "2.0", "id": f"register-{os.getpid()}", "method": "client/registerCapability",
+                  "params": {"registrations": [{"id": "watch", "method": "workspace/didChangeWatchedFiles"}]}})
+        elif method == "workspace/didChangeConfiguration":
+            configuration = params["settings"]
+            if isinstance(configuration, dict) and configuration.get("crash"):
+                sys.stderr.write("fake: bad plugin setting\n")
+                sys.stderr.flush()
+                log("crash")
+                sys.exit(configuration["crash"])
+        elif method == "textDocument/didOpen":
+            document = params["textDocument"]
+            documents[document["uri"]] = {"version": document["version"], "text": document["text"]}
+            log(f"didOpen {document['uri']}")
+            if os.environ.get("FAKE_LSP_PROGRESS") and len(documents) == 1:
+                report_progress(float(os.environ["FAKE_LSP_PROGRESS"]))
+        elif method == "textDocument/didChange":
+            document = documents[params["textDocument"]["uri"]]
+            for change in params["contentChanges"]:
+                if "range" in change:
+                    text = document["text"]
+                    start = offset(text, change["range"]["start"])
+                    end = offset(text, change["range"]["end"])
+                    document["text"] = text[:start] + change["text"] + text[end:]
+                else:
+                    document["text"] = change["text"]
+            document["version"] = params["textDocument"]["version"]
+            send({"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics",
+                  "params": {"uri": params["textDocument"]["uri"], "diagnostics": []}})
+        elif method == "textDocument/didClose":
+            documents.pop(params["textDocument"]["uri"], None)
+        elif method == "fake/state":
+            send({"jsonrpc": "2.0", "id": message["id"], "result": {
+                "pid": os.getpid(), "documents": documents, "configuration": configuration,
+            }})
+        elif method == "fake/diagnose":
+            for number in range(params["count"]):
+                diagnostics = {"uri": params["uri"], "diagnostics": [{
+                    "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 1}},
+                    "message": f"problem {number}",
+                }]}
+                if "version" in params:
+                    diagnostics["version"] = params["version"]
+                if params.get("log"):
+                    send({"jsonrpc": "2.0", "method": "window/logMessage",
+                          "params": {"type": 4, "message": "x" * params["log"]}})
+                send({"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics", "params": diagnostics})
+            send({"jsonrpc": "2.0", "id": message["id"], "result": None})
+        elif method == "shutdown":
+            log("shutdown")
+            send({"jsonrpc": "2.0", "id": message["id"], "result": None})
+        elif method == "exit":
+            log("exit")
+            return
+        elif "id" in message and method:
+            send({"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32601, "message": method}})
+
+
+if __name__ == "__main__":
+    main()
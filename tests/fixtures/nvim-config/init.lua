@@ -0,0 +1,4 @@
+vim.g.mapleader = " "
+require("config.options")
+require("config.lazy")
+require("config.lsp")
@@ -0,0 +1,7 @@
+-- Neovim 0.11 native configuration
+vim.lsp.config("gopls", {
+  settings = {
+    gopls = { staticcheck = true },
+  },
+})
+vim.lsp.enable({ "gopls" })
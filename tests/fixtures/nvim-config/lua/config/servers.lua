@@ -0,0 +1,7 @@
+return {
+  lua_ls = {
+    settings = {
+      Lua = { diagnostics = { globals = { "vim" } } },
+    },
+  },
+}
@@ -0,0 +1,15 @@
+return {
+  "neovim/nvim-lspconfig",
+  dependencies = { "hrsh7th/cmp-nvim-lsp" },
+  opts = {
+    servers = {
+      pyright = {
+        settings = {
+          python = { analysis = { typeCheckingMode = "strict" } },
+        },
+        on_attach = function() end,
+      },
+      bashls = {},
+    },
+  },
+}
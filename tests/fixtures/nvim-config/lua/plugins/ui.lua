@@ -0,0 +1,11 @@
+return {
+  {
+    "nvim-telescope/telescope.nvim",
+    config = function()
+      local telescope = require("telescope")
+      telescope.setup({ defaults = { layout_strategy = "vertical" } })
+      vim.keymap.set("n", "<leader>ff", require("telescope.builtin").find_files)
+    end,
+  },
+  { "folke/tokyonight.nvim", config = function() vim.cmd.colorscheme("tokyonight") end },
+}
@@ -0,0 +1,177 @@
+"""Tests for installing servers from a local artifact store."""
+
+import hashlib
+import io
+import json
+import os
+import subprocess
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+
+def tar_artifact(path: Path, files: dict[str, tuple[bytes, int]]) -> str:
+    """Write a gzipped tarball of {name: (content, mode)}; returns its sha256."""
+    with tarfile.open(path, "w:gz") as tar:
+        for name, (content, mode) in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = mode
+            tar.addfile(info, io.BytesIO(content))
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def zip_artifact(path: Path, files: dict[str, tuple[bytes, int]]) -> str:
+    """Write a zip of {name: (content, mode)}; returns its sha256."""
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, (content, mode) in files.items():
+            info = zipfile.ZipInfo(name)
+            info.external_attr = (0o100000 | mode) << 16
+            zf.writestr(info, content)
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+FAKE_SERVER = b"#!/bin/sh\necho fake-server 1.0\n"
+
+
+@pytest.fixture
+def artifacts(temp_dir) -> Path:
+    """An artifact directory with a tarball and a zip server."""
+    artifact_dir = temp_dir / "artifacts"
+    artifact_dir.mkdir()
+    lua_sha = tar_artifact(artifact_dir / "lua-ls.tar.gz", {
+        "bin/lua-language-server": (FAKE_SERVER, 0o755),
+        "meta/template.lua": (b"-- data\n", 0o644),
+    })
+    pyright_sha = zip_artifact(artifact_dir / "pyright.zip", {
+        "pyright-langserver": (FAKE_SERVER, 0o755),
+    })
+    (artifact_dir / "manifest.json").write_text(json.dumps({"artifacts": [
+        {
+            "server": "lua_ls",
+            "version": "3.7.4",
+            "file": "lua-ls.tar.gz",
+            "sha256": lua_sha,
+            "bin": {"lua-language-server": "bin/lua-language-server"},
+        },
+        {
+            "server": "pyright",
+            "version": "1.1.350",
+            "platform": "plan9-mips",
+            "file": "missing-for-this-platform.zip",
+            "sha256": "0" * 64,
+            "bin": {"pyright-langserver": "pyright-langserver"},
+        },
+        {
+            "server": "pyright",
+            "version": "1.1.350",
+            "file": "pyright.zip",
+            "sha256": pyright_sha,
+            "bin": {"pyright-langserver": "pyright-langserver"},
+        },
+    ]}))
+    return artifact_dir
+
+
+@pytest.fixture
+def install(artifact_installer, temp_dir):
+    """Run install-artifact.py against a per-test store."""
+    store = temp_dir / "store"
+
+    def _install(*args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            ["python3", str(artifact_installer), *args, "--json-output"],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "LSPCTL_STORE": str(store)},
+        )
+
+    _install.store = store
+    return _install
+
+
+class TestArtifactStore:
+    """Tests for verified, content-addressed installs."""
+
+    def test_install_links_commands(self, install, artifacts):
+        """Servers are unpacked into the store and linked into its bin dir."""
+        result = install("install", "lua_ls", "pyright", "--from", str(artifacts))
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout)
+
+        assert [r["server"] for r in report["results"]] == ["lua_ls", "pyright"]
+        assert all(r["unpacked"] for r in report["results"])
+        link = install.store / "bin" / "lua-language-server"
+        assert report["results"][0]["commands"] == {"lua-language-server": str(link)}
+        output = subprocess.run([str(link)], capture_output=True, text=True).stdout
+        assert output == "fake-server 1.0\n"
+        assert os.access(install.store / "bin" / "pyright-langserver", os.X_OK)
+
+        digest = report["results"][0]["digest"]
+        assert link.resolve().is_relative_to(install.store / "objects" / digest)
+
+        listed = json.loads(install("list").stdout)
+        assert sorted(listed) == ["lua_ls", "pyright"]
+        assert listed["lua_ls"]["version"] == "3.7.4"
+
+    def test_reinstall_reuses_unpacked_copy(self, install, artifacts, temp_dir):
+        """An artifact already in the store is not unpacked again."""
+        install("install", "lua_ls", "--from", str(artifacts))
+        other_bin = temp_dir / "other-bin"
+        result = install(
+            "install", "lua_ls", "--from", str(artifacts),
+            "--bin-dir", str(other_bin), "--link", "hardlink",
+        )
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout)["results"][0]
+
+        assert report["unpacked"] is False
+        assert len(list((install.store / "objects").glob("*.files.json"))) == 1
+        linked = other_bin / "lua-language-server"
+        assert not linked.is_symlink()
+        target = install.store / "objects" / report["digest"] / "bin" / "lua-language-server"
+        assert linked.stat().st_ino == target.stat().st_ino
+
+    def test_checksum_mismatch_rejected(self, install, artifacts):
+        """A corrupted archive is refused before anything is unpacked."""
+        with open(artifacts / "lua-ls.tar.gz", "ab") as f:
+            f.write(b"tampered")
+
+        result = install("install", "lua_ls", "pyright", "--from", str(artifacts))
+        assert result.returncode == 1
+        report = json.loads(result.stdout)
+        assert "Checksum mismatch" in report["results"][0]["error"]
+        assert report["results"][1]["error"] is None
+        assert not (install.store / "bin" / "lua-language-server").exists()
+
+    def test_verify_detects_modified_files(self, install, artifacts):
+        """verify re-hashes unpacked trees and reports changes."""
+        install("install", "lua_ls", "--from", str(artifacts))
+        assert install("verify").returncode == 0
+
+        digest = json.loads(install("list").stdout)["lua_ls"]["digest"]
+        data_file = install.store / "objects" / digest / "meta" / "template.lua"
+        data_file.chmod(0o644)
+        data_file.write_text("-- changed\n")
+
+        result = install("verify")
+        assert result.returncode == 1
+        problems = json.loads(result.stdout)["problems"]
+        assert problems == [{"digest": digest, "path": "meta/template.lua", "problem": "modified"}]
+
+    def test_unsafe_archive_paths_rejected(self, install, artifacts):
+        """Archives that would write outside the store are refused."""
+        sha = tar_artifact(artifacts / "evil.tar.gz", {"../escape": (FAKE_SERVER, 0o755)})
+        manifest = json.loads((artifacts / "manifest.json").read_text())
+        manifest["artifacts"].append({
+            "server": "evil", "file": "evil.tar.gz", "sha256": sha, "bin": {"escape": "../escape"},
+        })
+        (artifacts / "manifest.json").write_text(json.dumps(manifest))
+
+        result = install("install", "evil", "--from", str(artifacts))
+        assert result.returncode == 1
+        assert "Unsafe path" in json.loads(result.stdout)["results"][0]["error"]
+        assert not (install.store / "escape").exists()
+        assert not (install.store.parent / "escape").exists()
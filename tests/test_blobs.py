@@ -0,0 +1,104 @@
+"""Tests for plugin files shared across marketplaces through the blob store."""
+
+import json
+import subprocess
+
+import pytest
+
+
+PLUGIN_FILES = (".claude-plugin/plugin.json", ".lsp.json")
+
+
+@pytest.fixture
+def sync(marketplace_generator, registry, temp_dir):
+    """Generate a marketplace into a named scope directory."""
+    registry_file = temp_dir / "registry.json"
+    registry_file.write_text(json.dumps(registry))
+
+    def _sync(scope: str, servers: list[str], *args: str, settings: dict | None = None) -> dict:
+        config_file = temp_dir / f"{scope}-config.json"
+        config_file.write_text(json.dumps({"ensure_installed": servers, "servers": settings or {}}))
+        result = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--config", str(config_file),
+                "--registry", str(registry_file),
+                "--output", str(temp_dir / scope / "marketplace"),
+                "--json-output",
+                *args,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout)
+
+    def _run(*args: str) -> dict:
+        result = subprocess.run(
+            ["python3", str(marketplace_generator), *args, "--json-output"],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout)
+
+    _sync.run = _run
+    _sync.plugin_dir = lambda scope, plugin: temp_dir / scope / "marketplace" / "plugins" / plugin
+    _sync.output = lambda scope: temp_dir / scope / "marketplace"
+    return _sync
+
+
+class TestSharedBlobs:
+    """Identical plugins are stored once and linked into every scope."""
+
+    def test_identical_plugins_share_files(self, sync):
+        """A second scope links the first scope's files instead of writing."""
+        first = sync("user", ["pylsp", "gopls"])
+        second = sync("project", ["gopls", "pylsp"])
+
+        assert first["reused_blobs"] == []
+        assert second["reused_blobs"] == ["lsp-go", "lsp-python-pylsp"]
+        for plugin in ("lsp-go", "lsp-python-pylsp"):
+            for rel_path in PLUGIN_FILES:
+                user_file = sync.plugin_dir("user", plugin) / rel_path
+                project_file = sync.plugin_dir("project", plugin) / rel_path
+                assert user_file.stat().st_ino == project_file.stat().st_ino
+                assert user_file.read_text() == project_file.read_text()
+
+    def test_different_settings_get_own_blob(self, sync, isolated_blobs):
+        """Plugins whose rendered files differ are stored separately."""
+        sync("user", ["pylsp"])
+        result = sync("project", ["pylsp"], settings={"pylsp": {"settings": {"x": 1}}})
+
+        assert result["reused_blobs"] == []
+        user_lsp = sync.plugin_dir("user", "lsp-python-pylsp") / ".lsp.json"
+        project_lsp = sync.plugin_dir("project", "lsp-python-pylsp") / ".lsp.json"
+        assert user_lsp.stat().st_ino != project_lsp.stat().st_ino
+        assert json.loads(project_lsp.read_text())["python"]["settings"] == {"x": 1}
+        assert len([p for p in isolated_blobs.iterdir() if p.is_dir()]) == 2
+
+    def test_gc_drops_unreferenced_blobs(self, sync, isolated_blobs):
+        """GC keeps blobs any scope links to and removes the rest."""
+        sync("user", ["pylsp", "gopls"])
+        sync("project", ["pylsp"])
+
+        sync.run("--output", str(sync.output("user")), "--deregister")
+        kept = sync.run("--gc-blobs")
+        assert kept["kept"] == 1
+        assert len(kept["removed"]) == 1
+        assert (sync.plugin_dir("project", "lsp-python-pylsp") / ".lsp.json").read_text()
+
+        sync.run("--output", str(sync.output("project")), "--deregister")
+        removed = sync.run("--gc-blobs")
+        assert removed["kept"] == 0
+        assert len(removed["removed"]) == 1
+        assert [p for p in isolated_blobs.iterdir() if p.is_dir()] == []
+
+    def test_no_dedup_writes_plain_files(self, sync, isolated_blobs):
+        """--no-dedup leaves the blob store alone."""
+        result = sync("user", ["pylsp"], "--no-dedup")
+
+        assert result["reused_blobs"] == []
+        lsp_json = sync.plugin_dir("user", "lsp-python-pylsp") / ".lsp.json"
+        assert lsp_json.stat().st_nlink == 1
+        assert not isolated_blobs.exists()
@@ -0,0 +1,152 @@
+"""Tests for caches shared across the worktrees and clones of a repository."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+# Prints the cache env and arguments the launcher hands to the server
+SHOW_CACHE = "import json, os, sys; print(json.dumps([os.environ.get('FAKE_CACHE'), sys.argv[1:]]))"
+
+
+def git(*args: str, cwd: Path) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        cwd=cwd, check=True, capture_output=True,
+    )
+
+
+def make_repo(path: Path, content: str) -> Path:
+    path.mkdir(parents=True)
+    git("init", "-q", cwd=path)
+    (path / "README").write_text(content)
+    git("add", "README", cwd=path)
+    git("commit", "-q", "-m", "initial", cwd=path)
+    return path
+
+
+@pytest.fixture
+def repos(temp_dir):
+    """A repository with a worktree and a clone, an unrelated repository and a plain directory."""
+    main = make_repo(temp_dir / "main", "main")
+    git("worktree", "add", "-q", str(temp_dir / "feature"), cwd=main)
+    git("clone", "-q", str(main), str(temp_dir / "clone"), cwd=temp_dir)
+    (temp_dir / "clone" / "more").write_text("x")
+    git("add", "more", cwd=temp_dir / "clone")
+    git("commit", "-q", "-m", "more", cwd=temp_dir / "clone")
+    other = make_repo(temp_dir / "other", "other")
+    plain = temp_dir / "plain"
+    plain.mkdir()
+    return {
+        "main": main,
+        "feature": temp_dir / "feature",
+        "clone": temp_dir / "clone",
+        "other": other,
+        "plain": plain,
+    }
+
+
+def show_cache(plugin_root, root: Path, cwd: Path) -> list:
+    result = subprocess.run(
+        [
+            sys.executable, str(plugin_root / "scripts" / "lsp-launch.py"),
+            "--shared-cache", str(root),
+            "--cache-env", "FAKE_CACHE={cache}/target",
+            "--name", "fake",
+            "--", sys.executable, "-c", SHOW_CACHE, "--index={cache}/index", "--stdio",
+        ],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+
+class TestSharedCache:
+    """Servers find one cache per repository, whichever checkout they run in."""
+
+    def test_worktrees_and_clones_share(self, plugin_root, repos, temp_dir):
+        """Worktrees and clones map to one directory; other repositories to another."""
+        root = temp_dir / "shared"
+        seen = {name: show_cache(plugin_root, root, path) for name, path in repos.items()}
+
+        cache, argv = seen["main"]
+        assert Path(cache).parent.parent.parent == root
+        assert Path(cache).name == "target"
+        assert Path(cache).parent.name == "fake"
+        assert Path(cache).parent.is_dir()
+        assert argv == [f"--index={Path(cache).parent}/index", "--stdio"]
+
+        assert seen["feature"] == seen["main"]
+        assert seen["clone"] == seen["main"]
+        assert seen["other"][0] != cache
+        # Outside a repository the server keeps its own defaults
+        assert seen["plain"] == [None, ["--stdio"]]
+
+    def test_generator_and_warm_use_cache(self, plugin_root, marketplace_generator, registry, repos, temp_dir):
+        """A shared_cache server is wrapped, and its warm-up fills the same cache."""
+        test_registry = dict(registry)
+        test_registry["fake_cli"] = {
+            "pluginName": "lsp-fake-cli",
+            "language": "python",
+            "description": "Fake server",
+            "command": sys.executable,
+            "args": ["-c", SHOW_CACHE],
+            "extensionToLanguage": {".py": "python"},
+            "installCommands": {},
+            "warm": {"command": [sys.executable, "-c", "import os; open('warmed', 'w').write(os.environ['FAKE_CACHE'])"]},
+            "cache": {"env": {"FAKE_CACHE": "{cache}/target"}},
+        }
+        registry_file = temp_dir / "registry.json"
+        registry_file.write_text(json.dumps(test_registry))
+        config = temp_dir / "config.json"
+        config.write_text(json.dumps({
+            "ensure_installed": ["fake_cli"],
+            "servers": {"fake_cli": {"shared_cache": str(temp_dir / "shared")}},
+        }))
+        generated = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--config", str(config),
+                "--registry", str(registry_file),
+                "--output", str(temp_dir / "marketplace"),
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert generated.returncode == 0, generated.stderr
+
+        lsp_json = temp_dir / "marketplace" / "plugins" / "lsp-fake-cli" / ".lsp.json"
+        lsp_config = json.loads(lsp_json.read_text())["python"]
+        assert lsp_config["args"][1:6] == [
+            "--shared-cache", str(temp_dir / "shared"),
+            "--cache-env", "FAKE_CACHE={cache}/target",
+            "--name",
+        ]
+        launched = subprocess.run(
+            [lsp_config["command"], *lsp_config["args"]],
+            capture_output=True,
+            text=True,
+            cwd=repos["feature"],
+        )
+        assert launched.returncode == 0, launched.stderr
+        cache = json.loads(launched.stdout)[0]
+
+        warmed = subprocess.run(
+            [
+                "python3", str(plugin_root / "scripts" / "lsp-warm.py"),
+                "--from-marketplace", str(temp_dir / "marketplace"),
+                "--registry", str(registry_file),
+                "--project", str(repos["main"]),
+                "--max-load", "0",
+                "--no-state",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert warmed.returncode == 0, warmed.stdout + warmed.stderr
+        assert (repos["main"] / "warmed").read_text() == cache
@@ -0,0 +1,126 @@
+"""Tests for the binary check script."""
+
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.skipif(shutil.which("jq") is None, reason="jq not available")
+
+
+def make_executable(path: Path, body: str = "#!/bin/sh\n") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(body)
+    path.chmod(0o755)
+
+
+def run_check(script: Path, path_dirs: list[Path], *args: str) -> subprocess.CompletedProcess:
+    """Run check-binaries.sh with PATH limited to path_dirs plus system dirs."""
+    env = {
+        **os.environ,
+        "PATH": os.pathsep.join([*map(str, path_dirs), "/usr/bin", "/bin"]),
+    }
+    return subprocess.run(
+        ["bash", str(script), *args], capture_output=True, text=True, env=env
+    )
+
+
+class TestCheckBinaries:
+    """Tests for check-binaries.sh."""
+
+    def test_statuses_and_shadowing(self, check_binaries_script, temp_dir):
+        """Reports installed, missing and unknown servers with shadowed copies."""
+        first, second = temp_dir / "first", temp_dir / "second"
+        make_executable(first / "pylsp")
+        make_executable(second / "pylsp")
+        (temp_dir / "first-link").symlink_to(first)
+
+        result = run_check(
+            check_binaries_script,
+            [first, temp_dir / "first-link", second],
+            "pylsp", "gopls", "not_a_server",
+        )
+
+        assert result.returncode == 1
+        report = json.loads(result.stdout)
+        assert report["servers"]["pylsp"] == {
+            "status": "installed",
+            "command": "pylsp",
+            "path": str(first / "pylsp"),
+            "root": "path",
+            "shadowed": [str(second / "pylsp")],
+        }
+        assert report["servers"]["gopls"] == {"status": "missing", "command": "gopls"}
+        assert report["servers"]["not_a_server"] == {"status": "unknown"}
+        assert report["summary"] == {"installed": 1, "missing": 1, "unknown": 1}
+
+    def test_mason_and_project_roots(self, check_binaries_script, temp_dir):
+        """Binaries outside PATH are found in Mason and the project's venv."""
+        project = temp_dir / "project"
+        make_executable(temp_dir / "mason" / "bin" / "gopls")
+        make_executable(project / ".venv" / "bin" / "pylsp")
+        make_executable(temp_dir / "path" / "pylsp")
+
+        result = subprocess.run(
+            ["bash", str(check_binaries_script), "gopls", "pylsp"],
+            capture_output=True,
+            text=True,
+            cwd=project,
+            env={
+                **os.environ,
+                "PATH": os.pathsep.join([str(temp_dir / "path"), "/usr/bin", "/bin"]),
+                "HOME": str(temp_dir / "home"),
+                "MASON": str(temp_dir / "mason"),
+            },
+        )
+
+        assert result.returncode == 0, result.stderr
+        servers = json.loads(result.stdout)["servers"]
+        assert servers["gopls"]["root"] == "mason"
+        assert servers["gopls"]["path"] == str(temp_dir / "mason" / "bin" / "gopls")
+        assert servers["pylsp"]["root"] == "path"
+        assert servers["pylsp"]["shadowed"] == [str(project / ".venv" / "bin" / "pylsp")]
+
+    def test_all_installed_exits_zero(self, check_binaries_script, temp_dir):
+        """Exit status is 0 when every requested server is installed."""
+        make_executable(temp_dir / "bin" / "pylsp")
+
+        result = run_check(check_binaries_script, [temp_dir / "bin"], "pylsp")
+
+        assert result.returncode == 0
+        assert json.loads(result.stdout)["servers"]["pylsp"]["shadowed"] == []
+
+    def test_jsonl_covers_registry(self, check_binaries_script, registry, temp_dir):
+        """--jsonl emits one object per registry server."""
+        result = run_check(check_binaries_script, [temp_dir], "--jsonl")
+
+        lines = [json.loads(line) for line in result.stdout.splitlines()]
+        assert sorted(line["server"] for line in lines) == sorted(registry)
+
+    def test_spawns_do_not_scale_with_servers(self, check_binaries_script, temp_dir):
+        """The whole registry costs the same process spawns as one server."""
+        log = temp_dir / "spawns.log"
+        wrappers = temp_dir / "wrappers"
+        for tool in ("jq", "which"):
+            real = shutil.which(tool)
+            if real is None:
+                continue
+            make_executable(
+                wrappers / tool,
+                f'#!/bin/sh\necho {tool} >> "{log}"\nexec "{real}" "$@"\n',
+            )
+
+        def spawns(*args: str) -> list[str]:
+            log.write_text("")
+            run_check(check_binaries_script, [wrappers], *args)
+            return log.read_text().split()
+
+        one = spawns("pylsp")
+        everything = spawns()
+
+        assert one == ["jq", "jq"]
+        assert everything == one
@@ -0,0 +1,210 @@
+"""Tests for syncing many project scopes in one fleet run."""
+
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.skipif(shutil.which("lua") is None, reason="lua not available")
+
+
+def add_project(root: Path, name: str, config: str) -> Path:
+    """Create a project with a .claude/lsp-config.lua."""
+    project = root / name
+    (project / ".claude").mkdir(parents=True)
+    (project / ".claude" / "lsp-config.lua").write_text(config)
+    return project
+
+
+@pytest.fixture
+def fleet(marketplace_generator, registry, temp_dir):
+    """A directory tree of projects and a runner for --fleet over it."""
+    root = temp_dir / "work"
+    root.mkdir()
+    registry_file = temp_dir / "registry.json"
+    registry_file.write_text(json.dumps(registry))
+    bin_dir = temp_dir / "bin"
+    bin_dir.mkdir()
+    calls = temp_dir / "calls"
+    fake = bin_dir / "pylsp"
+    fake.write_text(f'#!/bin/sh\necho call >> "{calls}"\necho "pylsp v1.0"\n')
+    fake.chmod(0o755)
+    home = temp_dir / "home"
+    home.mkdir()
+
+    def _run(*args: str, env: dict | None = None) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--fleet", str(root),
+                "--registry", str(registry_file),
+                "--json-output",
+                *args,
+            ],
+            capture_output=True,
+            text=True,
+            env={
+                **os.environ,
+                "HOME": str(home),
+                "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+                **(env or {}),
+            },
+        )
+
+    _run.root = root
+    _run.calls = calls
+    _run.home = home
+    _run.bin_dir = bin_dir
+    return _run
+
+
+class TestFleet:
+    """Tests for --fleet discovery, parsing and generation."""
+
+    def test_syncs_every_project(self, fleet):
+        """Each discovered project gets its own registered marketplace."""
+        alpha = add_project(fleet.root, "alpha", 'return { ensure_installed = { "pylsp" } }\n')
+        beta = add_project(
+            fleet.root / "nested", "beta", 'return { ensure_installed = { "pylsp", "gopls" } }\n'
+        )
+
+        result = fleet("--workers", "2")
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout)
+
+        assert [p["project"] for p in report["projects"]] == [str(alpha), str(beta)]
+        assert report["summary"] == {"projects": 2, "succeeded": 2, "failed": 0, "plugins": 3}
+        assert report["projects"][1]["generated"] == ["lsp-python-pylsp", "lsp-go"]
+        for project in (alpha, beta):
+            marketplace = project / ".claude" / "generated-lsp-marketplace"
+            assert (marketplace / ".claude-plugin" / "marketplace.json").exists()
+            settings = json.loads((project / ".claude" / "settings.json").read_text())
+            assert "generated-lsp" in settings["extraKnownMarketplaces"]
+
+    def test_binaries_resolved_once(self, fleet):
+        """Projects sharing a server share one binary lookup and version probe."""
+        for name in ("one", "two", "three"):
+            add_project(fleet.root, name, 'return { ensure_installed = { "pylsp" } }\n')
+
+        result = fleet()
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout)
+
+        assert report["binaries"]["pylsp"].endswith("/pylsp")
+        assert fleet.calls.read_text().count("call") == 1
+        assert all(p["missing_binaries"] == [] for p in report["projects"])
+
+    def test_invalid_project_does_not_stop_others(self, fleet):
+        """A config that fails to parse is reported; the rest still sync."""
+        add_project(fleet.root, "good", 'return { ensure_installed = { "pylsp" } }\n')
+        bad = add_project(fleet.root, "bad", "return { ensure_installed = \n")
+
+        result = fleet()
+        assert result.returncode == 1
+        report = json.loads(result.stdout)
+
+        assert report["summary"]["failed"] == 1
+        failed = [p for p in report["projects"] if p["error"]]
+        assert [p["project"] for p in failed] == [str(bad)]
+        assert not (bad / ".claude" / "generated-lsp-marketplace").exists()
+        assert (fleet.root / "good" / ".claude" / "generated-lsp-marketplace").exists()
+
+    def test_events_per_project(self, fleet):
+        """--events reports each project as it is parsed and synced."""
+        add_project(fleet.root, "good", 'return { ensure_installed = { "pylsp" } }\n')
+        bad = add_project(fleet.root, "bad", "return { ensure_installed = \n")
+
+        result = fleet("--events")
+        assert result.returncode == 1
+        events = [json.loads(line) for line in result.stdout.splitlines()]
+
+        parsed = {e["project"]: e for e in events if e["event"] == "project_parsed"}
+        assert parsed[str(bad)]["error"]
+        assert parsed[str(fleet.root / "good")]["error"] is None
+        [synced] = [e for e in events if e["event"] == "project_synced"]
+        assert synced["generated"] == ["lsp-python-pylsp"]
+        assert [e["command"] for e in events if e["event"] == "binary_resolved"] == ["pylsp"]
+        assert events[-1]["event"] == "result"
+        assert events[-1]["result"]["summary"]["failed"] == 1
+
+    def test_skips_dependency_and_hidden_dirs(self, fleet):
+        """Configs under node_modules or hidden directories are not projects."""
+        add_project(fleet.root, "app", 'return { ensure_installed = { "pylsp" } }\n')
+        add_project(fleet.root / "app" / "node_modules", "dep", 'return {}\n')
+        add_project(fleet.root / ".cache", "copy", 'return {}\n')
+
+        result = fleet()
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout)
+        assert [p["project"] for p in report["projects"]] == [str(fleet.root / "app")]
+
+    def test_layers_merged_like_single_sync(self, fleet):
+        """Each project merges the user and local layers around its own config."""
+        (fleet.home / ".claude").mkdir()
+        (fleet.home / ".claude" / "lsp-config.lua").write_text(
+            'return { ensure_installed = { "gopls" }, servers = { gopls = { idle_timeout = 5 } } }\n'
+        )
+        plain = add_project(fleet.root, "plain", 'return { ensure_installed = { "pylsp" } }\n')
+        local = add_project(fleet.root, "local", 'return { ensure_installed = { "pylsp" } }\n')
+        (local / ".claude" / "lsp-config.local.lua").write_text(
+            'return { servers = { gopls = { idle_timeout = 0 } } }\n'
+        )
+
+        result = fleet()
+        assert result.returncode == 0, result.stderr
+        report = {p["project"]: p for p in json.loads(result.stdout)["projects"]}
+
+        def gopls_args(project: Path) -> list:
+            lsp_json = project / ".claude" / "generated-lsp-marketplace" / "plugins" / "lsp-go" / ".lsp.json"
+            return json.loads(lsp_json.read_text())["go"].get("args", [])
+
+        for project in (plain, local):
+            assert report[str(project)]["generated"] == ["lsp-go", "lsp-python-pylsp"]
+        assert "--idle-timeout" in gopls_args(plain)
+        assert "--idle-timeout" not in gopls_args(local)
+
+        # Explicit layers replace the defaults
+        result = fleet("--layer", "project={}/.claude/lsp-config.lua")
+        assert result.returncode == 0, result.stderr
+        assert all(p["generated"] == ["lsp-python-pylsp"] for p in json.loads(result.stdout)["projects"])
+
+    def test_shared_roots_scanned_once(self, fleet, temp_dir):
+        """Workers reuse the shared root listings and search only project roots."""
+        scans = temp_dir / "scans"
+        hooks = temp_dir / "hooks"
+        hooks.mkdir()
+        (hooks / "sitecustomize.py").write_text(
+            "import sys\n"
+            "def _hook(event, args):\n"
+            "    if event == 'os.scandir':\n"
+            f"        with open({str(scans)!r}, 'a') as f:\n"
+            "            f.write(str(args[0]) + '\\n')\n"
+            "sys.addaudithook(_hook)\n"
+        )
+        projects = [
+            add_project(fleet.root, name, 'return { ensure_installed = { "pylsp", "gopls" } }\n')
+            for name in ("one", "two", "three")
+        ]
+        local = projects[0] / "node_modules" / ".bin" / "gopls"
+        local.parent.mkdir(parents=True)
+        local.write_text("#!/bin/sh\necho 'gopls v0.1'\n")
+        local.chmod(0o755)
+
+        result = fleet("--workers", "2", env={"PYTHONPATH": str(hooks)})
+        assert result.returncode == 0, result.stderr
+        report = {p["project"]: p for p in json.loads(result.stdout)["projects"]}
+        assert report[str(projects[0])]["missing_binaries"] == []
+        assert [report[str(p)]["missing_binaries"] for p in projects[1:]] == [["gopls"], ["gopls"]]
+
+        scanned = scans.read_text().splitlines()
+        assert scanned.count(str(fleet.bin_dir)) == 1
+        project_roots = {
+            str(project / root)
+            for project in projects
+            for root in (".venv/bin", "venv/bin", "node_modules/.bin")
+        }
+        assert project_roots.isdisjoint(scanned)
@@ -0,0 +1,316 @@
+"""Tests for the idle-stopping server launcher."""
+
+import json
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+
+# Idle timeout in minutes; 0.01 is 0.6 seconds
+IDLE_MINUTES = "0.01"
+
+
+class Client:
+    """Speaks LSP to a launcher process; server requests get a null result."""
+
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.messages: queue.Queue = queue.Queue()
+        self.server_requests: list[dict] = []
+        self.notifications: list[dict] = []
+        self.next_id = 0
+        self.lock = threading.Lock()
+        # Cleared to stop reading, so the launcher's writes back up
+        self.reading = threading.Event()
+        self.reading.set()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        stream = self.process.stdout
+        while True:
+            self.reading.wait()
+            header = stream.readline()
+            if not header:
+                return
+            length = int(header.split(b":")[1])
+            stream.readline()
+            message = json.loads(stream.read(length))
+            if "method" in message and "id" in message:
+                self.server_requests.append(message)
+                self.send({"id": message["id"], "result": None})
+            elif "method" in message:
+                self.notifications.append(message)
+            else:
+                self.messages.put(message)
+
+    def send(self, message: dict):
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode()
+        with self.lock:
+            self.process.stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+            self.process.stdin.flush()
+
+    def notify(self, method: str, params: dict | None = None):
+        self.send({"method": method, "params": params or {}})
+
+    def request(self, method: str, params: dict | None = None, timeout: float = 10.0):
+        self.next_id += 1
+        request_id = self.next_id
+        self.send({"id": request_id, "method": method, "params": params or {}})
+        deadline = time.monotonic() + timeout
+        while True:
+            message = self.messages.get(timeout=max(deadline - time.monotonic(), 0.01))
+            if message["id"] == request_id:
+                return message
+
+
+@pytest.fixture
+def launch(plugin_root, fixtures_dir, temp_dir, monkeypatch):
+    """Start the launcher in front of the fake server."""
+    events = temp_dir / "events.log"
+    monkeypatch.setenv("FAKE_LSP_LOG", str(events))
+    processes = []
+
+    def _launch(*options: str) -> Client:
+        process = subprocess.Popen(
+            [
+                sys.executable, str(plugin_root / "scripts" / "lsp-launch.py"),
+                *(options or ("--idle-timeout", IDLE_MINUTES)),
+                "--", sys.executable, str(fixtures_dir / "fake-lsp-server.py"),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        processes.append(process)
+        return Client(process)
+
+    _launch.events = lambda: [line.split(" ", 1) for line in events.read_text().splitlines()]
+    _launch.count = lambda name: sum(event == name for _, event in _launch.events())
+    _launch.stopped = lambda count=1: _launch.count("exit") >= count
+    yield _launch
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def handshake(client: Client):
+    result = client.request("initialize", {"processId": None, "rootUri": "file:///w", "capabilities": {}})
+    client.notify("initialized")
+    return result
+
+
+def wait_for(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+class TestIdleRestart:
+    """The server stops while idle and comes back on demand."""
+
+    def test_stops_when_idle_and_replays_session(self, launch):
+        """A restarted server gets the handshake, configuration and edited documents."""
+        client = launch()
+        handshake(client)
+        client.notify("workspace/didChangeConfiguration", {"settings": {"fake": {"level": 2}}})
+        client.notify("textDocument/didOpen", {"textDocument": {
+            "uri": "file:///w/a.py", "languageId": "python", "version": 1,
+            "text": "x = '\U0001f600'\ny = 1\n",
+        }})
+        # Positions count UTF-16 code units: the emoji is two
+        client.notify("textDocument/didChange", {
+            "textDocument": {"uri": "file:///w/a.py", "version": 2},
+            "contentChanges": [
+                {"range": {"start": {"line": 0, "character": 7}, "end": {"line": 0, "character": 8}},
+                 "text": "!'"},
+                {"range": {"start": {"line": 1, "character": 4}, "end": {"line": 1, "character": 5}},
+                 "text": "42"},
+            ],
+        })
+        client.notify("textDocument/didOpen", {"textDocument": {
+            "uri": "file:///w/b.py", "languageId": "python", "version": 1, "text": "b",
+        }})
+        client.notify("textDocument/didClose", {"textDocument": {"uri": "file:///w/b.py"}})
+        first_pid = client.request("fake/state")["result"]["pid"]
+
+        wait_for(launch.stopped)
+
+        state = client.request("fake/state")["result"]
+        assert state["pid"] != first_pid
+        assert state["configuration"] == {"fake": {"level": 2}}
+        assert state["documents"] == {
+            "file:///w/a.py": {"version": 2, "text": "x = '\U0001f600!'\ny = 42\n"},
+        }
+
+        second = [event for pid, event in launch.events() if int(pid) == state["pid"]]
+        assert second == ["start", "initialize", "initialized", "didOpen file:///w/a.py"]
+        # The repeated capability registration is answered by the launcher
+        assert len(client.server_requests) == 1
+
+    def test_edits_wake_the_server(self, launch):
+        """A didChange to a stopped server restarts it so diagnostics flow."""
+        client = launch()
+        handshake(client)
+        client.notify("textDocument/didOpen", {"textDocument": {
+            "uri": "file:///w/a.py", "languageId": "python", "version": 1, "text": "a\n",
+        }})
+        wait_for(launch.stopped)
+
+        client.notify("textDocument/didChange", {
+            "textDocument": {"uri": "file:///w/a.py", "version": 2},
+            "contentChanges": [{"text": "b\n"}],
+        })
+        wait_for(lambda: sum(event == "initialize" for _, event in launch.events()) == 2)
+        state = client.request("fake/state")["result"]
+        assert state["documents"]["file:///w/a.py"] == {"version": 2, "text": "b\n"}
+        assert any(n["method"] == "textDocument/publishDiagnostics" for n in client.notifications)
+
+    def test_shutdown_while_stopped(self, launch):
+        """Shutdown and exit to a stopped server end the session without a restart."""
+        client = launch()
+        handshake(client)
+        wait_for(launch.stopped)
+
+        assert client.request("shutdown") == {"jsonrpc": "2.0", "id": 2, "result": None}
+        client.notify("exit")
+        assert client.process.wait(timeout=10) == 0
+        assert sum(event == "start" for _, event in launch.events()) == 1
+
+    def test_busy_server_is_not_stopped(self, launch):
+        """Traffic within the timeout keeps the same server running."""
+        client = launch()
+        handshake(client)
+        pid = client.request("fake/state")["result"]["pid"]
+        for _ in range(4):
+            time.sleep(0.2)
+            assert client.request("fake/state")["result"]["pid"] == pid
+
+
+class TestSupervisor:
+    """A crashing server is restarted with backoff instead of ending the session."""
+
+    def test_crash_loop_backs_off(self, launch, marketplace_generator, temp_dir, monkeypatch):
+        """Crashes double the wait, fail requests meanwhile, and are logged and recorded."""
+        monkeypatch.setenv("HOME", str(temp_dir))
+        client = launch("--supervise", "--name", "fake")
+        handshake(client)
+        client.notify("workspace/didChangeConfiguration", {"settings": {"crash": 3}})
+        wait_for(lambda: launch.count("crash") == 1)
+        assert client.request("fake/state")["error"]["code"] == -32803
+
+        # After 1s the replayed configuration crashes it again; the next wait is 2s
+        wait_for(lambda: launch.count("crash") == 2)
+        time.sleep(1.0)
+        assert launch.count("start") == 2
+        client.notify("workspace/didChangeConfiguration", {"settings": {"fake": {"level": 1}}})
+        wait_for(lambda: launch.count("start") == 3)
+        assert client.request("fake/state")["result"]["configuration"] == {"fake": {"level": 1}}
+
+        log = (temp_dir / ".cache" / "lspctl" / "logs" / "fake.log").read_text()
+        assert log.count("fake exited with 3") == 2
+        assert "fake: bad plugin setting" in log
+
+        shown = subprocess.run(
+            ["python3", str(marketplace_generator), "--output", str(temp_dir / "marketplace"),
+             "--show-state", "--json-output"],
+            capture_output=True,
+            text=True,
+        )
+        assert shown.returncode == 0, shown.stderr
+        health = json.loads(shown.stdout)["health"]["fake"]
+        assert health["crashes"] == 2
+        assert health["last_exit_code"] == 3
+        assert health["unhealthy"] is False
+
+    def test_crash_before_initialize_answered(self, launch, temp_dir, monkeypatch):
+        """The restarted server answers the initialize its predecessor never did."""
+        monkeypatch.setenv("HOME", str(temp_dir))
+        monkeypatch.setenv("FAKE_LSP_CRASH_MARKER", str(temp_dir / "crashed"))
+        client = launch("--supervise", "--name", "fake")
+
+        result = handshake(client)
+        assert result["result"]["serverInfo"]["name"] == "fake"
+        assert launch.count("crash") == 1
+        pid = client.request("fake/state")["result"]["pid"]
+        assert result["result"]["serverInfo"]["pid"] == pid
+        assert launch.count("start") == 2
+        # The client's initialize reached the new server once, unreplayed
+        assert [event for _, event in launch.events()] == [
+            "start", "initialize", "crash", "start", "initialize", "initialized",
+        ]
+
+    def test_exit_without_shutdown_is_final(self, launch, temp_dir, monkeypatch):
+        """A server the client told to exit is not restarted, even without a shutdown."""
+        monkeypatch.setenv("HOME", str(temp_dir))
+        client = launch("--supervise", "--name", "fake")
+        handshake(client)
+
+        client.notify("exit")
+        client.process.wait(timeout=10)
+        assert launch.count("start") == 1
+        assert not (temp_dir / ".cache" / "lspctl" / "logs" / "fake.log").exists()
+
+
+class TestDiagnostics:
+    """Bursts of diagnostics reach the client as the newest set per document."""
+
+    def test_coalesces_bursts(self, launch):
+        """Superseded and stale sets are dropped, and the savings are logged."""
+        client = launch("--coalesce-diagnostics", "300")
+        handshake(client)
+        for uri in ("file:///w/a.py", "file:///w/b.py"):
+            client.notify("textDocument/didOpen", {"textDocument": {
+                "uri": uri, "languageId": "python", "version": 1, "text": "a\n",
+            }})
+        client.notify("textDocument/didChange", {
+            "textDocument": {"uri": "file:///w/b.py", "version": 2},
+            "contentChanges": [{"text": "b\n"}],
+        })
+
+        client.request("fake/diagnose", {"uri": "file:///w/a.py", "count": 50})
+        # Diagnostics for a version the client has already replaced
+        client.request("fake/diagnose", {"uri": "file:///w/b.py", "count": 5, "version": 1})
+        wait_for(lambda: any(n["method"] == "textDocument/publishDiagnostics" for n in client.notifications))
+        time.sleep(0.5)
+
+        published = [n["params"] for n in client.notifications if n["method"] == "textDocument/publishDiagnostics"]
+        # The fake server's own diagnostics for the didChange of b.py come first
+        assert [(p["uri"], p["diagnostics"][0]["message"] if p["diagnostics"] else None) for p in published] == [
+            ("file:///w/b.py", None),
+            ("file:///w/a.py", "problem 49"),
+        ]
+
+        client.request("shutdown")
+        client.notify("exit")
+        assert client.process.wait(timeout=10) == 0
+        stderr = client.process.stderr.read().decode()
+        assert "forwarded 2 of 56 notifications, dropped 54" in stderr
+
+    def test_flushes_during_sustained_storm(self, launch):
+        """Held diagnostics are flushed on time even while events keep arriving."""
+        client = launch("--coalesce-diagnostics", "200")
+        handshake(client)
+        client.notify("textDocument/didOpen", {"textDocument": {
+            "uri": "file:///w/a.py", "languageId": "python", "version": 1, "text": "a\n",
+        }})
+
+        # With the client not reading, forwarding the log messages blocks the
+        # launcher while the rest of the storm queues up behind them
+        client.reading.clear()
+        client.send({"id": "storm", "method": "fake/diagnose",
+                     "params": {"uri": "file:///w/a.py", "count": 2000, "log": 1000}})
+        time.sleep(1.0)
+        client.reading.set()
+
+        response = client.messages.get(timeout=30)
+        assert response["id"] == "storm"
+        # The window closed long before the queue drained, so a set was
+        # flushed ahead of the response rather than after it
+        published = [n for n in client.notifications if n["method"] == "textDocument/publishDiagnostics"]
+        assert published
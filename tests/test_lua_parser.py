@@ -1,6 +1,8 @@
 """Tests for the Lua config parser."""
 
 import json
+import os
+import shutil
 import subprocess
 from pathlib import Path
 
@@ -99,6 +101,49 @@ class TestLuaParserErrors:
         assert result.returncode != 0
         assert "Usage:" in result.stderr
 
+    def test_batch_reports_errors_per_config(
+        self, lua_parser_script, minimal_config, invalid_config
+    ):
+        """Test that --batch parses every config and keeps failures separate."""
+        result = subprocess.run(
+            ["lua", str(lua_parser_script), "--batch", str(minimal_config), str(invalid_config)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        parsed = json.loads(result.stdout)
+
+        assert parsed[str(minimal_config)]["config"] == parse_lua_config(
+            lua_parser_script, minimal_config
+        )
+        assert "error" not in parsed[str(minimal_config)]
+        assert "config" not in parsed[str(invalid_config)]
+        assert parsed[str(invalid_config)]["error"]
+
+    def test_batch_merges_layers_per_argument(self, lua_parser_script, temp_dir):
+        """Test that --batch with --layer merges the layers for each argument."""
+        (temp_dir / "user.lua").write_text('return { ensure_installed = { "gopls" } }')
+        for name, server in (("a", "pylsp"), ("b", "rust_analyzer")):
+            (temp_dir / name).mkdir()
+            (temp_dir / name / "lsp.lua").write_text(f'return {{ ensure_installed = {{ "{server}" }} }}')
+        result = subprocess.run(
+            [
+                "lua", str(lua_parser_script), "--batch", "--no-cache",
+                "--layer", f"user={temp_dir / 'user.lua'}",
+                "--layer", "project={}/lsp.lua",
+                str(temp_dir / "a"), str(temp_dir / "b"),
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        parsed = json.loads(result.stdout)
+
+        assert parsed[str(temp_dir / "a")]["config"]["ensure_installed"] == ["gopls", "pylsp"]
+        assert parsed[str(temp_dir / "b")]["config"]["sources"]["ensure_installed"] == {
+            "gopls": "user", "rust_analyzer": "project"
+        }
+
 
 class TestLuaParserVimMock:
     """Tests for vim global mock compatibility."""
@@ -194,3 +239,403 @@ return {
         result = parse_lua_config(lua_parser_script, config)
         # Should not raise JSON decode error
         assert result["servers"]["pylsp"]["settings"]["pylsp"]["format"]["quote"] == "'"
+
+
+class TestLuaParserSandbox:
+    """Tests for the restricted, budgeted evaluation environment."""
+
+    def _run(self, lua_parser_script, config, *options, env=None):
+        return subprocess.run(
+            ["lua", str(lua_parser_script), *options, str(config)],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            env=env,
+        )
+
+    def test_infinite_loop_hits_instruction_budget(self, lua_parser_script, temp_dir):
+        """Test that a runaway loop fails fast with the elapsed cost."""
+        config = temp_dir / "loop.lua"
+        config.write_text("while true do end\nreturn {}\n")
+
+        result = self._run(
+            lua_parser_script, config, "--max-instructions", "100000"
+        )
+        assert result.returncode != 0
+        assert "instruction budget of 100000 exceeded" in result.stderr
+        assert "instructions" in result.stderr and "CPU" in result.stderr
+
+    def test_pcall_cannot_swallow_budget_error(self, lua_parser_script, temp_dir):
+        """Test that budget errors escape pcall inside the config."""
+        config = temp_dir / "pcall-loop.lua"
+        config.write_text(
+            "while true do pcall(function() while true do end end) end\n"
+        )
+
+        result = self._run(
+            lua_parser_script, config, "--max-instructions", "100000"
+        )
+        assert result.returncode != 0
+        assert "instruction budget" in result.stderr
+
+    @pytest.mark.parametrize("source", [
+        "return setmetatable({}, {__index = function() while true do end end})\n",
+        "return { servers = setmetatable({}, {__pairs = function() while true do end end}) }\n",
+        "return { servers = { pylsp = setmetatable({}, {__pairs = function() while true do end end}) } }\n",
+    ])
+    def test_result_metamethods_never_run(self, lua_parser_script, temp_dir, source):
+        """Test that the returned config is read raw, without its metamethods."""
+        config = temp_dir / "metamethods.lua"
+        config.write_text(source)
+
+        result = self._run(lua_parser_script, config)
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout)["ensure_installed"] in ([], {})
+
+    def test_finalizers_rejected(self, lua_parser_script, temp_dir):
+        """Test that a config cannot leave a __gc finalizer to run unbudgeted."""
+        config = temp_dir / "gc.lua"
+        config.write_text(
+            "keep = setmetatable({}, {__gc = function() while true do end end})\n"
+            "return { ensure_installed = {\"pylsp\"} }\n"
+        )
+
+        result = self._run(lua_parser_script, config)
+        assert result.returncode != 0
+        assert "__gc metamethods are not allowed" in result.stderr
+
+    def test_error_object_tostring_under_budget(self, lua_parser_script, temp_dir):
+        """Test that an error object's __tostring runs under the budget."""
+        config = temp_dir / "tostring.lua"
+        config.write_text(
+            "error(setmetatable({}, {__tostring = function() while true do end end}))\n"
+        )
+
+        result = self._run(
+            lua_parser_script, config, "--max-instructions", "100000"
+        )
+        assert result.returncode != 0
+        assert "instruction budget of 100000 exceeded" in result.stderr
+
+    def test_string_metatable_hidden(self, lua_parser_script, temp_dir):
+        """Test that configs cannot reach the string metatable the parser shares."""
+        config = temp_dir / "string-mt.lua"
+        config.write_text(
+            'return { ensure_installed = { getmetatable("") == nil and "hidden" or "shared" } }\n'
+        )
+
+        result = parse_lua_config(lua_parser_script, config)
+        assert result["ensure_installed"] == ["hidden"]
+
+    def test_memory_ceiling(self, lua_parser_script, temp_dir):
+        """Test that unbounded allocation hits the memory ceiling."""
+        config = temp_dir / "memory.lua"
+        config.write_text("""
+local t = {}
+for i = 1, 1e9 do t[i] = ("x"):rep(64) .. i end
+return {}
+""")
+        result = self._run(lua_parser_script, config, "--max-memory-kb", "4096")
+        assert result.returncode != 0
+        assert "memory limit of 4096 KB exceeded" in result.stderr
+
+    def test_large_string_rep_rejected(self, lua_parser_script, temp_dir):
+        """Test that a single huge allocation is refused up front."""
+        config = temp_dir / "rep.lua"
+        config.write_text('local s = string.rep("x", 1e10)\nreturn {}\n')
+
+        result = self._run(lua_parser_script, config)
+        assert result.returncode != 0
+        assert "memory limit" in result.stderr
+
+    def test_restricted_globals(self, lua_parser_script, temp_dir):
+        """Test that io, os.execute, debug and load are not reachable."""
+        config = temp_dir / "globals.lua"
+        config.write_text("""
+local found = {}
+if io then table.insert(found, "io") end
+if os.execute then table.insert(found, "os.execute") end
+if debug then table.insert(found, "debug") end
+if load or loadstring or dofile then table.insert(found, "load") end
+return { ensure_installed = found }
+""")
+        result = parse_lua_config(lua_parser_script, config)
+        assert result["ensure_installed"] in ([], {})
+
+    def test_print_goes_to_stderr(self, lua_parser_script, temp_dir):
+        """Test that print() in a config doesn't corrupt the JSON output."""
+        config = temp_dir / "print.lua"
+        config.write_text('print("hello")\nreturn { ensure_installed = {"pylsp"} }\n')
+
+        result = self._run(lua_parser_script, config)
+        assert result.returncode == 0
+        assert json.loads(result.stdout)["ensure_installed"] == ["pylsp"]
+        assert "hello" in result.stderr
+
+    def test_unlisted_module_is_stubbed(self, lua_parser_script, temp_dir):
+        """Test that modules outside the allowlist are never loaded."""
+        (temp_dir / "servers.lua").write_text('error("should not load")\n')
+        config = temp_dir / "require.lua"
+        config.write_text("""
+local servers = require("servers")
+return { ensure_installed = servers.list or {"pylsp"} }
+""")
+        env = dict(os.environ, LUA_PATH=f"{temp_dir}/?.lua")
+        result = self._run(lua_parser_script, config, env=env)
+        assert result.returncode == 0
+        assert json.loads(result.stdout)["ensure_installed"] == ["pylsp"]
+
+    def test_allowlisted_module_is_sandboxed(self, lua_parser_script, temp_dir):
+        """Test that allowlisted modules load under the same restrictions."""
+        (temp_dir / "servers.lua").write_text(
+            'return { list = { "gopls", io and "io" or "sandboxed" } }\n'
+        )
+        config = temp_dir / "require.lua"
+        config.write_text(
+            'return { ensure_installed = require("servers").list }\n'
+        )
+        env = dict(os.environ, LUA_PATH=f"{temp_dir}/?.lua")
+        result = self._run(
+            lua_parser_script, config, "--allow-module", "servers", env=env
+        )
+        assert result.returncode == 0
+        assert json.loads(result.stdout)["ensure_installed"] == ["gopls", "sandboxed"]
+
+    def test_invalid_budget_option(self, lua_parser_script, minimal_config):
+        """Test that a non-numeric budget is rejected with usage."""
+        result = self._run(
+            lua_parser_script, minimal_config, "--max-instructions", "lots"
+        )
+        assert result.returncode != 0
+        assert "Usage:" in result.stderr
+
+
+class TestLuaParserNvimImport:
+    """Tests for importing LSP setup from a full Neovim config tree."""
+
+    def _import(self, lua_parser_script, config_dir, cache_path):
+        result = subprocess.run(
+            [
+                "lua", str(lua_parser_script),
+                "--import-nvim", "--cache", str(cache_path),
+                str(config_dir),
+            ],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout), result.stderr
+
+    def test_import_records_servers(
+        self, lua_parser_script, nvim_config_dir, temp_dir
+    ):
+        """Test lspconfig, vim.lsp, mason-lspconfig and lazy specs are recorded."""
+        result, _ = self._import(
+            lua_parser_script, nvim_config_dir, temp_dir / "cache.lua"
+        )
+
+        # vim.lsp.config/enable, LazyVim opts.servers and mason handlers
+        assert result["ensure_installed"] == ["gopls", "bashls", "pyright", "lua_ls"]
+        assert result["servers"]["gopls"]["settings"]["gopls"]["staticcheck"] is True
+        pyright = result["servers"]["pyright"]
+        assert pyright["settings"]["python"]["analysis"]["typeCheckingMode"] == "strict"
+        assert "on_attach" not in pyright
+        lua_ls = result["servers"]["lua_ls"]
+        assert lua_ls["settings"]["Lua"]["diagnostics"]["globals"] == ["vim"]
+        assert "capabilities" not in lua_ls
+
+    def test_deps_out_lists_loaded_files(
+        self, lua_parser_script, nvim_config_dir, temp_dir
+    ):
+        """Test --deps-out lists every module the import read."""
+        deps = temp_dir / "deps.txt"
+        result = subprocess.run(
+            [
+                "lua", str(lua_parser_script),
+                "--import-nvim", "--no-cache", "--deps-out", str(deps),
+                str(nvim_config_dir),
+            ],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        assert result.returncode == 0, result.stderr
+
+        files = deps.read_text().splitlines()
+        assert files[0] == f"{nvim_config_dir}/init.lua"
+        assert sorted(Path(f).relative_to(nvim_config_dir).as_posix() for f in files[1:]) == [
+            "lua/config/lazy.lua",
+            "lua/config/lsp.lua",
+            "lua/config/options.lua",
+            "lua/config/servers.lua",
+            "lua/plugins/lspconfig.lua",
+            "lua/plugins/mason.lua",
+            "lua/plugins/ui.lua",
+        ]
+
+    def test_reimport_uses_cache(self, lua_parser_script, nvim_config_dir, temp_dir):
+        """Test that an unchanged tree is served entirely from the cache."""
+        cache = temp_dir / "cache.lua"
+        first, stderr = self._import(lua_parser_script, nvim_config_dir, cache)
+        assert "(8 evaluated, 0 cached)" in stderr
+
+        second, stderr = self._import(lua_parser_script, nvim_config_dir, cache)
+        assert "(0 evaluated, 8 cached)" in stderr
+        assert second == first
+
+    def test_changed_dependency_reevaluates_dependents(
+        self, lua_parser_script, nvim_config_dir, temp_dir
+    ):
+        """Test that only changed files and the modules requiring them re-run."""
+        config_dir = temp_dir / "nvim"
+        shutil.copytree(nvim_config_dir, config_dir)
+        cache = temp_dir / "cache.lua"
+        self._import(lua_parser_script, config_dir, cache)
+
+        servers = config_dir / "lua" / "config" / "servers.lua"
+        servers.write_text(servers.read_text().replace('"vim"', '"vim", "describe"'))
+
+        result, stderr = self._import(lua_parser_script, config_dir, cache)
+        # servers.lua and plugins/mason.lua, which requires it
+        assert "(2 evaluated, 6 cached)" in stderr
+        globals_ = result["servers"]["lua_ls"]["settings"]["Lua"]["diagnostics"]["globals"]
+        assert globals_ == ["vim", "describe"]
+
+    def test_broken_module_is_skipped(
+        self, lua_parser_script, nvim_config_dir, temp_dir
+    ):
+        """Test that one failing plugin spec doesn't lose the rest."""
+        config_dir = temp_dir / "nvim"
+        shutil.copytree(nvim_config_dir, config_dir)
+        (config_dir / "lua" / "plugins" / "broken.lua").write_text(
+            'error("boom")\n'
+        )
+
+        result, stderr = self._import(
+            lua_parser_script, config_dir, temp_dir / "cache.lua"
+        )
+        assert "Warning: skipping lua/plugins/broken.lua" in stderr
+        assert "pyright" in result["ensure_installed"]
+
+    def test_missing_init_lua(self, lua_parser_script, temp_dir):
+        """Test that a directory without init.lua is an error."""
+        result = subprocess.run(
+            ["lua", str(lua_parser_script), "--import-nvim", "--no-cache", str(temp_dir)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode != 0
+        assert "No init.lua found" in result.stderr
+
+
+class TestLuaParserLayered:
+    """Tests for layered user + project + local config merging."""
+
+    USER = """
+return {
+  ensure_installed = { "pylsp", "lua_ls" },
+  servers = {
+    pylsp = {
+      settings = { pylsp = { plugins = { ruff = { enabled = true, lineLength = 80 } } } }
+    },
+    lua_ls = {
+      settings = { Lua = { diagnostics = { globals = { "vim" } } } }
+    }
+  }
+}
+"""
+    PROJECT = """
+return {
+  ensure_installed = { "pyright", "pylsp" },
+  servers = {
+    pylsp = {
+      settings = { pylsp = { plugins = { ruff = { lineLength = 120 } } } }
+    },
+    lua_ls = {
+      settings = { Lua = { diagnostics = { globals = { "describe" } } } }
+    }
+  }
+}
+"""
+
+    def _write_layers(self, temp_dir) -> tuple[Path, Path]:
+        user = temp_dir / "user.lua"
+        user.write_text(self.USER)
+        project = temp_dir / "project.lua"
+        project.write_text(self.PROJECT)
+        return user, project
+
+    def _run(self, lua_parser_script, temp_dir, *layers):
+        cmd = ["lua", str(lua_parser_script), "--cache", str(temp_dir / "cache.lua")]
+        for layer in layers:
+            cmd.extend(["--layer", layer])
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+
+    def test_merge_with_project_precedence(self, lua_parser_script, temp_dir):
+        """Test union of ensure_installed and deep-merge of servers."""
+        user, project = self._write_layers(temp_dir)
+        result = self._run(
+            lua_parser_script, temp_dir,
+            f"user={user}", f"project={project}",
+            f"local={temp_dir / 'lsp-config.local.lua'}",
+        )
+        assert result.returncode == 0, result.stderr
+        merged = json.loads(result.stdout)
+
+        assert merged["ensure_installed"] == ["pylsp", "lua_ls", "pyright"]
+        ruff = merged["servers"]["pylsp"]["settings"]["pylsp"]["plugins"]["ruff"]
+        assert ruff == {"enabled": True, "lineLength": 120}
+        # Lists are replaced, not merged
+        lua_globals = merged["servers"]["lua_ls"]["settings"]["Lua"]["diagnostics"]["globals"]
+        assert lua_globals == ["describe"]
+        # The missing local layer is skipped
+        assert [layer["name"] for layer in merged["layers"]] == ["user", "project"]
+
+    def test_sources_record_layer(self, lua_parser_script, temp_dir):
+        """Test that each merged value records the layer it came from."""
+        user, project = self._write_layers(temp_dir)
+        result = self._run(
+            lua_parser_script, temp_dir, f"user={user}", f"project={project}"
+        )
+        sources = json.loads(result.stdout)["sources"]
+
+        assert sources["ensure_installed"] == {
+            "pylsp": "user", "lua_ls": "user", "pyright": "project"
+        }
+        assert sources["servers"]["pylsp"] == {
+            "settings.pylsp.plugins.ruff.enabled": "user",
+            "settings.pylsp.plugins.ruff.lineLength": "project",
+        }
+
+    def test_cache_keyed_by_all_layers(self, lua_parser_script, temp_dir):
+        """Test that the merged result is cached until any layer changes."""
+        user, project = self._write_layers(temp_dir)
+        layers = (f"user={user}", f"project={project}")
+
+        first = self._run(lua_parser_script, temp_dir, *layers)
+        assert "Merged 2 config layers" in first.stderr
+        second = self._run(lua_parser_script, temp_dir, *layers)
+        assert "served from cache" in second.stderr
+        assert second.stdout == first.stdout
+
+        user.write_text(self.USER.replace("lineLength = 80", "lineLength = 90"))
+        third = self._run(lua_parser_script, temp_dir, *layers)
+        assert "Merged 2 config layers" in third.stderr
+
+    def test_layer_error_names_layer(self, lua_parser_script, temp_dir, invalid_config):
+        """Test that a broken layer reports which layer failed."""
+        user, _ = self._write_layers(temp_dir)
+        result = self._run(
+            lua_parser_script, temp_dir, f"user={user}", f"project={invalid_config}"
+        )
+        assert result.returncode != 0
+        assert "project layer" in result.stderr
+
+    def test_no_layers_exist(self, lua_parser_script, temp_dir):
+        """Test that at least one layer file must exist."""
+        result = self._run(
+            lua_parser_script, temp_dir, f"user={temp_dir / 'missing.lua'}"
+        )
+        assert result.returncode != 0
+        assert "Cannot open file" in result.stderr
@@ -1,6 +1,7 @@
 """Tests for the marketplace generator."""
 
 import json
+import os
 import subprocess
 import tempfile
 from pathlib import Path
@@ -16,6 +17,7 @@ def run_generator(
     scope: str | None = None,
     settings_path: Path | None = None,
     extra_args: list | None = None,
+    env: dict | None = None,
 ) -> tuple[int, str, str]:
     """Run the marketplace generator script."""
     # Write config to temp file
@@ -46,7 +48,7 @@ def run_generator(
     if extra_args:
         cmd.extend(extra_args)
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
     return result.returncode, result.stdout, result.stderr
 
 
@@ -123,6 +125,147 @@ class TestMarketplaceGeneration:
         assert "settings" in lsp_config["python"]
         assert lsp_config["python"]["settings"]["pylsp"]["plugins"]["ruff"]["enabled"]
 
+    def test_events_stream(self, marketplace_generator, registry, temp_dir):
+        """--events streams per-server progress and ends with the result."""
+        config = {"ensure_installed": ["pylsp", "nonexistent"]}
+
+        returncode, stdout, stderr = run_generator(
+            marketplace_generator, config, registry, temp_dir, extra_args=["--events"]
+        )
+        assert returncode == 0, stderr
+
+        events = [json.loads(line) for line in stdout.splitlines()]
+        names = [event["event"] for event in events]
+        assert names[0] == "config_loaded"
+        assert events[0]["servers"] == ["pylsp", "nonexistent"]
+        assert "server_unknown" in names
+        assert names.index("plugin_written") > names.index("config_loaded")
+        assert names[-2:] == ["marketplace_written", "result"]
+
+        binary = next(e for e in events if e["event"] in ("binary_resolved", "binary_missing"))
+        assert (binary["server"], binary["command"]) == ("pylsp", "pylsp")
+        written = next(e for e in events if e["event"] == "plugin_written")
+        assert written["plugin"] == "lsp-python-pylsp"
+        assert events[-1]["result"]["generated"] == ["lsp-python-pylsp"]
+
+    def test_idle_timeout_wraps_command(self, marketplace_generator, registry, temp_dir):
+        """Servers with idle_timeout or record run through the launcher."""
+        config = {
+            "ensure_installed": ["gopls", "pylsp", "ts_ls", "bashls", "clangd", "rust_analyzer"],
+            "servers": {
+                "gopls": {"idle_timeout": 30},
+                "ts_ls": {"record": "~/sessions"},
+                "bashls": {"supervise": True},
+                "clangd": {"coalesce_diagnostics": True},
+                "rust_analyzer": {"shared_cache": True},
+            },
+        }
+
+        returncode, _, stderr = run_generator(marketplace_generator, config, registry, temp_dir)
+        assert returncode == 0, stderr
+
+        plugins = temp_dir / "marketplace" / "plugins"
+        go = json.loads((plugins / "lsp-go" / ".lsp.json").read_text())["go"]
+        assert os.path.isabs(go["command"])
+        assert os.access(go["command"], os.X_OK)
+        assert Path(go["args"][0]).name == "lsp-launch.py"
+        assert Path(go["args"][0]).is_file()
+        assert go["args"][1:] == ["--idle-timeout", "30", "--", "gopls", "serve"]
+
+        python = json.loads((plugins / "lsp-python-pylsp" / ".lsp.json").read_text())["python"]
+        assert python["command"] == "pylsp"
+
+        typescript = json.loads((plugins / "lsp-typescript" / ".lsp.json").read_text())["typescript"]
+        assert typescript["args"][1:] == ["--record", "~/sessions", "--", "typescript-language-server", "--stdio"]
+
+        bash = json.loads((plugins / "lsp-bash" / ".lsp.json").read_text())["bash"]
+        assert bash["args"][1:] == ["--supervise", "--name", "bashls", "--", "bash-language-server", "start"]
+
+        cpp = json.loads((plugins / "lsp-cpp" / ".lsp.json").read_text())["cpp"]
+        assert cpp["args"][1:] == ["--coalesce-diagnostics", "200", "--name", "clangd", "--", "clangd"]
+
+        rust = json.loads((plugins / "lsp-rust" / ".lsp.json").read_text())["rust"]
+        assert rust["args"][1:] == [
+            "--shared-cache", "~/.cache/lspctl/repos",
+            "--cache-env", "CARGO_TARGET_DIR={cache}/target",
+            "--name", "rust_analyzer",
+            "--", "rust-analyzer",
+        ]
+
+    def test_bundle_single_plugin(self, marketplace_generator, registry, temp_dir, plugin_root):
+        """--bundle writes one plugin; servers sharing a language are keyed by name."""
+        config = {
+            "ensure_installed": ["pylsp", "pyright", "lua_ls"],
+            "servers": {"pyright": {"settings": {"python": {"analysis": {"strict": True}}}}},
+        }
+
+        returncode, stdout, stderr = run_generator(
+            marketplace_generator, config, registry, temp_dir, extra_args=["--bundle"]
+        )
+        assert returncode == 0, stderr
+        result = json.loads(stdout)
+        assert result["generated"] == ["lsp-bundle"]
+
+        marketplace_dir = temp_dir / "marketplace"
+        assert [p.name for p in (marketplace_dir / "plugins").iterdir()] == ["lsp-bundle"]
+        marketplace = json.loads((marketplace_dir / ".claude-plugin" / "marketplace.json").read_text())
+        [entry] = marketplace["plugins"]
+        assert entry["name"] == "lsp-bundle"
+        assert entry["keywords"] == ["lsp", "python", "lua"]
+
+        lsp_json = json.loads((marketplace_dir / "plugins" / "lsp-bundle" / ".lsp.json").read_text())
+        assert list(lsp_json) == ["pylsp", "pyright", "lua"]
+        assert lsp_json["pylsp"]["command"] == "pylsp"
+        assert lsp_json["pyright"]["settings"] == {"python": {"analysis": {"strict": True}}}
+        assert lsp_json["lua"]["command"] == registry["lua_ls"]["command"]
+
+        removed = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--remove", "pylsp",
+                "--registry", str(plugin_root / "registry" / "servers.json"),
+                "--output", str(marketplace_dir),
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert removed.returncode == 1
+        assert "regenerate with --bundle" in removed.stderr
+
+    def test_binaries_outside_path(self, marketplace_generator, registry, temp_dir):
+        """Servers installed by Mason or in an extra root run by absolute path."""
+        mason_gopls = temp_dir / "mason" / "bin" / "gopls"
+        extra_pylsp = temp_dir / "tools" / "pylsp"
+        for binary in (mason_gopls, extra_pylsp):
+            binary.parent.mkdir(parents=True)
+            binary.write_text("#!/bin/sh\necho 1.0\n")
+            binary.chmod(0o755)
+        env = {
+            **os.environ,
+            "PATH": "/usr/bin:/bin",
+            "HOME": str(temp_dir / "home"),
+            "MASON": str(temp_dir / "mason"),
+            "LSPCTL_SEARCH_ROOTS": str(temp_dir / "tools"),
+        }
+        config = {"ensure_installed": ["gopls", "pylsp", "lua_ls"]}
+
+        returncode, stdout, stderr = run_generator(
+            marketplace_generator, config, registry, temp_dir, env=env
+        )
+        assert returncode == 0, stderr
+        result = json.loads(stdout)
+        assert result["binaries"]["gopls"]["path"] == str(mason_gopls)
+        assert result["binaries"]["gopls"]["root"] == "mason"
+        assert result["binaries"]["pylsp"]["root"] == "extra"
+        assert list(result["missing_binaries"]) == ["lua_ls"]
+
+        plugins = temp_dir / "marketplace" / "plugins"
+        assert json.loads((plugins / "lsp-go" / ".lsp.json").read_text())["go"]["command"] == str(mason_gopls)
+        python = json.loads((plugins / "lsp-python-pylsp" / ".lsp.json").read_text())["python"]
+        assert python["command"] == str(extra_pylsp)
+        lua = json.loads((plugins / "lsp-lua" / ".lsp.json").read_text())["lua"]
+        assert lua["command"] == registry["lua_ls"]["command"]
+
     def test_unknown_server_warning(
         self, marketplace_generator, registry, temp_dir
     ):
@@ -588,3 +731,77 @@ class TestMarketplaceDeregister:
 
         assert result_data["files_deleted"] is False
         assert result_data["plugins_removed"] == []
+
+
+class TestConcurrentSync:
+    """Tests for many syncs sharing one marketplace and settings file."""
+
+    def test_parallel_syncs_stay_consistent(
+        self, marketplace_generator, registry, temp_dir
+    ):
+        """Parallel syncs serialize without corrupting shared files."""
+        registry_file = temp_dir / "registry.json"
+        registry_file.write_text(json.dumps(registry))
+        output_dir = temp_dir / "marketplace"
+        settings_path = temp_dir / "settings.json"
+        settings_path.write_text(json.dumps({"theme": "dark", "enabledPlugins": {"x@y": True}}))
+
+        server_sets = [
+            ["pylsp"],
+            ["lua_ls", "gopls"],
+            ["ts_ls", "jsonls", "yamlls"],
+            ["rust_analyzer", "clangd", "bashls", "pyright"],
+        ]
+
+        def sync(i: int) -> subprocess.Popen:
+            config_file = temp_dir / f"config-{i}.json"
+            config_file.write_text(json.dumps({"ensure_installed": server_sets[i % 4]}))
+            return subprocess.Popen(
+                [
+                    "python3", str(marketplace_generator),
+                    "--config", str(config_file),
+                    "--registry", str(registry_file),
+                    "--output", str(output_dir),
+                    "--settings", str(settings_path),
+                    "--json-output",
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+
+        first = sync(0)
+        _, stderr = first.communicate()
+        assert first.returncode == 0, stderr
+
+        procs = [sync(i) for i in range(16)]
+
+        # Readers never see a missing or partially written marketplace.json
+        marketplace_json = output_dir / ".claude-plugin" / "marketplace.json"
+        reads = 0
+        while any(p.poll() is None for p in procs):
+            json.loads(marketplace_json.read_text())
+            reads += 1
+        assert reads > 0
+
+        for proc in procs:
+            _, stderr = proc.communicate()
+            assert proc.returncode == 0, stderr
+
+        settings = json.loads(settings_path.read_text())
+        assert settings["theme"] == "dark"
+        assert settings["enabledPlugins"] == {"x@y": True}
+        assert settings["extraKnownMarketplaces"]["generated-lsp"]["source"]["path"] == \
+            str(output_dir.absolute())
+
+        # The marketplace matches exactly one sync's output
+        marketplace = json.loads(marketplace_json.read_text())
+        listed = sorted(p["name"] for p in marketplace["plugins"])
+        on_disk = sorted(p.name for p in (output_dir / "plugins").iterdir())
+        assert listed == on_disk
+        expected = [sorted(registry[s]["pluginName"] for s in servers) for servers in server_sets]
+        assert listed in expected
+
+        # No build or swap directories are left behind
+        leftovers = [p.name for p in temp_dir.iterdir() if ".build-" in p.name or ".old-" in p.name]
+        assert leftovers == []
@@ -0,0 +1,245 @@
+"""Tests for the Mason registry importer and the SQLite registry store."""
+
+import json
+import sqlite3
+import subprocess
+import zipfile
+from pathlib import Path
+
+import pytest
+
+
+def run_importer(mason_importer: Path, *args: str) -> subprocess.CompletedProcess:
+    """Run the Mason registry importer script."""
+    return subprocess.run(
+        ["python3", str(mason_importer), *args],
+        capture_output=True,
+        text=True,
+    )
+
+
+@pytest.fixture
+def registry_store(mason_importer, mason_snapshot, plugin_root, temp_dir) -> Path:
+    """Import the snapshot fixture with the bundled registry as overlay."""
+    store = temp_dir / "registry.db"
+    result = run_importer(
+        mason_importer,
+        "--snapshot", str(mason_snapshot),
+        "--overlay", str(plugin_root / "registry" / "servers.json"),
+        "--output", str(store),
+        "--json-output",
+    )
+    assert result.returncode == 0, result.stderr
+    return store
+
+
+def load_entry(store: Path, name: str) -> dict | None:
+    """Read one entry straight from the store."""
+    conn = sqlite3.connect(store)
+    try:
+        row = conn.execute("SELECT entry FROM servers WHERE name = ?", (name,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+
+class TestMasonTranslation:
+    """Tests for translating Mason packages into registry entries."""
+
+    def test_only_lsp_packages_with_lspconfig_name(
+        self, mason_importer, mason_snapshot, temp_dir
+    ):
+        """Test that formatters and unmapped packages are skipped."""
+        store = temp_dir / "registry.db"
+        result = run_importer(
+            mason_importer,
+            "--snapshot", str(mason_snapshot),
+            "--output", str(store),
+            "--json-output",
+        )
+        assert result.returncode == 0
+        summary = json.loads(result.stdout)
+        assert summary["packages_read"] == 8
+        assert summary["servers_imported"] == 6
+
+        assert load_entry(store, "stylua") is None
+        assert load_entry(store, "lua_ls") is not None
+
+    def test_npm_package_translation(self, mason_importer, mason_snapshot, temp_dir):
+        """Test command, args, install methods and file types for npm servers."""
+        store = temp_dir / "registry.db"
+        run_importer(
+            mason_importer, "--snapshot", str(mason_snapshot), "--output", str(store)
+        )
+
+        pyright = load_entry(store, "pyright")
+        assert pyright["command"] == "pyright-langserver"
+        assert pyright["args"] == ["--stdio"]
+        assert pyright["installCommands"]["npm"] == "npm install -g pyright"
+        assert pyright["extensionToLanguage"][".py"] == "python"
+        assert pyright["language"] == "python"
+
+        volar = load_entry(store, "volar")
+        assert volar["installCommands"]["npm"] == "npm install -g @vue/language-server"
+        assert volar["pluginName"] == "lsp-volar"
+
+    def test_other_package_sources(self, mason_importer, mason_snapshot, temp_dir):
+        """Test install commands for pypi, golang and cargo sources."""
+        store = temp_dir / "registry.db"
+        run_importer(
+            mason_importer, "--snapshot", str(mason_snapshot), "--output", str(store)
+        )
+
+        assert load_entry(store, "pylsp")["installCommands"]["pipx"] == (
+            "pipx install python-lsp-server"
+        )
+        assert load_entry(store, "gopls")["installCommands"]["go"] == (
+            "go install golang.org/x/tools/gopls@latest"
+        )
+        taplo = load_entry(store, "taplo")
+        assert taplo["installCommands"]["cargo"] == "cargo install taplo-cli"
+        assert taplo["args"] == []
+
+    def test_zip_snapshot(self, mason_importer, mason_snapshot, temp_dir):
+        """Test reading the registry.json.zip release asset."""
+        archive = temp_dir / "registry.json.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.write(mason_snapshot, "registry.json")
+
+        store = temp_dir / "registry.db"
+        result = run_importer(
+            mason_importer, "--snapshot", str(archive), "--output", str(store)
+        )
+        assert result.returncode == 0, result.stderr
+        assert load_entry(store, "gopls") is not None
+
+
+class TestRegistryStore:
+    """Tests for the indexed store and overlay precedence."""
+
+    def test_overlay_takes_precedence(self, registry_store, registry):
+        """Test that hand-maintained entries override Mason translations."""
+        assert load_entry(registry_store, "pylsp") == registry["pylsp"]
+        assert load_entry(registry_store, "gopls")["args"] == ["serve"]
+        # Mason-only servers are still present
+        assert load_entry(registry_store, "taplo") is not None
+
+    def test_indexes_exist(self, registry_store):
+        """Test that language and extension lookups are indexed."""
+        conn = sqlite3.connect(registry_store)
+        try:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT name FROM servers WHERE language = ?",
+                ("python",),
+            ).fetchall()
+            ext_plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT name FROM server_extensions WHERE extension = ?",
+                (".py",),
+            ).fetchall()
+        finally:
+            conn.close()
+        assert any("USING INDEX" in row[-1] or "USING COVERING INDEX" in row[-1] for row in plan)
+        assert any("INDEX" in row[-1] for row in ext_plan)
+
+    def test_find_by_extension(self, mason_importer, registry_store):
+        """Test querying servers for a file extension."""
+        result = run_importer(
+            mason_importer,
+            "--output", str(registry_store),
+            "--find-extension", ".py",
+            "--json-output",
+        )
+        assert result.returncode == 0
+        assert json.loads(result.stdout) == ["pylsp", "pyright"]
+
+    def test_find_by_language(self, mason_importer, registry_store):
+        """Test querying servers for a language."""
+        result = run_importer(
+            mason_importer,
+            "--output", str(registry_store),
+            "--find-language", "toml",
+            "--json-output",
+        )
+        assert json.loads(result.stdout) == ["taplo"]
+
+
+class TestGeneratorWithStore:
+    """Tests for generate-marketplace.py reading the SQLite store."""
+
+    def test_generate_from_store(self, marketplace_generator, registry_store, temp_dir):
+        """Test generating plugins for overlay and Mason-only servers."""
+        config = temp_dir / "config.json"
+        config.write_text(json.dumps({
+            "ensure_installed": ["pylsp", "taplo", "unknown_server"],
+            "servers": {},
+        }))
+        output = temp_dir / "marketplace"
+
+        result = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--config", str(config),
+                "--registry", str(registry_store),
+                "--output", str(output),
+                "--json-output",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        data = json.loads(result.stdout)
+        assert data["generated"] == ["lsp-python-pylsp", "lsp-taplo"]
+        assert data["unknown_servers"] == ["unknown_server"]
+
+        with open(output / "plugins" / "lsp-taplo" / ".lsp.json") as f:
+            lsp_json = json.load(f)
+        assert lsp_json["toml"]["command"] == "taplo"
+
+    def test_remove_with_store(self, marketplace_generator, registry_store, temp_dir):
+        """Test --remove resolves plugin names through the store."""
+        config = temp_dir / "config.json"
+        config.write_text(json.dumps({"ensure_installed": ["taplo"], "servers": {}}))
+        output = temp_dir / "marketplace"
+        common = ["--registry", str(registry_store), "--output", str(output), "--json-output"]
+
+        subprocess.run(
+            ["python3", str(marketplace_generator), "--config", str(config), *common],
+            capture_output=True,
+            text=True,
+        )
+        result = subprocess.run(
+            ["python3", str(marketplace_generator), "--remove", "taplo", *common],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0
+        assert json.loads(result.stdout)["removed"] == "lsp-taplo"
+
+    def test_rebuild_state_with_store(self, marketplace_generator, registry_store, temp_dir):
+        """Test --rebuild-state maps plugins back to servers through the store."""
+        config = temp_dir / "config.json"
+        config.write_text(json.dumps({"ensure_installed": ["taplo", "pylsp"], "servers": {}}))
+        output = temp_dir / "marketplace"
+        common = ["--registry", str(registry_store), "--output", str(output), "--json-output"]
+
+        subprocess.run(
+            ["python3", str(marketplace_generator), "--config", str(config), "--no-state", *common],
+            capture_output=True,
+            text=True,
+        )
+        subprocess.run(
+            ["python3", str(marketplace_generator), "--rebuild-state", *common],
+            capture_output=True,
+            text=True,
+        )
+        result = subprocess.run(
+            ["python3", str(marketplace_generator), "--show-state", *common],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        plugins = json.loads(result.stdout)["plugins"]
+        assert {(p["plugin_name"], p["server_name"]) for p in plugins} == {
+            ("lsp-taplo", "taplo"),
+            ("lsp-python-pylsp", "pylsp"),
+        }
@@ -0,0 +1,186 @@
+"""Tests for the plan/apply sync engine."""
+
+import json
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+STUB_CLAUDE = r'''#!/usr/bin/env python3
+"""Stub Claude CLI that installs plugins from the generated marketplace."""
+import fcntl, json, os, shutil, sys
+from pathlib import Path
+
+config_dir = Path(os.environ["CLAUDE_CONFIG_DIR"])
+marketplace = Path(os.environ["STUB_MARKETPLACE"])
+action, key = sys.argv[2], sys.argv[3]
+plugin = key.split("@")[0]
+
+with open(config_dir / "stub-calls.log", "a") as f:
+    f.write(f"{action} {plugin}\n")
+
+registry = config_dir / "plugins" / "installed_plugins.json"
+registry.parent.mkdir(parents=True, exist_ok=True)
+with open(config_dir / "stub.lock", "w") as lock:
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    data = json.loads(registry.read_text()) if registry.exists() else {"version": 2, "plugins": {}}
+    install_path = config_dir / "plugins" / "cache" / plugin
+    if action == "install":
+        if install_path.exists():
+            shutil.rmtree(install_path)
+        shutil.copytree(marketplace / "plugins" / plugin, install_path)
+        data["plugins"][key] = [{"scope": "user", "installPath": str(install_path)}]
+    else:
+        data["plugins"].pop(key, None)
+        shutil.rmtree(install_path, ignore_errors=True)
+    registry.write_text(json.dumps(data))
+'''
+
+
+@pytest.fixture
+def sync_env(temp_dir, registry, marketplace_generator):
+    """Stub Claude CLI plus a helper that runs the generator in plan/apply mode."""
+    config_dir = temp_dir / "claude-config"
+    config_dir.mkdir()
+    bin_dir = temp_dir / "bin"
+    bin_dir.mkdir()
+    claude = bin_dir / "claude"
+    claude.write_text(STUB_CLAUDE)
+    claude.chmod(0o755)
+
+    output_dir = temp_dir / "marketplace"
+    settings_path = config_dir / "settings.json"
+    registry_file = temp_dir / "registry.json"
+    registry_file.write_text(json.dumps(registry))
+    env = {
+        **os.environ,
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+        "CLAUDE_CONFIG_DIR": str(config_dir),
+        "STUB_MARKETPLACE": str(output_dir),
+    }
+
+    def run(config: dict, *mode: str) -> dict:
+        config_file = temp_dir / "config.json"
+        config_file.write_text(json.dumps(config))
+        result = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--config", str(config_file),
+                "--registry", str(registry_file),
+                "--output", str(output_dir),
+                "--settings", str(settings_path),
+                "--json-output",
+                *mode,
+            ],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout)
+
+    def calls() -> list[str]:
+        log = config_dir / "stub-calls.log"
+        lines = log.read_text().splitlines() if log.exists() else []
+        log.unlink(missing_ok=True)
+        return sorted(lines)
+
+    run.calls = calls
+    run.output_dir = output_dir
+    run.settings_path = settings_path
+    return run
+
+
+def actions(plan: dict) -> dict[str, str]:
+    return {step["plugin"]: step["action"] for step in plan["steps"]}
+
+
+class TestPlanApply:
+    """Tests for --dry-run and --apply."""
+
+    def test_dry_run_changes_nothing(self, sync_env):
+        """A fresh plan adds everything without generating or calling the CLI."""
+        plan = sync_env({"ensure_installed": ["pylsp", "lua_ls"]}, "--dry-run")
+
+        assert actions(plan) == {"lsp-python-pylsp": "add", "lsp-lua": "add"}
+        assert plan["summary"] == {"add": 2, "update": 0, "remove": 0, "noop": 0}
+        assert plan["regenerate"] is True
+        assert not sync_env.output_dir.exists()
+        assert sync_env.calls() == []
+
+    def test_apply_then_noop(self, sync_env):
+        """Applying installs everything once; a second apply does nothing."""
+        config = {"ensure_installed": ["pylsp", "lua_ls"]}
+
+        result = sync_env(config, "--apply")
+        assert result["ok"]
+        assert sync_env.calls() == ["install lsp-lua", "install lsp-python-pylsp"]
+        assert (sync_env.output_dir / "plugins" / "lsp-lua" / ".lsp.json").exists()
+
+        plan = sync_env(config, "--dry-run")
+        assert set(actions(plan).values()) == {"noop"}
+        assert plan["regenerate"] is False
+
+        result = sync_env(config, "--apply")
+        assert result["generation"] is None
+        assert sync_env.calls() == []
+
+    def test_changed_settings_update_one_plugin(self, sync_env):
+        """Only the plugin whose settings changed is reinstalled."""
+        sync_env({"ensure_installed": ["pylsp", "lua_ls"]}, "--apply")
+        sync_env.calls()
+
+        config = {
+            "ensure_installed": ["pylsp", "lua_ls"],
+            "servers": {"lua_ls": {"settings": {"Lua": {"diagnostics": {"globals": ["vim"]}}}}},
+        }
+        plan = sync_env(config, "--dry-run")
+        assert actions(plan) == {"lsp-python-pylsp": "noop", "lsp-lua": "update"}
+
+        sync_env(config, "--apply")
+        assert sync_env.calls() == ["install lsp-lua", "uninstall lsp-lua"]
+        assert set(actions(sync_env(config, "--dry-run")).values()) == {"noop"}
+
+    def test_dropped_server_removed(self, sync_env):
+        """Servers dropped from the config are uninstalled and ungenerated."""
+        sync_env({"ensure_installed": ["pylsp", "lua_ls"]}, "--apply")
+        sync_env.calls()
+
+        config = {"ensure_installed": ["pylsp"]}
+        plan = sync_env(config, "--dry-run")
+        assert actions(plan) == {"lsp-python-pylsp": "noop", "lsp-lua": "remove"}
+        assert plan["steps"][1]["server_name"] == "lua_ls"
+
+        sync_env(config, "--apply")
+        assert sync_env.calls() == ["uninstall lsp-lua"]
+        assert not (sync_env.output_dir / "plugins" / "lsp-lua").exists()
+
+    def test_disabled_plugin_left_alone(self, sync_env):
+        """Plugins the user disabled are not reinstalled."""
+        config = {"ensure_installed": ["pylsp"]}
+        sync_env(config, "--apply")
+        sync_env.calls()
+
+        settings = json.loads(sync_env.settings_path.read_text())
+        settings["enabledPlugins"] = {"lsp-python-pylsp@generated-lsp": False}
+        sync_env.settings_path.write_text(json.dumps(settings))
+
+        plan = sync_env(config, "--dry-run")
+        assert plan["steps"][0]["action"] == "noop"
+        assert plan["steps"][0]["reason"] == "disabled in settings"
+
+    def test_switch_to_bundle(self, sync_env):
+        """Switching to --bundle swaps the per-server plugins for one bundle."""
+        config = {"ensure_installed": ["pylsp", "lua_ls"]}
+        sync_env(config, "--apply")
+        sync_env.calls()
+
+        plan = sync_env(config, "--dry-run", "--bundle")
+        assert actions(plan) == {"lsp-bundle": "add", "lsp-python-pylsp": "remove", "lsp-lua": "remove"}
+
+        sync_env(config, "--apply", "--bundle")
+        assert sync_env.calls() == ["install lsp-bundle", "uninstall lsp-lua", "uninstall lsp-python-pylsp"]
+        assert sorted(p.name for p in (sync_env.output_dir / "plugins").iterdir()) == ["lsp-bundle"]
+        assert set(actions(sync_env(config, "--dry-run", "--bundle")).values()) == {"noop"}
@@ -0,0 +1,284 @@
+"""Tests for the Claude CLI plugin runner."""
+
+import json
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+STUB_CLAUDE = r'''#!/usr/bin/env python3
+"""Stub Claude CLI: logs calls and follows per-plugin behaviour from $STUB_BEHAVIOR."""
+import json, os, sys, time
+from pathlib import Path
+
+stub_dir = Path(os.environ["STUB_DIR"])
+plugin = sys.argv[3].split("@")[0]
+behavior = json.loads(os.environ.get("STUB_BEHAVIOR", "{}")).get(plugin, {})
+
+counter = stub_dir / f"{plugin}.count"
+calls = int(counter.read_text()) + 1 if counter.exists() else 1
+counter.write_text(str(calls))
+
+def log(event):
+    with open(stub_dir / "calls.log", "a") as f:
+        f.write(json.dumps({"event": event, "plugin": plugin, "argv": sys.argv[1:], "t": time.time()}) + "\n")
+
+# Read-modify-write settings.json and installed_plugins.json the way the
+# CLI enables a plugin
+settings_file = Path(os.environ.get("STUB_SETTINGS", stub_dir / "settings.json"))
+settings = json.loads(settings_file.read_text()) if settings_file.exists() else {}
+installed_file = Path(os.environ["CLAUDE_CONFIG_DIR"]) / "plugins" / "installed_plugins.json"
+installed = json.loads(installed_file.read_text()) if installed_file.exists() else {"plugins": {}}
+log("start")
+time.sleep(behavior.get("sleep", 0.2))
+log("end")
+if calls <= behavior.get("transient_failures", 0):
+    print(behavior.get("error", "Error: read ECONNRESET"), file=sys.stderr)
+    sys.exit(1)
+if behavior.get("fail"):
+    print(f"Error: Plugin {plugin} not found", file=sys.stderr)
+    sys.exit(1)
+settings.setdefault("enabledPlugins", {})[sys.argv[3]] = True
+settings_file.write_text(json.dumps(settings))
+installed["plugins"][sys.argv[3]] = [{"scope": "user"}]
+installed_file.parent.mkdir(parents=True, exist_ok=True)
+installed_file.write_text(json.dumps(installed))
+print(f"Installed {plugin}")
+'''
+
+
+@pytest.fixture
+def stub_claude(temp_dir):
+    """Put a stub `claude` on PATH and return (env, stub_dir)."""
+    bin_dir = temp_dir / "bin"
+    bin_dir.mkdir()
+    claude = bin_dir / "claude"
+    claude.write_text(STUB_CLAUDE)
+    claude.chmod(0o755)
+    stub_dir = temp_dir / "stub"
+    stub_dir.mkdir()
+    env = {
+        **os.environ,
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+        "STUB_DIR": str(stub_dir),
+        "CLAUDE_CONFIG_DIR": str(temp_dir / "claude"),
+    }
+    return env, stub_dir
+
+
+def ops_command(script: Path, settings: Path, *args: str) -> list[str]:
+    return ["python3", str(script), *args, "--json-output", "--backoff", "0.05", "--settings", str(settings)]
+
+
+def run_ops(script: Path, env: dict, behavior: dict, *args: str) -> tuple[int, dict]:
+    result = subprocess.run(
+        ops_command(script, Path(env["STUB_DIR"]) / "settings.json", *args),
+        capture_output=True,
+        text=True,
+        env={**env, "STUB_BEHAVIOR": json.dumps(behavior)},
+    )
+    return result.returncode, json.loads(result.stdout)
+
+
+def installed_plugins(env: dict) -> list[str]:
+    path = Path(env["CLAUDE_CONFIG_DIR"]) / "plugins" / "installed_plugins.json"
+    return sorted(json.loads(path.read_text())["plugins"])
+
+
+def max_overlap(stub_dir: Path) -> int:
+    """Highest number of stub calls that were running at the same time."""
+    events = [json.loads(line) for line in (stub_dir / "calls.log").read_text().splitlines()]
+    running = peak = 0
+    for event in sorted(events, key=lambda e: (e["t"], e["event"] == "start")):
+        running += 1 if event["event"] == "start" else -1
+        peak = max(peak, running)
+    return peak
+
+
+class TestPluginOps:
+    """Tests for plugin-ops.py."""
+
+    def test_settings_writes_serialized(self, plugin_ops_script, stub_claude):
+        """Calls never overlap, so none loses a write."""
+        env, stub_dir = stub_claude
+        plugins = [f"lsp-{i}" for i in range(6)]
+
+        returncode, report = run_ops(plugin_ops_script, env, {}, "install", *plugins)
+
+        assert returncode == 0
+        assert report["summary"] == {"ok": 6, "failed": 0, "timeout": 0}
+        assert [r["plugin"] for r in report["results"]] == plugins
+        assert max_overlap(stub_dir) == 1
+        settings = json.loads((stub_dir / "settings.json").read_text())
+        assert sorted(settings["enabledPlugins"]) == sorted(f"{p}@generated-lsp" for p in plugins)
+        assert installed_plugins(env) == sorted(f"{p}@generated-lsp" for p in plugins)
+
+    def test_scopes_share_installed_plugins_lock(self, plugin_ops_script, stub_claude, temp_dir):
+        """Runs for different settings files still take turns on installed_plugins.json."""
+        env, stub_dir = stub_claude
+        runs = []
+        for scope in ("user", "project"):
+            settings = temp_dir / scope / "settings.json"
+            settings.parent.mkdir()
+            plugins = [f"lsp-{scope}-{i}" for i in range(3)]
+            runs.append(subprocess.Popen(
+                ops_command(plugin_ops_script, settings, "install", *plugins, "--no-state"),
+                stdout=subprocess.DEVNULL,
+                env={**env, "STUB_SETTINGS": str(settings)},
+            ))
+
+        assert [run.wait(timeout=60) for run in runs] == [0, 0]
+        assert max_overlap(stub_dir) == 1
+        assert installed_plugins(env) == sorted(
+            f"lsp-{scope}-{i}@generated-lsp" for scope in ("user", "project") for i in range(3)
+        )
+
+    @pytest.mark.parametrize("error, transient", [
+        ("Error: HTTP 503 Service Unavailable", True),
+        ("Error: settings.json is locked by another process", True),
+        ("Error: plugin blocked by policy", False),
+        ("Error: requires version 1.5.429", False),
+        ("Error: /cache/502/plugin.json is invalid", False),
+    ])
+    def test_transient_errors_matched_whole(self, plugin_ops_script, stub_claude, error, transient):
+        """Status codes and words count only on their own."""
+        env, _ = stub_claude
+
+        returncode, report = run_ops(
+            plugin_ops_script, env, {"lsp-go": {"transient_failures": 1, "error": error}},
+            "install", "lsp-go",
+        )
+
+        assert report["results"][0]["attempts"] == (2 if transient else 1)
+        assert returncode == (0 if transient else 1)
+
+    def test_transient_failure_retried(self, plugin_ops_script, stub_claude):
+        """Transient errors are retried until the call succeeds."""
+        env, _ = stub_claude
+
+        returncode, report = run_ops(
+            plugin_ops_script, env, {"lsp-go": {"transient_failures": 2}},
+            "install", "lsp-go", "lsp-lua",
+        )
+
+        assert returncode == 0
+        go, lua = report["results"]
+        assert go["status"] == "ok"
+        assert go["attempts"] == 3
+        assert [a["status"] for a in go["attempt_log"]] == ["failed", "failed", "ok"]
+        assert lua["attempts"] == 1
+
+    def test_permanent_failure_not_retried(self, plugin_ops_script, stub_claude):
+        """Non-transient errors fail immediately and fail the run."""
+        env, _ = stub_claude
+
+        returncode, report = run_ops(
+            plugin_ops_script, env, {"lsp-bad": {"fail": True}},
+            "uninstall", "lsp-bad", "lsp-lua",
+        )
+
+        assert returncode == 1
+        bad = report["results"][0]
+        assert bad["status"] == "failed"
+        assert bad["attempts"] == 1
+        assert "not found" in bad["output"]
+        assert report["summary"] == {"ok": 1, "failed": 1, "timeout": 0}
+
+    def test_timeout(self, plugin_ops_script, stub_claude):
+        """Hung calls are killed after --timeout and retried."""
+        env, _ = stub_claude
+
+        returncode, report = run_ops(
+            plugin_ops_script, env, {"lsp-slow": {"sleep": 30}},
+            "install", "lsp-slow", "--timeout", "0.5", "--retries", "1",
+        )
+
+        assert returncode == 1
+        slow = report["results"][0]
+        assert slow["status"] == "timeout"
+        assert slow["attempts"] == 2
+        assert report["duration_ms"] < 10000
+
+    def test_events_stream_as_calls_finish(self, plugin_ops_script, stub_claude):
+        """--events reports each outcome while later calls are still running."""
+        env, stub_dir = stub_claude
+        process = subprocess.Popen(
+            [
+                "python3", str(plugin_ops_script), "install", "lsp-bad", "lsp-slow",
+                "--events", "--no-state", "--settings", str(stub_dir / "settings.json"),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            env={**env, "STUB_BEHAVIOR": json.dumps({"lsp-bad": {"fail": True}, "lsp-slow": {"sleep": 2}})},
+        )
+        events = []
+        for line in process.stdout:
+            events.append(json.loads(line))
+            if events[-1]["event"] == "install_finished":
+                # The failure arrives before the run is over
+                assert process.poll() is None
+                break
+        events.extend(json.loads(line) for line in process.stdout)
+        assert process.wait() == 1
+
+        assert [e["event"] for e in events] == [
+            "install_started", "install_finished", "install_started", "install_finished", "result",
+        ]
+        bad, slow = events[1], events[3]
+        assert (bad["plugin"], bad["status"], bad["attempts"]) == ("lsp-bad", "failed", 1)
+        assert (slow["plugin"], slow["status"]) == ("lsp-slow", "ok")
+        assert slow["duration_ms"] >= 2000
+        assert events[-1]["result"]["summary"] == {"ok": 1, "failed": 1, "timeout": 0}
+        assert all(a["t_ms"] <= b["t_ms"] for a, b in zip(events, events[1:]))
+
+    def test_from_marketplace_and_history(
+        self, plugin_ops_script, marketplace_generator, registry, stub_claude, temp_dir
+    ):
+        """Plugins come from a generated marketplace; outcomes reach the state store."""
+        env, stub_dir = stub_claude
+        config_file = temp_dir / "config.json"
+        config_file.write_text(json.dumps({"ensure_installed": ["pylsp", "lua_ls"]}))
+        registry_file = temp_dir / "registry.json"
+        registry_file.write_text(json.dumps(registry))
+        output_dir = temp_dir / "marketplace"
+        subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--config", str(config_file),
+                "--registry", str(registry_file),
+                "--output", str(output_dir),
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+        returncode, report = run_ops(
+            plugin_ops_script, env, {},
+            "install", "--from-marketplace", str(output_dir), "--scope", "project",
+        )
+
+        assert returncode == 0
+        argvs = [
+            json.loads(line)["argv"]
+            for line in (stub_dir / "calls.log").read_text().splitlines()
+            if json.loads(line)["event"] == "start"
+        ]
+        assert sorted(argvs) == [
+            ["plugin", "install", "lsp-lua@generated-lsp", "--scope", "project"],
+            ["plugin", "install", "lsp-python-pylsp@generated-lsp", "--scope", "project"],
+        ]
+
+        state = json.loads(subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--output", str(output_dir), "--show-state", "--json-output",
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout)
+        installs = [h for h in state["history"] if h["action"] == "plugin-install"]
+        assert sorted(h["detail"] for h in installs) == ["lsp-lua", "lsp-python-pylsp"]
+        assert all(h["status"] == "ok" for h in installs)
@@ -0,0 +1,167 @@
+"""Tests for recording sessions (lsp-launch --record) and replaying them (lsp-replay)."""
+
+import gzip
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+class Session:
+    """Drives a launcher one message at a time; server requests get a null result."""
+
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.next_id = 0
+
+    def send(self, message: dict):
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode()
+        self.process.stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        self.process.stdin.flush()
+
+    def notify(self, method: str, params: dict | None = None):
+        self.send({"method": method, "params": params or {}})
+
+    def request(self, method: str, params: dict | None = None) -> dict:
+        self.next_id += 1
+        self.send({"id": self.next_id, "method": method, "params": params or {}})
+        stream = self.process.stdout
+        while True:
+            length = int(stream.readline().split(b":")[1])
+            stream.readline()
+            message = json.loads(stream.read(length))
+            if "method" in message and "id" in message:
+                self.send({"id": message["id"], "result": None})
+            elif message.get("id") == self.next_id:
+                return message
+
+
+@pytest.fixture
+def record(plugin_root, fixtures_dir, temp_dir):
+    """Start the launcher in front of the fake server, recording to temp_dir/sessions."""
+    processes = []
+
+    def _record() -> Session:
+        process = subprocess.Popen(
+            [
+                sys.executable, str(plugin_root / "scripts" / "lsp-launch.py"),
+                "--record", str(temp_dir / "sessions"),
+                "--", sys.executable, str(fixtures_dir / "fake-lsp-server.py"),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        processes.append(process)
+        return Session(process)
+
+    _record.sessions = lambda: sorted((temp_dir / "sessions").glob("*.jsonl.gz"))
+    yield _record
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def replay(plugin_root, fixtures_dir, registry, temp_dir, monkeypatch):
+    """Run lsp-replay.py against a registry with the fake server in it."""
+    events = temp_dir / "events.log"
+    monkeypatch.setenv("FAKE_LSP_LOG", str(events))
+    test_registry = dict(registry)
+    test_registry["fake"] = {
+        "pluginName": "lsp-fake",
+        "language": "python",
+        "description": "Fake server",
+        "command": sys.executable,
+        "args": [str(fixtures_dir / "fake-lsp-server.py")],
+        "extensionToLanguage": {".py": "python"},
+        "installCommands": {},
+    }
+    registry_file = temp_dir / "registry.json"
+    registry_file.write_text(json.dumps(test_registry))
+
+    def _replay(session, *args: str) -> dict:
+        result = subprocess.run(
+            [
+                "python3", str(plugin_root / "scripts" / "lsp-replay.py"),
+                str(session), "fake",
+                "--registry", str(registry_file),
+                "--no-state",
+                "--json-output",
+                *args,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr + result.stdout
+        return json.loads(result.stdout)
+
+    _replay.events = lambda: [line.split(" ", 1)[1] for line in events.read_text().splitlines()]
+    return _replay
+
+
+def handshake(session: Session, root: str = "file:///recorded/ws"):
+    session.request("initialize", {"processId": 1, "rootUri": root, "capabilities": {}})
+    session.notify("initialized")
+
+
+class TestRecordReplay:
+    """A recorded session drives a server and is measured."""
+
+    def test_replay_reports_latency_and_memory(self, record, replay, temp_dir):
+        """Client traffic is replayed into another project with other settings."""
+        session = record()
+        handshake(session)
+        session.notify("workspace/didChangeConfiguration", {"settings": {"fake": {"level": 1}}})
+        session.notify("textDocument/didOpen", {"textDocument": {
+            "uri": "file:///recorded/ws/a.py", "languageId": "python", "version": 1, "text": "x = 1\n",
+        }})
+        for _ in range(3):
+            session.request("fake/state")
+        assert "error" in session.request("textDocument/hover")
+        session.request("shutdown")
+        session.notify("exit")
+        assert session.process.wait(timeout=10) == 0
+
+        [log] = record.sessions()
+        with gzip.open(log, "rt") as f:
+            header, *entries = [json.loads(line) for line in f]
+        assert header["lspctl_session"] == 1
+        assert header["command"][-1].endswith("fake-lsp-server.py")
+        assert {direction for _, direction, _ in entries} == {"c", "s"}
+
+        project = temp_dir / "project"
+        project.mkdir()
+        report = replay(log, "--speed", "0", "--project", str(project), "--settings", '{"fake": {"level": 2}}')
+        assert report["status"] == "ok"
+        assert report["unanswered"] == 0
+        assert report["requests"] == 6
+        methods = report["methods"]
+        assert methods["fake/state"]["count"] == 3
+        assert methods["fake/state"]["p50_ms"] <= methods["fake/state"]["p99_ms"]
+        assert methods["textDocument/hover"]["errors"] == 1
+        assert methods["shutdown"]["count"] == 1
+        assert report["peak_rss_kb"] > 0
+        assert report["throughput_rps"] > 0
+        assert f"didOpen {project.resolve().as_uri()}/a.py" in replay.events()
+
+    def test_cut_off_session_replays_at_pace(self, record, replay):
+        """A killed recording still replays, at its recorded pacing, and ends cleanly."""
+        session = record()
+        handshake(session)
+        time.sleep(0.5)
+        session.request("fake/state")
+        session.process.kill()
+        session.process.wait()
+
+        [log] = record.sessions()
+        report = replay(log)
+        assert report["status"] == "ok"
+        assert report["methods"]["fake/state"]["count"] == 1
+        # The missing shutdown is sent once everything was answered
+        assert report["methods"]["shutdown"]["count"] == 1
+        assert report["duration_s"] >= 0.4
+        assert replay.events()[-2:] == ["shutdown", "exit"]
@@ -0,0 +1,151 @@
+"""Tests for resolving version-manager shims at sync time."""
+
+import json
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+FAKE_ASDF = """#!/bin/sh
+# asdf which <command>: the install .tool-versions in the cwd selects
+# (every call logs its subcommand; probing the shim runs "asdf exec")
+echo "$1" >> "$ASDF_DATA_DIR/calls"
+version=$(sed -n 's/^python //p' .tool-versions 2>/dev/null)
+[ -n "$version" ] || exit 1
+echo "$ASDF_DATA_DIR/installs/python/$version/bin/$2"
+"""
+
+
+def make_executable(path: Path, body: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(body)
+    path.chmod(0o755)
+
+
+@pytest.fixture
+def asdf_env(temp_dir):
+    """A project whose pylsp is an asdf shim over two installed versions."""
+    asdf = temp_dir / "asdf"
+    make_executable(asdf / "shims" / "pylsp", "#!/bin/sh\nexec asdf exec pylsp \"$@\"\n")
+    make_executable(temp_dir / "bin" / "asdf", FAKE_ASDF)
+    for version in ("3.11.9", "3.12.4"):
+        install = asdf / "installs" / "python" / version / "bin"
+        make_executable(install / "python3", "#!/bin/sh\n")
+        make_executable(install / "pylsp", "#!/usr/bin/env python3\nprint('pylsp')\n")
+
+    project = temp_dir / "project"
+    project.mkdir()
+    (project / ".tool-versions").write_text("python 3.11.9\n")
+    env = {
+        **os.environ,
+        "HOME": str(temp_dir / "home"),
+        "ASDF_DATA_DIR": str(asdf),
+        "PATH": os.pathsep.join([str(asdf / "shims"), str(temp_dir / "bin"), "/usr/bin", "/bin"]),
+    }
+    return {"asdf": asdf, "project": project, "env": env}
+
+
+def sync(marketplace_generator, registry, temp_dir, project, env, scope: str = "project") -> dict:
+    config = temp_dir / "config.json"
+    config.write_text(json.dumps({"ensure_installed": ["pylsp"]}))
+    registry_file = temp_dir / "registry.json"
+    registry_file.write_text(json.dumps(registry))
+    result = subprocess.run(
+        [
+            "python3", str(marketplace_generator),
+            "--config", str(config),
+            "--registry", str(registry_file),
+            "--scope", scope,
+            "--json-output",
+        ],
+        capture_output=True,
+        text=True,
+        cwd=project,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    root = Path(env["HOME"]) if scope == "user" else project
+    lsp_json = root / ".claude" / "generated-lsp-marketplace" / "plugins" / "lsp-python-pylsp" / ".lsp.json"
+    return {"result": json.loads(result.stdout), "python": json.loads(lsp_json.read_text())["python"]}
+
+
+class TestShimResolution:
+    """Shims are written to .lsp.json as the binary they run."""
+
+    def test_shim_resolved_and_revalidated(self, marketplace_generator, registry, temp_dir, asdf_env):
+        """The concrete install is written, cached, and re-resolved when .tool-versions changes."""
+        asdf, project, env = asdf_env["asdf"], asdf_env["project"], asdf_env["env"]
+        install = asdf / "installs" / "python" / "3.11.9" / "bin"
+
+        first = sync(marketplace_generator, registry, temp_dir, project, env)
+        # The env-shebang script runs on the interpreter from its own install
+        assert first["python"]["command"] == str(install / "python3")
+        assert first["python"]["args"] == [str(install / "pylsp")]
+        binary = first["result"]["binaries"]["pylsp"]
+        assert binary["path"] == str(install / "pylsp")
+        assert binary["shim"] == str(asdf / "shims" / "pylsp")
+        calls = (asdf / "calls").read_text().count("which")
+
+        # Unchanged version files: the cached answer is used
+        second = sync(marketplace_generator, registry, temp_dir, project, env)
+        assert second["python"] == first["python"]
+        assert (asdf / "calls").read_text().count("which") == calls
+
+        (project / ".tool-versions").write_text("python 3.12.4\n")
+        third = sync(marketplace_generator, registry, temp_dir, project, env)
+        assert third["python"]["args"] == [str(asdf / "installs" / "python" / "3.12.4" / "bin" / "pylsp")]
+
+    def test_dry_run_never_runs_manager(self, marketplace_generator, registry, temp_dir, asdf_env):
+        """Planning answers shims from the last sync and never asks the manager."""
+        asdf, project, env = asdf_env["asdf"], asdf_env["project"], asdf_env["env"]
+        sync(marketplace_generator, registry, temp_dir, project, env)
+        calls = (asdf / "calls").read_text().count("which")
+
+        def dry_run() -> dict:
+            result = subprocess.run(
+                [
+                    "python3", str(marketplace_generator),
+                    "--config", str(temp_dir / "config.json"),
+                    "--registry", str(temp_dir / "registry.json"),
+                    "--scope", "project",
+                    "--dry-run",
+                    "--json-output",
+                ],
+                capture_output=True,
+                text=True,
+                cwd=project,
+                env=env,
+            )
+            assert result.returncode == 0, result.stderr
+            return json.loads(result.stdout)
+
+        assert dry_run()["regenerate"] is False
+        # A changed version file makes the recorded answer stale
+        (project / ".tool-versions").write_text("python 3.12.4\n")
+        assert dry_run()["regenerate"] is True
+        assert (asdf / "calls").read_text().count("which") == calls
+
+    def test_user_scope_keeps_shims(self, marketplace_generator, registry, temp_dir, asdf_env):
+        """Without a project, the shim is written as is and the manager is never asked."""
+        asdf, env = asdf_env["asdf"], asdf_env["env"]
+        home = Path(env["HOME"])
+        home.mkdir()
+        # Pins in $HOME must not leak into every project's user-scope plugin
+        (home / ".tool-versions").write_text("python 3.12.4\n")
+
+        synced = sync(marketplace_generator, registry, temp_dir, home, env, scope="user")
+        assert synced["python"]["command"] == "pylsp"
+        assert "args" not in synced["python"]
+        calls = asdf / "calls"
+        assert not calls.exists() or "which" not in calls.read_text()
+
+    def test_unresolvable_shim_kept(self, marketplace_generator, registry, temp_dir, asdf_env):
+        """A shim the manager cannot resolve is left to PATH as before."""
+        project = asdf_env["project"]
+        (project / ".tool-versions").unlink()
+
+        synced = sync(marketplace_generator, registry, temp_dir, project, asdf_env["env"])
+        assert synced["python"]["command"] == "pylsp"
+        assert "args" not in synced["python"]
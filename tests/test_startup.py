@@ -0,0 +1,114 @@
+"""Cold-start budget tests for generate-marketplace.py."""
+
+import json
+import subprocess
+import time
+
+import pytest
+
+
+IMPORT_RUNS = 3
+WALL_RUNS = 9
+
+
+def import_times(*argv: str) -> dict[str, int]:
+    """
+    Run python3 -X importtime and map each imported module to its self
+    time (us), the fastest of IMPORT_RUNS runs.
+    """
+    modules = {}
+    for _ in range(IMPORT_RUNS):
+        result = subprocess.run(
+            ["python3", "-X", "importtime", *argv],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, _cumulative, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            modules[name] = min(int(self_us), modules.get(name, int(self_us)))
+    return modules
+
+
+def run_ms(argv: list[str]) -> float:
+    """Return the wall time of one run, in milliseconds."""
+    started = time.perf_counter()
+    subprocess.run(
+        ["python3", *argv],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return (time.perf_counter() - started) * 1000
+
+
+def overhead_ms(*argv: str) -> float:
+    """
+    Return the fastest wall time of several runs above a bare interpreter,
+    in milliseconds. The runs alternate with bare ones so that load on the
+    machine slows both alike.
+    """
+    bare, runs = [], []
+    for _ in range(WALL_RUNS):
+        bare.append(run_ms(["-c", "pass"]))
+        runs.append(run_ms(list(argv)))
+    return min(runs) - min(bare)
+
+
+@pytest.fixture
+def budget(fixtures_dir) -> dict:
+    """Load the recorded startup budget."""
+    with open(fixtures_dir / "startup-budget.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def mode_argv(marketplace_generator, plugin_root, temp_dir) -> dict[str, list[str]]:
+    """Command lines for each budgeted mode against a generated marketplace."""
+    config = temp_dir / "config.json"
+    config.write_text(json.dumps({"ensure_installed": ["pylsp", "gopls"], "servers": {}}))
+    output = temp_dir / "marketplace"
+    generate = [
+        str(marketplace_generator),
+        "--config", str(config),
+        "--registry", str(plugin_root / "registry" / "servers.json"),
+        "--output", str(output),
+    ]
+    subprocess.run(generate, capture_output=True, check=True)
+    return {
+        "help": [str(marketplace_generator), "--help"],
+        "remove": [
+            str(marketplace_generator),
+            "--registry", str(plugin_root / "registry" / "servers.json"),
+            "--output", str(output),
+            "--remove", "lua_ls",
+        ],
+        "generate": generate,
+    }
+
+
+@pytest.mark.parametrize("mode", ["help", "remove", "generate"])
+class TestStartupBudget:
+    """Each mode imports only what it needs and starts within budget."""
+
+    def test_import_budget(self, mode, mode_argv, budget):
+        """Imports beyond the bare interpreter stay within the recorded budget."""
+        baseline = import_times("-c", "pass")
+        imported = import_times(*mode_argv[mode])
+        extra = {name: us for name, us in imported.items() if name not in baseline}
+
+        forbidden = sorted(set(budget[mode]["forbidden"]) & set(extra))
+        assert forbidden == [], f"{mode} imports {forbidden}"
+
+        import_ms = sum(extra.values()) / 1000
+        slowest = sorted(extra.items(), key=lambda item: -item[1])[:5]
+        assert import_ms <= budget[mode]["import_ms"], (
+            f"{mode} imports took {import_ms:.1f}ms; slowest: {slowest}"
+        )
+
+    def test_wall_budget(self, mode, mode_argv, budget):
+        """Cold-start wall time above a bare interpreter stays within budget."""
+        wall_ms = overhead_ms(*mode_argv[mode])
+        assert wall_ms <= budget[mode]["wall_ms"], f"{mode} took {wall_ms:.1f}ms over baseline"
@@ -0,0 +1,372 @@
+"""Tests for the lspctl state store."""
+
+import json
+import os
+import sqlite3
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+def run_generator(marketplace_generator: Path, *args: str, env: dict | None = None) -> dict:
+    """Run the generator with --json-output and return its parsed result."""
+    result = subprocess.run(
+        ["python3", str(marketplace_generator), *args, "--json-output"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+
+@pytest.fixture
+def generate(marketplace_generator, registry, temp_dir):
+    """Generate a marketplace for the given servers and return its path."""
+    registry_file = temp_dir / "registry.json"
+    registry_file.write_text(json.dumps(registry))
+    output_dir = temp_dir / "marketplace"
+
+    def _generate(servers: list[str], env: dict | None = None) -> dict:
+        config_file = temp_dir / "config.json"
+        config_file.write_text(json.dumps({"ensure_installed": servers, "servers": {}}))
+        return run_generator(
+            marketplace_generator,
+            "--config", str(config_file),
+            "--registry", str(registry_file),
+            "--output", str(output_dir),
+            env=env,
+        )
+
+    _generate.output_dir = output_dir
+    _generate.registry_file = registry_file
+    return _generate
+
+
+class TestStateStore:
+    """Tests for recording and querying generator state."""
+
+    def test_generate_records_plugins(self, marketplace_generator, generate, isolated_state):
+        """Generated plugins are recorded with content hashes."""
+        generate(["pylsp", "lua_ls"])
+        assert isolated_state.exists()
+
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert state["known"]
+        assert [p["plugin_name"] for p in state["plugins"]] == ["lsp-python-pylsp", "lsp-lua"]
+        assert [p["server_name"] for p in state["plugins"]] == ["pylsp", "lua_ls"]
+        assert all(len(p["content_hash"]) == 64 for p in state["plugins"])
+        assert state["history"][0]["action"] == "generate"
+        assert state["history"][0]["duration_ms"] is not None
+
+    def test_remove_updates_state(self, marketplace_generator, generate):
+        """Removal reads and updates the state store."""
+        generate(["pylsp", "lua_ls", "gopls"])
+
+        result = run_generator(
+            marketplace_generator,
+            "--registry", str(generate.registry_file),
+            "--output", str(generate.output_dir),
+            "--remove", "lua_ls",
+        )
+        assert result["removed"] == "lsp-lua"
+        assert result["remaining_plugins"] == ["lsp-python-pylsp", "lsp-go"]
+
+        marketplace = json.loads(
+            (generate.output_dir / ".claude-plugin" / "marketplace.json").read_text()
+        )
+        assert [p["name"] for p in marketplace["plugins"]] == ["lsp-python-pylsp", "lsp-go"]
+
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert state["current"]
+        assert [p["plugin_name"] for p in state["plugins"]] == ["lsp-python-pylsp", "lsp-go"]
+        assert [(e["action"], e["server_name"]) for e in state["history"][:1]] == [("remove", "lua_ls")]
+
+    def test_remove_never_opens_store(self, marketplace_generator, generate, temp_dir):
+        """--remove works from marketplace.json; the store only catches up with removals."""
+        generate(["pylsp", "lua_ls", "gopls"])
+        (temp_dir / "file").write_text("")
+        removed = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--registry", str(generate.registry_file),
+                "--output", str(generate.output_dir),
+                "--remove", "lua_ls",
+                "--state", str(temp_dir / "file" / "state.db"),
+                "--json-output",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert removed.returncode == 0, removed.stderr
+        assert "State store unavailable" not in removed.stderr
+        assert json.loads(removed.stdout)["remaining_plugins"] == ["lsp-python-pylsp", "lsp-go"]
+
+        # A plugin edited by hand is not a removal, so the record is distrusted
+        lsp_json = generate.output_dir / "plugins" / "lsp-go" / ".lsp.json"
+        lsp_json.write_text(lsp_json.read_text().replace("gopls", "gopls-fork"))
+        run_generator(
+            marketplace_generator,
+            "--registry", str(generate.registry_file),
+            "--output", str(generate.output_dir),
+            "--remove", "pylsp",
+        )
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert not state["current"]
+
+    def test_rebuild_after_lost_state(self, marketplace_generator, generate, isolated_state):
+        """--rebuild-state recovers plugins and hashes from disk."""
+        generate(["pylsp", "gopls"])
+        before = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+
+        for path in isolated_state.parent.glob("lspctl-state.db*"):
+            path.unlink()
+        isolated_state.write_bytes(b"not a database at all" * 100)
+
+        rebuilt = run_generator(
+            marketplace_generator,
+            "--registry", str(generate.registry_file),
+            "--output", str(generate.output_dir),
+            "--rebuild-state",
+        )
+        assert rebuilt["plugins"] == ["lsp-python-pylsp", "lsp-go"]
+
+        after = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert [(p["plugin_name"], p["server_name"], p["content_hash"]) for p in after["plugins"]] == [
+            (p["plugin_name"], p["server_name"], p["content_hash"]) for p in before["plugins"]
+        ]
+        assert (isolated_state.parent / "lspctl-state.db.corrupt").exists()
+
+    def test_older_schema_gains_new_tables(self, marketplace_generator, generate, isolated_state):
+        """A database from an older schema version is migrated on open."""
+        generate(["pylsp"])
+        # Take the database back to version 2
+        with sqlite3.connect(isolated_state) as conn:
+            conn.executescript("""
+                DROP TABLE launches;
+                ALTER TABLE scopes DROP COLUMN project;
+                DROP TABLE binaries;
+                CREATE TABLE binaries (
+                    project TEXT NOT NULL, command TEXT NOT NULL, path TEXT, version TEXT,
+                    mtime REAL, size INTEGER, checked_at REAL NOT NULL,
+                    PRIMARY KEY (project, command)
+                );
+                PRAGMA user_version = 2;
+            """)
+
+        generate(["pylsp"])
+
+        with sqlite3.connect(isolated_state) as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            scope_columns = {row[1] for row in conn.execute("PRAGMA table_info(scopes)")}
+            binaries = conn.execute("SELECT project, command FROM binaries").fetchall()
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        assert "launches" in tables
+        assert "project" in scope_columns
+        assert binaries == [(None, "pylsp")]
+        assert version > 2
+
+    def test_remove_after_sync_without_state(self, marketplace_generator, generate, temp_dir):
+        """A marketplace rewritten with --no-state is read from disk, not the stale state."""
+        generate(["pylsp", "gopls"])
+        config_file = temp_dir / "config.json"
+        config_file.write_text(json.dumps({"ensure_installed": ["lua_ls", "pyright"], "servers": {}}))
+        run_generator(
+            marketplace_generator,
+            "--config", str(config_file),
+            "--registry", str(generate.registry_file),
+            "--output", str(generate.output_dir),
+            "--no-state",
+        )
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert state["known"] and not state["current"]
+
+        missing = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--registry", str(generate.registry_file),
+                "--output", str(generate.output_dir),
+                "--remove", "pylsp",
+                "--json-output",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert "lsp-python-pylsp" in json.loads(missing.stdout)["error"]
+
+        result = run_generator(
+            marketplace_generator,
+            "--registry", str(generate.registry_file),
+            "--output", str(generate.output_dir),
+            "--remove", "pyright",
+        )
+        assert result["remaining_plugins"] == ["lsp-lua"]
+        marketplace = json.loads(
+            (generate.output_dir / ".claude-plugin" / "marketplace.json").read_text()
+        )
+        assert [p["name"] for p in marketplace["plugins"]] == ["lsp-lua"]
+        # --remove leaves the store alone, and a record that did not just
+        # lose plugins stays distrusted until it is rebuilt
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert not state["current"]
+        run_generator(
+            marketplace_generator,
+            "--registry", str(generate.registry_file),
+            "--output", str(generate.output_dir),
+            "--rebuild-state",
+        )
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert state["current"]
+        assert [(p["plugin_name"], p["server_name"]) for p in state["plugins"]] == [("lsp-lua", "lua_ls")]
+
+    def test_binaries_cached_per_project(self, marketplace_generator, registry, temp_dir):
+        """Each project's venv binary keeps its own cached version."""
+        registry_file = temp_dir / "registry.json"
+        registry_file.write_text(json.dumps(registry))
+        config_file = temp_dir / "config.json"
+        config_file.write_text(json.dumps({"ensure_installed": ["pylsp"], "servers": {}}))
+        calls = temp_dir / "calls"
+        projects = {}
+        for name, version in (("one", "1.0.0"), ("two", "2.0.0")):
+            project = temp_dir / name
+            fake = project / ".venv" / "bin" / "pylsp"
+            fake.parent.mkdir(parents=True)
+            fake.write_text(f'#!/bin/sh\necho {name} >> "{calls}"\necho "pylsp v{version}"\n')
+            fake.chmod(0o755)
+            projects[name] = project
+        env = {**os.environ, "PATH": "/usr/bin:/bin"}
+
+        def sync(project: Path) -> dict:
+            result = subprocess.run(
+                [
+                    "python3", str(marketplace_generator),
+                    "--config", str(config_file),
+                    "--registry", str(registry_file),
+                    "--scope", "project",
+                    "--json-output",
+                ],
+                capture_output=True,
+                text=True,
+                cwd=project,
+                env=env,
+            )
+            assert result.returncode == 0, result.stderr
+            return json.loads(result.stdout)["binaries"]["pylsp"]
+
+        for name in ("one", "two", "one", "two"):
+            assert sync(projects[name])["version"] == ("pylsp v1.0.0" if name == "one" else "pylsp v2.0.0")
+        assert calls.read_text().split() == ["one", "two"]
+
+    def test_show_state_uses_scope_project(self, marketplace_generator, registry, temp_dir):
+        """A scope shows the binary resolved for its own project, not the latest anywhere."""
+        registry_file = temp_dir / "registry.json"
+        registry_file.write_text(json.dumps(registry))
+        config_file = temp_dir / "config.json"
+        config_file.write_text(json.dumps({"ensure_installed": ["pylsp"], "servers": {}}))
+        project = temp_dir / "project"
+        home = temp_dir / "home"
+        # The venv is searched before cargo, but only for a project
+        cargo = temp_dir / "cargo"
+        for fake, version in ((project / ".venv" / "bin" / "pylsp", "2.0.0"), (cargo / "bin" / "pylsp", "1.0.0")):
+            fake.parent.mkdir(parents=True)
+            fake.write_text(f'#!/bin/sh\necho "pylsp v{version}"\n')
+            fake.chmod(0o755)
+        home.mkdir()
+        env = {**os.environ, "HOME": str(home), "CARGO_HOME": str(cargo), "PATH": "/usr/bin:/bin"}
+
+        def generator(scope: str, *args: str) -> dict:
+            result = subprocess.run(
+                ["python3", str(marketplace_generator), "--scope", scope, *args, "--json-output"],
+                capture_output=True,
+                text=True,
+                cwd=project,
+                env=env,
+            )
+            assert result.returncode == 0, result.stderr
+            return json.loads(result.stdout)
+
+        common = ["--config", str(config_file), "--registry", str(registry_file)]
+        generator("project", *common)
+        # The user scope resolves the same command later, and without a project
+        generator("user", *common)
+
+        shown = {
+            scope: generator(scope, "--show-state")["plugins"][0]["binary"]
+            for scope in ("project", "user")
+        }
+        assert shown["project"]["path"] == str(project / ".venv" / "bin" / "pylsp")
+        assert shown["project"]["project"] == str(project)
+        assert shown["user"]["path"] == str(cargo / "bin" / "pylsp")
+        assert shown["user"]["project"] is None
+
+    def test_binary_version_probed_once(self, generate, temp_dir):
+        """Versions are cached until the binary changes."""
+        bin_dir = temp_dir / "bin"
+        bin_dir.mkdir()
+        calls = temp_dir / "calls"
+        fake = bin_dir / "pylsp"
+        fake.write_text(f'#!/bin/sh\necho call >> "{calls}"\necho "pylsp v1.2.3"\n')
+        fake.chmod(0o755)
+        env = {**os.environ, "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}"}
+
+        first = generate(["pylsp"], env=env)
+        second = generate(["pylsp"], env=env)
+
+        assert "pylsp" not in first["missing_binaries"]
+        assert first["binaries"]["pylsp"] == {"path": str(fake), "version": "pylsp v1.2.3", "root": "path"}
+        assert second["binaries"]["pylsp"]["version"] == "pylsp v1.2.3"
+        assert calls.read_text().count("call") == 1
+
+    def test_record_install_history(self, marketplace_generator, generate):
+        """Install attempts land in the scope's history."""
+        generate(["pylsp"])
+        run_generator(
+            marketplace_generator,
+            "--output", str(generate.output_dir),
+            "--record-install", "pylsp",
+            "--install-method", "pip",
+            "--install-status", "failed",
+            "--install-duration", "2.5",
+        )
+
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        install = state["history"][0]
+        assert install["action"] == "install"
+        assert install["server_name"] == "pylsp"
+        assert install["status"] == "failed"
+        assert install["detail"] == "pip"
+        assert install["duration_ms"] == 2500
+
+    def test_deregister_drops_scope(self, marketplace_generator, generate):
+        """Deregistering forgets the scope's plugins."""
+        generate(["pylsp", "lua_ls"])
+
+        result = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--deregister"
+        )
+        assert result["plugins_removed"] == ["lsp-python-pylsp", "lsp-lua"]
+
+        state = run_generator(
+            marketplace_generator, "--output", str(generate.output_dir), "--show-state"
+        )
+        assert not state["known"]
+        assert state["plugins"] == []
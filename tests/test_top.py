@@ -0,0 +1,136 @@
+"""Tests for the per-server resource monitor (lsp-top)."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def write_process(proc_root: Path, pid: int, argv: list[str], *, rss_kb: int, ticks: int,
+                  threads: int = 1, start_s: float = 10.0, io: tuple[int, int] | None = (0, 0)):
+    """Create /proc/<pid> files for a fake process."""
+    pid_dir = proc_root / str(pid)
+    pid_dir.mkdir(parents=True)
+    (pid_dir / "cmdline").write_bytes(b"\0".join(arg.encode() for arg in argv) + b"\0")
+    comm = os.path.basename(argv[0])[:15]
+    # Fields after "(comm)": state ppid pgrp session tty tpgid flags minflt cminflt
+    # majflt cmajflt utime stime cutime cstime priority nice num_threads itrealvalue starttime
+    fields = ["S", "1", str(pid), str(pid), "0", "-1", "0", "0", "0", "0", "0",
+              str(ticks), "0", "0", "0", "20", "0", str(threads), "0", str(int(start_s * CLK_TCK))]
+    (pid_dir / "stat").write_text(f"{pid} ({comm}) " + " ".join(fields) + "\n")
+    (pid_dir / "status").write_text(f"Name:\t{comm}\nVmRSS:\t{rss_kb} kB\nThreads:\t{threads}\n")
+    if io is not None:
+        (pid_dir / "io").write_text(f"rchar: 1\nread_bytes: {io[0]}\nwrite_bytes: {io[1]}\n")
+
+
+@pytest.fixture
+def fake_proc(temp_dir):
+    """A /proc tree with two pylsp instances, pyright under node and a shell."""
+    proc_root = temp_dir / "proc"
+    proc_root.mkdir()
+    (proc_root / "uptime").write_text("110.00 200.00\n")
+    write_process(proc_root, 101, ["/home/u/.local/bin/pylsp"], rss_kb=50000, ticks=5 * CLK_TCK,
+                  threads=2, io=(4096, 1024))
+    write_process(proc_root, 102, ["pylsp", "-v"], rss_kb=30000, ticks=0, start_s=60.0, io=(0, 2048))
+    write_process(proc_root, 200, ["node", "/usr/lib/node_modules/pyright/langserver.index.js"],
+                  rss_kb=1, ticks=0)
+    write_process(proc_root, 201, ["node", "/usr/bin/pyright-langserver", "--stdio"],
+                  rss_kb=200000, ticks=10 * CLK_TCK, threads=7, io=None)
+    write_process(proc_root, 300, ["/bin/bash"], rss_kb=4000, ticks=CLK_TCK)
+    return proc_root
+
+
+@pytest.fixture
+def run_top(lsp_top_script):
+    def _run(*args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            ["python3", str(lsp_top_script), *args],
+            capture_output=True,
+            text=True,
+        )
+    return _run
+
+
+class TestSampling:
+    """Processes are mapped to registry servers and aggregated."""
+
+    def test_aggregates_per_server(self, run_top, fake_proc):
+        """Instances are summed per server; unrelated processes are ignored."""
+        result = run_top("--proc-root", str(fake_proc), "--iterations", "1", "--json-output")
+        assert result.returncode == 0, result.stderr
+
+        servers = json.loads(result.stdout)["servers"]
+        assert set(servers) == {"pylsp", "pyright"}
+
+        pylsp = servers["pylsp"]
+        assert pylsp["instances"] == 2
+        assert pylsp["pids"] == [101, 102]
+        assert pylsp["rss_kb"] == 80000
+        assert pylsp["threads"] == 3
+        assert pylsp["uptime_s"] == 100.0
+        assert pylsp["cpu_pct"] == 5.0
+        assert (pylsp["read_bytes"], pylsp["write_bytes"]) == (4096, 3072)
+
+        # Matched through the interpreter's script argument
+        pyright = servers["pyright"]
+        assert pyright["pids"] == [201]
+        assert pyright["cpu_pct"] == 10.0
+        assert pyright["read_bytes"] is None
+
+    def test_record_and_summarize(self, run_top, fake_proc, temp_dir):
+        """A recording condenses to per-server means and peaks."""
+        recording = temp_dir / "run.jsonl"
+        result = run_top("--proc-root", str(fake_proc), "--iterations", "3", "--interval", "0.01",
+                         "--record", str(recording))
+        assert result.returncode == 0, result.stderr
+
+        lines = recording.read_text().splitlines()
+        assert json.loads(lines[0])["format"] == "lspctl-top"
+        assert len(lines) == 4
+
+        result = run_top("--summarize", str(recording), "--json-output")
+        assert result.returncode == 0, result.stderr
+        summary = json.loads(result.stdout)[str(recording)]
+        assert summary["samples"] == 3
+        assert summary["servers"]["pylsp"]["max_instances"] == 2
+        assert summary["servers"]["pylsp"]["mean_rss_kb"] == 80000
+        assert summary["servers"]["pyright"]["peak_rss_kb"] == 200000
+
+    def test_summarize_rejects_other_files(self, run_top, temp_dir):
+        """Files that are not recordings fail with an error."""
+        other = temp_dir / "other.jsonl"
+        other.write_text('{"hello": 1}\n')
+        result = run_top("--summarize", str(other))
+        assert result.returncode == 1
+        assert "not an lsp-top recording" in result.stderr
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def test_detects_live_server(run_top, temp_dir):
+    """A running process named like a registry command shows up."""
+    bin_dir = temp_dir / "bin"
+    bin_dir.mkdir()
+    server = bin_dir / "gopls"
+    server.write_text(f"#!{sys.executable}\nimport time\ntime.sleep(30)\n")
+    server.chmod(0o755)
+
+    process = subprocess.Popen([str(server), "serve"])
+    try:
+        # Give the interpreter time to exec before sampling
+        time.sleep(0.3)
+        result = run_top("--iterations", "1", "--json-output")
+        assert result.returncode == 0, result.stderr
+        gopls = json.loads(result.stdout)["servers"].get("gopls")
+        assert gopls is not None
+        assert process.pid in gopls["pids"]
+        assert gopls["rss_kb"] > 0
+    finally:
+        process.kill()
+        process.wait()
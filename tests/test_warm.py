@@ -0,0 +1,144 @@
+"""Tests for index pre-warming (lsp-warm)."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def project(temp_dir):
+    """A project with a marker file and a few sources."""
+    root = temp_dir / "project"
+    (root / "src" / "deep").mkdir(parents=True)
+    (root / "build.marker").write_text("")
+    (root / "main.py").write_text("print('main')\n")
+    (root / "src" / "util.py").write_text("x = 1\n")
+    (root / "src" / "deep" / "more.py").write_text("y = 2\n")
+    (root / "node_modules").mkdir()
+    (root / "node_modules" / "vendored.py").write_text("")
+    return root
+
+
+@pytest.fixture
+def warm(plugin_root, fixtures_dir, registry, temp_dir, monkeypatch):
+    """Run lsp-warm.py against a registry with fake warmable servers."""
+    events = temp_dir / "events.log"
+    monkeypatch.setenv("FAKE_LSP_LOG", str(events))
+    fake = {
+        "pluginName": "lsp-fake",
+        "language": "python",
+        "description": "Fake server",
+        "command": sys.executable,
+        "args": [str(fixtures_dir / "fake-lsp-server.py")],
+        "extensionToLanguage": {".py": "python"},
+        "installCommands": {},
+    }
+    test_registry = dict(registry)
+    test_registry["fake"] = {**fake, "warm": {"markers": ["build.marker"], "files": 2}}
+    test_registry["fake_cli"] = {
+        **fake,
+        "pluginName": "lsp-fake-cli",
+        "warm": {"markers": ["build.marker"], "command": [sys.executable, "-c", "open('warmed', 'w')"]},
+    }
+    test_registry["fake_broken"] = {
+        **fake,
+        "pluginName": "lsp-fake-broken",
+        "warm": {"command": [sys.executable, "-c", "import sys; sys.exit('no toolchain')"]},
+    }
+    test_registry["fake_elsewhere"] = {**fake, "pluginName": "lsp-fake-other", "warm": {"markers": ["go.mod"]}}
+    registry_file = temp_dir / "registry.json"
+    registry_file.write_text(json.dumps(test_registry))
+
+    def _warm(*args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [
+                "python3", str(plugin_root / "scripts" / "lsp-warm.py"),
+                "--registry", str(registry_file),
+                "--max-load", "0",
+                "--no-state",
+                *args,
+            ],
+            capture_output=True,
+            text=True,
+        )
+
+    _warm.events = lambda: [line.split(" ", 1)[1] for line in events.read_text().splitlines()]
+    return _warm
+
+
+class TestWarm:
+    """Registry warm actions run per project."""
+
+    def test_lsp_warmup_waits_for_indexing(self, warm, project, monkeypatch):
+        """The server sees the handshake and sources, and is shut down after indexing."""
+        monkeypatch.setenv("FAKE_LSP_PROGRESS", "1")
+        result = warm("fake", "--project", str(project), "--json-output")
+        assert result.returncode == 0, result.stderr
+
+        report = json.loads(result.stdout)
+        [fake] = report["results"]
+        assert fake["status"] == "ok"
+        assert fake["files_opened"] == 2
+        assert fake["progress"] == "indexing 50%"
+        assert fake["elapsed_s"] > 1
+
+        events = warm.events()
+        assert events[:3] == ["start", "initialize", "initialized"]
+        opened = [event for event in events if event.startswith("didOpen")]
+        # Shallowest files first; dependency trees are not searched
+        assert opened == [
+            f"didOpen {(project / 'main.py').as_uri()}",
+            f"didOpen {(project / 'src' / 'util.py').as_uri()}",
+        ]
+        assert events.index("indexed") < events.index("shutdown")
+        assert events[-1] == "exit"
+
+    def test_command_warmup_and_skips(self, warm, project):
+        """CLI warm-ups run in the project; servers without markers are skipped."""
+        result = warm("fake_cli", "fake_elsewhere", "pylsp", "--project", str(project), "--json-output")
+        assert result.returncode == 0, result.stderr
+
+        results = {r["server"]: r for r in json.loads(result.stdout)["results"]}
+        assert set(results) == {"fake_cli", "fake_elsewhere"}
+        assert results["fake_cli"]["status"] == "ok"
+        assert results["fake_cli"]["method"] == "command"
+        assert (project / "warmed").exists()
+        assert results["fake_elsewhere"]["status"] == "skipped"
+        assert results["fake_elsewhere"]["reason"] == "no go.mod"
+
+    def test_failure_is_reported(self, warm, project):
+        """A failing warm-up is reported per server and sets the exit code."""
+        result = warm("fake_broken", "fake_cli", "--project", str(project), "--concurrency", "2")
+        assert result.returncode == 1
+
+        assert "fake_broken: started" in result.stdout
+        assert "failed   fake_broken" in result.stdout
+        assert "no toolchain" in result.stdout
+        assert "ok       fake_cli" in result.stdout
+        assert "Warmed 1/2 servers" in result.stdout
+
+    @pytest.mark.parametrize("layout", [[], ["--bundle"]])
+    def test_servers_from_marketplace(self, warm, project, marketplace_generator, temp_dir, layout):
+        """Without names, every warmable server in the marketplace (or bundle) is warmed."""
+        config = temp_dir / "config.json"
+        config.write_text(json.dumps({"ensure_installed": ["fake_cli", "pylsp"], "servers": {}}))
+        generated = subprocess.run(
+            [
+                "python3", str(marketplace_generator),
+                "--config", str(config),
+                "--registry", str(temp_dir / "registry.json"),
+                "--output", str(temp_dir / "marketplace"),
+                "--no-state",
+                *layout,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert generated.returncode == 0, generated.stderr
+
+        result = warm("--from-marketplace", str(temp_dir / "marketplace"),
+                      "--project", str(project), "--json-output")
+        assert result.returncode == 0, result.stderr
+        assert [r["server"] for r in json.loads(result.stdout)["results"]] == ["fake_cli"]
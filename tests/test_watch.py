@@ -0,0 +1,200 @@
+"""Tests for the generator's inotify watch mode."""
+
+import json
+import os
+import select
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = [
+    pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only"),
+    pytest.mark.skipif(shutil.which("lua") is None, reason="lua not available"),
+]
+
+
+def write_atomically(path: Path, text: str) -> None:
+    """Save the way editors do: write a temp file, rename it over the target."""
+    tmp = path.with_name(path.name + ".swp")
+    tmp.write_text(text)
+    tmp.replace(path)
+
+
+class Watcher:
+    """A running watch-mode generator emitting JSON reports."""
+
+    def __init__(
+        self, marketplace_generator: Path, temp_dir: Path, registry: dict, source: list[str] | None = None
+    ):
+        self.config = temp_dir / "lsp-config.lua"
+        self.registry_file = temp_dir / "registry.json"
+        self.bin_dir = temp_dir / "bin"
+        self.output_dir = temp_dir / "marketplace"
+        self.bin_dir.mkdir()
+        self.registry_file.write_text(json.dumps(registry))
+        write_atomically(self.config, 'return { ensure_installed = { "pylsp" } }\n')
+        env = {**os.environ, "PATH": f"{self.bin_dir}{os.pathsep}{os.environ['PATH']}"}
+        self.proc = subprocess.Popen(
+            [
+                "python3", str(marketplace_generator),
+                "--watch",
+                *(source or ["--lua-config", str(self.config)]),
+                "--registry", str(self.registry_file),
+                "--output", str(self.output_dir),
+                "--debounce", "0.2",
+                "--json-output",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=env,
+        )
+
+    def next_report(self, timeout: float = 10.0) -> dict | None:
+        ready, _, _ = select.select([self.proc.stdout], [], [], timeout)
+        if not ready:
+            return None
+        line = self.proc.stdout.readline()
+        return json.loads(line) if line else None
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        self.proc.wait(timeout=5)
+
+
+@pytest.fixture
+def watcher(marketplace_generator, temp_dir, registry):
+    w = Watcher(marketplace_generator, temp_dir, registry)
+    yield w
+    w.stop()
+
+
+class TestWatchMode:
+    """Tests for --watch."""
+
+    def test_initial_sync(self, watcher):
+        """The first run parses and generates everything."""
+        report = watcher.next_report()
+        assert report["stages"] == ["initial"]
+        assert report["generated"] == ["lsp-python-pylsp"]
+        assert report["missing_binaries"] == ["pylsp"]
+        assert (watcher.output_dir / "plugins" / "lsp-python-pylsp" / ".lsp.json").exists()
+
+    def test_config_edit_regenerates_changed_plugins(self, watcher):
+        """A config edit re-parses and writes only new or changed plugins."""
+        watcher.next_report()
+        pylsp_json = watcher.output_dir / "plugins" / "lsp-python-pylsp" / ".lsp.json"
+        before = pylsp_json.stat().st_mtime_ns
+
+        write_atomically(watcher.config, 'return { ensure_installed = { "pylsp", "lua_ls" } }\n')
+        report = watcher.next_report()
+
+        assert report["stages"] == ["parse"]
+        assert report["generated"] == ["lsp-lua"]
+        assert pylsp_json.stat().st_mtime_ns == before
+
+        write_atomically(watcher.config, 'return { ensure_installed = { "lua_ls" } }\n')
+        report = watcher.next_report()
+        assert report["removed"] == ["lsp-python-pylsp"]
+        assert not pylsp_json.exists()
+
+    def test_burst_is_debounced(self, watcher):
+        """Rapid saves produce a single re-sync."""
+        watcher.next_report()
+
+        for i in range(5):
+            write_atomically(watcher.config, f'-- save {i}\nreturn {{ ensure_installed = {{ "gopls" }} }}\n')
+            time.sleep(0.02)
+
+        report = watcher.next_report()
+        assert report["stages"] == ["parse"]
+        assert report["generated"] == ["lsp-go"]
+        assert watcher.next_report(timeout=1.0) is None
+
+    def test_binary_on_path_resolved_without_regeneration(self, watcher):
+        """A server binary appearing on PATH only re-resolves binaries."""
+        watcher.next_report()
+
+        fake = watcher.bin_dir / "pylsp"
+        fake.write_text("#!/bin/sh\necho pylsp 9.9\n")
+        fake.chmod(0o755)
+        report = watcher.next_report()
+
+        assert report["stages"] == ["binaries"]
+        assert report["generated"] == []
+        assert report["binaries"]["pylsp"]["path"] == str(fake)
+        assert report["missing_binaries"] == []
+
+    def test_registry_edit_regenerates(self, watcher, registry):
+        """A registry change regenerates the plugins whose output changed."""
+        watcher.next_report()
+
+        edited = json.loads(json.dumps(registry))
+        edited["pylsp"]["description"] = "Edited description"
+        edited["gopls"]["description"] = "Not configured, no effect"
+        write_atomically(watcher.registry_file, json.dumps(edited))
+        report = watcher.next_report()
+
+        assert report["stages"] == ["registry"]
+        assert report["generated"] == ["lsp-python-pylsp"]
+
+    def test_parse_error_reported_and_recovered(self, watcher):
+        """A broken save is reported; the next good save syncs again."""
+        watcher.next_report()
+
+        write_atomically(watcher.config, "return {\n")
+        report = watcher.next_report()
+        assert report["error"]
+        assert (watcher.output_dir / "plugins" / "lsp-python-pylsp").exists()
+
+        write_atomically(watcher.config, 'return { ensure_installed = { "pylsp", "bashls" } }\n')
+        report = watcher.next_report()
+        assert report["error"] is None
+        assert report["generated"] == ["lsp-bash"]
+
+
+class TestWatchNvimConfig:
+    """Tests for --watch over an imported Neovim config tree."""
+
+    @pytest.fixture
+    def nvim_watcher(self, marketplace_generator, nvim_config_dir, temp_dir, registry):
+        config_dir = temp_dir / "nvim"
+        shutil.copytree(nvim_config_dir, config_dir)
+        w = Watcher(marketplace_generator, temp_dir, registry, ["--import-nvim", str(config_dir)])
+        w.config_dir = config_dir
+        yield w
+        w.stop()
+
+    def test_new_module_directory_watched(self, nvim_watcher):
+        """Modules in a lua/ subdirectory created after startup are picked up."""
+        report = nvim_watcher.next_report()
+        assert "lsp-cpp" not in report["generated"]
+
+        lang = nvim_watcher.config_dir / "lua" / "plugins" / "lang"
+        lang.mkdir()
+        assert nvim_watcher.next_report()["stages"] == ["parse"]
+
+        write_atomically(lang / "init.lua", (
+            'return { "neovim/nvim-lspconfig", opts = { servers = { clangd = {} } } }\n'
+        ))
+        report = nvim_watcher.next_report()
+        assert report["stages"] == ["parse"]
+        assert report["generated"] == ["lsp-cpp"]
+
+    def test_state_error_reported(self, nvim_watcher, isolated_state):
+        """A state store error fails one run, not the watcher."""
+        nvim_watcher.next_report()
+        config = nvim_watcher.config_dir / "lua" / "plugins" / "lspconfig.lua"
+        saved = config.read_text()
+
+        for suffix in ("", "-wal", "-shm"):
+            isolated_state.with_name(isolated_state.name + suffix).write_bytes(b"not a database at all" * 2000)
+        write_atomically(config, saved.replace("bashls = {},", "bashls = {}, clangd = {},"))
+        report = nvim_watcher.next_report()
+        assert report["error"]
+        assert nvim_watcher.proc.poll() is None